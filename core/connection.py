@@ -41,9 +41,21 @@ from configs.manage_api_client import DeviceNotFoundException, DeviceBindExcepti
 from core.utils.prompt_manager import PromptManager
 from core.utils.voiceprint_provider import VoiceprintProvider
 from core.utils import textUtils
+from core.utils.metrics import REGISTRY
 
 TAG = __name__
 
+_DROPPED_MESSAGES = REGISTRY.counter(
+    "xiaozhi_dropped_messages_total", "未处理而丢弃的设备消息数", ["reason"]
+)
+_DROPPED_BIND_TIMEOUT = _DROPPED_MESSAGES.labels("bind_timeout")
+_DROPPED_NEED_BIND = _DROPPED_MESSAGES.labels("need_bind")
+# 关闭连接时各队列中未处理的消息，按关闭原因计数
+_DROPPED_ON_CLOSE = {
+    reason: _DROPPED_MESSAGES.labels(reason)
+    for reason in ("timeout", "error", "client_close", "server_close")
+}
+
 auto_import_modules("plugins.functions")
 
 
@@ -155,6 +167,8 @@ class ConnectionHandler:
             int(self.config.get("close_connection_no_voice_time", 120)) + 60
         )  # 在原来第一道关闭的基础上加60秒，进行二道关闭
         self.timeout_task = None
+        # 连接关闭原因（timeout/error/client_close/server_close），用于丢弃消息计数
+        self.close_reason = None
 
         # {"mcp":true} 表示启用MCP功能
         self.features = None
@@ -212,6 +226,8 @@ class ConnectionHandler:
                     await self._route_message(message)
             except websockets.exceptions.ConnectionClosed:
                 self.logger.bind(tag=TAG).info("客户端断开连接")
+            if self.close_reason is None:
+                self.close_reason = "client_close"
 
         except AuthenticationError as e:
             self.logger.bind(tag=TAG).error(f"Authentication failed: {str(e)}")
@@ -219,6 +235,8 @@ class ConnectionHandler:
         except Exception as e:
             stack_trace = traceback.format_exc()
             self.logger.bind(tag=TAG).error(f"Connection error: {str(e)}-{stack_trace}")
+            if self.close_reason is None:
+                self.close_reason = "error"
             return
         finally:
             try:
@@ -287,12 +305,14 @@ class ConnectionHandler:
                 await asyncio.wait_for(self.bind_completed_event.wait(), timeout=1)
             except asyncio.TimeoutError:
                 # 超时仍未获取到真实状态，丢弃消息
+                _DROPPED_BIND_TIMEOUT.inc()
                 await self._discard_message_with_bind_prompt()
                 return
 
         # 已经获取到真实状态，检查是否需要绑定
         if self.need_bind:
             # 需要绑定，丢弃消息
+            _DROPPED_NEED_BIND.inc()
             await self._discard_message_with_bind_prompt()
             return
 
@@ -1118,8 +1138,12 @@ class ConnectionHandler:
             if self.stop_event:
                 self.stop_event.set()
 
-            # 清空任务队列
-            self.clear_queues()
+            # 清空任务队列，未处理的消息按关闭原因计入丢弃数
+            if self.close_reason is None:
+                self.close_reason = "server_close"
+            dropped = self.clear_queues()
+            if dropped:
+                _DROPPED_ON_CLOSE[self.close_reason].inc(dropped)
 
             # 关闭WebSocket连接
             try:
@@ -1178,7 +1202,13 @@ class ConnectionHandler:
                 self.stop_event.set()
 
     def clear_queues(self):
-        """清空所有任务队列"""
+        """
+        清空所有任务队列
+
+        Returns:
+            清掉的消息数
+        """
+        cleared = 0
         if self.tts:
             self.logger.bind(tag=TAG).debug(
                 f"开始清理: TTS队列大小={self.tts.tts_text_queue.qsize()}, 音频队列大小={self.tts.tts_audio_queue.qsize()}"
@@ -1197,15 +1227,18 @@ class ConnectionHandler:
                         q.get_nowait()
                     except queue.Empty:
                         break
+                    cleared += 1
 
             # 重置音频流控器（取消后台任务并清空队列）
             if hasattr(self, "audio_rate_controller") and self.audio_rate_controller:
+                cleared += len(self.audio_rate_controller.queue)
                 self.audio_rate_controller.reset()
                 self.logger.bind(tag=TAG).debug("已重置音频流控器")
 
             self.logger.bind(tag=TAG).debug(
                 f"清理结束: TTS队列大小={self.tts.tts_text_queue.qsize()}, 音频队列大小={self.tts.tts_audio_queue.qsize()}"
             )
+        return cleared
 
     def reset_vad_states(self):
         self.client_audio_buffer = bytearray()
@@ -1238,6 +1271,7 @@ class ConnectionHandler:
                     if current_time - last_activity_time > self.timeout_seconds * 1000:
                         if not self.stop_event.is_set():
                             self.logger.bind(tag=TAG).info("连接超时，准备关闭")
+                            self.close_reason = "timeout"
                             # 设置停止事件，防止重复处理
                             self.stop_event.set()
                             # 使用 try-except 包装关闭操作，确保不会因为异常而阻塞
@@ -1,6 +1,8 @@
 from .handler import DanmakuHandler, DanmakuConnection
 from .service import DanmakuService
 from .device_manager import DeviceManager
+from .room import LiveRoom
+from .reactions import ReactionEngine
 from .ota_handler import DanmakuOTAHandler
 
 __all__ = [
@@ -8,5 +10,7 @@ __all__ = [
     'DanmakuConnection',
     'DanmakuService',
     'DeviceManager',
+    'LiveRoom',
+    'ReactionEngine',
     'DanmakuOTAHandler',
 ]
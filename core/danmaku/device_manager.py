@@ -1,15 +1,42 @@
 """
 设备管理器
 管理所有连接的硬件设备，支持音频广播功能
+
+每个设备有独立的有界发送队列和发送任务，广播时只把数据放入各设备队列，
+网络差的设备只会让自己的队列积压（超出上限时按策略丢弃），不会拖慢其他设备。
+
+广播的同时在有界环形缓冲中保留当前句子（tts start、sentence_start 和之后的音频帧），
+回复中途连接的设备先按节奏补发当前句子，追上后再接收实时音频。
+
+每个设备记录健康状态（ping 往返时间、发送耗时的指数移动平均、连续失败次数、未发送的缓冲字节数），
+链路变差的设备降级（发送队列缩短，积压时更快跳到最新进度），失效的连接立即移除，不必等待定期清理。
 """
 
 import asyncio
 import json
-from typing import Dict, Set
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Set
+from urllib.parse import parse_qs, urlparse
 from dataclasses import dataclass
 from datetime import datetime
 import websockets
 
+# 发送队列满时的丢弃策略
+DROP_OLDEST = "drop_oldest"  # 丢弃最早的待发送数据（跳到最新进度）
+DROP_NEWEST = "drop_newest"  # 丢弃新数据（保留已排队的内容）
+
+# 设备健康状态
+HEALTHY = "healthy"
+DEMOTED = "demoted"  # 链路变差，发送队列缩短
+EVICTED = "evicted"  # 已移除
+
+# 移除原因
+EVICT_SEND_FAILURES = "send_failures"  # 连续发送失败
+EVICT_MISSED_PONGS = "missed_pongs"  # 连续 ping 无响应
+EVICT_BUFFER = "buffer"  # 未发送的缓冲数据过多
+EVICT_STALLED = "stalled"  # 单次发送卡住
+
 
 @dataclass
 class DeviceInfo:
@@ -18,22 +45,127 @@ class DeviceInfo:
     websocket: websockets.WebSocketServerProtocol
     connected_at: datetime
     client_ip: str
+    send_queue: Optional[asyncio.Queue] = None  # 待发送数据
+    writer_task: Optional[asyncio.Task] = None  # 发送任务
+    sent_count: int = 0
+    dropped_count: int = 0
+    state: str = HEALTHY
+    rtt: Optional[float] = None  # ping 往返时间的指数移动平均（秒）
+    send_latency: Optional[float] = None  # 单次发送耗时的指数移动平均（秒）
+    send_failures: int = 0  # 连续发送失败次数
+    missed_pongs: int = 0  # 连续 ping 无响应次数
+    sending_since: float = 0.0  # 正在进行的发送的开始时间（0 表示空闲）
+
+
+class CatchupBuffer:
+    """
+    当前句子的有界缓冲
+
+    收到 sentence_start 时清空并重新开始记录，帧数和字节数超出上限时丢弃最早的帧，内存占用严格有界。
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        """
+        Args:
+            config: 补发配置（danmaku.device_queue.catchup）
+        """
+        config = config or {}
+        self.max_frames = max(1, int(config.get("max_frames", 50)))
+        self.max_bytes = int(float(config.get("max_kb", 64)) * 1024)
+        self.idle_timeout = float(config.get("idle_timeout", 1.0))  # 超过该秒数没有新音频视为句子已结束
+
+        self.frames = deque()
+        self.bytes = 0
+        self.start_message = None  # 最近的 tts start 消息
+        self.sentence_message = None  # 当前句子的 sentence_start 消息
+        self.last_at = 0.0
+
+    def record(self, data):
+        """记录一条广播数据（音频帧为 bytes，控制消息为 JSON 字符串）"""
+        if isinstance(data, (bytes, bytearray)):
+            if self.sentence_message is None:
+                return
+            self.frames.append(data)
+            self.bytes += len(data)
+            while len(self.frames) > self.max_frames or self.bytes > self.max_bytes:
+                self.bytes -= len(self.frames.popleft())
+            self.last_at = time.monotonic()
+            return
+
+        if '"tts"' not in data:
+            return
+        try:
+            state = json.loads(data).get("state")
+        except (ValueError, AttributeError):
+            return
+        if state == "start":
+            self.start_message = data
+        elif state == "sentence_start":
+            self.sentence_message = data
+            self.frames.clear()
+            self.bytes = 0
+            self.last_at = time.monotonic()
+
+    def snapshot(self) -> list:
+        """
+        当前句子的补发内容
+
+        Returns:
+            [tts start, sentence_start, 音频帧...]，没有正在播放的句子时返回空列表
+        """
+        if self.sentence_message is None or time.monotonic() - self.last_at > self.idle_timeout:
+            return []
+        items = [message for message in (self.start_message, self.sentence_message) if message]
+        items.extend(self.frames)
+        return items
 
 
 class DeviceManager:
     """设备管理器"""
 
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, config: Dict[str, Any] = None):
         """
         初始化设备管理器
 
         Args:
             logger: 日志记录器
+            config: 设备发送队列配置（danmaku.device_queue）
         """
         self.logger = logger
         self.devices: Dict[str, DeviceInfo] = {}  # device_id -> DeviceInfo
         self.device_lock = asyncio.Lock()
 
+        config = config or {}
+        self.queue_size = max(1, int(config.get("max_size", 100)))  # 每个设备最多排队的消息数
+        self.drop_policy = config.get("drop_policy", DROP_OLDEST)
+
+        # 中途加入的设备补发当前句子
+        catchup_config = config.get("catchup", {})
+        self.catchup = CatchupBuffer(catchup_config) if catchup_config.get("enabled", True) else None
+        self.catchup_burst = max(0, int(catchup_config.get("burst_frames", 5)))  # 开始时立即发送的帧数
+        frame_duration = float(catchup_config.get("frame_duration", 60)) / 1000
+        catchup_rate = max(1.0, float(catchup_config.get("rate", 1.25)))  # 补发速度（相对实时播放的倍数）
+        self.catchup_interval = frame_duration / catchup_rate  # 之后每帧的发送间隔
+
+        # 设备健康检查
+        health_config = config.get("health", {})
+        self.health_enabled = health_config.get("enabled", True)
+        self.ping_interval = float(health_config.get("ping_interval", 5))
+        self.ping_timeout = float(health_config.get("ping_timeout", 5))
+        self.ewma_alpha = float(health_config.get("ewma_alpha", 0.3))
+        self.demote_rtt = float(health_config.get("demote_rtt_ms", 800)) / 1000
+        self.demote_send_latency = float(health_config.get("demote_send_ms", 200)) / 1000
+        self.demoted_queue_size = max(1, int(health_config.get("demoted_queue_size", 10)))
+        self.max_failures = max(1, int(health_config.get("max_failures", 3)))
+        self.max_buffered = int(float(health_config.get("max_buffer_kb", 256)) * 1024)
+        self.max_stall = float(health_config.get("max_stall", 10))
+
+        # 累计统计（包括已断开的设备）
+        self.total_sent = 0
+        self.total_dropped = 0
+        self.total_catchups = 0
+        self.evictions: Dict[str, int] = {}  # 移除原因 -> 设备数
+
     async def add_device(self, device_id: str, websocket: websockets.WebSocketServerProtocol, client_ip: str):
         """
         添加设备
@@ -48,8 +180,17 @@ class DeviceManager:
                 device_id=device_id,
                 websocket=websocket,
                 connected_at=datetime.now(),
-                client_ip=client_ip
+                client_ip=client_ip,
+                send_queue=asyncio.Queue(maxsize=self.queue_size),
             )
+            catchup = self.catchup.snapshot() if self.catchup is not None else []
+            device_info.writer_task = asyncio.create_task(self._device_writer(device_info, catchup))
+
+            # 同一设备重连时停止旧连接的发送任务
+            previous = self.devices.get(device_id)
+            if previous is not None:
+                self._stop_writer(previous)
+
             self.devices[device_id] = device_info
             self.logger.debug(f"设备已连接: {device_id} ({client_ip}), 当前设备数: {len(self.devices)}")
 
@@ -63,7 +204,11 @@ class DeviceManager:
         async with self.device_lock:
             if device_id in self.devices:
                 device_info = self.devices.pop(device_id)
-                self.logger.debug(f"设备已断开: {device_id}, 剩余设备数: {len(self.devices)}")
+                self._stop_writer(device_info)
+                self.logger.debug(
+                    f"设备已断开: {device_id}, 剩余设备数: {len(self.devices)}, "
+                    f"已发送 {device_info.sent_count}, 丢弃 {device_info.dropped_count}"
+                )
                 try:
                     await device_info.websocket.close()
                 except Exception as e:
@@ -71,45 +216,110 @@ class DeviceManager:
 
     async def broadcast_audio(self, audio_data: bytes, exclude_devices: Set[str] = None):
         """
-        向所有设备广播音频数据
+        向所有设备广播音频数据（只放入各设备的发送队列，不等待发送完成）
 
         Args:
             audio_data: 音频数据
             exclude_devices: 需要排除的设备ID集合
         """
-        if exclude_devices is None:
-            exclude_devices = set()
+        if self.catchup is not None:
+            self.catchup.record(audio_data)
 
-        async with self.device_lock:
-            # 获取需要发送的设备列表
-            target_devices = [
-                device_info for device_id, device_info in self.devices.items()
-                if device_id not in exclude_devices
-            ]
-
-        if not target_devices:
-            self.logger.warning(f"⚠️  没有可用的设备接收广播（当前设备数: {len(self.devices)}）")
+        if not self.devices:
+            self.logger.warning(f"⚠️  没有可用的设备接收广播（当前设备数: 0）")
             return
 
-        self.logger.debug(f"准备广播音频: {len(audio_data)} 字节 → {len(target_devices)} 个设备")
+        # 遍历过程中没有 await，设备列表不会被并发修改，无需加锁
+        for device_id, device_info in self.devices.items():
+            if exclude_devices and device_id in exclude_devices:
+                continue
+            self._enqueue(device_info, audio_data)
 
-        # 并发发送给所有设备
-        tasks = []
-        for device_info in target_devices:
-            task = self._send_to_device(device_info, audio_data)
-            tasks.append(task)
+    def _enqueue(self, device_info: DeviceInfo, data):
+        """
+        放入设备发送队列，队列已满时按丢弃策略处理
 
-        # 等待所有发送完成
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        Args:
+            device_info: 设备信息
+            data: 要发送的数据
+        """
+        send_queue = device_info.send_queue
+        limit = self.demoted_queue_size if device_info.state == DEMOTED else self.queue_size
+        if send_queue.qsize() >= limit:
+            if self.drop_policy == DROP_NEWEST:
+                self._record_drop(device_info)
+                return
+            # 刚降级的设备队列可能超出降级后的上限，一次丢弃到上限以内
+            while send_queue.qsize() >= limit:
+                try:
+                    send_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                self._record_drop(device_info)
+        send_queue.put_nowait(data)
+
+    def _record_drop(self, device_info: DeviceInfo):
+        """记录丢弃的数据（首次及每丢弃100条记录一次日志）"""
+        device_info.dropped_count += 1
+        self.total_dropped += 1
+        if device_info.dropped_count == 1 or device_info.dropped_count % 100 == 0:
+            self.logger.warning(
+                f"⚠️  设备 {device_info.device_id} 发送积压，已丢弃 {device_info.dropped_count} 条数据"
+            )
+
+    async def _device_writer(self, device_info: DeviceInfo, catchup: list = None):
+        """
+        设备发送任务：按顺序发送队列中的数据（连接关闭后由 remove_device 取消）
+
+        Args:
+            device_info: 设备信息
+            catchup: 需要先补发的当前句子
+        """
+        send_queue = device_info.send_queue
+        if catchup:
+            if not await self._send_catchup(device_info, catchup):
+                return
+        while True:
+            data = await send_queue.get()
+            await self._send_to_device(device_info, data)
+
+    async def _send_catchup(self, device_info: DeviceInfo, items: list) -> bool:
+        """
+        补发当前句子并追上实时音频
 
-        # 统计发送结果
-        success_count = sum(1 for r in results if r is True)
-        failed_count = len(results) - success_count
+        前 catchup_burst 帧立即发送，之后按 catchup_interval 的节奏发送，避免塞满设备缓冲区；
+        补发期间实时广播的数据进入发送队列，继续按节奏发送直到队列清空。
 
-        if failed_count > 0:
-            self.logger.warning(f"音频广播完成: 成功 {success_count}, 失败 {failed_count}")
-        else:
-            self.logger.debug(f"音频广播完成: 成功 {success_count}")
+        Returns:
+            设备连接是否仍然正常
+        """
+        pending = deque(items)
+        frames_sent = 0
+        start = time.monotonic()
+        while True:
+            if not pending:
+                try:
+                    pending.append(device_info.send_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            data = pending.popleft()
+            if isinstance(data, (bytes, bytearray)):
+                if frames_sent >= self.catchup_burst:
+                    delay = start + (frames_sent - self.catchup_burst) * self.catchup_interval - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                frames_sent += 1
+            if not await self._send_to_device(device_info, data):
+                return False
+
+        self.total_catchups += 1
+        self.logger.debug(f"设备 {device_info.device_id} 补发当前句子 {frames_sent} 帧后接入实时音频")
+        return True
+
+    def _stop_writer(self, device_info: DeviceInfo):
+        """停止设备的发送任务"""
+        if device_info.writer_task and not device_info.writer_task.done():
+            device_info.writer_task.cancel()
 
     async def _send_to_device(self, device_info: DeviceInfo, data: bytes) -> bool:
         """
@@ -122,8 +332,16 @@ class DeviceManager:
         Returns:
             是否发送成功
         """
+        started = time.monotonic()
+        device_info.sending_since = started
         try:
             await device_info.websocket.send(data)
+            device_info.sent_count += 1
+            self.total_sent += 1
+            device_info.send_failures = 0
+            if self.health_enabled:
+                device_info.send_latency = self._ewma(device_info.send_latency, time.monotonic() - started)
+                self._check_device(device_info)
             return True
         except websockets.exceptions.ConnectionClosed as e:
             self.logger.warning(f"❌ 设备连接已关闭: {device_info.device_id}, 原因: {e}")
@@ -132,8 +350,123 @@ class DeviceManager:
             return False
         except Exception as e:
             self.logger.error(f"❌ 发送数据到设备 {device_info.device_id} 时出错: {e}")
+            device_info.send_failures += 1
+            if self.health_enabled:
+                self._check_device(device_info)
+            return False
+        finally:
+            device_info.sending_since = 0.0
+
+    def _ewma(self, current: Optional[float], sample: float) -> float:
+        """指数移动平均"""
+        if current is None:
+            return sample
+        return current + self.ewma_alpha * (sample - current)
+
+    @staticmethod
+    def _buffered_bytes(websocket) -> int:
+        """连接中已写入但尚未发出的字节数"""
+        transport = getattr(websocket, "transport", None)
+        if transport is None:
+            return 0
+        try:
+            return transport.get_write_buffer_size()
+        except Exception:
+            return 0
+
+    def _check_device(self, device_info: DeviceInfo) -> bool:
+        """
+        按阈值更新设备健康状态：失效的连接立即移除，链路变差的设备降级，恢复后升级
+
+        Returns:
+            设备是否仍保留
+        """
+        if device_info.state == EVICTED:
             return False
 
+        reason = None
+        if device_info.send_failures >= self.max_failures:
+            reason = EVICT_SEND_FAILURES
+        elif device_info.missed_pongs >= self.max_failures:
+            reason = EVICT_MISSED_PONGS
+        elif self._buffered_bytes(device_info.websocket) > self.max_buffered:
+            reason = EVICT_BUFFER
+        elif device_info.sending_since and time.monotonic() - device_info.sending_since > self.max_stall:
+            reason = EVICT_STALLED
+        if reason is not None:
+            self._evict(device_info, reason)
+            return False
+
+        rtt = device_info.rtt or 0.0
+        send_latency = device_info.send_latency or 0.0
+        if device_info.state == HEALTHY:
+            if rtt > self.demote_rtt or send_latency > self.demote_send_latency:
+                device_info.state = DEMOTED
+                self.logger.warning(
+                    f"⚠️  设备 {device_info.device_id} 链路变差，降级（RTT {rtt * 1000:.0f}ms，"
+                    f"发送耗时 {send_latency * 1000:.0f}ms）"
+                )
+        elif rtt < self.demote_rtt / 2 and send_latency < self.demote_send_latency / 2:
+            # 降到阈值一半以下才恢复，避免在阈值附近反复切换
+            device_info.state = HEALTHY
+            self.logger.info(f"设备 {device_info.device_id} 链路恢复")
+        return True
+
+    def _evict(self, device_info: DeviceInfo, reason: str):
+        """立即移出广播并在后台关闭连接（同一设备已重连时不影响新连接）"""
+        device_info.state = EVICTED
+        if self.devices.get(device_info.device_id) is not device_info:
+            return
+        del self.devices[device_info.device_id]
+        self._stop_writer(device_info)
+        self.evictions[reason] = self.evictions.get(reason, 0) + 1
+        self.logger.warning(
+            f"❌ 移除失效设备: {device_info.device_id}（{reason}），剩余设备数: {len(self.devices)}"
+        )
+        asyncio.create_task(self._close_quietly(device_info.websocket))
+
+    async def _close_quietly(self, websocket):
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+    async def _ping_device(self, device_info: DeviceInfo):
+        """发送 ping 并记录往返时间，超时记为一次无响应"""
+        started = time.monotonic()
+        try:
+            pong_waiter = await asyncio.wait_for(device_info.websocket.ping(), self.ping_timeout)
+            await asyncio.wait_for(pong_waiter, max(0.0, self.ping_timeout - (time.monotonic() - started)))
+        except asyncio.TimeoutError:
+            device_info.missed_pongs += 1
+            return
+        except websockets.exceptions.ConnectionClosed:
+            device_info.missed_pongs = self.max_failures
+            return
+        device_info.missed_pongs = 0
+        device_info.rtt = self._ewma(device_info.rtt, time.monotonic() - started)
+
+    async def check_health(self):
+        """ping 所有设备并按阈值降级或移除（由服务按 ping_interval 定期调用）"""
+        if not self.health_enabled:
+            return
+        devices = [info for info in self.devices.values() if hasattr(info.websocket, "ping")]
+        await asyncio.gather(*(self._ping_device(info) for info in devices), return_exceptions=True)
+        for device_info in list(self.devices.values()):
+            self._check_device(device_info)
+
+    def get_health_stats(self) -> dict:
+        """获取设备健康统计"""
+        states = [info.state for info in self.devices.values()]
+        rtts = [info.rtt for info in self.devices.values() if info.rtt is not None]
+        return {
+            "healthy": states.count(HEALTHY),
+            "demoted": states.count(DEMOTED),
+            "evictions": dict(self.evictions),
+            "rtt_avg_ms": round(sum(rtts) / len(rtts) * 1000, 1) if rtts else 0.0,
+            "rtt_max_ms": round(max(rtts) * 1000, 1) if rtts else 0.0,
+        }
+
     async def broadcast_message(self, message: dict, exclude_devices: Set[str] = None):
         """
         向所有设备广播JSON消息
@@ -153,13 +486,26 @@ class DeviceManager:
         """获取当前连接的设备数量"""
         return len(self.devices)
 
+    def get_queued_count(self) -> int:
+        """获取所有设备发送队列中待发送的消息总数"""
+        return sum(info.send_queue.qsize() for info in self.devices.values() if info.send_queue)
+
     def get_device_list(self) -> list:
         """获取设备列表"""
         return [
             {
                 "device_id": device_id,
                 "client_ip": device_info.client_ip,
-                "connected_at": device_info.connected_at.isoformat()
+                "connected_at": device_info.connected_at.isoformat(),
+                "queued": device_info.send_queue.qsize() if device_info.send_queue else 0,
+                "sent": device_info.sent_count,
+                "dropped": device_info.dropped_count,
+                "state": device_info.state,
+                "rtt_ms": round(device_info.rtt * 1000, 1) if device_info.rtt is not None else None,
+                "send_ms": round(device_info.send_latency * 1000, 1) if device_info.send_latency is not None else None,
+                "send_failures": device_info.send_failures,
+                "missed_pongs": device_info.missed_pongs,
+                "buffered": self._buffered_bytes(device_info.websocket),
             }
             for device_id, device_info in self.devices.items()
         ]
@@ -201,8 +547,89 @@ class DeviceManager:
 
             # 移除断开的设备
             for device_id in disconnected_devices:
-                self.devices.pop(device_id, None)
+                device_info = self.devices.pop(device_id, None)
+                if device_info is not None:
+                    self._stop_writer(device_info)
                 self.logger.debug(f"清理断开的设备: {device_id}")
 
             if disconnected_devices:
                 self.logger.info(f"清理完成，移除 {len(disconnected_devices)} 个设备")
+
+
+# 与硬件协议兼容的 hello 响应
+HELLO_RESPONSE = {
+    "type": "hello",
+    "version": 1,
+    "transport": "websocket",
+    "audio_params": {
+        "format": "opus",
+        "sample_rate": 16000,
+        "channels": 1,
+        "frame_duration": 60
+    }
+}
+
+
+async def serve_device_connection(websocket, device_managers: Dict[str, "DeviceManager"], default_room_id: str, logger):
+    """
+    处理一个设备WebSocket连接：按 room-id 加入直播间的设备分组，发送 hello 响应，保持连接直到断开
+
+    Args:
+        websocket: WebSocket连接
+        device_managers: 直播间ID -> 设备管理器
+        default_room_id: 设备未指定直播间时加入的直播间
+        logger: 日志记录器
+    """
+    device_id = None
+    device_manager = None
+
+    try:
+        # 从请求头或URL参数获取device_id和room-id
+        # websocket.request.path 包含完整路径，如 "/danmaku/?device-id=xxx&room-id=yyy"
+        headers = dict(websocket.request.headers)
+        query_params = parse_qs(urlparse(websocket.request.path).query)
+        device_id = headers.get("device-id") or query_params.get("device-id", [None])[0]
+        room_id = headers.get("room-id") or query_params.get("room-id", [None])[0]
+
+        if not device_id:
+            logger.warning("设备连接缺少device-id")
+            await websocket.send("缺少device-id参数")
+            await websocket.close()
+            return
+
+        # 未指定直播间时加入默认直播间
+        room_id = room_id or default_room_id
+        device_manager = device_managers.get(room_id)
+        if device_manager is None:
+            logger.warning(f"设备 {device_id} 请求的直播间不存在: {room_id}")
+            await websocket.send(f"直播间不存在: {room_id}")
+            await websocket.close()
+            return
+
+        # 获取客户端IP
+        client_ip = websocket.remote_address[0]
+
+        # 发送标准的 hello 响应消息（使用 device_id 作为 session_id），之后再接收补发和实时音频
+        hello_response = {**HELLO_RESPONSE, "session_id": device_id}
+        await websocket.send(json.dumps(hello_response, ensure_ascii=False))
+        logger.info(f"✅ 已发送 hello 响应给设备: {device_id}")
+
+        # 添加到直播间的设备管理器
+        await device_manager.add_device(device_id, websocket, client_ip)
+        logger.info(f"设备 {device_id} 加入直播间: {room_id}")
+
+        # 保持连接
+        async for message in websocket:
+            # 这里可以处理设备发来的消息（如果需要）
+            logger.debug(f"收到设备消息: {device_id}: {message}")
+
+    except websockets.exceptions.ConnectionClosed:
+        logger.debug(f"设备断开连接: {device_id}")
+
+    except Exception as e:
+        logger.error(f"处理设备连接时出错: {e}")
+
+    finally:
+        # 移除设备
+        if device_id and device_manager is not None:
+            await device_manager.remove_device(device_id)
@@ -0,0 +1,432 @@
+"""
+多进程设备广播
+单个事件循环同时负责所有设备的 WebSocket 分帧和写入时，设备数多了以后进程CPU会先于 LLM/TTS 达到上限。
+开启后设备连接由多个工作进程处理：
+    - 工作进程以 SO_REUSEPORT 共同监听设备端口，内核把新连接分配到各进程，每个进程持有一部分设备
+    - 主进程（弹幕处理器）每个音频帧只编码一次，通过 Unix 套接字发布给所有工作进程
+    - 工作进程把帧放入本进程各设备的发送队列（沿用 DeviceManager 的有界队列和丢弃策略），
+      并定期回报设备数和发送统计；工作进程退出后由主进程重新启动
+
+帧格式：类型(uint8) + 直播间ID长度(uint16) + 内容长度(uint32) + 直播间ID + 内容
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import struct
+import tempfile
+from typing import Any, Dict, List, Optional, Set
+
+import websockets
+
+from core.danmaku.device_manager import DeviceManager, serve_device_connection
+
+TAG = __name__
+
+FRAME_BINARY = 0  # 音频帧（二进制消息）
+FRAME_TEXT = 1  # 控制消息（文本消息）
+FRAME_STATS = 2  # 工作进程回报的统计（JSON）
+_FRAME_HEADER = struct.Struct(">BHI")
+
+
+def encode_frame(kind: int, room_id: str, payload) -> bytes:
+    """编码一帧（payload 为 str 时按 UTF-8 编码）"""
+    room = room_id.encode("utf-8")
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return _FRAME_HEADER.pack(kind, len(room), len(payload)) + room + payload
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    """
+    读取一帧
+
+    Returns:
+        (类型, 直播间ID, 内容)
+
+    Raises:
+        asyncio.IncompleteReadError: 对端已关闭
+    """
+    kind, room_length, payload_length = _FRAME_HEADER.unpack(await reader.readexactly(_FRAME_HEADER.size))
+    body = await reader.readexactly(room_length + payload_length)
+    return kind, body[:room_length].decode("utf-8"), body[room_length:]
+
+
+def is_supported() -> bool:
+    """当前平台是否支持多进程广播（需要 SO_REUSEPORT 和 Unix 套接字，Windows 不支持）"""
+    return hasattr(socket, "SO_REUSEPORT") and hasattr(socket, "AF_UNIX")
+
+
+class FanoutWorker:
+    """工作进程：持有一部分设备连接，把主进程发布的帧广播给这些设备"""
+
+    def __init__(
+        self,
+        index: int,
+        socket_path: str,
+        host: str,
+        port: int,
+        room_ids: List[str],
+        default_room_id: str,
+        device_queue_config: Dict[str, Any],
+        stats_interval: float,
+        logger,
+    ):
+        self.index = index
+        self.socket_path = socket_path
+        self.host = host
+        self.port = port
+        self.default_room_id = default_room_id
+        self.stats_interval = stats_interval
+        self.logger = logger
+        self.device_managers = {
+            room_id: DeviceManager(logger=logger, config=device_queue_config) for room_id in room_ids
+        }
+        self.stop_event = asyncio.Event()
+
+    async def run(self):
+        """启动设备服务器和发布通道，主进程断开后退出"""
+        ipc_server = await asyncio.start_unix_server(self._handle_publisher, path=self.socket_path)
+        ws_server = await websockets.serve(
+            self._handle_device,
+            self.host,
+            self.port,
+            reuse_port=True,
+            ping_interval=20,
+            ping_timeout=10,
+            close_timeout=5
+        )
+        cleanup_task = asyncio.create_task(self._periodic_cleanup())
+        health_task = asyncio.create_task(self._periodic_health_check())
+        self.logger.debug(f"广播工作进程 #{self.index} 已启动（pid {os.getpid()}）")
+        try:
+            await self.stop_event.wait()
+        finally:
+            cleanup_task.cancel()
+            health_task.cancel()
+            ws_server.close()
+            ipc_server.close()
+
+    async def _handle_device(self, websocket):
+        await serve_device_connection(websocket, self.device_managers, self.default_room_id, self.logger)
+
+    async def _handle_publisher(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """接收主进程发布的帧并放入各设备发送队列"""
+        stats_task = asyncio.create_task(self._report_stats(writer))
+        try:
+            while True:
+                kind, room_id, payload = await read_frame(reader)
+                device_manager = self.device_managers.get(room_id)
+                if device_manager is None:
+                    continue
+                if kind == FRAME_TEXT:
+                    payload = payload.decode("utf-8")
+                if not device_manager.devices:
+                    # 本进程没有设备时也记录当前句子，之后中途加入的设备可以补发
+                    if device_manager.catchup is not None:
+                        device_manager.catchup.record(payload)
+                    continue
+                await device_manager.broadcast_audio(payload)
+                # 读缓冲区有数据时 readexactly 不会让出事件循环，主动让各设备的发送任务先发送
+                await asyncio.sleep(0)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            self.logger.debug(f"广播工作进程 #{self.index} 与主进程的连接已断开")
+        finally:
+            stats_task.cancel()
+            self.stop_event.set()
+
+    async def _report_stats(self, writer: asyncio.StreamWriter):
+        """定期回报各直播间的设备数和发送统计"""
+        while True:
+            stats = {
+                room_id: {
+                    "devices": device_manager.get_device_count(),
+                    "queued": device_manager.get_queued_count(),
+                    "sent": device_manager.total_sent,
+                    "dropped": device_manager.total_dropped,
+                    "catchups": device_manager.total_catchups,
+                    "health": device_manager.get_health_stats(),
+                }
+                for room_id, device_manager in self.device_managers.items()
+            }
+            writer.write(encode_frame(FRAME_STATS, "", json.dumps(stats)))
+            await writer.drain()
+            await asyncio.sleep(self.stats_interval)
+
+    async def _periodic_cleanup(self):
+        """定期清理断开的设备"""
+        while True:
+            await asyncio.sleep(60)
+            for device_manager in self.device_managers.values():
+                await device_manager.cleanup_disconnected_devices()
+
+    async def _periodic_health_check(self):
+        """定期 ping 设备，降级或移除链路异常的设备"""
+        device_managers = list(self.device_managers.values())
+        if not device_managers or not device_managers[0].health_enabled:
+            return
+        while True:
+            try:
+                await asyncio.sleep(device_managers[0].ping_interval)
+                await asyncio.gather(*(device_manager.check_health() for device_manager in device_managers))
+            except Exception as e:
+                self.logger.error(f"广播工作进程 #{self.index} 检查设备健康状态时出错: {e}")
+
+
+def run_worker(index, socket_path, host, port, room_ids, default_room_id, device_queue_config, stats_interval):
+    """工作进程入口"""
+    from configs.logger import setup_logging
+
+    worker = FanoutWorker(
+        index, socket_path, host, port, room_ids, default_room_id,
+        device_queue_config, stats_interval, setup_logging()
+    )
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        pass
+
+
+class _WorkerLink:
+    """主进程中一个工作进程的状态"""
+
+    def __init__(self, index: int, socket_path: str):
+        self.index = index
+        self.socket_path = socket_path
+        self.process = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.stats: Dict[str, Dict[str, int]] = {}  # 最近一次回报的统计
+        self.dropped = 0  # 工作进程处理不过来时丢弃的帧数
+
+
+class FanoutPublisher:
+    """主进程：启动并监控工作进程，把每一帧发布给所有工作进程"""
+
+    def __init__(self, config: Dict[str, Any], room_ids: List[str], default_room_id: str, logger):
+        """
+        Args:
+            config: 弹幕配置（danmaku），使用 ws_host、ws_port、device_queue 和 fanout
+            room_ids: 直播间ID列表
+            default_room_id: 设备未指定直播间时加入的直播间
+            logger: 日志记录器
+        """
+        fanout_config = config.get("fanout", {})
+        self.worker_count = max(1, int(fanout_config.get("workers", 2)))
+        self.max_buffer = int(float(fanout_config.get("max_buffer_kb", 1024)) * 1024)
+        self.stats_interval = float(fanout_config.get("stats_interval", 1.0))
+        self.host = config.get("ws_host", "0.0.0.0")
+        self.port = int(config.get("ws_port", 8001))
+        self.device_queue_config = dict(config.get("device_queue", {}))
+        self.room_ids = list(room_ids)
+        self.default_room_id = default_room_id
+        self.logger = logger
+
+        self.socket_dir = None
+        self.links: List[_WorkerLink] = []
+        self.tasks: Set[asyncio.Task] = set()
+        self.running = False
+        self.published = 0
+        self.device_managers = {room_id: FanoutDeviceManager(self, room_id) for room_id in self.room_ids}
+
+    async def start(self, timeout: float = 30):
+        """启动全部工作进程，等待发布通道全部连通"""
+        self.running = True
+        self.socket_dir = tempfile.mkdtemp(prefix="danmaku-fanout-")
+        self.links = [
+            _WorkerLink(index, os.path.join(self.socket_dir, f"worker-{index}.sock"))
+            for index in range(self.worker_count)
+        ]
+        ready = []
+        for link in self.links:
+            connected = asyncio.get_running_loop().create_future()
+            ready.append(connected)
+            task = asyncio.create_task(self._supervise(link, connected))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        await asyncio.wait_for(asyncio.gather(*ready), timeout=timeout)
+        self.logger.info(
+            f"✅ 多进程设备广播已启动: {self.worker_count} 个工作进程共同监听 ws://{self.host}:{self.port}/danmaku/"
+        )
+
+    async def stop(self):
+        """停止全部工作进程"""
+        self.running = False
+        for task in list(self.tasks):
+            task.cancel()
+        for link in self.links:
+            if link.writer is not None:
+                link.writer.close()
+            if link.process is not None and link.process.is_alive():
+                link.process.terminate()
+        for link in self.links:
+            if link.process is not None:
+                await asyncio.get_running_loop().run_in_executor(None, link.process.join, 5)
+        if self.socket_dir:
+            shutil.rmtree(self.socket_dir, ignore_errors=True)
+
+    def publish(self, room_id: str, data):
+        """
+        发布一帧给所有工作进程（只编码一次，不等待发送完成）
+
+        某个工作进程的未发送数据超过 max_buffer 时，对该进程丢弃这一帧音频；
+        文本帧（JSON控制消息）从不丢弃，否则设备会缺少 tts start/stop 等状态
+        """
+        is_text = isinstance(data, str)
+        frame = encode_frame(FRAME_TEXT if is_text else FRAME_BINARY, room_id, data)
+        for link in self.links:
+            writer = link.writer
+            if writer is None or writer.transport.is_closing():
+                continue
+            if not is_text and writer.transport.get_write_buffer_size() > self.max_buffer:
+                link.dropped += 1
+                continue
+            writer.write(frame)
+        self.published += 1
+
+    def room_stats(self, room_id: str) -> Dict[str, int]:
+        """各工作进程最近回报的统计之和"""
+        total = {"devices": 0, "queued": 0, "sent": 0, "dropped": 0, "catchups": 0}
+        for link in self.links:
+            stats = link.stats.get(room_id)
+            if stats:
+                for key in total:
+                    total[key] += stats.get(key, 0)
+        return total
+
+    def room_health(self, room_id: str) -> dict:
+        """合并各工作进程最近回报的设备健康统计"""
+        total = {"healthy": 0, "demoted": 0, "evictions": {}, "rtt_avg_ms": 0.0, "rtt_max_ms": 0.0}
+        rtt_sum = 0.0
+        for link in self.links:
+            health = link.stats.get(room_id, {}).get("health")
+            if not health:
+                continue
+            total["healthy"] += health["healthy"]
+            total["demoted"] += health["demoted"]
+            for reason, count in health["evictions"].items():
+                total["evictions"][reason] = total["evictions"].get(reason, 0) + count
+            total["rtt_max_ms"] = max(total["rtt_max_ms"], health["rtt_max_ms"])
+            rtt_sum += health["rtt_avg_ms"] * (health["healthy"] + health["demoted"])
+        devices = total["healthy"] + total["demoted"]
+        if devices:
+            total["rtt_avg_ms"] = round(rtt_sum / devices, 1)
+        return total
+
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        return {
+            "workers": [
+                {
+                    "index": link.index,
+                    "alive": link.process is not None and link.process.is_alive(),
+                    "devices": sum(stats.get("devices", 0) for stats in link.stats.values()),
+                    "ipc_dropped": link.dropped,
+                }
+                for link in self.links
+            ],
+            "published": self.published,
+        }
+
+    async def _supervise(self, link: _WorkerLink, connected: asyncio.Future):
+        """启动工作进程并接收其回报，进程退出后重新启动"""
+        context = multiprocessing.get_context("spawn")
+        while self.running:
+            if os.path.exists(link.socket_path):
+                os.unlink(link.socket_path)
+            link.process = context.Process(
+                target=run_worker,
+                args=(
+                    link.index, link.socket_path, self.host, self.port, self.room_ids,
+                    self.default_room_id, self.device_queue_config, self.stats_interval,
+                ),
+                daemon=True,
+            )
+            link.process.start()
+            try:
+                reader, link.writer = await self._connect(link)
+                if not connected.done():
+                    connected.set_result(True)
+                while True:
+                    kind, _, payload = await read_frame(reader)
+                    if kind == FRAME_STATS:
+                        link.stats = json.loads(payload)
+            except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+                if not connected.done():
+                    connected.set_exception(ConnectionError(f"广播工作进程 #{link.index} 启动失败: {e}"))
+                    return
+                if self.running:
+                    self.logger.error(f"广播工作进程 #{link.index} 已退出，1秒后重新启动: {e}")
+            finally:
+                if link.writer is not None:
+                    link.writer.close()
+                link.writer = None
+                link.stats = {}
+                if link.process.is_alive():
+                    link.process.terminate()
+            await asyncio.sleep(1)
+
+    async def _connect(self, link: _WorkerLink, timeout: float = 30):
+        """等待工作进程创建 Unix 套接字后连接"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            try:
+                return await asyncio.open_unix_connection(link.socket_path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if loop.time() > deadline or not link.process.is_alive():
+                    raise ConnectionError(f"无法连接广播工作进程 #{link.index}")
+                await asyncio.sleep(0.05)
+
+
+class FanoutDeviceManager:
+    """
+    多进程模式下主进程中代替 DeviceManager 的对象
+
+    广播发布给所有工作进程；设备数和发送统计来自工作进程的定期回报（有约 stats_interval 秒的延迟）
+    """
+
+    def __init__(self, publisher: FanoutPublisher, room_id: str):
+        self.publisher = publisher
+        self.room_id = room_id
+
+    async def broadcast_audio(self, audio_data, exclude_devices: Set[str] = None):
+        """发布音频帧或控制消息（不支持排除设备）"""
+        self.publisher.publish(self.room_id, audio_data)
+
+    async def broadcast_message(self, message: dict, exclude_devices: Set[str] = None):
+        """以文本帧发布JSON消息（不会因背压被丢弃）"""
+        self.publisher.publish(self.room_id, json.dumps(message, ensure_ascii=False))
+
+    def get_device_count(self) -> int:
+        return self.publisher.room_stats(self.room_id)["devices"]
+
+    def get_queued_count(self) -> int:
+        return self.publisher.room_stats(self.room_id)["queued"]
+
+    @property
+    def total_sent(self) -> int:
+        return self.publisher.room_stats(self.room_id)["sent"]
+
+    @property
+    def total_dropped(self) -> int:
+        return self.publisher.room_stats(self.room_id)["dropped"]
+
+    @property
+    def total_catchups(self) -> int:
+        return self.publisher.room_stats(self.room_id)["catchups"]
+
+    def get_health_stats(self) -> dict:
+        return self.publisher.room_health(self.room_id)
+
+    async def check_health(self):
+        """设备健康状态由工作进程检查"""
+
+    def get_device_list(self) -> list:
+        """设备在工作进程中，主进程只有各进程的设备数"""
+        return []
+
+    async def cleanup_disconnected_devices(self):
+        """断开的设备由工作进程清理"""
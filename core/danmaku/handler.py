@@ -4,17 +4,24 @@
 """
 
 import asyncio
+import json
 import uuid
 import queue
 import threading
 import re
+import time
 from typing import Dict, Any
 from datetime import datetime
 
-from core.utils.dialogue import Message, Dialogue
-from core.providers.tts.dto.dto import ContentType, TTSMessageDTO, SentenceType
+from core.utils.dialogue import Message, SlidingWindowDialogue
+from core.providers.tts.dto.dto import ContentType, TTSMessageDTO, SentenceType, InterfaceType
 from core.utils import textUtils
 from core.utils.audioRateController import AudioRateController
+from core.utils.tts_pool import get_executor
+from core.danmaku.scheduler import PriorityEventScheduler
+from core.danmaku.reply_cache import ReplyCache
+from core.danmaku.latency import LatencyTrace, LatencyTracker
+from core.danmaku.moderation import DanmakuModerator, ACTION_DROP, ACTION_REWRITE
 
 TAG = __name__
 
@@ -83,6 +90,47 @@ def is_pure_emoji_or_empty(text: str) -> bool:
     return len(text_without_emoji) == 0
 
 
+class PreparedReply:
+    """
+    流水线中的一条待播放回复
+
+    由准备阶段创建并启动LLM生成，播放阶段按创建顺序依次取出播放。
+    LLM文本片段通过 text_queue 流式交给播放阶段（None 表示生成结束），
+    如果回复在轮到播放之前已生成完毕，还会提前合成好 Opus 音频帧。
+    """
+
+    def __init__(self, danmaku: dict, query: str):
+        self.danmaku = danmaku
+        self.username = danmaku.get('username', '观众')
+        self.content = danmaku.get('content', '')
+        self.query = query
+        self.sentence_id = str(uuid.uuid4().hex)
+
+        # LLM生成结果
+        self.text_queue = asyncio.Queue()  # 流式文本片段（已移除表情），None 表示结束
+        self.text_parts = []  # 原始回复片段（保留表情，用于对话历史）
+        self.llm_done = asyncio.Event()
+        self.generate_task = None
+
+        # 预合成的音频
+        self.render_task = None
+        self.opus_packets = None
+
+        # 播放阶段是否已开始流式消费文本（开始后不再预合成）
+        self.streaming_started = False
+
+        # 回复缓存
+        self.cache_key = None  # 可缓存的弹幕才有缓存键
+        self.from_cache = False  # 是否直接使用缓存的回复和音频
+
+        # 延迟追踪（未开启时为 None）
+        self.trace = None
+
+    @property
+    def full_text(self) -> str:
+        return "".join(self.text_parts)
+
+
 class DanmakuHandler:
     """弹幕消息处理器"""
 
@@ -110,8 +158,16 @@ class DanmakuHandler:
         self.device_manager = device_manager
         self.logger = logger
 
-        # 对话管理
-        self.dialogue = Dialogue()
+        # 对话管理：滑动窗口 + 滚动摘要，长时间直播时提示词大小保持稳定
+        context_config = self.config.get("danmaku", {}).get("context", {})
+        self.dialogue = SlidingWindowDialogue(
+            max_turns=int(context_config.get("max_turns", 10)),
+            max_tokens=int(context_config.get("max_tokens", 1500)),
+            summary_max_chars=int(context_config.get("summary_max_chars", 300)),
+        )
+        self.llm_summary_enabled = context_config.get("llm_summary", False)  # 是否用LLM压缩摘要
+        self.llm_summary_batch = int(context_config.get("llm_summary_batch", 6))  # 累计多少条移出消息后重新摘要
+        self.summary_task = None
         self.session_id = str(uuid.uuid4())
 
         # 系统提示词
@@ -122,59 +178,97 @@ class DanmakuHandler:
         self.message_queue = asyncio.Queue()
         self.processing = False
 
-        # 音频发送相关
+        # 音频发送相关（播放回复期间持有，互动反应在两条回复之间播放）
         self.audio_send_lock = asyncio.Lock()
 
         # 弹幕流控配置
         danmaku_config = self.config.get("danmaku", {})
         self.flow_control_enabled = danmaku_config.get("flow_control_enabled", True)  # 是否启用流控
-        self.flow_control_strategy = danmaku_config.get("flow_control_strategy", "skip")  # skip 或 queue_limit
+        self.flow_control_strategy = danmaku_config.get("flow_control_strategy", "skip")  # skip、queue_limit 或 priority
         self.max_queue_size = danmaku_config.get("max_queue_size", 1)  # 队列最大长度
 
+        # 优先级调度：按事件类型、礼物价值、用户和等待时间选择下一条回复
+        self.scheduler = None
+        self.scheduler_event = asyncio.Event()  # 有新事件加入调度器
+        if self.flow_control_enabled and self.flow_control_strategy == "priority":
+            self.scheduler = PriorityEventScheduler(danmaku_config.get("scheduler", {}))
+
+        # 流水线配置：播放当前回复的同时，提前为后续弹幕生成回复
+        self.pipeline_depth = max(0, int(danmaku_config.get("pipeline_depth", 1)))  # 预生成深度，0 为串行
+        self.prerender_tts = danmaku_config.get("prerender_tts", True)  # 是否提前合成音频
+        self.ready_queue = asyncio.Queue()  # 按顺序等待播放的回复
+        self.pipeline_slots = asyncio.Semaphore(self.pipeline_depth + 1)  # 正在播放 + 预生成中的回复数上限
+        self.playback_task = None
+        self.generate_tasks = set()  # 进行中的LLM生成任务（停止时取消）
+
+        # 批量模式：把多条待处理弹幕合并为一次LLM请求，一条回复同时回应多位观众
+        batch_config = danmaku_config.get("batch", {})
+        self.batch_enabled = batch_config.get("enabled", False)
+        self.batch_max_size = max(1, int(batch_config.get("max_size", 5)))  # 每批最多弹幕数
+        self.batch_wait_window = float(batch_config.get("wait_window", 1.0))  # 凑批最多等待秒数
+
+        # 回复缓存：重复弹幕直接播放缓存的回复音频，不占用LLM和TTS
+        cache_config = danmaku_config.get("reply_cache", {})
+        self.reply_cache = ReplyCache(cache_config) if cache_config.get("enabled", True) else None
+
+        # 内容审核：弹幕入队前按词库丢弃或打码，不占用队列、LLM和TTS
+        moderation_config = danmaku_config.get("moderation", {})
+        self.moderator = None
+        if moderation_config.get("enabled", False):
+            self.moderator = DanmakuModerator(moderation_config, logger=self.logger)
+            self.logger.info(f"弹幕内容审核已启用，词库: {len(self.moderator)} 个词")
+
+        # LLM超时配置（秒）
+        self.llm_first_token_timeout = float(danmaku_config.get("llm_first_token_timeout", 15))
+        self.llm_timeout = float(danmaku_config.get("llm_timeout", 60))
+
+        # 延迟追踪：记录每条回复从收到弹幕到第一个音频帧发出的各阶段耗时
+        latency_config = danmaku_config.get("latency", {})
+        self.latency = None
+        if latency_config.get("enabled", True):
+            self.latency = LatencyTracker(window=int(latency_config.get("window", 500)))
+
+        # 统计信息（优先级模式下的丢弃数另见调度器统计）
+        self.stats = {
+            "received": 0,  # 收到的弹幕和事件
+            "dropped": 0,  # 流控丢弃（只保留最新弹幕、批量合并时丢弃）
+            "served": 0,  # 已生成回复的弹幕和事件（批量回复按弹幕数计）
+            "blocked": 0,  # 内容审核丢弃
+            "rewritten": 0,  # 内容审核打码后继续回复
+        }
+
         # 当前处理状态
         self.is_speaking = False  # 是否正在处理弹幕和播放音频
         self.current_processing_danmaku = None  # 当前正在处理的弹幕
 
         self.logger.info("弹幕消息处理器初始化完成")
-        if self.flow_control_enabled:
+        if self.scheduler is not None:
+            self.logger.info(f"弹幕流控已启用，策略: priority, 最多待处理事件: {self.scheduler.max_pending}")
+        elif self.flow_control_enabled:
             self.logger.info(f"弹幕流控已启用，策略: {self.flow_control_strategy}, 队列大小: {self.max_queue_size}")
 
     async def start(self):
-        """启动消息处理（串行化模式）"""
+        """启动消息处理（流水线模式：生成与播放重叠，播放严格按顺序）"""
         self.processing = True
-        self.logger.info("启动弹幕消息处理（串行模式）")
+        if self.pipeline_depth > 0:
+            self.logger.info(f"启动弹幕消息处理（流水线模式，预生成深度: {self.pipeline_depth}）")
+        else:
+            self.logger.info("启动弹幕消息处理（串行模式）")
 
-        # 串行化处理弹幕：一次只处理一条，等待音频播放完成后再处理下一条
-        while self.processing:
-            try:
-                # 清空队列中的旧弹幕，只保留最新的
-                latest_danmaku = None
-                while True:
-                    try:
-                        latest_danmaku = self.message_queue.get_nowait()
-                    except asyncio.QueueEmpty:
-                        break
-
-                # 如果没有弹幕，等待新弹幕
-                if latest_danmaku is None:
-                    try:
-                        latest_danmaku = await asyncio.wait_for(
-                            self.message_queue.get(),
-                            timeout=1.0
-                        )
-                    except asyncio.TimeoutError:
-                        continue
-
-                # 处理弹幕消息（会阻塞直到音频播放完成）
-                await self._process_danmaku(latest_danmaku)
-
-            except Exception as e:
-                self.logger.error(f"处理弹幕消息时出错: {e}")
-                await asyncio.sleep(0.1)
+        self.playback_task = asyncio.create_task(self._playback_loop())
+        try:
+            await self._prepare_loop()
+        finally:
+            if self.playback_task and not self.playback_task.done():
+                self.playback_task.cancel()
 
     async def stop(self):
         """停止消息处理"""
         self.processing = False
+        if self.playback_task and not self.playback_task.done():
+            self.playback_task.cancel()
+        for task in list(self.generate_tasks):
+            task.cancel()
         if self.tts:
             await self.tts.close()
         self.logger.info("停止弹幕消息处理")
@@ -188,91 +282,601 @@ class DanmakuHandler:
         """
         username = danmaku.get('username', '观众')
         content = danmaku.get('content', '')
+        self.stats["received"] += 1
+        danmaku.setdefault('received_at', time.monotonic())  # 采集器未记录接收时间时以入队时间代替
+
+        if self.moderator is not None and (danmaku.get('type') or 'danmaku') == 'danmaku':
+            action, content, matched = self.moderator.moderate(content)
+            if action == ACTION_DROP:
+                self.stats["blocked"] += 1
+                self.logger.info(f"🚫 审核丢弃弹幕: {username}: {danmaku.get('content', '')} (命中: {'、'.join(matched[:3])})")
+                return
+            if action == ACTION_REWRITE:
+                self.stats["rewritten"] += 1
+                danmaku['content'] = content
+                self.logger.debug(f"审核打码弹幕: {username}: {content}")
+
+        if self.scheduler is not None:
+            if self.scheduler.push(danmaku):
+                self.scheduler_event.set()
+                self.logger.debug(f"✅ 事件已加入调度器: {username}: {content}")
+            return
 
         await self.message_queue.put(danmaku)
         self.logger.debug(f"✅ 弹幕已加入队列: {username}: {content}")
 
-    async def _process_danmaku(self, danmaku: dict):
+    def get_stats(self) -> dict:
+        """获取统计信息（pending 为待处理的弹幕和事件数）"""
+        stats = dict(self.stats)
+        if self.scheduler is not None:
+            scheduler_stats = self.scheduler.get_stats()
+            stats["dropped"] += sum(
+                scheduler_stats[key] for key in ("expired", "evicted", "rejected", "replaced")
+            )
+            stats["pending"] = scheduler_stats["pending"]
+        else:
+            stats["pending"] = self.message_queue.qsize()
+        return stats
+
+    async def _prepare_loop(self):
         """
-        处理单条弹幕消息（串行化：等待音频播放完成）
+        准备阶段：取最新弹幕并启动LLM生成
 
-        Args:
-            danmaku: 弹幕信息
+        每条回复占用一个流水线槽位，播放完成后释放，
+        因此最多同时存在 1 条正在播放 + pipeline_depth 条预生成中的回复。
+        """
+        while self.processing:
+            slot_acquired = False
+            try:
+                await self.pipeline_slots.acquire()
+                slot_acquired = True
+
+                latest_danmaku = await self._next_danmaku()
+                if latest_danmaku is None:
+                    continue
+
+                reply = self._create_reply(latest_danmaku)
+                if reply is None:
+                    continue
+                self.stats["served"] += len(latest_danmaku.get("items") or [latest_danmaku])
+                if self.latency is not None:
+                    reply.trace = LatencyTrace(latest_danmaku.get("received_at"))
+                    reply.trace.mark("dequeued")
+
+                if not self._apply_cached_reply(reply):
+                    reply.generate_task = asyncio.create_task(self._generate_reply(reply))
+                    self.generate_tasks.add(reply.generate_task)
+                    reply.generate_task.add_done_callback(self.generate_tasks.discard)
+                await self.ready_queue.put(reply)
+                slot_acquired = False  # 槽位交由播放阶段释放
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"处理弹幕消息时出错: {e}")
+                await asyncio.sleep(0.1)
+            finally:
+                if slot_acquired:
+                    self.pipeline_slots.release()
+
+    async def _next_danmaku(self):
         """
+        取出队列中最新的弹幕（丢弃更早的弹幕），队列为空时最多等待1秒
+
+        Returns:
+            弹幕信息，超时返回 None
+        """
+        if self.batch_enabled:
+            return await self._next_batch()
+
+        if self.scheduler is not None:
+            return await self._next_scheduled_event()
+
+        # 清空队列中的旧弹幕，只保留最新的
+        latest_danmaku = None
+        drained = 0
+        while True:
+            try:
+                latest_danmaku = self.message_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            drained += 1
+        self.stats["dropped"] += max(0, drained - 1)
+
+        # 如果没有弹幕，等待新弹幕
+        if latest_danmaku is None:
+            try:
+                latest_danmaku = await asyncio.wait_for(
+                    self.message_queue.get(),
+                    timeout=1.0
+                )
+            except asyncio.TimeoutError:
+                return None
+
+        return latest_danmaku
+
+    async def _next_scheduled_event(self):
+        """
+        从优先级调度器取出得分最高的事件，没有事件时最多等待1秒
+
+        Returns:
+            事件信息，超时返回 None
+        """
+        event = self.scheduler.pop()
+        if event is not None:
+            return event
+
+        self.scheduler_event.clear()
         try:
-            username = danmaku.get('username', '观众')
-            content = danmaku.get('content', '')
+            await asyncio.wait_for(self.scheduler_event.wait(), timeout=1.0)
+        except asyncio.TimeoutError:
+            return None
+        return self.scheduler.pop()
 
-            if not content.strip():
-                self.logger.debug(f"跳过空弹幕: {username}")
-                return
+    async def _next_batch(self):
+        """
+        批量模式：收集待处理的弹幕合并为一批
+
+        先取出已积压的弹幕，不足 batch_max_size 条时在 batch_wait_window 秒内继续等待新弹幕。
+        优先级模式下礼物等事件仍单独回复。
+
+        Returns:
+            单条弹幕/事件或合并后的批量事件，没有弹幕时返回 None
+        """
+        if self.scheduler is not None:
+            first = await self._next_scheduled_event()
+            if first is None or (first.get('type') or 'danmaku') != 'danmaku':
+                return first
+            items = [first] + self._take_pending_chat(self.batch_max_size - 1)
+        else:
+            items = self._take_pending_chat(self.batch_max_size)
+            if not items:
+                try:
+                    items = [await asyncio.wait_for(self.message_queue.get(), timeout=1.0)]
+                except asyncio.TimeoutError:
+                    return None
+
+        # 在等待窗口内继续收集新弹幕
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_wait_window
+        while len(items) < self.batch_max_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            more = await self._wait_pending_chat(remaining, self.batch_max_size - len(items))
+            if not more:
+                break
+            items.extend(more)
+
+        return self._merge_batch(items)
+
+    def _take_pending_chat(self, limit: int) -> list:
+        """
+        不等待地取出待处理弹幕
+
+        FIFO队列全部取出（由 _merge_batch 保留最新的弹幕）；
+        优先级调度器按得分取出，最多 limit 条，遇到非弹幕事件停止。
+        """
+        items = []
+        if self.scheduler is None:
+            while True:
+                try:
+                    items.append(self.message_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    return items
+
+        while len(items) < limit:
+            event = self.scheduler.peek()
+            if event is None or (event.get('type') or 'danmaku') != 'danmaku':
+                break
+            items.append(self.scheduler.pop())
+        return items
+
+    async def _wait_pending_chat(self, timeout: float, limit: int) -> list:
+        """等待新弹幕到达，超时返回空列表"""
+        if self.scheduler is None:
+            try:
+                return [await asyncio.wait_for(self.message_queue.get(), timeout=timeout)]
+            except asyncio.TimeoutError:
+                return []
+
+        items = self._take_pending_chat(limit)
+        if items:
+            return items
+        self.scheduler_event.clear()
+        try:
+            await asyncio.wait_for(self.scheduler_event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return []
+        return self._take_pending_chat(limit)
 
-            # 过滤纯表情符号的弹幕
+    def _merge_batch(self, items: list):
+        """
+        合并一批弹幕：过滤无效弹幕，同一用户只保留最新一条，最多保留最新的 batch_max_size 条
+
+        Returns:
+            只剩一条时返回该弹幕，多条时返回批量事件，全部无效返回 None
+        """
+        latest_by_user = {}
+        for item in items:
+            content = item.get('content', '')
             if is_pure_emoji_or_empty(content):
-                self.logger.debug(f"⏭️  跳过纯表情弹幕: {username}: {content}")
-                return
+                continue
+            username = item.get('username', '观众')
+            latest_by_user.pop(username, None)  # 保持按最新弹幕的时间排序
+            latest_by_user[username] = item
+
+        selected = list(latest_by_user.values())[-self.batch_max_size:]
+        self.stats["dropped"] += len(items) - len(selected)
+        if not selected:
+            return None
+        if len(selected) == 1:
+            return selected[0]
+
+        return {
+            'type': 'batch',
+            'username': '、'.join(item.get('username', '观众') for item in selected),
+            'content': ' / '.join(item.get('content', '') for item in selected),
+            'items': selected,
+            'received_at': min(item.get('received_at', time.monotonic()) for item in selected),  # 按最早的弹幕计算延迟
+        }
 
-            self.logger.info(f"▶️  处理弹幕: {username}: {content}")
+    def _create_reply(self, danmaku: dict):
+        """
+        过滤无效弹幕并创建待播放回复
 
-            # 生成唯一的句子ID
-            sentence_id = str(uuid.uuid4().hex)
-            self.logger.debug(f"   生成句子ID: {sentence_id}")
+        Args:
+            danmaku: 弹幕信息
 
-            # 更新conn对象的sentence_id，以便Rate Controller能正确检测句子变化
-            old_sentence_id = getattr(self.tts.conn, 'sentence_id', None)
-            self.tts.conn.sentence_id = sentence_id
-            self.logger.debug(f"✅ 设置conn.sentence_id: {old_sentence_id} → {sentence_id}")
+        Returns:
+            PreparedReply，弹幕无需处理时返回 None
+        """
+        username = danmaku.get('username', '观众')
+        content = danmaku.get('content', '')
+        event_type = danmaku.get('type') or 'danmaku'
 
-            # 发送FIRST消息（开始）
-            self.tts.tts_text_queue.put(
-                TTSMessageDTO(
-                    sentence_id=sentence_id,
-                    sentence_type=SentenceType.FIRST,
-                    content_type=ContentType.ACTION,
-                )
-            )
-            self.logger.debug(f"   已发送FIRST消息到TTS队列")
+        # 礼物、关注、粉丝团事件请LLM感谢观众，批量弹幕合并为一个提问
+        if event_type != 'danmaku':
+            query = self._build_event_query(event_type, username, danmaku)
+            if query is None:
+                return None
+            self.logger.info(f"▶️  处理事件: {username}: {content}")
+            return PreparedReply(danmaku, query)
 
-            # 将弹幕内容添加到对话历史
-            query = f"{username}说: {content}"
-            self.dialogue.put(Message(role="user", content=query))
+        if not content.strip():
+            self.logger.debug(f"跳过空弹幕: {username}")
+            return None
 
-            # 调用LLM生成回复
-            response_text = await self._call_llm(query, sentence_id)
+        # 过滤纯表情符号的弹幕
+        if is_pure_emoji_or_empty(content):
+            self.logger.debug(f"⏭️  跳过纯表情弹幕: {username}: {content}")
+            return None
 
-            # 检查LLM回复是否有效（移除表情后）
-            response_text_cleaned = remove_emojis(response_text)
+        self.logger.info(f"▶️  处理弹幕: {username}: {content}")
+        return PreparedReply(danmaku, f"{username}说: {content}")
 
-            if not response_text or not response_text.strip():
-                self.logger.warning(f"⚠️  LLM返回空内容，跳过此弹幕: {username}: {content}")
-                return
+    def _apply_cached_reply(self, reply: PreparedReply) -> bool:
+        """
+        查询回复缓存，命中时直接填充回复文本和音频帧
+
+        Args:
+            reply: 待播放回复
+
+        Returns:
+            是否命中缓存
+        """
+        if self.reply_cache is None or (reply.danmaku.get('type') or 'danmaku') != 'danmaku':
+            return False
+        reply.cache_key = self.reply_cache.make_key(reply.content)
+        if reply.cache_key is None:
+            return False
+
+        cached = self.reply_cache.get(reply.cache_key)
+        if cached is None:
+            return False
+
+        text, opus_packets = cached
+        reply.text_parts.append(text)
+        reply.opus_packets = opus_packets
+        reply.from_cache = True
+        reply.text_queue.put_nowait(None)
+        reply.llm_done.set()
+
+        self.dialogue.put(Message(role="user", content=reply.query))
+        self.dialogue.put(Message(role="assistant", content=text))
+        self._maybe_summarize()
+        self.logger.info(f"♻️  命中回复缓存: {reply.content} → {text}")
+        self.logger.debug(f"回复缓存统计: {self.reply_cache.get_stats()}")
+        return True
+
+    def _is_cacheable(self, reply: PreparedReply) -> bool:
+        """回复可以复用给其他观众时才缓存（回复中提到了用户名则不缓存）"""
+        return (
+            self.reply_cache is not None
+            and reply.cache_key is not None
+            and not reply.from_cache
+            and bool(reply.full_text.strip())
+            and reply.username not in reply.full_text
+        )
+
+    @staticmethod
+    def _build_event_query(event_type: str, username: str, event: dict):
+        """根据事件类型生成发给LLM的提问，未知类型返回 None"""
+        if event_type == 'gift':
+            gift_name = event.get('gift_name', '礼物')
+            gift_count = event.get('gift_count', 1)
+            return f"{username}送出了{gift_count}个{gift_name}，请感谢TA"
+        if event_type == 'fansclub':
+            return f"{username}加入了粉丝团，请欢迎TA"
+        if event_type == 'follow':
+            return f"{username}关注了主播，请感谢TA"
+        if event_type == 'batch':
+            lines = [
+                f"{index}. {item.get('username', '观众')}说: {item.get('content', '')}"
+                for index, item in enumerate(event.get('items', []), 1)
+            ]
+            return "以下是直播间观众的最新弹幕，请用一段简短的话同时回应他们，可以点名回应：\n" + "\n".join(lines)
+        return None
+
+    async def _generate_reply(self, reply: PreparedReply):
+        """
+        生成阶段：调用LLM生成回复，完成后（可选）提前合成音频
+
+        Args:
+            reply: 待播放回复
+        """
+        try:
+            # 本轮提问在生成完成后才与回复一起写入对话历史，
+            # 避免多条预生成回复交错写入
+            dialogue = self.dialogue.get_llm_dialogue()
+            dialogue.append({"role": "user", "content": reply.query})
 
-            if not response_text_cleaned or not response_text_cleaned.strip():
-                self.logger.warning(f"⚠️  LLM回复移除表情后为空，跳过TTS: {username} → {response_text}")
-                # 仍然添加到对话历史
-                self.dialogue.put(Message(role="assistant", content=response_text))
+            response_text = await self._call_llm(dialogue, reply)
+
+            if not response_text or not response_text.strip():
+                self.logger.warning(f"⚠️  LLM返回空内容，跳过此弹幕: {reply.username}: {reply.content}")
                 return
 
+            self.dialogue.put(Message(role="user", content=reply.query))
             # 将回复添加到对话历史（保留原始内容，包括表情）
             self.dialogue.put(Message(role="assistant", content=response_text))
+            self._maybe_summarize()
+
+            # 回复在轮到播放前已生成完毕：提前合成音频，播放时无需再等待TTS
+            if self._can_prerender() and not reply.streaming_started:
+                text_for_tts = remove_emojis(response_text)
+                if text_for_tts:
+                    loop = asyncio.get_running_loop()
+                    reply.render_task = loop.run_in_executor(get_executor(), self.tts.to_tts, text_for_tts)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(f"生成弹幕回复时出错: {e}", exc_info=True)
+        finally:
+            reply.text_queue.put_nowait(None)
+            reply.llm_done.set()
+
+    def _maybe_summarize(self):
+        """移出窗口的消息累计足够多时，在后台用LLM重写滚动摘要"""
+        if not self.llm_summary_enabled:
+            return
+        if len(self.dialogue.evicted_since_summary) < self.llm_summary_batch:
+            return
+        if self.summary_task and not self.summary_task.done():
+            return
+        self.summary_task = asyncio.create_task(self._summarize_history())
+
+    async def _summarize_history(self):
+        """调用LLM将旧摘要和新移出的对话压缩为新的摘要"""
+        evicted = list(self.dialogue.evicted_since_summary)
+        evicted_total = self.dialogue.evicted_total
+        previous_summary = self.dialogue.llm_summary  # 抽取式摘要行都在 evicted 中
+        max_chars = self.dialogue.summary_max_chars
+        system_prompt = (
+            f"你负责压缩直播间的历史对话。请把已有摘要和新增对话合并成一段不超过{max_chars}字的摘要，"
+            "只保留观众关心的话题、重要观众和已回答过的问题，直接输出摘要内容。"
+        )
+        user_prompt = "已有摘要：\n" + (previous_summary or "无") + "\n\n新增对话：\n" + "\n".join(evicted)
+        try:
+            loop = asyncio.get_running_loop()
+            summary = await loop.run_in_executor(
+                None, self.llm.response_no_stream, system_prompt, user_prompt
+            )
+            if summary and not summary.startswith("【"):
+                self.dialogue.set_summary(summary, summarized_total=evicted_total)
+                self.logger.debug(f"📝 已更新对话摘要: {self.dialogue.summary}")
+        except Exception as e:
+            self.logger.warning(f"生成对话摘要失败，继续使用抽取式摘要: {e}")
+
+    def _can_prerender(self) -> bool:
+        """是否可以提前合成整段回复（仅非流式TTS且直接返回音频数据时可用）"""
+        return (
+            self.prerender_tts
+            and self.pipeline_depth > 0
+            and getattr(self.tts, "interface_type", None) == InterfaceType.NON_STREAM
+            and getattr(self.tts, "delete_audio_file", False)
+        )
+
+    async def _playback_loop(self):
+        """播放阶段：严格按准备顺序播放回复，每条播放完成后释放流水线槽位"""
+        while True:
+            reply = await self.ready_queue.get()
+            try:
+                async with self.audio_send_lock:
+                    await self._play_reply(reply)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"处理弹幕时出错: {e}", exc_info=True)
+            finally:
+                self.is_speaking = False
+                self.current_processing_danmaku = None
+                self.pipeline_slots.release()
+
+    async def _play_reply(self, reply: PreparedReply):
+        """
+        播放单条回复（等待音频播放完成后返回）
+
+        Args:
+            reply: 待播放回复
+        """
+        self.is_speaking = True
+        self.current_processing_danmaku = reply.danmaku
+
+        # 预合成结果可用时直接播放音频帧
+        if reply.llm_done.is_set() and reply.render_task is not None:
+            try:
+                reply.opus_packets = await reply.render_task
+            except Exception as e:
+                self.logger.warning(f"预合成音频失败，改为实时合成: {e}")
+                reply.opus_packets = None
+
+        # 更新conn对象的sentence_id，以便Rate Controller能正确检测句子变化
+        conn = self.tts.conn
+        old_sentence_id = getattr(conn, 'sentence_id', None)
+        conn.sentence_id = reply.sentence_id
+        self.logger.debug(f"✅ 设置conn.sentence_id: {old_sentence_id} → {reply.sentence_id}")
+        self._reset_playback_done()
+        conn.latency_trace = reply.trace
+
+        # 实时合成的音频在发送给设备时收集，播放完成后写入缓存
+        capture = None
+        if (
+            not reply.opus_packets
+            and self.reply_cache is not None
+            and reply.cache_key is not None
+            and not reply.from_cache
+            and hasattr(conn, "audio_capture")
+        ):
+            capture = conn.audio_capture = []
+
+        try:
+            if reply.opus_packets:
+                self._enqueue_prerendered_audio(reply)
+            else:
+                has_text = await self._stream_reply_text(reply)
+                if not has_text:
+                    return
 
-            # 发送LAST消息（结束）
+            # ✨ 关键：等待音频播放完成后再播放下一条（保证顺序）
+            self.logger.debug(f"⏳ 等待音频播放完成...")
+            completed = await self._wait_for_playback_done()
+        finally:
+            if capture is not None:
+                conn.audio_capture = None
+            conn.latency_trace = None
+            if self.latency is not None:
+                self.latency.record(reply.trace)
+
+        if self._is_cacheable(reply):
+            opus_packets = reply.opus_packets or capture
+            if opus_packets and (completed or reply.opus_packets) and not conn.client_abort:
+                self.reply_cache.put(reply.cache_key, reply.full_text, opus_packets)
+        self.logger.info(f"✅ 弹幕处理完成: {reply.username}")
+
+    async def _stream_reply_text(self, reply: PreparedReply) -> bool:
+        """
+        将LLM文本片段流式送入TTS队列
+
+        Args:
+            reply: 待播放回复
+
+        Returns:
+            是否发送了有效文本
+        """
+        reply.streaming_started = True
+
+        # 发送FIRST消息（开始）
+        self.tts.tts_text_queue.put(
+            TTSMessageDTO(
+                sentence_id=reply.sentence_id,
+                sentence_type=SentenceType.FIRST,
+                content_type=ContentType.ACTION,
+            )
+        )
+        self.logger.debug(f"   已发送FIRST消息到TTS队列")
+
+        text_sent_count = 0
+        while True:
+            content_for_tts = await reply.text_queue.get()
+            if content_for_tts is None:
+                break
+            if reply.trace is not None:
+                reply.trace.mark("tts_start")
             self.tts.tts_text_queue.put(
                 TTSMessageDTO(
-                    sentence_id=sentence_id,
-                    sentence_type=SentenceType.LAST,
-                    content_type=ContentType.ACTION,
+                    sentence_id=reply.sentence_id,
+                    sentence_type=SentenceType.MIDDLE,
+                    content_type=ContentType.TEXT,
+                    content_detail=content_for_tts,
                 )
             )
-            self.logger.debug(f"   已发送LAST消息到TTS队列")
+            text_sent_count += 1
+
+        if text_sent_count == 0:
+            if reply.full_text.strip():
+                self.logger.warning(f"⚠️  LLM回复移除表情后为空，跳过TTS: {reply.username} → {reply.full_text}")
+            return False
+
+        # 发送LAST消息（结束）
+        self.tts.tts_text_queue.put(
+            TTSMessageDTO(
+                sentence_id=reply.sentence_id,
+                sentence_type=SentenceType.LAST,
+                content_type=ContentType.ACTION,
+            )
+        )
+        self.logger.debug(f"   已发送 {text_sent_count} 段文本和LAST消息到TTS队列")
+        return True
 
-            # ✨ 关键：等待音频播放完成后再返回（串行化处理）
-            self.logger.debug(f"⏳ 等待音频播放完成...")
+    def _enqueue_prerendered_audio(self, reply: PreparedReply):
+        """
+        将预合成的音频帧直接送入TTS音频队列
+
+        Args:
+            reply: 待播放回复（opus_packets 已就绪）
+        """
+        self.tts.conn.client_abort = False
+        self.tts.tts_audio_first_sentence = True
+
+        text = remove_emojis(reply.full_text)
+        if reply.trace is not None:
+            reply.trace.mark("tts_start")
+        self.tts.tts_audio_queue.put((SentenceType.FIRST, None, text))
+        for packet in reply.opus_packets:
+            self.tts.tts_audio_queue.put((SentenceType.MIDDLE, packet, None))
+        self.tts.tts_audio_queue.put((SentenceType.LAST, [], None))
+        self.logger.debug(f"   已发送 {len(reply.opus_packets)} 个预合成音频帧")
+
+    def _reset_playback_done(self):
+        """清除连接上的播放完成事件"""
+        playback_done = getattr(self.tts.conn, "playback_done", None)
+        if playback_done is not None:
+            playback_done.clear()
+
+    async def _wait_for_playback_done(self) -> bool:
+        """
+        等待当前回复播放完成
+
+        DanmakuConnection 在收到TTS stop 消息（所有音频帧发送完毕后才会发出）时
+        设置 playback_done 事件；其他连接退回到等待 Rate Controller 队列清空。
+
+        Returns:
+            是否确认播放完成（超时返回 False）
+        """
+        playback_done = getattr(self.tts.conn, "playback_done", None)
+        if playback_done is None:
             await self._wait_for_audio_completion()
-            self.logger.info(f"✅ 弹幕处理完成: {username}")
+            return False
 
-        except Exception as e:
-            self.logger.error(f"处理弹幕时出错: {e}", exc_info=True)
+        try:
+            await asyncio.wait_for(playback_done.wait(), timeout=60.0)  # 最多等待60秒
+            self.logger.debug("   ✓ 音频播放完成")
+            return True
+        except asyncio.TimeoutError:
+            self.logger.error("   ✗ 等待音频播放超时（60秒）！")
+            return False
 
     async def _wait_for_audio_completion(self):
         """
@@ -336,63 +940,64 @@ class DanmakuHandler:
         except Exception as e:
             self.logger.error(f"等待音频完成时出错: {e}", exc_info=True)
 
-    async def _call_llm(self, query: str, sentence_id: str) -> str:
+    async def _call_llm(self, dialogue: list, reply: PreparedReply) -> str:
         """
-        调用LLM生成回复
+        调用LLM生成回复，文本片段实时写入 reply.text_queue
 
         Args:
-            query: 用户查询
-            sentence_id: 句子ID
+            dialogue: 发送给LLM的对话
+            reply: 待播放回复
 
         Returns:
             LLM回复文本
         """
         try:
-            self.logger.debug(f"调用LLM处理: {query}")
+            self.logger.debug(f"调用LLM处理: {reply.query}")
 
-            # 获取对话历史
-            dialogue = self.dialogue.get_llm_dialogue()
+            # 异步流式读取LLM输出，生成过程中事件循环保持响应（音频播放、设备连接等不受影响）
+            loop = asyncio.get_running_loop()
+            llm_responses = self.llm.response_async(self.session_id, dialogue)
+            deadline = loop.time() + self.llm_timeout
 
-            # 调用LLM流式响应
-            llm_responses = self.llm.response(self.session_id, dialogue)
-
-            # 收集响应
-            response_parts = []
-            emotion_flag = True
             text_sent_count = 0
+            try:
+                while True:
+                    # 首个片段使用首字超时，之后受整体超时约束
+                    remaining = deadline - loop.time()
+                    if not reply.text_parts:
+                        remaining = min(remaining, self.llm_first_token_timeout)
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
 
-            for response in llm_responses:
-                content = response
-
-                # 提取情绪（仅首次）
-                if emotion_flag and content and content.strip():
-                    # 注意：这里需要在异步环境中运行，需要调整
-                    # await textUtils.get_emotion(self, content)
-                    emotion_flag = False
-
-                if content and len(content) > 0:
-                    response_parts.append(content)
-
-                    # 移除表情符号后再发送给TTS（TTS无法处理表情）
-                    content_for_tts = remove_emojis(content)
-
-                    # 只有移除表情后仍有文字内容时才发送给TTS
-                    if content_for_tts and content_for_tts.strip():
-                        self.logger.debug(f"发送文本给TTS: {content_for_tts} (原文: {content})")
-                        self.tts.tts_text_queue.put(
-                            TTSMessageDTO(
-                                sentence_id=sentence_id,
-                                sentence_type=SentenceType.MIDDLE,
-                                content_type=ContentType.TEXT,
-                                content_detail=content_for_tts,
-                            )
-                        )
-                        text_sent_count += 1
-                    else:
-                        self.logger.debug(f"跳过纯表情片段: {content}")
+                    try:
+                        content = await asyncio.wait_for(llm_responses.__anext__(), timeout=remaining)
+                    except StopAsyncIteration:
+                        break
+
+                    if content and len(content) > 0:
+                        if reply.trace is not None:
+                            reply.trace.mark("llm_first_token")
+                        reply.text_parts.append(content)
+
+                        # 移除表情符号后再发送给TTS（TTS无法处理表情）
+                        content_for_tts = remove_emojis(content)
+
+                        # 只有移除表情后仍有文字内容时才发送给TTS
+                        if content_for_tts and content_for_tts.strip():
+                            self.logger.debug(f"发送文本给TTS: {content_for_tts} (原文: {content})")
+                            reply.text_queue.put_nowait(content_for_tts)
+                            text_sent_count += 1
+                        else:
+                            self.logger.debug(f"跳过纯表情片段: {content}")
+            except asyncio.TimeoutError:
+                stage = "首字" if not reply.text_parts else "整体"
+                self.logger.warning(f"⚠️  LLM响应超时（{stage}），已生成内容: {reply.full_text}")
+            finally:
+                # 超时或取消时关闭流，通知提供方停止生成
+                await llm_responses.aclose()
 
             # 合并完整回复
-            full_response = "".join(response_parts)
+            full_response = reply.full_text
 
             # 检查是否有有效内容
             if not full_response.strip():
@@ -400,7 +1005,7 @@ class DanmakuHandler:
                 return ""
 
             self.logger.info(f"LLM回复: {full_response}")
-            self.logger.debug(f"📝 已发送 {text_sent_count} 段文本给TTS")
+            self.logger.debug(f"📝 已生成 {text_sent_count} 段文本")
 
             return full_response
 
@@ -448,52 +1053,71 @@ class DanmakuConnection:
         self.last_activity_time = 0  # 最后活动时间
         self.current_speaker = None  # 当前说话人
 
+        # 播放完成事件：TTS stop 消息在所有音频帧发送完毕后才会发出
+        self.playback_done = asyncio.Event()
+
+        # 音频帧收集（不为 None 时记录发送给设备的音频帧，用于回复缓存）
+        self.audio_capture = None
+        self.latency_trace = None  # 当前播放回复的延迟追踪
+        self.packet_count = 0  # 音频包计数器
+
     def _create_mock_websocket(self):
-        """创建模拟的 WebSocket 对象"""
+        """
+        创建模拟的 WebSocket 对象
+
+        发送音频和TTS状态消息优先走 send_audio_frame / send_control_message，
+        这里只兼容其他直接调用 websocket.send 的代码：按数据类型区分，字符串为控制消息，字节为音频帧。
+        """
         class MockWebSocket:
-            def __init__(self, device_manager, logger):
-                self.device_manager = device_manager
-                self.logger = logger
-                self.packet_count = 0  # 音频包计数器
+            def __init__(self, connection):
+                self.connection = connection
 
             async def send(self, data):
                 """发送数据到所有设备"""
-                device_count = self.device_manager.get_device_count()
+                if isinstance(data, str):
+                    await self.connection.send_control_message(json.loads(data))
+                else:
+                    await self.connection.send_audio_frame(data)
 
-                # 检测数据类型
-                try:
-                    # 尝试解析为JSON
-                    if isinstance(data, (str, bytes)):
-                        data_bytes = data.encode('utf-8') if isinstance(data, str) else data
-                        data_str = data_bytes.decode('utf-8')
-                        import json
-                        json_obj = json.loads(data_str)
-
-                        # 🚫 只过滤 stop 消息，避免硬件进入聆听状态
-                        # start 和 sentence_start 消息需要保留，硬件需要它们来开始播放
-                        if json_obj.get('type') == 'tts' and json_obj.get('state') == 'stop':
-                            self.logger.bind(tag=TAG).debug(
-                                f"🚫 过滤 TTS stop 消息（避免硬件进入聆听状态）"
-                            )
-                            return  # 不发送给设备
-
-                        # 其他JSON消息正常发送（包括 start 和 sentence_start）
-                        self.logger.bind(tag=TAG).debug(
-                            f"📨 发送控制消息: {json_obj} → {device_count} 个设备"
-                        )
-                    else:
-                        raise ValueError("Not JSON")
-                except:
-                    # 音频数据
-                    self.packet_count += 1
-                    if self.packet_count <= 5 or self.packet_count % 50 == 0:
-                        self.logger.bind(tag=TAG).debug(
-                            f"🔊 音频包 #{self.packet_count}: {len(data)} 字节 → {device_count} 个设备"
-                        )
+        return MockWebSocket(self)
 
-                await self.device_manager.broadcast_audio(data)
+    async def send_audio_frame(self, packet: bytes):
+        """
+        广播一帧音频到所有设备
 
-        return MockWebSocket(self.device_manager, self.logger)
+        Args:
+            packet: Opus音频帧
+        """
+        if self.audio_capture is not None:
+            self.audio_capture.append(packet)
+        if self.latency_trace is not None:
+            self.latency_trace.mark("first_send")
+
+        self.packet_count += 1
+        if self.packet_count <= 5 or self.packet_count % 50 == 0:
+            self.logger.bind(tag=TAG).debug(
+                f"🔊 音频包 #{self.packet_count}: {len(packet)} 字节 → {self.device_manager.get_device_count()} 个设备"
+            )
+        await self.device_manager.broadcast_audio(packet)
+
+    async def send_control_message(self, message: dict):
+        """
+        广播控制消息到所有设备
+
+        Args:
+            message: 消息字典
+        """
+        # 🚫 只过滤 stop 消息，避免硬件进入聆听状态
+        # start 和 sentence_start 消息需要保留，硬件需要它们来开始播放
+        if message.get('type') == 'tts' and message.get('state') == 'stop':
+            self.logger.bind(tag=TAG).debug(f"🚫 过滤 TTS stop 消息（避免硬件进入聆听状态）")
+            self.playback_done.set()
+            return  # 不发送给设备
+
+        self.logger.bind(tag=TAG).debug(
+            f"📨 发送控制消息: {message} → {self.device_manager.get_device_count()} 个设备"
+        )
+        await self.device_manager.broadcast_audio(json.dumps(message))
 
     def set_tts(self, tts):
         """设置 TTS 实例"""
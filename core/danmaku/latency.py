@@ -0,0 +1,126 @@
+"""
+弹幕端到端延迟追踪
+每条回复携带一个 LatencyTrace，在各处理阶段记录时间点（同一阶段只记录第一次）：
+
+    received         采集器收到弹幕
+    dequeued         处理器从队列取出
+    llm_first_token  LLM返回第一个文本片段（缓存命中的回复没有该阶段）
+    tts_start        文本或预合成音频交给TTS（含等待上一条回复播放的时间）
+    first_opus       第一个Opus音频帧进入发送流程
+    first_send       第一个音频帧交给 DeviceManager.broadcast_audio
+
+LatencyTracker 按阶段保存最近若干条回复的耗时，计算滚动分位数
+"""
+
+import math
+import time
+from collections import deque
+from typing import Dict, Optional
+
+STAGES = ("received", "dequeued", "llm_first_token", "tts_start", "first_opus", "first_send")
+TOTAL = "total"  # received → first_send
+
+
+class LatencyTrace:
+    """单条回复的各阶段时间点"""
+
+    __slots__ = ("marks",)
+
+    def __init__(self, received_at: Optional[float] = None):
+        self.marks = {"received": received_at if received_at is not None else time.monotonic()}
+
+    def mark(self, stage: str):
+        """记录阶段时间点（已记录过的阶段不覆盖）"""
+        if stage not in self.marks:
+            self.marks[stage] = time.monotonic()
+
+    def durations(self) -> Dict[str, float]:
+        """
+        各阶段耗时（秒）：与上一个已记录阶段的时间差，另含端到端总耗时
+
+        Returns:
+            {阶段: 耗时}，没有记录到的阶段不包含
+        """
+        result = {}
+        previous = None
+        for stage in STAGES:
+            at = self.marks.get(stage)
+            if at is None:
+                continue
+            if previous is not None:
+                result[stage] = at - previous
+            previous = at
+        if "first_send" in self.marks:
+            result[TOTAL] = self.marks["first_send"] - self.marks["received"]
+        return result
+
+
+class LatencyTracker:
+    """按阶段统计最近若干条回复的延迟分位数"""
+
+    def __init__(self, window: int = 500):
+        """
+        Args:
+            window: 每个阶段保留的最近样本数
+        """
+        self.window = max(1, int(window))
+        self.samples = {stage: deque(maxlen=self.window) for stage in STAGES[1:] + (TOTAL,)}
+        self.count = 0
+        self.histograms = None  # 阶段 -> 直方图子指标（bind_histogram 后同时输出到 /metrics）
+
+    def bind_histogram(self, histogram, **labels):
+        """
+        把每条回复的阶段耗时同时记录到直方图指标
+
+        Args:
+            histogram: 带 stage 标签的直方图（core.utils.metrics.Histogram）
+            labels: 其余标签值
+        """
+        self.histograms = {stage: histogram.labels(stage=stage, **labels) for stage in self.samples}
+
+    def record(self, trace: Optional[LatencyTrace]):
+        """记录一条完成的回复（没有发出音频的回复不计入）"""
+        if trace is None or "first_send" not in trace.marks:
+            return
+        for stage, duration in trace.durations().items():
+            self.samples[stage].append(duration)
+            if self.histograms is not None:
+                self.histograms[stage].observe(duration)
+        self.count += 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        各阶段延迟分位数（毫秒）
+
+        Returns:
+            {阶段: {"count", "p50", "p90", "p99", "max"}}，没有样本的阶段不包含
+        """
+        result = {}
+        for stage, values in self.samples.items():
+            if not values:
+                continue
+            ordered = sorted(values)
+            result[stage] = {
+                "count": len(ordered),
+                "p50": round(_percentile(ordered, 50) * 1000, 1),
+                "p90": round(_percentile(ordered, 90) * 1000, 1),
+                "p99": round(_percentile(ordered, 99) * 1000, 1),
+                "max": round(ordered[-1] * 1000, 1),
+            }
+        return result
+
+    def format_summary(self) -> str:
+        """单行文本摘要（用于定期日志）"""
+        summary = self.summary()
+        if not summary:
+            return "暂无样本"
+        return "，".join(
+            f"{stage} p50={values['p50']:.0f}ms p99={values['p99']:.0f}ms"
+            for stage, values in summary.items()
+        )
+
+
+def _percentile(ordered: list, pct: float) -> float:
+    """已排序样本的分位数（最近秩法）"""
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
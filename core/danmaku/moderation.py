@@ -0,0 +1,279 @@
+"""
+弹幕内容审核
+启动时把词库构建为 Aho-Corasick 自动机，每条弹幕只需按字符扫描一遍即可找出全部命中的词，
+耗时与弹幕长度成正比，与词库大小无关。命中的弹幕在进入LLM之前被丢弃或把敏感词替换为掩码。
+
+匹配前对弹幕和词库做相同的归一化：全角转半角、转小写，可选忽略标点/空白/表情
+（"加 微 信"、"加-微-信" 与 "加微信" 视为相同），替换时按原文位置打码。
+"""
+
+import os
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+ACTION_PASS = "pass"
+ACTION_DROP = "drop"
+ACTION_REWRITE = "rewrite"
+
+# 网址、域名等广告链接
+_LINK_PATTERN = re.compile(
+    r"(https?://|www\.|[a-z0-9-]+\.(com|cn|net|org|top|xyz|vip|cc|me|io)\b)", re.IGNORECASE
+)
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick 多模式匹配自动机
+
+    每个节点保存子节点字典、失败指针，以及沿失败链最近的终止节点（输出链接），
+    扫描时每个字符均摊 O(1)，命中数为 k 时总耗时 O(n + k)。
+    """
+
+    def __init__(self, terms: Iterable[str] = ()):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._term: List[int] = [-1]  # 以该节点结尾的词序号，-1 表示不是词尾
+        self._output: List[int] = [0]  # 沿失败链最近的词尾节点，0 表示没有
+        self._depth: List[int] = [0]
+        self.terms: List[str] = []
+        self._built = False
+        for term in terms:
+            self.add(term)
+
+    def __len__(self):
+        return len(self.terms)
+
+    @property
+    def node_count(self) -> int:
+        return len(self._goto)
+
+    def add(self, term: str) -> int:
+        """
+        添加一个词（构建前调用）
+
+        Returns:
+            词序号，重复的词返回已有序号，空词返回 -1
+        """
+        if not term:
+            return -1
+        if self._built:
+            raise RuntimeError("自动机已构建，不能再添加词")
+        node = 0
+        for ch in term:
+            child = self._goto[node].get(ch)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][ch] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._term.append(-1)
+                self._output.append(0)
+                self._depth.append(self._depth[node] + 1)
+            node = child
+        if self._term[node] < 0:
+            self._term[node] = len(self.terms)
+            self.terms.append(term)
+        return self._term[node]
+
+    def build(self):
+        """按广度优先顺序计算失败指针和输出链接"""
+        goto, fail, term, output = self._goto, self._fail, self._term, self._output
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, child in goto[node].items():
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(ch, 0) if node else 0
+                fail[child] = target if target != child else 0
+                output[child] = fail[child] if term[fail[child]] >= 0 else output[fail[child]]
+                queue.append(child)
+        self._built = True
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """
+        扫描文本中所有命中的词（包括重叠的词）
+
+        Yields:
+            (起始位置, 结束位置, 词序号)
+        """
+        if not self._built:
+            self.build()
+        goto, fail, term, output, depth = self._goto, self._fail, self._term, self._output, self._depth
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = node if term[node] >= 0 else output[node]
+            while hit:
+                yield i + 1 - depth[hit], i + 1, term[hit]
+                hit = output[hit]
+
+
+class DanmakuModerator:
+    """
+    弹幕审核器
+
+    词库来自配置中的 terms 和 lexicon_files，每个词可单独指定处理方式：
+        drop     丢弃整条弹幕
+        rewrite  把命中的词替换为掩码后继续回复
+    同一条弹幕同时命中两种词时按 drop 处理。
+    """
+
+    def __init__(self, config: Dict[str, Any] = None, logger=None):
+        """
+        初始化审核器并构建自动机
+
+        Args:
+            config: 审核配置（danmaku.moderation）
+            logger: 日志记录器
+        """
+        config = config or {}
+        self.logger = logger
+        self.default_action = self._parse_action(config.get("action", ACTION_DROP)) or ACTION_DROP
+        self.mask = str(config.get("mask", "*")) or "*"
+        self.ignore_symbols = config.get("ignore_symbols", True)
+        self.block_links = config.get("block_links", True)
+
+        self._fold_cache: Dict[str, str] = {}
+        self.automaton = AhoCorasick()
+        self._actions: List[str] = []  # 按词序号保存处理方式
+
+        for term in config.get("terms") or []:
+            self._add_entry(str(term))
+        for path in config.get("lexicon_files") or []:
+            self._load_lexicon(path)
+        self.automaton.build()
+
+        # 统计信息
+        self.stats = {
+            "checked": 0,
+            "dropped": 0,
+            "rewritten": 0,
+        }
+
+    def __len__(self):
+        return len(self.automaton)
+
+    def moderate(self, text: str) -> Tuple[str, str, List[str]]:
+        """
+        审核一条弹幕
+
+        Args:
+            text: 弹幕内容
+
+        Returns:
+            (处理方式, 处理后的文本, 命中的词)，处理方式为 pass/drop/rewrite
+        """
+        self.stats["checked"] += 1
+        if not text:
+            return ACTION_PASS, text, []
+
+        if self.block_links and _LINK_PATTERN.search(unicodedata.normalize("NFKC", text)):
+            self.stats["dropped"] += 1
+            return ACTION_DROP, text, ["<link>"]
+
+        folded, positions = self._fold_text(text)
+        spans = []
+        matched = []
+        terms, actions = self.automaton.terms, self._actions
+        for start, end, index in self.automaton.iter_matches(folded):
+            matched.append(terms[index])
+            if actions[index] == ACTION_DROP:
+                self.stats["dropped"] += 1
+                return ACTION_DROP, text, matched
+            spans.append((positions[start], positions[end - 1] + 1))
+
+        if not spans:
+            return ACTION_PASS, text, []
+
+        masked = list(text)
+        for start, end in spans:
+            for i in range(start, end):
+                if not masked[i].isspace():
+                    masked[i] = None
+        if not any(ch is not None and ch.isalnum() for ch in masked):
+            # 整条弹幕都是敏感词，打码后没有可回复的内容
+            self.stats["dropped"] += 1
+            return ACTION_DROP, text, matched
+        self.stats["rewritten"] += 1
+        return ACTION_REWRITE, "".join(self.mask if ch is None else ch for ch in masked), matched
+
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        return {**self.stats, "terms": len(self.automaton)}
+
+    def _fold_char(self, ch: str) -> str:
+        """归一化单个字符（结果缓存），忽略符号时标点、空白和表情返回空串"""
+        folded = self._fold_cache.get(ch)
+        if folded is None:
+            folded = unicodedata.normalize("NFKC", ch).lower()
+            if self.ignore_symbols:
+                folded = "".join(c for c in folded if c.isalnum())
+            self._fold_cache[ch] = folded
+        return folded
+
+    def _fold_text(self, text: str) -> Tuple[str, List[int]]:
+        """
+        归一化文本，并记录归一化后每个字符对应的原文位置
+
+        Returns:
+            (归一化文本, 原文位置列表)
+        """
+        chars = []
+        positions = []
+        fold = self._fold_char
+        for i, ch in enumerate(text):
+            folded = fold(ch)
+            if len(folded) == 1:
+                chars.append(folded)
+                positions.append(i)
+            elif folded:
+                chars.extend(folded)
+                positions.extend([i] * len(folded))
+        return "".join(chars), positions
+
+    def _add_entry(self, line: str):
+        """
+        添加词库中的一行：词，或 "词|drop"、"词|rewrite"
+        """
+        line = line.strip()
+        if not line or line.startswith("#"):
+            return
+        action = None
+        if "|" in line:
+            term, _, suffix = line.rpartition("|")
+            action = self._parse_action(suffix)
+            if action is not None:
+                line = term
+        folded = self._fold_text(line)[0]
+        if not folded:
+            return
+        index = self.automaton.add(folded)
+        action = action or self.default_action
+        if index == len(self._actions):
+            self._actions.append(action)
+        elif action == ACTION_DROP:
+            self._actions[index] = ACTION_DROP  # 重复的词以更严格的处理方式为准
+
+    def _load_lexicon(self, path: str):
+        """加载词库文件（UTF-8，每行一个词，# 开头为注释）"""
+        if not os.path.exists(path):
+            if self.logger:
+                self.logger.warning(f"审核词库文件不存在: {path}")
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                self._add_entry(line)
+
+    @staticmethod
+    def _parse_action(value) -> Optional[str]:
+        value = str(value or "").strip().lower()
+        if value in (ACTION_DROP, ACTION_REWRITE):
+            return value
+        return None
@@ -0,0 +1,279 @@
+"""
+直播间互动反应
+点赞、礼物、进场、关注等高频事件不经过LLM，直接播放按模板预合成的Opus音频片段：
+
+- 模板中的固定文字在启动时合成一次，之后只做音频帧拼接
+- 模板中的 {name} 用观众昵称的短语音片段替换，昵称片段按LRU缓存
+- 每种事件类型单独限速，等待播放的反应有数量和时效上限
+- 与弹幕回复共用音频发送锁，反应只在两条回复之间播放，不会与回复重叠
+"""
+
+import re
+import json
+import time
+import random
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from core.utils.tts_pool import get_executor
+
+TAG = __name__
+
+NAME_PLACEHOLDER = "{name}"
+
+# 昵称中只保留文字和数字（表情、符号无法合成或读出来很奇怪）
+_NAME_STRIP_PATTERN = re.compile(r"[\W_]+")
+
+# 默认反应模板：点赞和进场数量很大，默认只开启礼物和关注
+DEFAULT_REACTIONS = {
+    "gift": {"min_interval": 5, "templates": ["谢谢{name}的礼物", "感谢{name}送的礼物"]},
+    "follow": {"min_interval": 10, "templates": ["感谢{name}的关注"]},
+}
+
+
+class ReactionClip:
+    """一个反应模板：固定文字片段的音频帧和昵称插入位置"""
+
+    def __init__(self, template: str):
+        self.template = template
+        self.texts = template.split(NAME_PLACEHOLDER)  # 相邻两段之间插入昵称
+        self.segments: List[List[bytes]] = []  # 与 texts 一一对应的音频帧
+
+    @property
+    def has_name(self) -> bool:
+        return len(self.texts) > 1
+
+    def render_text(self, name: str) -> str:
+        return name.join(self.texts)
+
+
+class ReactionEngine:
+    """互动反应引擎"""
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        tts,
+        device_manager,
+        logger,
+        audio_lock: Optional[asyncio.Lock] = None,
+        session_id: Optional[str] = None
+    ):
+        """
+        初始化互动反应引擎
+
+        Args:
+            config: 反应配置（danmaku.reactions）
+            tts: 语音合成实例（用于预合成模板和昵称片段）
+            device_manager: 设备管理器实例
+            logger: 日志记录器
+            audio_lock: 与弹幕回复共用的音频发送锁
+            session_id: 发送给设备的TTS消息会话ID
+        """
+        self.tts = tts
+        self.device_manager = device_manager
+        self.logger = logger
+        self.audio_lock = audio_lock or asyncio.Lock()
+        self.session_id = session_id
+
+        self.max_pending = max(1, int(config.get("max_pending", 3)))  # 最多等待播放的反应数
+        self.max_delay = float(config.get("max_delay", 8))  # 反应等待超过该秒数后丢弃
+        self.name_max_length = int(config.get("name_max_length", 8))  # 昵称最多读出的字数
+        self.name_cache_size = max(1, int(config.get("name_cache_size", 200)))  # 缓存的昵称片段数
+        self.frame_duration = int(config.get("frame_duration", 60)) / 1000.0  # 音频帧时长（秒）
+        self.pre_buffer_count = 5  # 开头直接发送的帧数（与 sendAudioHandle 预缓冲一致）
+
+        # 事件类型 -> {"min_interval": 秒, "clips": [ReactionClip]}
+        self.reactions: Dict[str, Dict[str, Any]] = {}
+        for event_type, reaction_config in (config.get("types") or DEFAULT_REACTIONS).items():
+            templates = [t for t in (reaction_config or {}).get("templates", []) if t]
+            if not templates:
+                continue
+            self.reactions[event_type] = {
+                "min_interval": float(reaction_config.get("min_interval", 10)),
+                "clips": [ReactionClip(template) for template in templates],
+            }
+
+        self.last_accepted: Dict[str, float] = {}  # 事件类型 -> 上次接受的时间
+        self.pending = asyncio.Queue(maxsize=self.max_pending)
+        self.name_cache: "OrderedDict[str, List[bytes]]" = OrderedDict()
+        self.play_task = None
+
+        self.stats = {
+            "played": 0,
+            "rate_limited": 0,
+            "queue_full": 0,
+            "expired": 0,
+            "name_hits": 0,
+            "name_misses": 0,
+        }
+
+    @property
+    def event_types(self) -> List[str]:
+        """可处理的事件类型"""
+        return list(self.reactions)
+
+    def handles(self, event_type: str) -> bool:
+        """是否处理该类型的事件"""
+        return event_type in self.reactions
+
+    async def prepare(self):
+        """预合成所有模板的固定文字片段，合成失败的模板会被移除"""
+        start = time.time()
+        for event_type in list(self.reactions):
+            clips = []
+            for clip in self.reactions[event_type]["clips"]:
+                segments = await asyncio.gather(*(self._synthesize(text) for text in clip.texts))
+                if any(segment is None for segment in segments):
+                    self.logger.warning(f"⚠️  反应模板合成失败，已跳过: {clip.template}")
+                    continue
+                clip.segments = list(segments)
+                clips.append(clip)
+            if clips:
+                self.reactions[event_type]["clips"] = clips
+            else:
+                del self.reactions[event_type]
+        self.logger.info(
+            f"互动反应已就绪: {', '.join(self.reactions) or '无'}，预合成耗时 {time.time() - start:.1f}秒"
+        )
+
+    async def start(self):
+        """预合成模板并启动播放任务"""
+        await self.prepare()
+        self.play_task = asyncio.create_task(self._play_loop())
+
+    async def stop(self):
+        """停止播放任务"""
+        if self.play_task and not self.play_task.done():
+            self.play_task.cancel()
+
+    async def add_event(self, event: dict) -> bool:
+        """
+        接收一个互动事件（不等待播放）
+
+        Args:
+            event: 采集器回调的事件字典
+
+        Returns:
+            事件是否被接受（限速或队列已满时返回 False）
+        """
+        event_type = event.get("type")
+        reaction = self.reactions.get(event_type)
+        if reaction is None:
+            return False
+
+        now = time.monotonic()
+        if now - self.last_accepted.get(event_type, float("-inf")) < reaction["min_interval"]:
+            self.stats["rate_limited"] += 1
+            return False
+        if self.pending.full():
+            self.stats["queue_full"] += 1
+            return False
+
+        self.last_accepted[event_type] = now
+        self.pending.put_nowait((now, event_type, event.get("username", "")))
+        return True
+
+    async def _play_loop(self):
+        """按接收顺序播放反应，等待过久的反应直接丢弃"""
+        while True:
+            accepted_at, event_type, username = await self.pending.get()
+            try:
+                if time.monotonic() - accepted_at > self.max_delay:
+                    self.stats["expired"] += 1
+                    continue
+
+                clip = random.choice(self.reactions[event_type]["clips"])
+                name = self._clean_name(username) if clip.has_name else ""
+                packets = await self._render(clip, name)
+
+                async with self.audio_lock:
+                    # 等待回复播放期间可能已经过时
+                    if time.monotonic() - accepted_at > self.max_delay:
+                        self.stats["expired"] += 1
+                        continue
+                    await self._send_clip(clip.render_text(name), packets)
+                self.stats["played"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"播放互动反应时出错: {e}")
+
+    async def _render(self, clip: ReactionClip, name: str) -> List[bytes]:
+        """拼接模板片段和昵称片段的音频帧"""
+        name_packets = await self._get_name_packets(name) if name else []
+        packets = list(clip.segments[0])
+        for segment in clip.segments[1:]:
+            packets.extend(name_packets)
+            packets.extend(segment)
+        return packets
+
+    async def _get_name_packets(self, name: str) -> List[bytes]:
+        """获取昵称的语音片段（LRU缓存）"""
+        packets = self.name_cache.get(name)
+        if packets is not None:
+            self.name_cache.move_to_end(name)
+            self.stats["name_hits"] += 1
+            return packets
+
+        self.stats["name_misses"] += 1
+        packets = await self._synthesize(name)
+        if packets is None:
+            return []  # 合成失败时省略昵称
+        self.name_cache[name] = packets
+        self.name_cache.move_to_end(name)
+        while len(self.name_cache) > self.name_cache_size:
+            self.name_cache.popitem(last=False)
+        return packets
+
+    async def _synthesize(self, text: str) -> Optional[List[bytes]]:
+        """合成一段文字为Opus音频帧（空文字返回空列表，失败返回 None）"""
+        if not text.strip():
+            return []
+        try:
+            loop = asyncio.get_running_loop()
+            packets = await loop.run_in_executor(get_executor(), self.tts.to_tts, text)
+            return list(packets) if packets else None
+        except Exception as e:
+            self.logger.warning(f"合成反应语音失败: {text}，错误: {e}")
+            return None
+
+    def _clean_name(self, username: str) -> str:
+        """清理昵称：去掉表情和符号，截断到最大长度"""
+        return _NAME_STRIP_PATTERN.sub("", username or "")[:self.name_max_length]
+
+    async def _send_clip(self, text: str, packets: List[bytes]):
+        """
+        按音频帧时长节奏发送一段反应音频
+
+        与弹幕回复一样只发送 start 和 sentence_start，不发送 stop，避免硬件进入聆听状态
+        """
+        await self._send_control({"type": "tts", "state": "start", "session_id": self.session_id})
+        await self._send_control(
+            {"type": "tts", "state": "sentence_start", "text": text, "session_id": self.session_id}
+        )
+
+        start = time.monotonic()
+        for index, packet in enumerate(packets):
+            if index >= self.pre_buffer_count:
+                delay = start + (index - self.pre_buffer_count) * self.frame_duration - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self.device_manager.broadcast_audio(packet)
+
+        # 等待设备播放完毕再释放发送锁
+        remaining = start + len(packets) * self.frame_duration - time.monotonic()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+        self.logger.debug(f"🎉 播放互动反应: {text}（{len(packets)} 帧）")
+
+    async def _send_control(self, message: dict):
+        await self.device_manager.broadcast_audio(json.dumps(message, ensure_ascii=False))
+
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        stats = dict(self.stats)
+        stats["pending"] = self.pending.qsize()
+        stats["name_cache_size"] = len(self.name_cache)
+        return stats
@@ -0,0 +1,158 @@
+"""
+弹幕回复缓存
+直播间弹幕重复度很高（打招呼、"主播好"、反复被问到的问题），
+按归一化后的弹幕文本缓存 LLM 回复和合成好的 Opus 音频帧，命中时直接播放，不占用 LLM 和 TTS
+"""
+
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.utils.cache.strategies import CacheEntry
+
+# 标点、空白、表情等非文字字符
+_NON_WORD_PATTERN = re.compile(r"[\W_]+", re.UNICODE)
+# 连续重复3次以上的字符（"哈哈哈哈" 与 "哈哈哈" 视为相同）
+_REPEAT_PATTERN = re.compile(r"(.)\1{2,}")
+
+
+def normalize_danmaku_text(text: str) -> str:
+    """
+    归一化弹幕文本：全角转半角、转小写、去除标点/空白/表情、压缩重复字符
+
+    Args:
+        text: 原始弹幕文本
+
+    Returns:
+        归一化后的文本
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _NON_WORD_PATTERN.sub("", text)
+    return _REPEAT_PATTERN.sub(r"\1\1", text)
+
+
+class ReplyCache:
+    """
+    回复缓存（TTL + LRU，按条目数和字节数限制大小）
+
+    仅在事件循环中使用，不需要加锁。
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        """
+        初始化回复缓存
+
+        Args:
+            config: 缓存配置（danmaku.reply_cache）
+        """
+        config = config or {}
+        self.ttl = float(config.get("ttl", 3600))
+        self.max_entries = max(1, int(config.get("max_entries", 200)))
+        self.max_bytes = int(float(config.get("max_mb", 20)) * 1024 * 1024)
+        self.max_text_length = int(config.get("max_text_length", 20))  # 只缓存较短的弹幕
+
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self.total_bytes = 0
+
+        # 统计信息
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def make_key(self, content: str) -> Optional[str]:
+        """
+        生成缓存键
+
+        Args:
+            content: 弹幕内容
+
+        Returns:
+            缓存键，弹幕为空或过长时返回 None（不参与缓存）
+        """
+        key = normalize_danmaku_text(content)
+        if not key or len(key) > self.max_text_length:
+            return None
+        return key
+
+    def get(self, key: str) -> Optional[Tuple[str, List[bytes]]]:
+        """
+        查询缓存
+
+        Returns:
+            (回复文本, Opus音频帧列表)，未命中返回 None
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        if entry.is_expired():
+            self._remove(key)
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+
+        entry.touch()
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry.value
+
+    def put(self, key: str, text: str, opus_packets: List[bytes]):
+        """
+        写入缓存，超出条目数或字节数上限时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            text: 回复文本
+            opus_packets: Opus音频帧
+        """
+        if not key or not text or not opus_packets:
+            return
+        size = len(text.encode("utf-8")) + sum(len(packet) for packet in opus_packets)
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CacheEntry(
+            value=(text, list(opus_packets)), timestamp=time.time(), ttl=self.ttl
+        )
+        self._sizes[key] = size
+        self.total_bytes += size
+        self.stats["stores"] += 1
+
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        """清空缓存"""
+        self._entries.clear()
+        self._sizes.clear()
+        self.total_bytes = 0
+
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+    def _remove(self, key: str):
+        del self._entries[key]
+        self.total_bytes -= self._sizes.pop(key, 0)
@@ -0,0 +1,211 @@
+"""
+直播间上下文
+一个服务进程可同时服务多个直播间：各直播间共享LLM和事件循环，
+弹幕采集器、消息队列、对话上下文、TTS通道和设备分组相互独立
+"""
+
+import asyncio
+from typing import Any, Dict
+
+from core.live.douyin_collector import DouyinDanmakuCollector, MockDouyinDanmakuCollector
+from core.live.douyin_proxy_collector import DouyinProxyCollector
+from core.live.frame_recorder import FrameRecorder
+from core.danmaku.handler import DanmakuHandler, DanmakuConnection
+from core.danmaku.device_manager import (
+    DeviceManager, EVICT_SEND_FAILURES, EVICT_MISSED_PONGS, EVICT_BUFFER, EVICT_STALLED
+)
+from core.danmaku.reactions import ReactionEngine
+from core.utils.metrics import REGISTRY
+
+TAG = __name__
+
+
+class LiveRoom:
+    """单个直播间"""
+
+    def __init__(self, room_id: str, config: Dict[str, Any], llm, tts, logger, device_manager=None):
+        """
+        初始化直播间（需要在事件循环中调用）
+
+        Args:
+            room_id: 直播间ID
+            config: 该直播间的完整配置（danmaku 部分已合并直播间覆盖项）
+            llm: 共享的大语言模型实例
+            tts: 该直播间独占的语音合成实例
+            logger: 日志记录器
+            device_manager: 设备管理器（多进程广播模式下由 FanoutPublisher 提供，默认在本进程管理设备）
+        """
+        self.room_id = room_id
+        self.config = config
+        self.danmaku_config = config.get("danmaku", {})
+        self.llm = llm
+        self.tts = tts
+        self.logger = logger
+
+        self.device_manager = device_manager or DeviceManager(
+            logger=logger,
+            config=self.danmaku_config.get("device_queue", {})
+        )
+        self.handler = DanmakuHandler(
+            config=config,
+            llm=llm,
+            tts=tts,
+            device_manager=self.device_manager,
+            logger=logger
+        )
+
+        # TTS音频通道（使用模拟连接广播到本直播间的设备）
+        self.connection = DanmakuConnection(self.device_manager, logger, config)
+        self.connection.set_tts(tts)
+
+        # 互动反应：点赞、礼物等事件直接播放预合成音频，不经过LLM
+        self.reactions = None
+        reactions_config = self.danmaku_config.get("reactions", {})
+        if reactions_config.get("enabled", False):
+            self.reactions = ReactionEngine(
+                reactions_config,
+                tts,
+                self.device_manager,
+                logger,
+                audio_lock=self.handler.audio_send_lock,
+                session_id=self.connection.session_id
+            )
+
+        self.collector = self._create_collector()
+        self.tasks = []
+        self._register_metrics(REGISTRY)
+
+    def _create_collector(self):
+        """根据直播间配置创建弹幕采集器"""
+        if self.danmaku_config.get("use_mock", True):
+            self.logger.debug(f"[{self.room_id}] 使用模拟弹幕采集器")
+            return MockDouyinDanmakuCollector(
+                room_id=self.room_id,
+                on_message_callback=self.on_event,
+                logger=self.logger,
+                interval=self.danmaku_config.get("mock_interval", 10)
+            )
+        if self.danmaku_config.get("use_proxy", False):
+            proxy_ws_url = self.danmaku_config.get("proxy_ws_url", "ws://127.0.0.1:8888")
+            self.logger.info(f"[{self.room_id}] 使用 DouyinBarrageGrab 代理采集器: {proxy_ws_url}")
+            forward_types = ["danmaku"]
+            if self.handler.scheduler is not None:
+                # 优先级调度模式下，除弹幕外还需要采集礼物、关注和粉丝团事件
+                forward_types += ["gift", "follow", "fansclub"]
+            if self.reactions is not None:
+                forward_types += self.reactions.event_types
+            recorder = None
+            record_path = self.danmaku_config.get("record_path")
+            if record_path:
+                # 录制原始消息，可用 tools/danmaku_replay.py 离线回放
+                record_path = record_path.replace("{room_id}", str(self.room_id))
+                recorder = FrameRecorder(record_path)
+                self.logger.info(f"[{self.room_id}] 录制原始弹幕消息到: {record_path}")
+            return DouyinProxyCollector(
+                on_message_callback=self.on_event,
+                ws_url=proxy_ws_url,
+                logger=self.logger,
+                forward_types=forward_types,
+                recorder=recorder
+            )
+        self.logger.info(f"[{self.room_id}] 使用真实抖音弹幕采集器（需要自行实现协议）")
+        return DouyinDanmakuCollector(
+            room_id=self.room_id,
+            on_message_callback=self.on_event,
+            logger=self.logger
+        )
+
+    def _register_metrics(self, registry):
+        """注册本直播间的运行指标（均为拉取时计算的回调，处理流程中没有额外开销）"""
+        room = self.room_id
+        registry.gauge("xiaozhi_danmaku_devices", "当前连接的设备数", ["room"]).labels(room).set_function(
+            self.device_manager.get_device_count
+        )
+
+        queue_depth = registry.gauge("xiaozhi_danmaku_queue_depth", "各队列中等待的消息数", ["room", "queue"])
+        queue_depth.labels(room, "pending").set_function(lambda: self.handler.get_stats()["pending"])
+        queue_depth.labels(room, "ready").set_function(self.handler.ready_queue.qsize)
+        queue_depth.labels(room, "device_send").set_function(self.device_manager.get_queued_count)
+        queue_depth.labels(room, "tts_text").set_function(self.tts.tts_text_queue.qsize)
+        queue_depth.labels(room, "tts_audio").set_function(self.tts.tts_audio_queue.qsize)
+
+        events = registry.counter("xiaozhi_danmaku_events_total", "弹幕和事件处理结果累计数", ["room", "result"])
+        for result in ("received", "dropped", "served", "blocked", "rewritten"):
+            events.labels(room, result).set_function(lambda result=result: self.handler.get_stats()[result])
+
+        frames = registry.counter(
+            "xiaozhi_danmaku_device_frames_total", "发往设备的消息累计数（dropped 为发送积压丢弃）", ["room", "result"]
+        )
+        frames.labels(room, "sent").set_function(lambda: self.device_manager.total_sent)
+        frames.labels(room, "dropped").set_function(lambda: self.device_manager.total_dropped)
+        registry.counter("xiaozhi_danmaku_device_catchups_total", "中途加入并补发当前句子的设备数", ["room"]).labels(
+            room
+        ).set_function(lambda: self.device_manager.total_catchups)
+
+        device_state = registry.gauge(
+            "xiaozhi_danmaku_device_state", "各健康状态的设备数（demoted 为链路变差已降级）", ["room", "state"]
+        )
+        for state in ("healthy", "demoted"):
+            device_state.labels(room, state).set_function(
+                lambda state=state: self.device_manager.get_health_stats()[state]
+            )
+        evictions = registry.counter(
+            "xiaozhi_danmaku_device_evictions_total", "因链路失效被移除的设备数", ["room", "reason"]
+        )
+        for reason in (EVICT_SEND_FAILURES, EVICT_MISSED_PONGS, EVICT_BUFFER, EVICT_STALLED):
+            evictions.labels(room, reason).set_function(
+                lambda reason=reason: self.device_manager.get_health_stats()["evictions"].get(reason, 0)
+            )
+        rtt = registry.gauge("xiaozhi_danmaku_device_rtt_seconds", "设备 ping 往返时间", ["room", "stat"])
+        for stat in ("avg", "max"):
+            rtt.labels(room, stat).set_function(
+                lambda stat=stat: self.device_manager.get_health_stats()[f"rtt_{stat}_ms"] / 1000
+            )
+
+        if self.handler.latency is not None:
+            self.handler.latency.bind_histogram(
+                registry.histogram("xiaozhi_danmaku_stage_latency_seconds", "回复各处理阶段耗时", ["room", "stage"]),
+                room=room,
+            )
+
+    async def on_event(self, event: dict):
+        """采集器回调：配置了互动反应的事件类型直接播放反应，其余交给弹幕处理器"""
+        if self.reactions is not None and self.reactions.handles(event.get("type")):
+            await self.reactions.add_event(event)
+            return
+        await self.handler.add_danmaku(event)
+
+    async def start(self):
+        """打开TTS通道，启动弹幕处理和采集"""
+        await self.tts.open_audio_channels(self.connection)
+        if self.reactions is not None:
+            await self.reactions.start()
+        self.tasks = [
+            asyncio.create_task(self.handler.start()),
+            asyncio.create_task(self.collector.start()),
+        ]
+        self.logger.info(f"✅ 直播间已启动: {self.room_id}")
+
+    async def stop(self):
+        """停止采集和处理，关闭TTS通道"""
+        await self.collector.stop()
+        if self.reactions is not None:
+            await self.reactions.stop()
+        await self.handler.stop()
+        self.connection.stop_event.set()
+        for task in self.tasks:
+            if not task.done():
+                task.cancel()
+        self.logger.info(f"直播间已停止: {self.room_id}")
+
+    def get_stats(self) -> dict:
+        """获取直播间状态"""
+        return {
+            "room_id": self.room_id,
+            "devices": self.device_manager.get_device_count(),
+            "dialogue": self.handler.dialogue.get_window_stats(),
+            "speaking": self.handler.is_speaking,
+            "handler": self.handler.get_stats(),
+            "latency": self.handler.latency.summary() if self.handler.latency is not None else None,
+            "reactions": self.reactions.get_stats() if self.reactions is not None else None,
+        }
@@ -0,0 +1,247 @@
+"""
+直播间事件优先级调度器
+按事件类型（礼物、粉丝团、关注、弹幕）、礼物价值、用户和等待时间为待处理事件打分，
+每次取出当前得分最高的事件，超过截止时间的事件自动丢弃
+
+打分规则：
+    得分 = 类型权重 + 价值权重 × log10(1 + 价值) - 重复用户惩罚 - 等待衰减 × 等待秒数
+
+所有事件的等待衰减速度相同，因此事件之间的先后关系不随时间改变，
+入队时即可算出固定的排序键（类型得分 + 衰减 × 到达时间），插入、取出、过期均为 O(log n)。
+"""
+
+import heapq
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# 默认类型权重
+DEFAULT_WEIGHTS = {
+    "gift": 100,
+    "fansclub": 60,
+    "follow": 40,
+    "danmaku": 10,
+}
+
+# 默认截止时间（秒），超过后事件不再回复
+DEFAULT_TTL = {
+    "gift": 120,
+    "fansclub": 60,
+    "follow": 30,
+    "danmaku": 20,
+}
+
+
+class _Entry:
+    """调度器中的一个待处理事件"""
+
+    __slots__ = ("key", "seq", "event", "deadline", "user", "event_type", "alive")
+
+    def __init__(self, key, seq, event, deadline, user, event_type):
+        self.key = key
+        self.seq = seq
+        self.event = event
+        self.deadline = deadline
+        self.user = user
+        self.event_type = event_type
+        self.alive = True
+
+
+class PriorityEventScheduler:
+    """
+    基于堆的直播间事件调度器
+
+    维护三个堆：最高得分堆（取出）、最低得分堆（队列满时淘汰）、截止时间堆（过期丢弃）。
+    删除采用惰性标记，失效条目过多时整体重建，内存占用与 max_pending 成正比。
+    """
+
+    def __init__(self, config: Dict[str, Any] = None, clock: Callable[[], float] = time.monotonic):
+        """
+        初始化调度器
+
+        Args:
+            config: 调度配置（danmaku.scheduler）
+            clock: 时间函数（秒），测试时可替换为模拟时钟
+        """
+        config = config or {}
+        self.clock = clock
+        self.max_pending = max(1, int(config.get("max_pending", 200)))
+        self.weights = {**DEFAULT_WEIGHTS, **(config.get("weights") or {})}
+        self.ttl = {**DEFAULT_TTL, **(config.get("ttl") or {})}
+        self.value_weight = float(config.get("value_weight", 20))  # 每10倍礼物价值增加的得分
+        self.age_weight = float(config.get("age_weight", 1))  # 每等待1秒降低的得分
+        self.repeat_user_penalty = float(config.get("repeat_user_penalty", 15))  # 最近被回复过的用户扣分
+        self.recent_user_window = int(config.get("recent_user_window", 20))  # 记录最近被回复的用户数
+
+        self._best = []  # (-key, seq, entry)
+        self._worst = []  # (key, seq, entry)
+        self._deadlines = []  # (deadline, seq, entry)
+        self._pending_chat = {}  # 用户 -> 该用户待处理的弹幕（每个用户只保留最新一条）
+        self._recent_users = OrderedDict()
+        self._seq = 0
+        self._live = 0
+
+        # 统计信息
+        self.stats = {
+            "pushed": 0,
+            "served": 0,
+            "expired": 0,
+            "evicted": 0,  # 队列已满时被更高得分事件挤出
+            "rejected": 0,  # 队列已满且得分不够，直接丢弃
+            "replaced": 0,  # 被同一用户的新弹幕替换
+        }
+
+    def __len__(self):
+        return self._live
+
+    def push(self, event: dict) -> bool:
+        """
+        加入一个事件
+
+        Args:
+            event: 事件信息 {"type": "danmaku"/"gift"/..., "username": ..., "value": ...}
+
+        Returns:
+            是否进入待处理队列
+        """
+        now = self.clock()
+        self._expire(now)
+        self.stats["pushed"] += 1
+
+        event_type = event.get("type") or "danmaku"
+        user = event.get("username", "")
+        key = self._score(event, event_type, user) + self.age_weight * now
+
+        # 同一用户的多条弹幕只保留最新一条
+        if event_type == "danmaku" and user:
+            previous = self._pending_chat.get(user)
+            if previous is not None and previous.alive:
+                self._remove(previous)
+                self.stats["replaced"] += 1
+
+        if self._live >= self.max_pending:
+            lowest = self._peek_worst()
+            if lowest is not None and lowest.key >= key:
+                self.stats["rejected"] += 1
+                return False
+            if lowest is not None:
+                self._remove(lowest)
+                self.stats["evicted"] += 1
+
+        ttl = float(self.ttl.get(event_type, self.ttl["danmaku"]))
+        self._seq += 1
+        entry = _Entry(key, self._seq, event, now + ttl, user, event_type)
+        heapq.heappush(self._best, (-key, entry.seq, entry))
+        heapq.heappush(self._worst, (key, entry.seq, entry))
+        heapq.heappush(self._deadlines, (entry.deadline, entry.seq, entry))
+        if event_type == "danmaku" and user:
+            self._pending_chat[user] = entry
+        self._live += 1
+
+        self._maybe_compact()
+        return True
+
+    def pop(self) -> Optional[dict]:
+        """
+        取出当前得分最高且未过期的事件
+
+        Returns:
+            事件信息，没有待处理事件时返回 None
+        """
+        self._expire(self.clock())
+        while self._best:
+            _, _, entry = heapq.heappop(self._best)
+            if not entry.alive:
+                continue
+            self._remove(entry)
+            self.stats["served"] += 1
+            self._remember_user(entry.user)
+            return entry.event
+        return None
+
+    def peek(self) -> Optional[dict]:
+        """
+        查看当前得分最高且未过期的事件（不取出）
+
+        Returns:
+            事件信息，没有待处理事件时返回 None
+        """
+        self._expire(self.clock())
+        while self._best:
+            entry = self._best[0][2]
+            if entry.alive:
+                return entry.event
+            heapq.heappop(self._best)
+        return None
+
+    def clear(self):
+        """清空所有待处理事件"""
+        self._best.clear()
+        self._worst.clear()
+        self._deadlines.clear()
+        self._pending_chat.clear()
+        self._live = 0
+
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        return {
+            **self.stats,
+            "pending": self._live,
+            "heap_entries": len(self._best) + len(self._worst) + len(self._deadlines),
+        }
+
+    def _score(self, event: dict, event_type: str, user: str) -> float:
+        """计算与时间无关的基础得分"""
+        score = float(self.weights.get(event_type, self.weights["danmaku"]))
+        value = event.get("value", 0) or 0
+        if value > 0:
+            score += self.value_weight * math.log10(1 + value)
+        if user and user in self._recent_users:
+            score -= self.repeat_user_penalty
+        return score
+
+    def _expire(self, now: float):
+        """丢弃所有已超过截止时间的事件"""
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, entry = heapq.heappop(self._deadlines)
+            if entry.alive:
+                self._remove(entry)
+                self.stats["expired"] += 1
+
+    def _peek_worst(self) -> Optional[_Entry]:
+        """返回得分最低的有效事件（顺带清理堆顶的失效条目）"""
+        while self._worst:
+            entry = self._worst[0][2]
+            if entry.alive:
+                return entry
+            heapq.heappop(self._worst)
+        return None
+
+    def _remove(self, entry: _Entry):
+        """惰性删除：仅标记失效，堆中的条目在弹出或重建时清理"""
+        entry.alive = False
+        self._live -= 1
+        if self._pending_chat.get(entry.user) is entry:
+            del self._pending_chat[entry.user]
+
+    def _remember_user(self, user: str):
+        """记录最近被回复的用户，用于降低重复用户的得分"""
+        if not user or self.recent_user_window <= 0:
+            return
+        self._recent_users[user] = True
+        self._recent_users.move_to_end(user)
+        while len(self._recent_users) > self.recent_user_window:
+            self._recent_users.popitem(last=False)
+
+    def _maybe_compact(self):
+        """失效条目超过有效条目时重建三个堆，保证内存有界"""
+        if len(self._best) + len(self._worst) + len(self._deadlines) <= 6 * self._live + 64:
+            return
+        entries = [item[2] for item in self._best if item[2].alive]
+        self._best = [(-e.key, e.seq, e) for e in entries]
+        self._worst = [(e.key, e.seq, e) for e in entries]
+        self._deadlines = [(e.deadline, e.seq, e) for e in entries]
+        heapq.heapify(self._best)
+        heapq.heapify(self._worst)
+        heapq.heapify(self._deadlines)
@@ -1,22 +1,22 @@
 """
 弹幕服务主模块
-整合弹幕采集、消息处理和设备管理
+整合弹幕采集、消息处理和设备管理，支持一个进程同时服务多个直播间
 """
 
 import asyncio
 import websockets
 from typing import Dict, Any
-from urllib.parse import parse_qs, urlparse
 from aiohttp import web
 
 from configs.logger import setup_logging
 from configs.settings import load_config
-from core.utils.modules_initialize import initialize_modules
-from core.live.douyin_collector import DouyinDanmakuCollector, MockDouyinDanmakuCollector
-from core.live.douyin_proxy_collector import DouyinProxyCollector
-from core.danmaku.handler import DanmakuHandler, DanmakuConnection
-from core.danmaku.device_manager import DeviceManager
+from core.utils.modules_initialize import initialize_modules, initialize_tts, initialize_tts_shared
+from core.danmaku.room import LiveRoom
 from core.danmaku.ota_handler import DanmakuOTAHandler
+from core.danmaku.device_manager import serve_device_connection
+from core.danmaku.fanout import FanoutPublisher, is_supported as fanout_supported
+from core.danmaku.warmup import UpstreamWarmer
+from core.utils.metrics import REGISTRY
 
 
 TAG = __name__
@@ -51,7 +51,9 @@ class DanmakuService:
         self.http_port = self.danmaku_config.get("http_port", 8003)
 
         # 初始化组件
-        self.device_manager = None
+        self.rooms: Dict[str, LiveRoom] = {}  # room_id -> LiveRoom
+        self.default_room = None  # 设备未指定直播间时加入的直播间
+        self.device_manager = None  # 以下三项指向默认直播间，兼容单直播间用法
         self.danmaku_handler = None
         self.danmaku_collector = None
         self.llm = None
@@ -61,13 +63,16 @@ class DanmakuService:
         # 服务器
         self.ws_server = None
         self.http_server = None
+        self.fanout = None  # 多进程设备广播（开启时设备连接由工作进程处理）
+        self.warmer = None  # 空闲时预热LLM和TTS连接
 
     async def initialize(self):
         """初始化服务组件"""
         try:
             self.logger.info("初始化弹幕服务组件...")
 
-            # 初始化LLM、TTS等模块
+            # 初始化LLM、TTS等模块（各直播间的TTS共用线程池和合成结果缓存）
+            initialize_tts_shared(self.config)
             modules = initialize_modules(
                 self.logger,
                 self.config,
@@ -87,50 +92,26 @@ class DanmakuService:
             if not self.tts:
                 raise RuntimeError("TTS初始化失败")
 
-            # 初始化设备管理器
-            self.device_manager = DeviceManager(logger=self.logger)
+            room_configs = self._build_room_configs()
+            self.fanout = self._create_fanout([room_id for room_id, _ in room_configs])
 
-            # 初始化弹幕处理器
-            self.danmaku_handler = DanmakuHandler(
-                config=self.config,
-                llm=self.llm,
-                tts=self.tts,
-                device_manager=self.device_manager,
-                logger=self.logger
-            )
+            # 初始化直播间：共享LLM，每个直播间独立的TTS通道、处理器、设备分组和采集器
+            for index, (room_id, room_config) in enumerate(room_configs):
+                room_tts = self.tts if index == 0 else initialize_tts(room_config)
+                device_manager = self.fanout.device_managers[room_id] if self.fanout is not None else None
+                room = LiveRoom(room_id, room_config, self.llm, room_tts, self.logger, device_manager=device_manager)
+                self.rooms[room_id] = room
+                self.logger.debug(f"✅ 直播间 {room_id} 音频格式: {room.connection.audio_format}")
 
-            # 打开TTS音频通道（使用模拟连接）
-            mock_connection = DanmakuConnection(self.device_manager, self.logger, self.config)
-            mock_connection.set_tts(self.tts)  # 设置 TTS 实例
-
-            # 调试：确认音频格式设置
-            self.logger.debug(f"✅ DanmakuConnection 音频格式: {mock_connection.audio_format}")
-
-            await self.tts.open_audio_channels(mock_connection)
-
-            # 初始化弹幕采集器
-            if self.use_mock:
-                self.logger.debug("使用模拟弹幕采集器")
-                self.danmaku_collector = MockDouyinDanmakuCollector(
-                    room_id=self.room_id,
-                    on_message_callback=self._on_danmaku_message,
-                    logger=self.logger
-                )
-            elif self.use_proxy:
-                self.logger.info("使用 DouyinBarrageGrab 代理采集器")
-                self.logger.debug(f"代理地址: {self.proxy_ws_url}")
-                self.danmaku_collector = DouyinProxyCollector(
-                    on_message_callback=self._on_danmaku_message,
-                    ws_url=self.proxy_ws_url,
-                    logger=self.logger
-                )
-            else:
-                self.logger.info("使用真实抖音弹幕采集器（需要自行实现协议）")
-                self.danmaku_collector = DouyinDanmakuCollector(
-                    room_id=self.room_id,
-                    on_message_callback=self._on_danmaku_message,
-                    logger=self.logger
-                )
+            self.default_room = next(iter(self.rooms.values()))
+            self.device_manager = self.default_room.device_manager
+            self.danmaku_handler = self.default_room.handler
+            self.danmaku_collector = self.default_room.collector
+
+            warmup_config = self.danmaku_config.get("warmup", {})
+            if warmup_config.get("enabled", True):
+                self.warmer = UpstreamWarmer(warmup_config, self.llm, self.rooms, self.logger)
+                self.warmer.register_metrics(REGISTRY)
 
             # 初始化OTA处理器（用于ESP32硬件连接验证）
             self.ota_handler = DanmakuOTAHandler(config=self.config)
@@ -143,15 +124,53 @@ class DanmakuService:
             self.logger.error(f"详细错误信息:\n{traceback.format_exc()}")
             raise
 
-    async def _on_danmaku_message(self, danmaku: dict):
+    def _build_room_configs(self):
         """
-        弹幕消息回调
+        生成各直播间的配置
 
-        Args:
-            danmaku: 弹幕信息
+        未配置 danmaku.rooms 时只有一个直播间（使用 danmaku.room_id）；
+        配置了 rooms 时，每项的字段覆盖 danmaku 下的同名配置，prompt 覆盖全局提示词。
+
+        Returns:
+            [(room_id, room_config), ...]
         """
-        # 将弹幕添加到处理队列
-        await self.danmaku_handler.add_danmaku(danmaku)
+        rooms = self.danmaku_config.get("rooms") or []
+        if not rooms:
+            return [(str(self.room_id or "default"), self.config)]
+
+        room_configs = []
+        for room in rooms:
+            room = dict(room)
+            room_id = str(room.pop("room_id"))
+            prompt = room.pop("prompt", None)
+
+            danmaku_config = {k: v for k, v in self.danmaku_config.items() if k != "rooms"}
+            danmaku_config.update(room)
+            danmaku_config["room_id"] = room_id
+
+            room_config = {**self.config, "danmaku": danmaku_config}
+            if prompt:
+                room_config["prompt"] = prompt
+            room_configs.append((room_id, room_config))
+        return room_configs
+
+    def _create_fanout(self, room_ids):
+        """开启多进程设备广播时创建发布器，平台不支持时退回单进程"""
+        workers = int(self.danmaku_config.get("fanout", {}).get("workers", 0))
+        if workers <= 0:
+            return None
+        if not fanout_supported():
+            self.logger.warning("当前平台不支持多进程设备广播（需要 SO_REUSEPORT），在主进程中处理设备连接")
+            return None
+        publisher = FanoutPublisher(self.danmaku_config, room_ids, room_ids[0], self.logger)
+        dropped = REGISTRY.counter(
+            "xiaozhi_danmaku_fanout_dropped_total", "工作进程处理不过来时丢弃的帧数", ["worker"]
+        )
+        for index in range(publisher.worker_count):
+            dropped.labels(index).set_function(
+                lambda index=index: publisher.links[index].dropped if index < len(publisher.links) else 0
+            )
+        return publisher
 
     async def start(self):
         """启动弹幕服务"""
@@ -161,25 +180,43 @@ class DanmakuService:
             # 初始化组件
             await self.initialize()
 
-            # 启动WebSocket服务器（用于设备连接）
-            asyncio.create_task(self._start_websocket_server())
+            # 启动WebSocket服务器（用于设备连接），多进程广播模式下由工作进程监听设备端口
+            if self.fanout is not None:
+                await self.fanout.start()
+            else:
+                asyncio.create_task(self._start_websocket_server())
 
             # 启动HTTP服务器（用于OTA接口）
             asyncio.create_task(self._start_http_server())
 
-            # 启动弹幕处理器
-            asyncio.create_task(self.danmaku_handler.start())
-
-            # 启动弹幕采集器
-            asyncio.create_task(self.danmaku_collector.start())
+            # 启动各直播间的弹幕处理器和采集器
+            for room in self.rooms.values():
+                await room.start()
 
             # 定期清理断开的设备
             asyncio.create_task(self._periodic_cleanup())
 
+            # 定期检查设备健康状态，多进程广播模式下由工作进程检查
+            health_config = self.danmaku_config.get("device_queue", {}).get("health", {})
+            if self.fanout is None and health_config.get("enabled", True):
+                asyncio.create_task(self._periodic_health_check(float(health_config.get("ping_interval", 5))))
+
+            # 空闲时预热上游连接
+            if self.warmer is not None:
+                asyncio.create_task(self.warmer.run())
+
+            # 定期输出延迟统计
+            log_interval = self.danmaku_config.get("latency", {}).get("log_interval", 60)
+            if log_interval and log_interval > 0:
+                asyncio.create_task(self._periodic_latency_log(log_interval))
+
             self.logger.info("弹幕服务启动成功")
             self.logger.info(f"WebSocket地址: ws://{self.ws_host}:{self.ws_port}/danmaku/")
             self.logger.info(f"HTTP OTA接口: http://{self.http_host}:{self.http_port}/xiaozhi/ota/")
-            self.logger.debug(f"直播间ID: {self.room_id}")
+            self.logger.info(f"延迟统计接口: http://{self.http_host}:{self.http_port}/danmaku/latency")
+            self.logger.info(f"设备状态接口: http://{self.http_host}:{self.http_port}/danmaku/devices")
+            self.logger.info(f"运行指标接口（Prometheus）: http://{self.http_host}:{self.http_port}/metrics")
+            self.logger.info(f"直播间: {', '.join(self.rooms)}（设备连接时通过 room-id 参数选择，默认 {self.default_room.room_id}）")
             self.logger.debug(f"模拟模式: {self.use_mock}")
             self.logger.debug(f"代理模式: {self.use_proxy}")
             if self.use_proxy:
@@ -225,66 +262,8 @@ class DanmakuService:
         Args:
             websocket: WebSocket连接
         """
-        device_id = None
-
-        try:
-            # 从请求头或URL参数获取device_id
-            headers = dict(websocket.request.headers)
-            device_id = headers.get("device-id")
-
-            if not device_id:
-                # 尝试从URL路径获取
-                # websocket.request.path 包含完整路径，如 "/danmaku/?device-id=xxx"
-                path = websocket.request.path
-                parsed_url = urlparse(path)
-                query_params = parse_qs(parsed_url.query)
-                if "device-id" in query_params:
-                    device_id = query_params["device-id"][0]
-
-            if not device_id:
-                self.logger.warning("设备连接缺少device-id")
-                await websocket.send("缺少device-id参数")
-                await websocket.close()
-                return
-
-            # 获取客户端IP
-            client_ip = websocket.remote_address[0]
-
-            # 添加到设备管理器
-            await self.device_manager.add_device(device_id, websocket, client_ip)
-
-            # 发送标准的 hello 响应消息（与硬件协议兼容）
-            import json
-            hello_response = {
-                "type": "hello",
-                "version": 1,
-                "transport": "websocket",
-                "session_id": device_id,  # 使用 device_id 作为 session_id
-                "audio_params": {
-                    "format": "opus",
-                    "sample_rate": 16000,
-                    "channels": 1,
-                    "frame_duration": 60
-                }
-            }
-            await websocket.send(json.dumps(hello_response, ensure_ascii=False))
-            self.logger.info(f"✅ 已发送 hello 响应给设备: {device_id}")
-
-            # 保持连接
-            async for message in websocket:
-                # 这里可以处理设备发来的消息（如果需要）
-                self.logger.debug(f"收到设备消息: {device_id}: {message}")
-
-        except websockets.exceptions.ConnectionClosed:
-            self.logger.debug(f"设备断开连接: {device_id}")
-
-        except Exception as e:
-            self.logger.error(f"处理设备连接时出错: {e}")
-
-        finally:
-            # 移除设备
-            if device_id:
-                await self.device_manager.remove_device(device_id)
+        device_managers = {room_id: room.device_manager for room_id, room in self.rooms.items()}
+        await serve_device_connection(websocket, device_managers, self.default_room.room_id, self.logger)
 
     async def _start_http_server(self):
         """启动HTTP服务器（用于OTA接口）"""
@@ -299,6 +278,9 @@ class DanmakuService:
                 web.get("/xiaozhi/ota/", self.ota_handler.handle_get),
                 web.post("/xiaozhi/ota/", self.ota_handler.handle_post),
                 web.options("/xiaozhi/ota/", self.ota_handler.handle_options),
+                web.get("/danmaku/latency", self._handle_latency),
+                web.get("/danmaku/devices", self._handle_devices),
+                web.get("/metrics", REGISTRY.handle_metrics),
             ])
 
             # 启动HTTP服务器
@@ -321,22 +303,70 @@ class DanmakuService:
         while True:
             try:
                 await asyncio.sleep(60)  # 每分钟清理一次
-                await self.device_manager.cleanup_disconnected_devices()
+                for room in self.rooms.values():
+                    await room.device_manager.cleanup_disconnected_devices()
             except Exception as e:
                 self.logger.error(f"清理设备时出错: {e}")
 
+    async def _periodic_health_check(self, interval: float):
+        """定期 ping 设备，降级或移除链路异常的设备"""
+        while True:
+            try:
+                await asyncio.sleep(interval)
+                await asyncio.gather(*(room.device_manager.check_health() for room in self.rooms.values()))
+            except Exception as e:
+                self.logger.error(f"检查设备健康状态时出错: {e}")
+
+    async def _periodic_latency_log(self, interval: float):
+        """定期输出各直播间的延迟分位数"""
+        while True:
+            await asyncio.sleep(interval)
+            for room in self.rooms.values():
+                latency = room.handler.latency
+                if latency is not None and latency.count:
+                    self.logger.info(f"⏱️  [{room.room_id}] 延迟统计（最近{latency.window}条）: {latency.format_summary()}")
+
+    async def _handle_latency(self, request):
+        """
+        延迟统计接口：各直播间每个处理阶段的延迟分位数（毫秒）
+
+        GET /danmaku/latency
+        """
+        rooms = {}
+        for room_id, room in self.rooms.items():
+            latency = room.handler.latency
+            rooms[room_id] = {
+                "replies": latency.count if latency is not None else 0,
+                "stages": latency.summary() if latency is not None else {},
+            }
+        return web.json_response({"rooms": rooms})
+
+    async def _handle_devices(self, request):
+        """
+        设备状态接口：各直播间的设备健康统计和设备列表（多进程广播模式下只有统计）
+
+        GET /danmaku/devices
+        """
+        rooms = {
+            room_id: {
+                "health": room.device_manager.get_health_stats(),
+                "devices": room.device_manager.get_device_list(),
+            }
+            for room_id, room in self.rooms.items()
+        }
+        return web.json_response({"rooms": rooms})
+
     async def stop(self):
         """停止弹幕服务"""
         try:
             self.logger.info("停止弹幕服务...")
 
-            # 停止弹幕采集器
-            if self.danmaku_collector:
-                await self.danmaku_collector.stop()
+            # 停止各直播间的弹幕采集器和处理器
+            for room in self.rooms.values():
+                await room.stop()
 
-            # 停止弹幕处理器
-            if self.danmaku_handler:
-                await self.danmaku_handler.stop()
+            if self.fanout is not None:
+                await self.fanout.stop()
 
             self.logger.info("弹幕服务已停止")
 
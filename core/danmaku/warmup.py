@@ -0,0 +1,121 @@
+"""
+上游连接空闲预热
+直播间安静一段时间后，LLM 的 HTTP 连接会被服务端或连接池关闭，下一条弹幕的回复要重新建立 TCP+TLS 连接，
+首条回复明显变慢。UpstreamWarmer 在直播间空闲期间定期调用各提供方的 warmup()：
+
+    LLM  默认请求模型列表保持连接池中的连接（不消耗token），可选发送只生成1个token的补全请求
+    TTS  每个直播间的TTS实例：OpenAI TTS 保持共享线程池各线程 HTTP 会话到服务的连接（流式合成复用）；
+         Edge TTS 每次合成都新建连接，只在 tts_request 开启时发送短合成请求；其他提供方没有可保持的连接，不预热
+
+直播间有弹幕或正在播放时不预热；每个上游每小时的预热次数受 max_per_hour 预算限制
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Dict
+
+
+class _WarmupTarget:
+    """一个需要预热的上游"""
+
+    def __init__(self, name: str, provider, request: bool, rooms: list):
+        self.name = name
+        self.provider = provider
+        self.request = request  # 是否发送真实的小请求
+        self.rooms = rooms  # 使用该上游的直播间，全部空闲时才预热
+        self.last_warmup = 0.0
+        self.history = deque()  # 最近一小时的预热时间
+        self.stats = {"ok": 0, "failed": 0, "skipped": 0}  # skipped 为超出预算跳过
+
+
+class UpstreamWarmer:
+    """空闲时定期预热LLM和各直播间TTS的连接"""
+
+    def __init__(self, config: Dict, llm, rooms: Dict, logger):
+        """
+        Args:
+            config: 预热配置（danmaku.warmup）
+            llm: 共享的大语言模型实例
+            rooms: 直播间ID -> LiveRoom
+            logger: 日志记录器
+        """
+        self.logger = logger
+        self.rooms = rooms
+        self.idle_after = float(config.get("idle_after", 20))  # 直播间空闲超过该秒数后开始预热
+        self.interval = float(config.get("interval", 30))  # 同一上游两次预热的最小间隔
+        self.max_per_hour = int(config.get("max_per_hour", 120))  # 每个上游每小时最多预热次数
+        self.tick = min(1.0, self.interval)
+
+        self.targets = [_WarmupTarget("llm", llm, config.get("llm_request", False), list(rooms))]
+        for room_id, room in rooms.items():
+            self.targets.append(_WarmupTarget(f"tts:{room_id}", room.tts, config.get("tts_request", False), [room_id]))
+
+        self.activity = {room_id: None for room_id in rooms}  # 直播间最近一次的处理计数
+        self.last_active = {room_id: time.monotonic() for room_id in rooms}
+
+    async def run(self):
+        """启动时先预热一次，之后每秒检查各直播间是否空闲"""
+        await asyncio.gather(*(self._warm(target) for target in self.targets))
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.check()
+            except Exception as e:
+                self.logger.error(f"预热上游连接时出错: {e}")
+
+    async def check(self):
+        """更新直播间活动状态，预热所有使用者都空闲且到了间隔的上游"""
+        now = time.monotonic()
+        for room_id, room in self.rooms.items():
+            stats = room.handler.get_stats()
+            activity = (stats["received"], stats["served"])
+            if room.handler.is_speaking or activity != self.activity[room_id]:
+                self.last_active[room_id] = now
+            self.activity[room_id] = activity
+
+        due = [
+            target for target in self.targets
+            if now - target.last_warmup >= self.interval
+            and all(now - self.last_active[room_id] >= self.idle_after for room_id in target.rooms)
+        ]
+        if due:
+            await asyncio.gather(*(self._warm(target) for target in due))
+
+    async def _warm(self, target: _WarmupTarget):
+        """在预算内预热一个上游"""
+        now = time.monotonic()
+        target.last_warmup = now
+        while target.history and now - target.history[0] > 3600:
+            target.history.popleft()
+        if len(target.history) >= self.max_per_hour:
+            target.stats["skipped"] += 1
+            return
+        target.history.append(now)
+
+        started = time.monotonic()
+        try:
+            warmed = await target.provider.warmup(request=target.request)
+        except Exception as e:
+            target.stats["failed"] += 1
+            self.logger.debug(f"预热 {target.name} 失败: {e}")
+            return
+        if warmed:
+            target.stats["ok"] += 1
+            self.logger.debug(f"已预热 {target.name}，耗时 {(time.monotonic() - started) * 1000:.0f}ms")
+        else:
+            # 提供方没有可预热的连接，退还预算
+            target.history.pop()
+
+    def get_stats(self) -> dict:
+        """获取各上游的预热统计"""
+        return {target.name: dict(target.stats) for target in self.targets}
+
+    def register_metrics(self, registry):
+        """注册预热次数指标"""
+        warmups = registry.counter(
+            "xiaozhi_danmaku_upstream_warmups_total", "空闲时预热上游连接的次数（skipped 为超出预算）", ["target", "result"]
+        )
+        for target in self.targets:
+            for result in target.stats:
+                warmups.labels(target.name, result).set_function(lambda target=target, result=result: target.stats[result])
@@ -10,6 +10,11 @@ TAG = __name__
 
 
 async def sendAudioMessage(conn, sentenceType, audios, text):
+    # 弹幕回复的延迟追踪：记录第一个音频帧进入发送流程的时间
+    latency_trace = getattr(conn, "latency_trace", None)
+    if latency_trace is not None and audios:
+        latency_trace.mark("first_opus")
+
     if conn.tts.tts_audio_first_sentence:
         conn.logger.bind(tag=TAG).info(f"发送第一段语音: {text}")
         conn.tts.tts_audio_first_sentence = False
@@ -240,6 +245,9 @@ async def _do_send_audio(conn, opus_packet, flow_control):
         start_time = time.time()
         timestamp = int(start_time * 1000) % (2**32)
         await _send_to_mqtt_gateway(conn, opus_packet, timestamp, sequence)
+    elif hasattr(conn, "send_audio_frame"):
+        # 连接提供了音频帧发送接口（如弹幕广播连接），无需再区分数据类型
+        await conn.send_audio_frame(opus_packet)
     else:
         # 直接发送opus数据包
         await conn.websocket.send(opus_packet)
@@ -273,7 +281,10 @@ async def send_tts_message(conn, state, text=None):
         conn.clearSpeakStatus()
 
     # 发送消息到客户端
-    await conn.websocket.send(json.dumps(message))
+    if hasattr(conn, "send_control_message"):
+        await conn.send_control_message(message)
+    else:
+        await conn.websocket.send(json.dumps(message))
 
 
 async def send_stt_message(conn, text):
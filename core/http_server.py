@@ -3,6 +3,7 @@ from aiohttp import web
 from configs.logger import setup_logging
 from core.api.ota_handler import OTAHandler
 from core.api.vision_handler import VisionHandler
+from core.utils.metrics import REGISTRY
 
 TAG = __name__
 
@@ -56,6 +57,8 @@ class SimpleHttpServer:
                     web.get("/mcp/vision/explain", self.vision_handler.handle_get),
                     web.post("/mcp/vision/explain", self.vision_handler.handle_post),
                     web.options("/mcp/vision/explain", self.vision_handler.handle_post),
+                    # Prometheus 运行指标
+                    web.get("/metrics", REGISTRY.handle_metrics),
                 ]
             )
 
@@ -181,11 +181,12 @@ class MockDouyinDanmakuCollector:
     这里提供一个模拟版本用于测试和演示
     """
 
-    def __init__(self, room_id: str, on_message_callback: Callable, logger=None):
+    def __init__(self, room_id: str, on_message_callback: Callable, logger=None, interval: float = 10):
         self.room_id = room_id
         self.on_message_callback = on_message_callback
         self.logger = logger or logging.getLogger(__name__)
         self.running = False
+        self.interval = interval  # 模拟弹幕间隔（秒）
 
         # 模拟弹幕数据
         self.mock_messages = [
@@ -203,8 +204,8 @@ class MockDouyinDanmakuCollector:
         self.logger.debug(f"启动模拟弹幕采集器 - 直播间ID: {self.room_id}")
 
         while self.running:
-            # 每10秒发送一条模拟弹幕
-            await asyncio.sleep(10)
+            # 每隔 interval 秒发送一条模拟弹幕
+            await asyncio.sleep(self.interval)
 
             if not self.running:
                 break
@@ -22,9 +22,10 @@
 
 import asyncio
 import json
+import re
 import time
 import logging
-from typing import Callable, Optional, Dict, Any
+from typing import Callable, Optional, Dict, Any, Iterable
 import websockets
 from enum import IntEnum
 
@@ -43,6 +44,31 @@ class MessageType(IntEnum):
     下播 = 9
 
 
+# 消息类型 -> 回调事件类型（未订阅的类型不解析 Data）
+EVENT_TYPES = {
+    MessageType.弹幕消息: "danmaku",
+    MessageType.点赞消息: "like",
+    MessageType.进入直播间: "enter",
+    MessageType.关注消息: "follow",
+    MessageType.礼物消息: "gift",
+    MessageType.粉丝团消息: "fansclub",
+    MessageType.直播间分享: "share",
+}
+
+# 消息类型 -> 统计字段（跳过解析的消息也要计数）
+STAT_KEYS = {
+    MessageType.弹幕消息: "danmaku_count",
+    MessageType.点赞消息: "like_count",
+    MessageType.进入直播间: "enter_count",
+    MessageType.关注消息: "follow_count",
+    MessageType.礼物消息: "gift_count",
+}
+
+# DouyinBarrageGrab 的消息以 {"Type":n, ... 开头，只看开头即可取得类型
+_TYPE_PATTERN = re.compile(r'"Type"\s*:\s*(\d+)')
+_TYPE_PEEK_LENGTH = 64
+
+
 class Gender(IntEnum):
     """性别枚举"""
     未知 = 0
@@ -72,7 +98,9 @@ class DouyinProxyCollector:
         self,
         on_message_callback: Callable,
         ws_url: str = "ws://127.0.0.1:8888",
-        logger=None
+        logger=None,
+        forward_types: Optional[Iterable[str]] = None,
+        recorder=None
     ):
         """
         初始化代理采集器
@@ -81,15 +109,36 @@ class DouyinProxyCollector:
             on_message_callback: 收到弹幕消息时的回调函数
             ws_url: DouyinBarrageGrab 的 WebSocket 地址
             logger: 日志记录器
+            forward_types: 需要回调的事件类型（danmaku/like/enter/follow/gift/fansclub/share），默认只回调弹幕
+            recorder: 原始消息录制器（FrameRecorder），用于离线回放
         """
         self.on_message_callback = on_message_callback
         self.ws_url = ws_url
+        self.forward_types = set(forward_types or ("danmaku",))
+        self.recorder = recorder
+        self.received_at = None  # 当前消息的接收时间（用于延迟追踪）
         self.logger = logger or logging.getLogger(__name__)
         self.websocket = None
         self.running = False
         self.reconnect_delay = 5  # 重连延迟(秒)
         self.max_reconnect_attempts = 100  # 最大重连次数
 
+        # 消息类型 -> 处理函数，只包含需要解析 Data 的类型
+        handlers = {
+            MessageType.弹幕消息: self._handle_danmaku,
+            MessageType.点赞消息: self._handle_like,
+            MessageType.进入直播间: self._handle_enter,
+            MessageType.关注消息: self._handle_follow,
+            MessageType.礼物消息: self._handle_gift,
+            MessageType.粉丝团消息: self._handle_fansclub,
+            MessageType.直播间分享: self._handle_share,
+        }
+        self.routes = {
+            msg_type: handler for msg_type, handler in handlers.items()
+            if EVENT_TYPES[msg_type] in self.forward_types
+        }
+        self.routes[MessageType.直播间统计] = self._handle_statistics  # 频率低，始终解析
+
         # 统计信息
         self.stats = {
             'total_messages': 0,
@@ -185,17 +234,15 @@ class DouyinProxyCollector:
                     break
 
                 message_count += 1
+                self.received_at = time.monotonic()
+                if self.recorder is not None:
+                    self.recorder.write(message)
 
-                # 尝试解析消息类型
-                try:
-                    data = json.loads(message)
-                    msg_type = data.get("Type", "unknown")
-                    if msg_type == MessageType.弹幕消息:
-                        danmaku_count += 1
-                        last_danmaku_time = time.time()
-                        warned_no_danmaku = False  # 重置警告标志
-                except:
-                    pass
+                msg_type = await self._process_message(message)
+                if msg_type == MessageType.弹幕消息:
+                    danmaku_count += 1
+                    last_danmaku_time = time.time()
+                    warned_no_danmaku = False  # 重置警告标志
 
                 # 每收到10条消息记录一次（确认正在接收）
                 if message_count % 10 == 0:
@@ -209,8 +256,6 @@ class DouyinProxyCollector:
                     )
                     warned_no_danmaku = True
 
-                await self._process_message(message)
-
             self.logger.info(f"📡 消息循环结束，总计接收 {message_count} 条消息（其中弹幕 {danmaku_count} 条）")
 
         except websockets.exceptions.ConnectionClosed as e:
@@ -223,14 +268,40 @@ class DouyinProxyCollector:
             self.logger.error(f"监听消息时出错: {e}")
             raise
 
-    async def _process_message(self, message: str):
+    @staticmethod
+    def _peek_type(message) -> Optional[int]:
+        """不解析JSON，从消息开头读取消息类型（读取不到返回 None）"""
+        if not isinstance(message, str):
+            return None
+        match = _TYPE_PATTERN.search(message, 0, _TYPE_PEEK_LENGTH)
+        return int(match.group(1)) if match else None
+
+    def _skip_message(self, msg_type: int):
+        """跳过无人订阅的消息，只更新统计"""
+        self.stats['total_messages'] += 1
+        stat_key = STAT_KEYS.get(msg_type)
+        if stat_key:
+            self.stats[stat_key] += 1
+
+    async def _process_message(self, message: str) -> Optional[int]:
         """
         处理收到的消息
 
+        每条消息最多解析一次：先按消息类型路由，无人订阅的类型（如未开启互动反应时的点赞、进场）
+        不解析JSON，直接计数后丢弃。
+
         Args:
             message: WebSocket 消息（JSON字符串）
+
+        Returns:
+            消息类型（无法识别时返回 None）
         """
         try:
+            msg_type = self._peek_type(message)
+            if msg_type is not None and msg_type not in self.routes and msg_type != MessageType.下播:
+                self._skip_message(msg_type)
+                return msg_type
+
             # 解析 JSON 消息
             data = json.loads(message)
 
@@ -240,50 +311,47 @@ class DouyinProxyCollector:
                 return
 
             msg_type = data["Type"]
-            self.stats['total_messages'] += 1
 
             # 处理下播消息（特殊处理，没有Data字段）
             if msg_type == MessageType.下播:
+                self.stats['total_messages'] += 1
                 await self._handle_live_exit()
-                return
+                return msg_type
+
+            handler = self.routes.get(msg_type)
+            if handler is None:
+                if msg_type not in EVENT_TYPES:
+                    self.logger.debug(f"未处理的消息类型: {msg_type}")
+                self._skip_message(msg_type)
+                return msg_type
+
+            self.stats['total_messages'] += 1
 
             # 检查是否有 Data 字段
             if "Data" not in data:
                 self.logger.warning(f"⚠️  消息类型 {msg_type} 缺少Data字段")
-                return
+                return msg_type
 
             # 解析 Data 字段（也是JSON字符串）
             try:
                 data_dict = json.loads(data["Data"])
             except json.JSONDecodeError:
                 self.logger.error(f"无法解析Data字段: {data['Data'][:100]}...")
-                return
+                return msg_type
 
-            # 根据消息类型处理
-            if msg_type == MessageType.弹幕消息:
-                await self._handle_danmaku(data_dict)
-            elif msg_type == MessageType.点赞消息:
-                await self._handle_like(data_dict)
-            elif msg_type == MessageType.进入直播间:
-                await self._handle_enter(data_dict)
-            elif msg_type == MessageType.关注消息:
-                await self._handle_follow(data_dict)
-            elif msg_type == MessageType.礼物消息:
-                await self._handle_gift(data_dict)
-            elif msg_type == MessageType.直播间统计:
-                await self._handle_statistics(data_dict)
-            elif msg_type == MessageType.粉丝团消息:
-                await self._handle_fansclub(data_dict)
-            elif msg_type == MessageType.直播间分享:
-                await self._handle_share(data_dict)
-            else:
-                self.logger.debug(f"未处理的消息类型: {msg_type}")
+            await handler(data_dict)
+            return msg_type
 
         except json.JSONDecodeError:
             self.logger.error(f"无效的JSON格式: {message[:100]}...")
         except Exception as e:
             self.logger.error(f"处理消息时出错: {e}", exc_info=True)
 
+    async def _emit(self, event: dict):
+        """回调事件，附带消息接收时间"""
+        event['received_at'] = self.received_at or time.monotonic()
+        await self.on_message_callback(event)
+
     async def _handle_danmaku(self, data: dict):
         """
         处理弹幕消息
@@ -310,6 +378,9 @@ class DouyinProxyCollector:
             # 记录日志（改为DEBUG级别，因为弹幕消息非常频繁）
             self.logger.debug(f"💬 [{room_name}] [{gender_str}] {username}: {content}")
 
+            if 'danmaku' not in self.forward_types:
+                return
+
             # 转换为标准格式并回调
             danmaku_info = {
                 'type': 'danmaku',
@@ -323,7 +394,7 @@ class DouyinProxyCollector:
                 'raw_data': data
             }
 
-            await self.on_message_callback(danmaku_info)
+            await self._emit(danmaku_info)
 
         except Exception as e:
             self.logger.error(f"处理弹幕消息失败: {e}")
@@ -340,6 +411,18 @@ class DouyinProxyCollector:
 
             self.logger.debug(f"👍 {username} 点赞 {count} 次，总点赞 {total}")
 
+            if 'like' in self.forward_types:
+                await self._emit({
+                    'type': 'like',
+                    'username': username,
+                    'content': f"点赞{count}次",
+                    'timestamp': 0,
+                    'count': count,
+                    'total': total,
+                    'user_info': user,
+                    'raw_data': data
+                })
+
         except Exception as e:
             self.logger.error(f"处理点赞消息失败: {e}")
 
@@ -354,6 +437,17 @@ class DouyinProxyCollector:
 
             self.logger.debug(f"👋 {username} 进入直播间，当前人数: {current_count}")
 
+            if 'enter' in self.forward_types:
+                await self._emit({
+                    'type': 'enter',
+                    'username': username,
+                    'content': '进入直播间',
+                    'timestamp': 0,
+                    'current_count': current_count,
+                    'user_info': user,
+                    'raw_data': data
+                })
+
         except Exception as e:
             self.logger.error(f"处理进入直播间消息失败: {e}")
 
@@ -367,6 +461,16 @@ class DouyinProxyCollector:
 
             self.logger.debug(f"❤️  {username} 关注了主播")
 
+            if 'follow' in self.forward_types:
+                await self._emit({
+                    'type': 'follow',
+                    'username': username,
+                    'content': '关注了主播',
+                    'timestamp': 0,
+                    'user_info': user,
+                    'raw_data': data
+                })
+
         except Exception as e:
             self.logger.error(f"处理关注消息失败: {e}")
 
@@ -385,6 +489,19 @@ class DouyinProxyCollector:
                 f"🎁 {username} 送出 {gift_count}个{gift_name}，价值 {gift_value} 抖币"
             )
 
+            if 'gift' in self.forward_types:
+                await self._emit({
+                    'type': 'gift',
+                    'username': username,
+                    'content': f"送出{gift_count}个{gift_name}",
+                    'timestamp': 0,
+                    'gift_name': gift_name,
+                    'gift_count': gift_count,
+                    'value': gift_value * gift_count,  # 礼物总价值（抖币）
+                    'user_info': user,
+                    'raw_data': data
+                })
+
         except Exception as e:
             self.logger.error(f"处理礼物消息失败: {e}")
 
@@ -408,6 +525,16 @@ class DouyinProxyCollector:
 
             self.logger.debug(f"⭐ {username} 加入了 {club_name} 粉丝团")
 
+            if 'fansclub' in self.forward_types:
+                await self._emit({
+                    'type': 'fansclub',
+                    'username': username,
+                    'content': f"加入了{club_name}粉丝团",
+                    'timestamp': 0,
+                    'user_info': user,
+                    'raw_data': data
+                })
+
         except Exception as e:
             self.logger.error(f"处理粉丝团消息失败: {e}")
 
@@ -419,6 +546,16 @@ class DouyinProxyCollector:
 
             self.logger.debug(f"📤 {username} 分享了直播间")
 
+            if 'share' in self.forward_types:
+                await self._emit({
+                    'type': 'share',
+                    'username': username,
+                    'content': '分享了直播间',
+                    'timestamp': 0,
+                    'user_info': user,
+                    'raw_data': data
+                })
+
         except Exception as e:
             self.logger.error(f"处理分享消息失败: {e}")
 
@@ -444,6 +581,9 @@ class DouyinProxyCollector:
     async def stop(self):
         """停止弹幕采集"""
         self.running = False
+        if self.recorder is not None:
+            self.recorder.close()
+            self.logger.info(f"已录制 {self.recorder.count} 条消息: {self.recorder.path}")
         if self.websocket:
             try:
                 await self.websocket.close()
@@ -460,7 +600,8 @@ class DouyinProxyCollector:
 def create_douyin_proxy_collector(
     on_message_callback: Callable,
     ws_url: str = "ws://127.0.0.1:8888",
-    logger=None
+    logger=None,
+    forward_types: Optional[Iterable[str]] = None
 ) -> DouyinProxyCollector:
     """
     创建抖音代理采集器
@@ -469,6 +610,7 @@ def create_douyin_proxy_collector(
         on_message_callback: 回调函数
         ws_url: DouyinBarrageGrab WebSocket 地址
         logger: 日志记录器
+        forward_types: 需要回调的事件类型
 
     Returns:
         采集器实例
@@ -476,7 +618,8 @@ def create_douyin_proxy_collector(
     return DouyinProxyCollector(
         on_message_callback,
         ws_url,
-        logger
+        logger,
+        forward_types
     )
 
 
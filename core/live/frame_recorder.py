@@ -0,0 +1,87 @@
+"""
+弹幕原始消息录制与读取
+把代理采集器收到的原始 WebSocket 消息连同到达时间写入压缩文件，用于离线回放和压测
+
+文件格式（整个文件使用 gzip 压缩）：
+    文件头: MAGIC
+    每条消息: 距上一条消息的毫秒数(uint32) + 类型(uint8，0 文本/1 二进制) + 长度(uint32) + 消息内容
+"""
+
+import gzip
+import struct
+import time
+from typing import Iterator, Tuple, Union
+
+MAGIC = b"DYREC\x01"
+_RECORD_HEADER = struct.Struct(">IBI")
+_KIND_TEXT = 0
+_KIND_BINARY = 1
+
+
+class FrameRecorder:
+    """原始消息录制器"""
+
+    def __init__(self, path: str, compresslevel: int = 6):
+        """
+        创建录制文件（已存在时覆盖）
+
+        Args:
+            path: 录制文件路径
+            compresslevel: gzip 压缩级别
+        """
+        self.path = path
+        self.file = gzip.open(path, "wb", compresslevel=compresslevel)
+        self.file.write(MAGIC)
+        self.last_time = None
+        self.count = 0
+
+    def write(self, frame: Union[str, bytes], timestamp: float = None):
+        """
+        写入一条消息
+
+        Args:
+            frame: 原始消息
+            timestamp: 到达时间（秒），默认为当前时间
+        """
+        now = time.monotonic() if timestamp is None else timestamp
+        delta_ms = 0 if self.last_time is None else max(0, int((now - self.last_time) * 1000))
+        self.last_time = now
+
+        if isinstance(frame, str):
+            kind, payload = _KIND_TEXT, frame.encode("utf-8")
+        else:
+            kind, payload = _KIND_BINARY, bytes(frame)
+        self.file.write(_RECORD_HEADER.pack(min(delta_ms, 0xFFFFFFFF), kind, len(payload)))
+        self.file.write(payload)
+        self.count += 1
+
+    def close(self):
+        """关闭录制文件"""
+        if not self.file.closed:
+            self.file.close()
+
+
+def read_frames(path: str) -> Iterator[Tuple[float, Union[str, bytes]]]:
+    """
+    读取录制文件
+
+    Args:
+        path: 录制文件路径
+
+    Yields:
+        (相对第一条消息的秒数, 原始消息)
+    """
+    with gzip.open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"不是弹幕录制文件: {path}")
+        offset_ms = 0
+        while True:
+            header = f.read(_RECORD_HEADER.size)
+            if len(header) < _RECORD_HEADER.size:
+                return
+            delta_ms, kind, length = _RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return  # 录制中断导致的不完整记录
+            offset_ms += delta_ms
+            yield offset_ms / 1000.0, payload.decode("utf-8") if kind == _KIND_TEXT else payload
@@ -1,3 +1,5 @@
+import asyncio
+import threading
 from abc import ABC, abstractmethod
 from configs.logger import setup_logging
 
@@ -37,3 +39,69 @@ class LLMProviderBase(ABC):
         for token in self.response(session_id, dialogue):
             yield token, None
 
+    async def warmup(self, request=False):
+        """
+        空闲时预热到LLM服务的连接，由弹幕服务在直播间安静时定期调用，
+        避免冷场后的第一条回复还要重新建立连接
+
+        Args:
+            request: 是否允许发送一个很短的真实请求（否则只做轻量的保活）
+
+        Returns:
+            是否访问了LLM服务（默认没有可预热的连接，返回 False）
+        """
+        return False
+
+    async def response_async(self, session_id, dialogue, **kwargs):
+        """
+        异步流式响应（逐个产出文本token的异步生成器）
+
+        默认实现在工作线程中迭代同步的 response() 生成器，通过队列把token交回事件循环，
+        网络读取不会阻塞事件循环。关闭异步生成器（或取消消费它的任务）后，
+        工作线程在下一个token处停止。有原生异步客户端的提供方应重写此方法。
+        """
+        loop = asyncio.get_running_loop()
+        token_queue = asyncio.Queue()
+        cancelled = threading.Event()
+        end_marker = object()
+
+        def _put(item):
+            try:
+                loop.call_soon_threadsafe(token_queue.put_nowait, item)
+            except RuntimeError:
+                # 事件循环已关闭
+                cancelled.set()
+
+        def _produce():
+            responses = None
+            try:
+                if kwargs:
+                    responses = self.response(session_id, dialogue, **kwargs)
+                else:
+                    responses = self.response(session_id, dialogue)
+                for token in responses:
+                    if cancelled.is_set():
+                        break
+                    _put(token)
+            except Exception as e:
+                _put(e)
+            finally:
+                if responses is not None and hasattr(responses, "close"):
+                    try:
+                        responses.close()
+                    except Exception:
+                        pass
+                _put(end_marker)
+
+        loop.run_in_executor(None, _produce)
+        try:
+            while True:
+                item = await token_queue.get()
+                if item is end_marker:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+
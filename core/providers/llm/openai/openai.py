@@ -1,3 +1,4 @@
+import json
 import httpx
 import openai
 from openai.types import CompletionUsage
@@ -47,6 +48,18 @@ class LLMProvider(LLMProviderBase):
             logger.bind(tag=TAG).error(model_key_msg)
             raise ValueError(model_key_msg)
         self.client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=httpx.Timeout(self.timeout))
+        # 异步客户端：用于在事件循环中直接流式读取，不占用线程
+        # 空闲连接保留 keepalive_expiry 秒（httpx 默认只保留5秒），配合空闲预热，直播间安静一段时间后的首条回复不必重新建立连接
+        keepalive_expiry = float(config.get("keepalive_expiry", 60))
+        self.async_client = openai.AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.timeout),
+            http_client=openai.DefaultAsyncHttpxClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=1000, max_keepalive_connections=100, keepalive_expiry=keepalive_expiry),
+            ),
+        )
 
     @staticmethod
     def normalize_dialogue(dialogue):
@@ -56,50 +69,120 @@ class LLMProvider(LLMProviderBase):
                 msg["content"] = ""
         return dialogue
 
-    def response(self, session_id, dialogue, **kwargs):
-        try:
-            dialogue = self.normalize_dialogue(dialogue)
+    def _build_request_params(self, dialogue, **kwargs):
+        """构造流式请求参数"""
+        dialogue = self.normalize_dialogue(dialogue)
 
-            request_params = {
-                "model": self.model_name,
-                "messages": dialogue,
-                "stream": True,
-            }
+        request_params = {
+            "model": self.model_name,
+            "messages": dialogue,
+            "stream": True,
+        }
 
-            # 添加可选参数,只有当参数不为None时才添加
-            optional_params = {
-                "max_tokens": kwargs.get("max_tokens", self.max_tokens),
-                "temperature": kwargs.get("temperature", self.temperature),
-                "top_p": kwargs.get("top_p", self.top_p),
-                "frequency_penalty": kwargs.get("frequency_penalty", self.frequency_penalty),
-            }
+        # 添加可选参数,只有当参数不为None时才添加
+        optional_params = {
+            "max_tokens": kwargs.get("max_tokens", self.max_tokens),
+            "temperature": kwargs.get("temperature", self.temperature),
+            "top_p": kwargs.get("top_p", self.top_p),
+            "frequency_penalty": kwargs.get("frequency_penalty", self.frequency_penalty),
+        }
 
-            for key, value in optional_params.items():
-                if value is not None:
-                    request_params[key] = value
+        for key, value in optional_params.items():
+            if value is not None:
+                request_params[key] = value
+
+        return request_params
+
+    @staticmethod
+    def _extract_content(chunk):
+        """提取流式分片中的文本内容"""
+        try:
+            delta = chunk.choices[0].delta if getattr(chunk, "choices", None) else None
+            return getattr(delta, "content", "") if delta else ""
+        except IndexError:
+            return ""
 
+    @staticmethod
+    def _filter_think(content, is_active):
+        """过滤 <think> 标签内的思考内容，返回 (可输出内容, 新的is_active状态)"""
+        if "<think>" in content:
+            is_active = False
+            content = content.split("<think>")[0]
+        if "</think>" in content:
+            is_active = True
+            content = content.split("</think>")[-1]
+        return (content if is_active else ""), is_active
+
+    def response(self, session_id, dialogue, **kwargs):
+        try:
+            request_params = self._build_request_params(dialogue, **kwargs)
             responses = self.client.chat.completions.create(**request_params)
 
             is_active = True
             for chunk in responses:
-                try:
-                    delta = chunk.choices[0].delta if getattr(chunk, "choices", None) else None
-                    content = getattr(delta, "content", "") if delta else ""
-                except IndexError:
-                    content = ""
+                content = self._extract_content(chunk)
                 if content:
-                    if "<think>" in content:
-                        is_active = False
-                        content = content.split("<think>")[0]
-                    if "</think>" in content:
-                        is_active = True
-                        content = content.split("</think>")[-1]
-                    if is_active:
+                    content, is_active = self._filter_think(content, is_active)
+                    if content:
                         yield content
 
         except Exception as e:
             logger.bind(tag=TAG).error(f"Error in response generation: {e}")
 
+    async def response_async(self, session_id, dialogue, **kwargs):
+        # 按行读取SSE直到响应体结束：openai 客户端读到 [DONE] 就关闭响应，分块结束标记没有读取时连接不能放回连接池，
+        # 下一次请求要重新建立 TCP+TLS 连接；提前结束（取消/超时）时退出上下文关闭HTTP流
+        try:
+            request_params = self._build_request_params(dialogue, **kwargs)
+            async with self.async_client.chat.completions.with_streaming_response.create(**request_params) as response:
+                is_active = True
+                async for line in response.iter_lines():
+                    content = self._extract_sse_content(line)
+                    if content:
+                        content, is_active = self._filter_think(content, is_active)
+                        if content:
+                            yield content
+
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error in async response generation: {e}")
+
+    @staticmethod
+    def _extract_sse_content(line):
+        """提取一行SSE数据中的文本内容"""
+        if not line.startswith("data:"):
+            return ""
+        data = line[5:].strip()
+        if not data or data == "[DONE]":
+            return ""
+        payload = json.loads(data)
+        if payload.get("error"):
+            error = payload["error"]
+            raise RuntimeError(error.get("message") if isinstance(error, dict) else error)
+        choices = payload.get("choices") or []
+        if not choices:
+            return ""
+        return (choices[0].get("delta") or {}).get("content") or ""
+
+    async def warmup(self, request=False):
+        """
+        保持到LLM服务的连接：默认请求模型列表（不消耗token），request=True 时发送只生成1个token的补全请求
+        """
+        try:
+            if request:
+                async with self.async_client.chat.completions.with_streaming_response.create(
+                    model=self.model_name, messages=[{"role": "user", "content": "你好"}], max_tokens=1, stream=True
+                ) as response:
+                    await response.read()
+            else:
+                await self.async_client.models.list()
+            return True
+        except openai.APIStatusError:
+            # 服务不支持该接口时连接仍已建立
+            return True
+        except Exception as e:
+            logger.bind(tag=TAG).debug(f"LLM预热失败: {e}")
+            return False
+
     def response_with_functions(self, session_id, dialogue, functions=None, **kwargs):
         try:
             dialogue = self.normalize_dialogue(dialogue)
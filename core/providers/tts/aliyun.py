@@ -124,6 +124,13 @@ class TTSProvider(TTSProviderBase):
             self.token = config.get("token")
             self.expire_time = None
 
+    def cache_params(self):
+        """影响合成结果的参数（TTS缓存键）"""
+        return {
+            "voice": self.voice, "format": self.format, "sample_rate": self.sample_rate, "volume": self.volume,
+            "speech_rate": self.speech_rate, "pitch_rate": self.pitch_rate, "host": self.host,
+        }
+
     def _refresh_token(self):
         """刷新Token并记录过期时间"""
         if self.access_key_id and self.access_key_secret:
@@ -9,10 +9,14 @@ import traceback
 from core.utils import p3
 from datetime import datetime
 from core.utils import textUtils
-from typing import Callable, Any
+from typing import Callable, Any, Tuple
 from abc import ABC, abstractmethod
 from configs.logger import setup_logging
 from core.utils.tts import MarkdownCleaner
+from core.utils.audio_decode import AudioStreamDecoder
+from core.utils.opus_encoder_utils import OpusEncoderUtils
+from core.utils.tts_pool import LoopQueue, run_blocking, run_coroutine, close_thread_loop
+from core.utils.tts_cache import get_cache as get_tts_cache
 from core.utils.output_counter import add_device_output
 from core.handle.reportHandle import enqueue_tts_report
 from core.handle.sendAudioHandle import sendAudioMessage
@@ -27,6 +31,16 @@ from core.providers.tts.dto.dto import (
 TAG = __name__
 logger = setup_logging()
 
+# 默认缓存参数中不包含的配置项（密钥、输出目录、超时等不影响合成结果）
+_CACHE_EXCLUDED_CONFIG = re.compile(r"key|token|secret|password|authorization|output_dir|delete_audio|timeout")
+
+
+def _task_cancelling() -> bool:
+    """当前任务是否已被请求取消（Python 3.11 起可判断，更早的版本返回 False）"""
+    task = asyncio.current_task()
+    cancelling = getattr(task, "cancelling", None)
+    return bool(cancelling and cancelling())
+
 
 class TTSProviderBase(ABC):
     def __init__(self, config, delete_audio_file):
@@ -35,8 +49,12 @@ class TTSProviderBase(ABC):
         self.delete_audio_file = delete_audio_file
         self.audio_file_type = "wav"
         self.output_file = config.get("output_dir", "tmp/")
-        self.tts_text_queue = queue.Queue()
-        self.tts_audio_queue = queue.Queue()
+        self.tts_timeout = float(config.get("tts_timeout") or 10)  # 合成请求超时时间（秒）
+        self._config = config
+        self.tts_text_queue = LoopQueue()
+        self.tts_audio_queue = LoopQueue()
+        self.tts_text_task = None
+        self.audio_play_task = None
         self.tts_audio_first_sentence = True
         self.before_stop_play_files = []
 
@@ -84,48 +102,39 @@ class TTSProviderBase(ABC):
 
     def to_tts_stream(self, text, opus_handler: Callable[[bytes], None] = None) -> None:
         text = MarkdownCleaner.clean_markdown(text)
-        max_repeat_time = 5
+        cache_key = self._get_cache_key(text)
+        if cache_key is not None:
+            packets = get_tts_cache().get(cache_key)
+            if packets is not None:
+                # 缓存命中：不请求提供方，直接播放
+                logger.bind(tag=TAG).debug(f"TTS缓存命中: {text}")
+                self.tts_audio_queue.put((SentenceType.FIRST, None, text))
+                for packet in packets:
+                    opus_handler(packet)
+                return None
+            packets, send_opus = [], opus_handler
+
+            def opus_handler(opus_data):
+                packets.append(opus_data)
+                send_opus(opus_data)
+
         if self.delete_audio_file:
-            logger.bind(tag=TAG).debug(f"🔧 to_tts_stream: text='{text}', opus_handler={opus_handler}, audio_file_type={self.audio_file_type}")
-            # 需要删除文件的直接转为音频数据
-            while max_repeat_time > 0:
-                try:
-                    audio_bytes = asyncio.run(self.text_to_speak(text, None))
-                    logger.bind(tag=TAG).debug(f"🔧 EdgeTTS返回: audio_bytes={'有数据' if audio_bytes else '无数据'}, 大小={len(audio_bytes) if audio_bytes else 0}字节")
-                    if audio_bytes:
-                        self.tts_audio_queue.put((SentenceType.FIRST, None, text))
-                        logger.bind(tag=TAG).debug(f"🔧 准备调用 audio_bytes_to_data_stream, callback={opus_handler}")
-                        audio_bytes_to_data_stream(
-                            audio_bytes,
-                            file_type=self.audio_file_type,
-                            is_opus=True,
-                            callback=opus_handler,
-                        )
-                        logger.bind(tag=TAG).debug(f"🔧 audio_bytes_to_data_stream 调用完成")
-                        break
-                    else:
-                        logger.bind(tag=TAG).warning(f"🔧 audio_bytes 为空，重试")
-                        max_repeat_time -= 1
-                except Exception as e:
-                    logger.bind(tag=TAG).warning(
-                        f"语音生成失败{5 - max_repeat_time + 1}次: {text}，错误: {e}"
-                    )
-                    max_repeat_time -= 1
-            if max_repeat_time > 0:
-                logger.bind(tag=TAG).debug(
-                    f"语音生成成功: {text}，重试{5 - max_repeat_time}次"
-                )
+            if hasattr(self, "text_to_speak_stream"):
+                # 提供方支持流式返回音频：边接收边解码
+                complete = self._to_tts_audio_stream(text, opus_handler)
             else:
-                logger.bind(tag=TAG).error(
-                    f"语音生成失败: {text}，请检查网络或服务是否正常"
-                )
+                # 需要删除文件的直接转为音频数据
+                complete = self._to_tts_bytes_stream(text, opus_handler)
+            if complete and cache_key is not None:
+                get_tts_cache().put(cache_key, packets)
             return None
         else:
+            max_repeat_time = 5
             tmp_file = self.generate_filename()
             try:
                 while not os.path.exists(tmp_file) and max_repeat_time > 0:
                     try:
-                        asyncio.run(self.text_to_speak(text, tmp_file))
+                        run_coroutine(self.text_to_speak(text, tmp_file))
                     except Exception as e:
                         logger.bind(tag=TAG).warning(
                             f"语音生成失败{5 - max_repeat_time + 1}次: {text}，错误: {e}"
@@ -148,15 +157,143 @@ class TTSProviderBase(ABC):
             except Exception as e:
                 logger.bind(tag=TAG).error(f"Failed to generate TTS file: {e}")
                 return None
-    
+
+    def cache_params(self):
+        """
+        影响合成结果的参数，用于生成TTS缓存键，不能包含密钥
+
+        默认使用提供方的全部配置（去掉密钥等配置项），任何一项配置不同都不共用缓存；
+        子类应返回全部影响音频的参数（音色、语速、音调、模型、输出格式、服务地址等）。
+
+        Returns:
+            参数字典，返回 None 表示不缓存该提供方的合成结果
+        """
+        return {
+            name: value for name, value in (self._config or {}).items()
+            if not _CACHE_EXCLUDED_CONFIG.search(str(name))
+        }
+
+    def _get_cache_key(self, text):
+        """TTS缓存键，未启用缓存或不参与缓存时返回 None（只缓存直接编码为Opus帧的结果）"""
+        cache = get_tts_cache()
+        if cache is None or not self.delete_audio_file:
+            return None
+        return cache.make_key(self, text)
+
+    def _to_tts_bytes_stream(self, text, opus_handler: Callable[[bytes], None]) -> bool:
+        """
+        合成一段文字并编码为Opus帧，没有收到音频或出错时重试
+
+        Returns:
+            是否成功输出了完整的音频
+        """
+        logger.bind(tag=TAG).debug(f"🔧 to_tts_stream: text='{text}', opus_handler={opus_handler}, audio_file_type={self.audio_file_type}")
+        max_repeat_time = 5
+        while max_repeat_time > 0:
+            try:
+                audio_bytes = run_coroutine(self.text_to_speak(text, None))
+                logger.bind(tag=TAG).debug(f"🔧 EdgeTTS返回: audio_bytes={'有数据' if audio_bytes else '无数据'}, 大小={len(audio_bytes) if audio_bytes else 0}字节")
+                if audio_bytes:
+                    self.tts_audio_queue.put((SentenceType.FIRST, None, text))
+                    logger.bind(tag=TAG).debug(f"🔧 准备调用 audio_bytes_to_data_stream, callback={opus_handler}")
+                    audio_bytes_to_data_stream(
+                        audio_bytes,
+                        file_type=self.audio_file_type,
+                        is_opus=True,
+                        callback=opus_handler,
+                    )
+                    logger.bind(tag=TAG).debug(f"🔧 audio_bytes_to_data_stream 调用完成")
+                    break
+                else:
+                    logger.bind(tag=TAG).warning(f"🔧 audio_bytes 为空，重试")
+                    max_repeat_time -= 1
+            except Exception as e:
+                logger.bind(tag=TAG).warning(
+                    f"语音生成失败{5 - max_repeat_time + 1}次: {text}，错误: {e}"
+                )
+                max_repeat_time -= 1
+        if max_repeat_time > 0:
+            logger.bind(tag=TAG).debug(
+                f"语音生成成功: {text}，重试{5 - max_repeat_time}次"
+            )
+            return True
+        logger.bind(tag=TAG).error(
+            f"语音生成失败: {text}，请检查网络或服务是否正常"
+        )
+        return False
+
+    def _to_tts_audio_stream(self, text, opus_handler: Callable[[bytes], None]) -> bool:
+        """
+        流式合成一段文字，没有收到音频时重试
+
+        Returns:
+            是否成功输出了完整的音频（中途中断的不算）
+        """
+        max_repeat_time = 5
+        while max_repeat_time > 0:
+            try:
+                started, complete = run_coroutine(self._stream_audio_to_opus(text, opus_handler))
+                if started:
+                    logger.bind(tag=TAG).debug(
+                        f"语音生成成功: {text}，重试{5 - max_repeat_time}次"
+                    )
+                    return complete
+                logger.bind(tag=TAG).warning(f"未收到音频数据，重试: {text}")
+            except Exception as e:
+                logger.bind(tag=TAG).warning(
+                    f"语音生成失败{5 - max_repeat_time + 1}次: {text}，错误: {e}"
+                )
+            max_repeat_time -= 1
+        logger.bind(tag=TAG).error(
+            f"语音生成失败: {text}，请检查网络或服务是否正常"
+        )
+        return False
+
+    async def _stream_audio_to_opus(self, text, opus_handler: Callable[[bytes], None]) -> Tuple[bool, bool]:
+        """
+        边接收边解码：text_to_speak_stream 返回的每块音频立即解码并编码为Opus帧，
+        第一帧在整句合成完成前就进入播放队列
+
+        Returns:
+            (是否收到了音频, 音频是否完整)，已输出音频后出错不再重试，避免重复播放
+        """
+        encoder = OpusEncoderUtils(16000, 1, 60)
+        decoder = AudioStreamDecoder(
+            self.audio_file_type,
+            callback=lambda pcm: encoder.encode_pcm_to_opus_stream(pcm, False, opus_handler),
+        )
+        started = False
+        try:
+            async for chunk in self.text_to_speak_stream(text):
+                if not started and chunk:
+                    started = True
+                    self.tts_audio_queue.put((SentenceType.FIRST, None, text))
+                decoder.feed(chunk)
+            decoder.finish()
+            encoder.encode_pcm_to_opus_stream(b"", True, opus_handler)
+        except Exception as e:
+            if not started:
+                raise
+            logger.bind(tag=TAG).error(f"语音流中断: {text}，错误: {e}")
+            return started, False
+        finally:
+            decoder.close()
+            encoder.close()
+        return started, started
+
     def to_tts(self, text):
         text = MarkdownCleaner.clean_markdown(text)
+        cache_key = self._get_cache_key(text)
+        if cache_key is not None:
+            packets = get_tts_cache().get(cache_key)
+            if packets is not None:
+                return list(packets)
         max_repeat_time = 5
         if self.delete_audio_file:
             # 需要删除文件的直接转为音频数据
             while max_repeat_time > 0:
                 try:
-                    audio_bytes = asyncio.run(self.text_to_speak(text, None))
+                    audio_bytes = run_coroutine(self.text_to_speak(text, None))
                     if audio_bytes:
                         audio_datas = []
                         audio_bytes_to_data_stream(
@@ -165,6 +302,8 @@ class TTSProviderBase(ABC):
                             is_opus=True,
                             callback=lambda data: audio_datas.append(data)
                         )
+                        if cache_key is not None:
+                            get_tts_cache().put(cache_key, audio_datas)
                         return audio_datas
                     else:
                         max_repeat_time -= 1
@@ -187,7 +326,7 @@ class TTSProviderBase(ABC):
             try:
                 while not os.path.exists(tmp_file) and max_repeat_time > 0:
                     try:
-                        asyncio.run(self.text_to_speak(text, tmp_file))
+                        run_coroutine(self.text_to_speak(text, tmp_file))
                     except Exception as e:
                         logger.bind(tag=TAG).warning(
                             f"语音生成失败{5 - max_repeat_time + 1}次: {text}，错误: {e}"
@@ -271,29 +410,40 @@ class TTSProviderBase(ABC):
             )
 
     async def open_audio_channels(self, conn):
+        """
+        启动TTS处理任务
+
+        文本处理和音频播放都是连接事件循环中的任务，阻塞的合成请求交给共享线程池，不为每个连接创建线程；
+        重写了 tts_text_priority_thread 的流式提供方（WebSocket 双向流式等）仍在每个连接各自的线程中处理文本
+        """
         self.conn = conn
-        # tts 消化线程
-        self.tts_priority_thread = threading.Thread(
-            target=self.tts_text_priority_thread, daemon=True
-        )
-        self.tts_priority_thread.start()
+        if hasattr(self, "tts_text_priority_thread"):
+            self.tts_priority_thread = threading.Thread(
+                target=self._run_text_thread, daemon=True
+            )
+            self.tts_priority_thread.start()
+        else:
+            self.tts_text_task = asyncio.create_task(self._tts_text_loop())
 
-        # 音频播放 消化线程
-        self.audio_play_priority_thread = threading.Thread(
-            target=self._audio_play_priority_thread, daemon=True
-        )
-        self.audio_play_priority_thread.start()
+        self.audio_play_task = asyncio.create_task(self._audio_play_loop())
+
+    def _run_text_thread(self):
+        """流式提供方的文本线程，退出时关闭线程的事件循环"""
+        try:
+            self.tts_text_priority_thread()
+        finally:
+            close_thread_loop()
 
     # 这里默认是非流式的处理方式
-    # 流式处理方式请在子类中重写
-    def tts_text_priority_thread(self):
+    # 流式处理方式请在子类中重写 tts_text_priority_thread
+    async def _tts_text_loop(self):
         while not self.conn.stop_event.is_set():
             try:
-                message = self.tts_text_queue.get(timeout=1)
+                message = await self.tts_text_queue.get_async(timeout=1)
                 if message.sentence_type == SentenceType.FIRST:
                     self.conn.client_abort = False
                 if self.conn.client_abort:
-                    logger.bind(tag=TAG).info("收到打断信息，终止TTS文本处理线程")
+                    logger.bind(tag=TAG).info("收到打断信息，终止TTS文本处理")
                     continue
                 if message.sentence_type == SentenceType.FIRST:
                     # 初始化参数
@@ -306,16 +456,14 @@ class TTSProviderBase(ABC):
                     self.tts_text_buff.append(message.content_detail)
                     segment_text = self._get_segment_text()
                     if segment_text:
-                        self.to_tts_stream(segment_text, opus_handler=self.handle_opus)
+                        await run_blocking(self.to_tts_stream, segment_text, self.handle_opus)
                 elif ContentType.FILE == message.content_type:
-                    self._process_remaining_text_stream(opus_handler=self.handle_opus)
+                    await run_blocking(self._process_remaining_text_stream, self.handle_opus)
                     tts_file = message.content_file
                     if tts_file and os.path.exists(tts_file):
-                        self._process_audio_file_stream(
-                            tts_file, callback=self.handle_opus
-                        )
+                        await run_blocking(self._process_audio_file_stream, tts_file, self.handle_opus)
                 if message.sentence_type == SentenceType.LAST:
-                    self._process_remaining_text_stream(opus_handler=self.handle_opus)
+                    await run_blocking(self._process_remaining_text_stream, self.handle_opus)
                     self.tts_audio_queue.put(
                         (message.sentence_type, [], message.content_detail)
                     )
@@ -328,7 +476,7 @@ class TTSProviderBase(ABC):
                 )
                 continue
 
-    def _audio_play_priority_thread(self):
+    async def _audio_play_loop(self):
         # 需要上报的文本和音频列表
         enqueue_text = None
         enqueue_audio = None
@@ -336,12 +484,8 @@ class TTSProviderBase(ABC):
             text = None
             try:
                 try:
-                    sentence_type, audio_datas, text = self.tts_audio_queue.get(
-                        timeout=0.1
-                    )
+                    sentence_type, audio_datas, text = await self.tts_audio_queue.get_async(timeout=1)
                 except queue.Empty:
-                    if self.conn.stop_event.is_set():
-                        break
                     continue
 
                 if self.conn.client_abort:
@@ -363,26 +507,37 @@ class TTSProviderBase(ABC):
 
                 # 发送音频
                 logger.bind(tag=TAG).debug(f"📤 准备发送音频: sentence_type={sentence_type}, audio_datas类型={type(audio_datas).__name__}, text={text}")
-                future = asyncio.run_coroutine_threadsafe(
-                    sendAudioMessage(self.conn, sentence_type, audio_datas, text),
-                    self.conn.loop,
-                )
                 try:
-                    future.result()
+                    await sendAudioMessage(self.conn, sentence_type, audio_datas, text)
                     logger.bind(tag=TAG).debug(f"✅ 音频发送完成")
                 except asyncio.CancelledError:
-                    # 任务被取消（通常是因为打断或 client_abort）
+                    # 任务本身被取消（直播间停止、连接关闭）时继续抛出；
+                    # 只有客户端打断导致的发送取消才跳过当前音频，继续处理队列
+                    if self.conn.stop_event.is_set() or _task_cancelling() or not self.conn.client_abort:
+                        raise
                     logger.bind(tag=TAG).debug(f"🚫 音频发送被取消: text={text}")
-                    continue  # 跳过当前音频，继续处理队列
+                    continue
 
                 # 记录输出和报告
                 if self.conn.max_output_size > 0 and text:
                     add_device_output(self.conn.headers.get("device-id"), len(text))
 
             except Exception as e:
-                logger.bind(tag=TAG).error(f"❌ audio_play_priority_thread 异常: text='{text}', 异常类型={type(e).__name__}, 异常信息={e}")
+                logger.bind(tag=TAG).error(f"❌ audio_play_loop 异常: text='{text}', 异常类型={type(e).__name__}, 异常信息={e}")
                 logger.bind(tag=TAG).error(f"异常堆栈: {traceback.format_exc()}")
 
+    async def warmup(self, request=False):
+        """
+        空闲时预热到TTS服务的连接，由弹幕服务在直播间安静时定期调用
+
+        Args:
+            request: 是否允许发送一句很短的真实合成请求
+
+        Returns:
+            是否访问了TTS服务（默认没有可预热的连接，返回 False）
+        """
+        return False
+
     async def start_session(self, session_id):
         pass
 
@@ -390,7 +545,16 @@ class TTSProviderBase(ABC):
         pass
 
     async def close(self):
-        """资源清理方法"""
+        """资源清理方法（取消并等待文本处理和音频播放任务）"""
+        current = asyncio.current_task()
+        tasks = [
+            task for task in (getattr(self, "tts_text_task", None), getattr(self, "audio_play_task", None))
+            if task is not None and task is not current and not task.done()
+        ]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
         if hasattr(self, "ws") and self.ws:
             await self.ws.close()
 
@@ -16,6 +16,12 @@ class TTSProvider(TTSProviderBase):
         self.host = "api.coze.cn"
         self.api_url = f"https://{self.host}/v1/audio/speech"
 
+    def cache_params(self):
+        """影响合成结果的参数（TTS缓存键）"""
+        return {
+            "model": self.model, "voice": self.voice, "response_format": self.response_format,
+        }
+
     async def text_to_speak(self, text, output_file):
         request_json = {
             "model": self.model,
@@ -28,6 +28,12 @@ class TTSProvider(TTSProviderBase):
         elif not isinstance(self.params, dict):
             raise TypeError("Custom TTS配置参数出错, 请参考配置说明")
 
+    def cache_params(self):
+        """影响合成结果的参数（TTS缓存键）"""
+        return {
+            "url": self.url, "method": self.method, "params": self.params, "format": self.format,
+        }
+
     def generate_filename(self):
         return os.path.join(self.output_file, f"tts-{datetime.now().date()}@{uuid.uuid4().hex}.{self.format}")
 
@@ -41,6 +41,14 @@ class TTSProvider(TTSProviderBase):
         if model_key_msg:
             logger.bind(tag=TAG).error(model_key_msg)
 
+    def cache_params(self):
+        """影响合成结果的参数（TTS缓存键）"""
+        return {
+            "api_url": self.api_url, "cluster": self.cluster, "voice": self.voice,
+            "speed_ratio": self.speed_ratio, "volume_ratio": self.volume_ratio, "pitch_ratio": self.pitch_ratio,
+            "audio_file_type": self.audio_file_type,
+        }
+
     async def text_to_speak(self, text, output_file):
         request_json = {
             "app": {
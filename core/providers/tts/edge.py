@@ -14,12 +14,27 @@ class TTSProvider(TTSProviderBase):
             self.voice = config.get("voice")
         self.audio_file_type = config.get("format", "mp3")
 
+    def cache_params(self):
+        """影响合成结果的参数（TTS缓存键）"""
+        return {
+            "voice": self.voice, "audio_file_type": self.audio_file_type,
+        }
+
     def generate_filename(self, extension=".mp3"):
         return os.path.join(
             self.output_file,
             f"tts-{datetime.now().date()}@{uuid.uuid4().hex}{extension}",
         )
 
+    async def warmup(self, request=False):
+        """Edge TTS 每次合成都新建 websocket 连接，只能通过一句很短的合成预热（解析域名、建立到服务的路由）"""
+        if not request:
+            return False
+        communicate = edge_tts.Communicate("嗯", voice=self.voice)
+        async for _ in communicate.stream():
+            pass
+        return True
+
     async def text_to_speak(self, text, output_file):
         try:
             communicate = edge_tts.Communicate(text, voice=self.voice)
@@ -36,11 +51,21 @@ class TTSProvider(TTSProviderBase):
                             f.write(chunk["data"])
             else:
                 # 返回音频二进制数据
-                audio_bytes = b""
+                audio_bytes = bytearray()
                 async for chunk in communicate.stream():
                     if chunk["type"] == "audio":
                         audio_bytes += chunk["data"]
-                return audio_bytes
+                return bytes(audio_bytes)
         except Exception as e:
             error_msg = f"Edge TTS请求失败: {e}"
-            raise Exception(error_msg)  # 抛出异常，让调用方捕获
\ No newline at end of file
+            raise Exception(error_msg)  # 抛出异常，让调用方捕获
+
+    async def text_to_speak_stream(self, text):
+        """逐块返回 MP3 数据，由基类边接收边解码"""
+        try:
+            communicate = edge_tts.Communicate(text, voice=self.voice)
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    yield chunk["data"]
+        except Exception as e:
+            raise Exception(f"Edge TTS请求失败: {e}")
\ No newline at end of file
@@ -135,6 +135,16 @@ class TTSProvider(TTSProviderBase):
         self.seed = int(config.get("seed")) if config.get("seed") else None
         self.api_url = config.get("api_url", "http://127.0.0.1:8080/v1/tts")
 
+    def cache_params(self):
+        """影响合成结果的参数（TTS缓存键）"""
+        return {
+            "api_url": self.api_url, "reference_id": self.reference_id, "reference_audio": self.reference_audio,
+            "reference_text": self.reference_text, "format": self.format, "normalize": self.normalize,
+            "channels": self.channels, "rate": self.rate, "max_new_tokens": self.max_new_tokens,
+            "chunk_length": self.chunk_length, "top_p": self.top_p, "temperature": self.temperature,
+            "repetition_penalty": self.repetition_penalty, "seed": self.seed,
+        }
+
     async def text_to_speak(self, text, output_file):
         # Prepare reference data
         byte_audios = [audio_to_bytes(ref_audio) for ref_audio in self.reference_audio]
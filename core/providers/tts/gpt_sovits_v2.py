@@ -67,6 +67,18 @@ class TTSProvider(TTSProviderBase):
         )
         self.audio_file_type = config.get("format", "wav")
 
+    def cache_params(self):
+        """影响合成结果的参数（TTS缓存键）"""
+        return {
+            "url": self.url, "text_lang": self.text_lang, "ref_audio_path": self.ref_audio_path,
+            "prompt_text": self.prompt_text, "prompt_lang": self.prompt_lang, "top_k": self.top_k,
+            "top_p": self.top_p, "temperature": self.temperature, "batch_threshold": self.batch_threshold,
+            "batch_size": self.batch_size, "speed_factor": self.speed_factor, "seed": self.seed,
+            "repetition_penalty": self.repetition_penalty, "text_split_method": self.text_split_method,
+            "split_bucket": self.split_bucket, "aux_ref_audio_paths": self.aux_ref_audio_paths,
+            "audio_file_type": self.audio_file_type,
+        }
+
     async def text_to_speak(self, text, output_file):
         request_json = {
             "text": text,
@@ -34,6 +34,16 @@ class TTSProvider(TTSProviderBase):
         self.if_sr = str(config.get("if_sr", False)).lower() in ("true", "1", "yes")
         self.audio_file_type = config.get("format", "wav")
 
+    def cache_params(self):
+        """影响合成结果的参数（TTS缓存键）"""
+        return {
+            "url": self.url, "refer_wav_path": self.refer_wav_path, "prompt_text": self.prompt_text,
+            "prompt_language": self.prompt_language, "text_language": self.text_language, "top_k": self.top_k,
+            "top_p": self.top_p, "temperature": self.temperature, "sample_steps": self.sample_steps,
+            "speed": self.speed, "cut_punc": self.cut_punc, "inp_refs": self.inp_refs, "if_sr": self.if_sr,
+            "audio_file_type": self.audio_file_type,
+        }
+
     async def text_to_speak(self, text, output_file):
         request_params = {
             "refer_wav_path": self.refer_wav_path,
@@ -1,5 +1,7 @@
+import aiohttp
 import requests
 from core.utils.util import check_model_key
+from core.utils.tts_pool import get_http_session, warm_http_sessions
 from core.providers.tts.base import TTSProviderBase
 from configs.logger import setup_logging
 
@@ -29,6 +31,17 @@ class TTSProvider(TTSProviderBase):
         if model_key_msg:
             logger.bind(tag=TAG).error(model_key_msg)
 
+    def cache_params(self):
+        """影响合成结果的参数（TTS缓存键）"""
+        return {
+            "api_url": self.api_url, "model": self.model, "voice": self.voice,
+            "response_format": self.response_format, "speed": self.speed,
+        }
+
+    async def warmup(self, request=False):
+        """保持共享线程池中各线程 HTTP 会话到TTS服务的连接（流式合成复用这些连接）"""
+        return await warm_http_sessions(self.api_url) > 0
+
     async def text_to_speak(self, text, output_file):
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -41,7 +54,7 @@ class TTSProvider(TTSProviderBase):
             "response_format": "wav",
             "speed": self.speed,
         }
-        response = requests.post(self.api_url, json=data, headers=headers)
+        response = requests.post(self.api_url, json=data, headers=headers, timeout=self.tts_timeout)
         if response.status_code == 200:
             if output_file:
                 with open(output_file, "wb") as audio_file:
@@ -52,3 +65,26 @@ class TTSProvider(TTSProviderBase):
             raise Exception(
                 f"OpenAI TTS请求失败: {response.status_code} - {response.text}"
             )
+
+    async def text_to_speak_stream(self, text):
+        """逐块返回响应中的音频数据（不等待整个响应），由基类边接收边解码"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        data = {
+            "model": self.model,
+            "input": text,
+            "voice": self.voice,
+            "response_format": self.response_format,
+            "speed": self.speed,
+        }
+        session = await get_http_session()
+        timeout = aiohttp.ClientTimeout(total=self.tts_timeout)
+        async with session.post(self.api_url, json=data, headers=headers, timeout=timeout) as response:
+            if response.status != 200:
+                raise Exception(
+                    f"OpenAI TTS请求失败: {response.status} - {await response.text()}"
+                )
+            async for chunk in response.content.iter_any():
+                yield chunk
@@ -51,6 +51,13 @@ class TTSProvider(TTSProviderBase):
         else:
             self.save_path = None
 
+    def cache_params(self):
+        """影响合成结果的参数（TTS缓存键）"""
+        return {
+            "url": self.url, "protocol": self.protocol, "spk_id": self.spk_id, "sample_rate": self.sample_rate,
+            "speed": self.speed, "volume": self.volume,
+        }
+
     async def pcm_to_wav(self, pcm_data: bytes, sample_rate: int = 24000, num_channels: int = 1,
                          bits_per_sample: int = 16) -> bytes:
         """
@@ -20,6 +20,13 @@ class TTSProvider(TTSProviderBase):
         self.host = "api.siliconflow.cn"
         self.api_url = f"https://{self.host}/v1/audio/speech"
 
+    def cache_params(self):
+        """影响合成结果的参数（TTS缓存键）"""
+        return {
+            "model": self.model, "voice": self.voice, "response_format": self.response_format,
+            "sample_rate": self.sample_rate, "speed": self.speed, "gain": self.gain,
+        }
+
     async def text_to_speak(self, text, output_file):
         request_json = {
             "model": self.model,
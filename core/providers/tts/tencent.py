@@ -24,6 +24,12 @@ class TTSProvider(TTSProviderBase):
         self.output_file = config.get("output_dir")
         self.audio_file_type = config.get("format", "wav")
 
+    def cache_params(self):
+        """影响合成结果的参数（TTS缓存键）"""
+        return {
+            "voice": self.voice, "audio_file_type": self.audio_file_type,
+        }
+
     def _get_auth_headers(self, request_body):
         """生成鉴权请求头"""
         # 获取当前UTC时间戳
@@ -34,6 +34,14 @@ class TTSProvider(TTSProviderBase):
         self.emotion = int(config.get("emotion", 1))
         self.header = {"Content-Type": "application/json"}
 
+    def cache_params(self):
+        """影响合成结果的参数（TTS缓存键）"""
+        return {
+            "url": self.url, "voice": self.voice, "to_lang": self.to_lang,
+            "volume_change_dB": self.volume_change_dB, "speed_factor": self.speed_factor,
+            "pitch_factor": self.pitch_factor, "emotion": self.emotion, "format": self.format,
+        }
+
     def generate_filename(self, extension=".mp3"):
         return os.path.join(
             self.output_file,
@@ -0,0 +1,382 @@
+"""
+进程内音频解码
+把TTS输出和本地音频文件解码为16kHz单声道16位PCM（Opus编码器的输入格式）：
+
+    WAV  标准库 wave 读取，numpy 转换声道、位深和采样率
+    MP3  miniaudio（可选依赖）在进程内解码并重采样
+    其他 以及上面解码失败时，回退到 pydub（MP3 等格式会启动 ffmpeg 子进程）
+
+pydub 解码 MP3 每段文字都要启动一次 ffmpeg 进程并通过管道传输数据，高并发时耗时和CPU开销都很大
+
+AudioStreamDecoder 边接收边解码流式返回的音频，第一块数据到达后即可输出PCM，不必等整句合成完成
+"""
+
+import queue
+import wave
+import struct
+import threading
+import numpy as np
+from io import BytesIO
+from pydub import AudioSegment
+from configs.logger import setup_logging
+
+try:
+    import miniaudio
+except ImportError:
+    miniaudio = None
+
+TAG = __name__
+logger = setup_logging()
+
+SAMPLE_RATE = 16000
+MINIAUDIO_FORMATS = ("mp3", "flac", "ogg")
+
+# 各解码方式的使用次数（stream 为边接收边解码）
+_stats = {"wav": 0, "miniaudio": 0, "ffmpeg": 0, "stream": 0}
+
+
+def decode_to_pcm(source, file_type: str) -> bytes:
+    """
+    解码音频为16kHz单声道16位小端PCM
+
+    Args:
+        source: 音频文件路径或二进制数据
+        file_type: 音频格式（文件后缀，如 wav、mp3）
+
+    Returns:
+        PCM数据
+    """
+    file_type = (file_type or "").lower().lstrip(".")
+    if isinstance(source, (bytearray, memoryview)):
+        source = bytes(source)
+
+    if file_type == "wav":
+        try:
+            pcm = _decode_wav(source)
+            _stats["wav"] += 1
+            return pcm
+        except (wave.Error, EOFError, ValueError) as e:
+            # 浮点、扩展格式等 wave 不支持的 WAV
+            logger.bind(tag=TAG).debug(f"WAV 进程内解码失败，使用 ffmpeg: {e}")
+    elif miniaudio is not None and file_type in MINIAUDIO_FORMATS:
+        try:
+            pcm = _decode_miniaudio(source)
+            _stats["miniaudio"] += 1
+            return pcm
+        except miniaudio.DecodeError as e:
+            logger.bind(tag=TAG).debug(f"{file_type} 进程内解码失败，使用 ffmpeg: {e}")
+
+    _stats["ffmpeg"] += 1
+    return _decode_ffmpeg(source, file_type)
+
+
+def get_decode_stats() -> dict:
+    """各解码方式的使用次数"""
+    return dict(_stats)
+
+
+def _decode_wav(source) -> bytes:
+    with wave.open(BytesIO(source) if isinstance(source, bytes) else source, "rb") as wav:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        frame_rate = wav.getframerate()
+        raw = wav.readframes(wav.getnframes())
+
+    samples = _to_int16(raw, sample_width)
+    if channels > 1:
+        samples = samples[: len(samples) // channels * channels].reshape(-1, channels)
+        samples = samples.mean(axis=1)
+    return _resample(samples, frame_rate).tobytes()
+
+
+def _to_int16(raw: bytes, sample_width: int) -> np.ndarray:
+    """按位深转换为16位采样"""
+    if sample_width == 1:
+        # 8位 WAV 为无符号数
+        return (np.frombuffer(raw, dtype=np.uint8).astype(np.int16) - 128) << 8
+    if sample_width == 2:
+        return np.frombuffer(raw, dtype="<i2")
+    if sample_width == 3:
+        data = np.frombuffer(raw[: len(raw) // 3 * 3], dtype=np.uint8).reshape(-1, 3)
+        return ((data[:, 2].astype(np.int8).astype(np.int16) << 8) | data[:, 1]).astype(np.int16)
+    if sample_width == 4:
+        return (np.frombuffer(raw, dtype="<i4") >> 16).astype(np.int16)
+    raise ValueError(f"不支持的位深: {sample_width * 8}位")
+
+
+def _resample(samples: np.ndarray, frame_rate: int) -> np.ndarray:
+    """线性插值重采样到16kHz"""
+    if frame_rate != SAMPLE_RATE and len(samples):
+        count = int(len(samples) * SAMPLE_RATE / frame_rate)
+        positions = np.arange(count) * (frame_rate / SAMPLE_RATE)
+        samples = np.interp(positions, np.arange(len(samples)), samples)
+    if samples.dtype == np.int16:
+        return samples
+    return np.round(samples).astype("<i2")
+
+
+def _decode_miniaudio(source) -> bytes:
+    options = dict(output_format=miniaudio.SampleFormat.SIGNED16, nchannels=1, sample_rate=SAMPLE_RATE)
+    if isinstance(source, bytes):
+        decoded = miniaudio.decode(source, **options)
+    else:
+        decoded = miniaudio.decode_file(source, **options)
+    return decoded.samples.tobytes()
+
+
+def _decode_ffmpeg(source, file_type: str) -> bytes:
+    # -nostdin 参数：不要从标准输入读取数据，否则FFmpeg会阻塞
+    audio = AudioSegment.from_file(
+        BytesIO(source) if isinstance(source, bytes) else source,
+        format=file_type or None,
+        parameters=["-nostdin"],
+    )
+    audio = audio.set_channels(1).set_frame_rate(SAMPLE_RATE).set_sample_width(2)
+    return audio.raw_data
+
+
+class _StreamResampler:
+    """分块线性插值重采样到16kHz，块之间保留插值位置，结果与整体重采样一致"""
+
+    def __init__(self, frame_rate: int):
+        self.step = frame_rate / SAMPLE_RATE
+        self.position = 0.0  # 下一个输出采样在当前块中的位置
+        self.last = None  # 上一块的最后一个采样
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        if self.step == 1 or len(samples) == 0:
+            return samples
+        if self.last is not None:
+            samples = np.concatenate(([self.last], samples))
+        end = len(samples) - 1
+        count = int((end - self.position) / self.step) + 1 if self.position <= end else 0
+        positions = self.position + np.arange(count) * self.step
+        self.position += count * self.step - end
+        self.last = samples[-1]
+        return np.interp(positions, np.arange(len(samples)), samples)
+
+
+class _WavStreamParser:
+    """解析流式 WAV：先读取头部，之后的数据块直接转换（数据长度字段可以是占位值）"""
+
+    def __init__(self):
+        self.header = bytearray()
+        self.format = None  # (声道数, 位深字节, 采样率)
+        self.remainder = b""
+        self.resampler = None
+
+    def feed(self, chunk: bytes) -> bytes:
+        if self.format is None:
+            self.header += chunk
+            data = self._parse_header()
+            if data is None:
+                return b""
+            chunk = data
+        channels, sample_width, _ = self.format
+        block = channels * sample_width
+        chunk = self.remainder + chunk
+        usable = len(chunk) // block * block
+        self.remainder = chunk[usable:]
+        samples = _to_int16(chunk[:usable], sample_width)
+        if channels > 1:
+            samples = samples.reshape(-1, channels).mean(axis=1)
+        samples = self.resampler.process(samples)
+        if samples.dtype != np.int16:
+            samples = np.round(samples).astype("<i2")
+        return samples.tobytes()
+
+    def _parse_header(self):
+        """头部完整时返回 data 块中已收到的数据，否则返回 None"""
+        header = bytes(self.header)
+        if len(header) < 12:
+            return None
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            raise ValueError("不是 WAV 数据")
+        offset = 12
+        fmt = None
+        while len(header) >= offset + 8:
+            chunk_id, size = header[offset: offset + 4], struct.unpack("<I", header[offset + 4: offset + 8])[0]
+            if chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("WAV 缺少 fmt 块")
+                self.format = fmt
+                self.resampler = _StreamResampler(fmt[2])
+                self.header = None
+                return header[offset + 8:]
+            if len(header) < offset + 8 + size:
+                return None
+            if chunk_id == b"fmt ":
+                format_tag, channels, frame_rate = struct.unpack("<HHI", header[offset + 8: offset + 16])
+                bits = struct.unpack("<H", header[offset + 22: offset + 24])[0]
+                if format_tag == 0xFFFE and size >= 26:
+                    format_tag = struct.unpack("<H", header[offset + 32: offset + 34])[0]
+                if format_tag != 1 or bits not in (8, 16, 24, 32):
+                    raise ValueError(f"不支持的 WAV 编码: {format_tag}，{bits}位")
+                fmt = (channels, bits // 8, frame_rate)
+            offset += 8 + size + (size & 1)
+        return None
+
+
+# MP3 第三层的比特率表（kbps），MPEG-1 和 MPEG-2/2.5
+_MP3_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _mp3_frame_length(header: bytes):
+    """MP3 帧头对应的帧长度，不是第三层帧头时返回 None"""
+    if header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version, layer = (header[1] >> 3) & 0x03, (header[1] >> 1) & 0x03
+    bitrate_index, rate_index, padding = header[2] >> 4, (header[2] >> 2) & 0x03, (header[2] >> 1) & 0x01
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _MP3_BITRATES[3 if version == 3 else 2][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    return (144 if version == 3 else 72) * bitrate // sample_rate + padding
+
+
+class _Mp3FrameSource(miniaudio.StreamableSource if miniaudio else object):
+    """
+    miniaudio 解码器的数据源：只交给解码器完整的 MP3 帧，没有完整帧时阻塞等待
+    （解码器读到半帧时会丢帧或初始化失败）
+    """
+
+    def __init__(self):
+        self.chunks = queue.Queue()
+        self.buffer = bytearray()
+        self.frame_remaining = 0  # 缓冲区开头属于已部分读取的帧的字节数
+        self.synced = False  # 是否已交给解码器足够同步帧头的数据
+        self.ended = False
+
+    def read(self, num_bytes: int) -> bytes:
+        while True:
+            ends = self._frame_ends()
+            if self.ended:
+                size = min(len(self.buffer), num_bytes)
+                break
+            complete = [end for end in ends if end <= len(self.buffer)]
+            # 解码器只要很少的数据时（如探测文件头）可以只给一帧的一部分
+            if len(complete) >= (1 if self.synced else 3):
+                size = min(complete[-1], num_bytes)
+                self.synced = self.synced or size == complete[-1]
+                break
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.ended = True
+            else:
+                self.buffer += chunk
+
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        next_end = next((end for end in ends if end >= size), size)
+        self.frame_remaining = next_end - size
+        return data
+
+    def _frame_ends(self) -> list:
+        """缓冲区中各帧（含 ID3 标签）的结束位置，无法识别帧头时返回整个缓冲区"""
+        ends = []
+        offset = self.frame_remaining
+        if offset:
+            ends.append(offset)
+        elif self.buffer[:3] == b"ID3":
+            if len(self.buffer) < 10:
+                return ends
+            size = self.buffer[6] << 21 | self.buffer[7] << 14 | self.buffer[8] << 7 | self.buffer[9]
+            offset = 10 + size
+            ends.append(offset)
+        while offset + 4 <= len(self.buffer):
+            length = _mp3_frame_length(self.buffer[offset: offset + 4])
+            if length is None:
+                # 无法识别的数据，交给解码器自行同步
+                return ends + [len(self.buffer)]
+            offset += length
+            ends.append(offset)
+        return ends
+
+
+class AudioStreamDecoder:
+    """
+    边接收边解码流式返回的音频
+
+    feed() 放入收到的数据，解码出的16kHz单声道16位PCM通过 callback 输出；finish() 表示数据结束并等待解码完成。
+    WAV 直接解析数据块；MP3 由 miniaudio 在单独的线程中解码（解码器从队列拉取完整的帧）；
+    其他格式（或未安装 miniaudio）在 finish() 时整体解码
+    """
+
+    def __init__(self, file_type: str, callback):
+        self.file_type = (file_type or "").lower().lstrip(".")
+        self.callback = callback
+        self.buffered = None  # 整体解码时缓存的数据
+        self.wav = None
+        self.source = None
+        self.thread = None
+        self.error = None
+
+        if self.file_type == "wav":
+            self.wav = _WavStreamParser()
+        elif miniaudio is not None and self.file_type == "mp3":
+            self.source = _Mp3FrameSource()
+            self.thread = threading.Thread(target=self._decode_loop, daemon=True)
+            self.thread.start()
+        else:
+            self.buffered = bytearray()
+
+    def feed(self, chunk: bytes):
+        if not chunk:
+            return
+        if self.error is not None:
+            raise self.error
+        if self.wav is not None:
+            try:
+                pcm = self.wav.feed(chunk)
+            except ValueError as e:
+                # wave 不支持的格式，改为整体解码
+                logger.bind(tag=TAG).debug(f"WAV 无法边接收边解码: {e}")
+                self.buffered = bytearray(self.wav.header or b"")
+                self.wav = None
+                return
+            if pcm:
+                self.callback(pcm)
+        elif self.source is not None:
+            self.source.chunks.put(bytes(chunk))
+        else:
+            self.buffered += chunk
+
+    def finish(self):
+        """数据结束，输出剩余PCM"""
+        if self.source is not None:
+            self.close()
+            if self.error is not None:
+                raise self.error
+            _stats["stream"] += 1
+        elif self.wav is not None:
+            _stats["stream"] += 1
+        elif self.buffered:
+            self.callback(decode_to_pcm(bytes(self.buffered), self.file_type))
+            self.buffered = None
+
+    def close(self):
+        """结束解码线程（出错中断时也要调用）"""
+        if self.thread is not None:
+            self.source.chunks.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _decode_loop(self):
+        try:
+            stream = miniaudio.stream_any(
+                self.source,
+                source_format=miniaudio.FileFormat.MP3,
+                output_format=miniaudio.SampleFormat.SIGNED16,
+                nchannels=1,
+                sample_rate=SAMPLE_RATE,
+                frames_to_read=SAMPLE_RATE * 60 // 1000,
+            )
+            for samples in stream:
+                self.callback(samples.tobytes())
+        except Exception as e:
+            # 下一次 feed() 或 finish() 时抛出
+            self.error = e
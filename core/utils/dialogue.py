@@ -1,5 +1,6 @@
 import uuid
 import re
+from collections import deque
 from typing import List, Dict
 from datetime import datetime
 
@@ -116,3 +117,125 @@ class Dialogue:
                 self.getMessages(m, dialogue)
 
         return dialogue
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数：中日韩字符约1个token，其余字符约4个一个token"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if "\u2e80" <= ch <= "\u9fff" or "\uf900" <= ch <= "\ufaff")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class SlidingWindowDialogue(Dialogue):
+    """
+    有token预算的滑动窗口对话
+
+    只保留最近 max_turns 轮且总token不超过 max_tokens 的对话，
+    更早的对话被移出窗口并折叠进一段长度受限的滚动摘要（附加在系统提示词后），
+    因此长时间运行时每次请求的提示词大小和内存占用都保持稳定。
+    """
+
+    SUMMARY_LINE_CHARS = 40  # 摘要中每条消息保留的最大字符数
+    EVICTED_BUFFER_SIZE = 64  # 等待LLM摘要的移出消息最多保留条数
+
+    def __init__(self, max_turns: int = 10, max_tokens: int = 1500, summary_max_chars: int = 300):
+        super().__init__()
+        self.max_messages = max(2, max_turns * 2)  # 一轮 = 一问一答
+        self.max_tokens = max_tokens
+        self.summary_max_chars = summary_max_chars
+
+        self._tokens: Dict[str, int] = {}  # uniq_id -> token数
+        self._window_tokens = 0
+        self._window_count = 0
+
+        self.summary = ""  # 滚动摘要（LLM摘要 + 之后的抽取式摘要行）
+        self.llm_summary = ""  # 最近一次LLM摘要（不参与裁剪）
+        self._summary_lines = deque()  # 抽取式摘要行
+        self._summary_chars = 0
+        self.evicted_since_summary = deque(maxlen=self.EVICTED_BUFFER_SIZE)  # 上次LLM摘要后移出窗口的消息
+        self.evicted_total = 0  # 累计移出窗口的消息数（生成LLM摘要前记录，用于区分摘要期间新移出的消息）
+
+    def put(self, message: Message):
+        super().put(message)
+        if message.role == "system":
+            return
+        tokens = estimate_tokens(message.content or "")
+        self._tokens[message.uniq_id] = tokens
+        self._window_tokens += tokens
+        self._window_count += 1
+        self._trim()
+
+    def _trim(self):
+        """按轮数和token预算移出最早的消息（始终保留最新一条）"""
+        while self._window_count > 1 and (
+            self._window_count > self.max_messages or self._window_tokens > self.max_tokens
+        ):
+            index = next(i for i, m in enumerate(self.dialogue) if m.role != "system")
+            message = self.dialogue.pop(index)
+            self._window_tokens -= self._tokens.pop(message.uniq_id, 0)
+            self._window_count -= 1
+            self._fold_into_summary(message)
+
+    def _fold_into_summary(self, message: Message):
+        """将移出窗口的消息压缩为一行摘要"""
+        content = (message.content or "").strip().replace("\n", " ")
+        if not content or message.role not in ("user", "assistant"):
+            return
+        if len(content) > self.SUMMARY_LINE_CHARS:
+            content = content[: self.SUMMARY_LINE_CHARS] + "…"
+        line = content if message.role == "user" else f"助手: {content}"
+        self.evicted_since_summary.append(line)
+        self.evicted_total += 1
+        self._append_summary_line(line)
+
+    def _append_summary_line(self, line: str):
+        """追加一行抽取式摘要，超出长度时丢弃最早的行（LLM摘要不会被丢弃）"""
+        self._summary_lines.append(line)
+        self._summary_chars += len(line) + 1
+        while self._summary_lines and self._summary_chars > self.summary_max_chars:
+            self._summary_chars -= len(self._summary_lines.popleft()) + 1
+        self._update_summary()
+
+    def _update_summary(self):
+        self.summary = "\n".join([self.llm_summary, *self._summary_lines] if self.llm_summary else self._summary_lines)
+
+    def set_summary(self, summary: str, summarized_total: int = None):
+        """
+        用外部生成的摘要（如LLM摘要）替换抽取式摘要
+
+        LLM摘要单独保存，之后移出窗口的消息仍按抽取式摘要行追加在其后，
+        超出 summary_max_chars 时只裁剪这些抽取式摘要行。
+
+        Args:
+            summary: 新摘要
+            summarized_total: 生成摘要前的 evicted_total。生成摘要期间新移出的消息不在摘要中，
+                保留在 evicted_since_summary 并重新追加为抽取式摘要行；None 表示摘要已包含全部移出的消息
+        """
+        newer = 0 if summarized_total is None else max(0, self.evicted_total - summarized_total)
+        pending = list(self.evicted_since_summary)[-newer:] if newer else []
+
+        self.llm_summary = (summary or "").strip()[: self.summary_max_chars]
+        self._summary_lines = deque()
+        self._summary_chars = 0
+        self.evicted_since_summary.clear()
+        self._update_summary()
+        for line in pending:
+            self.evicted_since_summary.append(line)
+            self._append_summary_line(line)
+
+    def get_llm_dialogue_with_memory(
+        self, memory_str: str = None, voiceprint_config: dict = None
+    ) -> List[Dict[str, str]]:
+        dialogue = super().get_llm_dialogue_with_memory(memory_str, voiceprint_config)
+        if self.summary and dialogue and dialogue[0]["role"] == "system":
+            dialogue[0]["content"] += f"\n\n<history_summary>\n{self.summary}\n</history_summary>"
+        return dialogue
+
+    def get_window_stats(self) -> Dict[str, int]:
+        """获取窗口统计信息"""
+        return {
+            "messages": self._window_count,
+            "tokens": self._window_tokens,
+            "summary_chars": len(self.summary),
+        }
@@ -7,10 +7,14 @@ import gc
 import asyncio
 import threading
 from configs.logger import setup_logging
+from core.utils.metrics import REGISTRY
 
 TAG = __name__
 logger = setup_logging()
 
+GC_OBJECTS = REGISTRY.gauge("xiaozhi_gc_objects", "最近一次定时GC后的对象数")
+GC_COLLECTED = REGISTRY.counter("xiaozhi_gc_collected_total", "定时GC累计回收的对象数")
+
 
 class GlobalGCManager:
     """全局垃圾回收管理器"""
@@ -94,6 +98,8 @@ class GlobalGCManager:
                     return before, collected, after
 
             before, collected, after = await loop.run_in_executor(None, do_gc)
+            GC_OBJECTS.set(after)
+            GC_COLLECTED.inc(collected)
             logger.bind(tag=TAG).debug(
                 f"全局GC执行完成 - 回收对象: {collected}, "
                 f"对象数量: {before} -> {after}"
@@ -0,0 +1,265 @@
+"""
+运行指标
+轻量的指标注册表（计数器、仪表、直方图），以 Prometheus 文本格式通过现有 aiohttp 服务的 /metrics 接口输出，
+不依赖 prometheus_client。
+
+记录开销：
+    计数器/仪表的 inc/set 只是一次属性加法或赋值，直方图的 observe 为一次二分查找加列表自增，
+    都不加锁（多个线程同时更新时极少数更新可能丢失，对运行指标可以接受）。
+    队列长度等可随时读取的状态使用 set_function 注册回调，只在拉取指标时计算，热路径上没有开销。
+
+指标名统一以 xiaozhi_ 开头（如 xiaozhi_ws_*、xiaozhi_danmaku_*、xiaozhi_tts_cache_*）。
+
+用法：
+    from core.utils.metrics import REGISTRY
+    sent = REGISTRY.counter("xiaozhi_audio_frames_sent_total", "发送的音频帧数", ["room"])
+    room_sent = sent.labels("room_a")   # 热路径上应缓存子指标
+    room_sent.inc()
+"""
+
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 默认直方图桶（秒），覆盖从几毫秒的发送到十几秒的LLM生成
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Value:
+    """计数器/仪表的一个标签组合"""
+
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, function: Optional[Callable[[], float]]):
+        """拉取指标时调用 function 取值（function 抛出异常时该样本不输出）"""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            return float(self.function())
+        return self.value
+
+
+class _HistogramValue:
+    """直方图的一个标签组合"""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最后一个为 +Inf 桶
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+
+class _Metric:
+    """指标基类：按标签值缓存子指标，没有标签时指标本身即可直接记录"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._bind(self.labels())
+
+    def labels(self, *values, **kwargs):
+        """
+        获取标签组合对应的子指标（热路径上应缓存返回值）
+
+        Args:
+            values: 按 labelnames 顺序的标签值，或使用关键字参数
+        """
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        """删除标签组合（如直播间停止后）"""
+        self._children.pop(tuple(str(value) for value in values), None)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _bind(self, child):
+        """没有标签时把子指标的方法绑定到指标本身"""
+        raise NotImplementedError
+
+    def _samples(self) -> Iterable[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {_escape_help(self.documentation)}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """计数器（只增不减）"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def _bind(self, child):
+        self.inc = child.inc
+        self.set_function = child.set_function
+        self.get = child.get
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            try:
+                value = child.get()
+            except Exception:
+                continue
+            yield "", tuple(zip(self.labelnames, key)), value
+
+
+class Gauge(Counter):
+    """仪表（可增可减的当前值）"""
+
+    type_name = "gauge"
+
+    def _bind(self, child):
+        super()._bind(child)
+        self.dec = child.dec
+        self.set = child.set
+
+
+class Histogram(_Metric):
+    """直方图（累计分桶计数、总和、样本数）"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets if not math.isinf(b)))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.bounds)
+
+    def _bind(self, child):
+        self.observe = child.observe
+
+    def _samples(self):
+        for key, child in list(self._children.items()):
+            labels = tuple(zip(self.labelnames, key))
+            counts = list(child.counts)
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", labels + (("le", _format_value(bound)),), cumulative
+            yield "_sum", labels, child.sum
+            yield "_count", labels, cumulative
+
+
+class MetricsRegistry:
+    """指标注册表（同名指标重复注册时返回已有的指标）"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    async def handle_metrics(self, request):
+        """
+        aiohttp 处理函数
+
+        GET /metrics
+        """
+        return web.Response(body=self.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    def _register(self, metric_class, name, documentation, labelnames, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is not None:
+            if type(metric) is not metric_class or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"指标 {name} 已注册为不同的类型或标签")
+            return metric
+        metric = self._metrics[name] = metric_class(name, documentation, labelnames, **kwargs)
+        return metric
+
+
+# 全局注册表
+REGISTRY = MetricsRegistry()
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if value != value:
+        return "NaN"
+    if float(value).is_integer():
+        return f"{int(value)}"
+    return repr(float(value))
@@ -1,6 +1,7 @@
 from typing import Dict, Any
 from configs.logger import setup_logging
-from core.utils import tts, llm, intent, memory, vad, asr
+from core.utils import tts, llm, intent, memory, vad, asr, tts_pool, tts_cache
+from core.utils.metrics import REGISTRY
 
 TAG = __name__
 logger = setup_logging()
@@ -134,12 +135,21 @@ def initialize_tts(config):
     )
     new_tts = tts.create_instance(
         tts_type,
-        config["TTS"][select_tts_module],
+        # 全局的TTS请求超时时间，提供方配置中可单独设置
+        {"tts_timeout": config.get("tts_timeout", 10), **config["TTS"][select_tts_module]},
         str(config.get("delete_audio", True)).lower() in ("true", "1", "yes"),
     )
     return new_tts
 
 
+def initialize_tts_shared(config):
+    """初始化所有TTS实例共用的线程池和合成结果缓存，服务启动时调用一次"""
+    tts_pool.configure(config.get("tts_pool_workers"))
+    cache = tts_cache.configure(config.get("tts_cache"))
+    if cache is not None:
+        cache.register_metrics(REGISTRY)
+
+
 def initialize_asr(config):
     select_asr_module = config["selected_module"]["ASR"]
     asr_type = (
@@ -1,14 +1,89 @@
 """
 Opus编码工具类
 将PCM音频数据编码为Opus格式
+
+创建 Opus 编码器需要分配和初始化编码器状态，每段文字、每个连接都新建编码器开销较大。
+编码器用完后放回进程内共享的编码器池，下次取出时重置状态（保留比特率等参数），在TTS分段和连接之间复用。
 """
 
 import logging
+import threading
 import traceback
 import numpy as np
 from opuslib_next import Encoder
 from opuslib_next import constants
-from typing import Optional, Callable, Any
+from typing import Optional, Callable, Any, Dict, List, Tuple
+
+MAX_IDLE_ENCODERS = 64  # 每种参数最多保留的空闲编码器数
+
+
+class OpusEncoderPool:
+    """可复用的Opus编码器池（按采样率、声道和编码参数分组，线程安全）"""
+
+    def __init__(self, max_idle: int = MAX_IDLE_ENCODERS):
+        self.max_idle = max_idle
+        self._idle: Dict[Tuple, List[Encoder]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "discarded": 0}
+
+    def acquire(self, sample_rate: int, channels: int, application: int = constants.APPLICATION_AUDIO,
+                bitrate: Optional[int] = None, complexity: Optional[int] = None,
+                signal: Optional[int] = None) -> Encoder:
+        """
+        取出一个编码器（没有空闲的编码器时新建）
+
+        Args:
+            sample_rate: 采样率 (Hz)
+            channels: 通道数
+            application: 编码模式
+            bitrate, complexity, signal: 编码参数，None 为编码器默认值
+
+        Returns:
+            状态已重置的编码器，用完后调用 release() 放回
+        """
+        key = (sample_rate, channels, application, bitrate, complexity, signal)
+        with self._lock:
+            idle = self._idle.get(key)
+            encoder = idle.pop() if idle else None
+            if encoder is not None:
+                self.stats["reused"] += 1
+        if encoder is not None:
+            # 重置编码状态（比特率等参数保留），不同的音频流之间互不影响
+            encoder.reset_state()
+        else:
+            encoder = Encoder(sample_rate, channels, application)
+            if bitrate is not None:
+                encoder.bitrate = bitrate
+            if complexity is not None:
+                encoder.complexity = complexity
+            if signal is not None:
+                encoder.signal = signal
+            encoder.pool_key = key
+            with self._lock:
+                self.stats["created"] += 1
+        return encoder
+
+    def release(self, encoder: Encoder):
+        """放回编码器（空闲编码器超出上限时直接释放）"""
+        key = getattr(encoder, "pool_key", None)
+        if key is None:
+            return
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(encoder)
+            else:
+                self.stats["discarded"] += 1
+
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        with self._lock:
+            return {**self.stats, "idle": sum(len(idle) for idle in self._idle.values())}
+
+
+# 进程内共享的编码器池
+ENCODER_POOL = OpusEncoderPool()
+
 
 class OpusEncoderUtils:
     """PCM到Opus的编码器"""
@@ -34,17 +109,20 @@ class OpusEncoderUtils:
         self.bitrate = 24000  # bps
         self.complexity = 10  # 最高质量
 
-        # 缓冲区初始化为空
-        self.buffer = np.array([], dtype=np.int16)
+        # 预分配一帧大小的缓冲区，只保存不足一帧的剩余样本（不随输入长度增长，不重复分配和复制）
+        self.buffer = np.zeros(self.total_frame_size, dtype=np.int16)
+        self.buffered = 0
 
         try:
-            # 创建Opus编码器
-            self.encoder = Encoder(
-                sample_rate, channels, constants.APPLICATION_AUDIO  # 音频优化模式
+            # 从编码器池取出Opus编码器
+            self.encoder = ENCODER_POOL.acquire(
+                sample_rate,
+                channels,
+                constants.APPLICATION_AUDIO,  # 音频优化模式
+                bitrate=self.bitrate,
+                complexity=self.complexity,
+                signal=constants.SIGNAL_VOICE,  # 语音信号优化
             )
-            self.encoder.bitrate = self.bitrate
-            self.encoder.complexity = self.complexity
-            self.encoder.signal = constants.SIGNAL_VOICE  # 语音信号优化
         except Exception as e:
             logging.error(f"初始化Opus编码器失败: {e}")
             raise RuntimeError("初始化失败") from e
@@ -52,52 +130,56 @@ class OpusEncoderUtils:
     def reset_state(self):
         """重置编码器状态"""
         self.encoder.reset_state()
-        self.buffer = np.array([], dtype=np.int16)
+        self.buffered = 0
 
     def encode_pcm_to_opus_stream(self, pcm_data: bytes, end_of_stream: bool, callback: Callable[[Any], Any]):
         """
         将PCM数据编码为Opus格式，以流式方式进行处理
 
+        完整的帧直接从输入数据中编码，只有跨调用的不足一帧的样本经过缓冲区，每次调用的开销与输入长度成正比
+
         Args:
             pcm_data: PCM字节数据
             end_of_stream: 是否为流的结束,
             callback: opus处理方法
-
-        Returns:
-            Opus数据包列表
         """
-        # 将字节数据转换为short数组
-        new_samples = self._convert_bytes_to_shorts(pcm_data)
-
-        # 校验PCM数据
-        self._validate_pcm_data(new_samples)
-
-        # 将新数据追加到缓冲区
-        self.buffer = np.append(self.buffer, new_samples)
-
+        # 将字节数据转换为short数组（不复制）
+        samples = self._convert_bytes_to_shorts(pcm_data)
+        frame_size = self.total_frame_size
         offset = 0
 
+        # 先用新数据补满上次剩余的不完整帧
+        if self.buffered:
+            take = min(frame_size - self.buffered, len(samples))
+            self.buffer[self.buffered : self.buffered + take] = samples[:take]
+            self.buffered += take
+            offset = take
+            if self.buffered == frame_size:
+                self._emit(self.buffer, callback)
+                self.buffered = 0
+
         # 处理所有完整帧
-        while offset <= len(self.buffer) - self.total_frame_size:
-            frame = self.buffer[offset : offset + self.total_frame_size]
-            output = self._encode(frame)
-            if output:
-                callback(output)
-            offset += self.total_frame_size
+        while len(samples) - offset >= frame_size:
+            self._emit(samples[offset : offset + frame_size], callback)
+            offset += frame_size
 
         # 保留未处理的样本
-        self.buffer = self.buffer[offset:]
+        remaining = len(samples) - offset
+        if remaining:
+            self.buffer[:remaining] = samples[offset:]
+            self.buffered = remaining
 
         # 流结束时处理剩余数据
-        if end_of_stream and len(self.buffer) > 0:
-            # 创建最后一帧并用0填充
-            last_frame = np.zeros(self.total_frame_size, dtype=np.int16)
-            last_frame[: len(self.buffer)] = self.buffer
+        if end_of_stream and self.buffered:
+            # 最后一帧用0填充
+            self.buffer[self.buffered :] = 0
+            self._emit(self.buffer, callback)
+            self.buffered = 0
 
-            output = self._encode(last_frame)
-            if output:
-                callback(output)
-            self.buffer = np.array([], dtype=np.int16)
+    def _emit(self, frame: np.ndarray, callback: Callable[[Any], Any]):
+        output = self._encode(frame)
+        if output:
+            callback(output)
 
     def _encode(self, frame: np.ndarray) -> Optional[bytes]:
         """编码一帧音频数据"""
@@ -120,20 +202,9 @@ class OpusEncoderUtils:
         # 假设输入是小端字节序的16位PCM
         return np.frombuffer(bytes_data, dtype=np.int16)
 
-    def _validate_pcm_data(self, pcm_shorts: np.ndarray) -> None:
-        """验证PCM数据是否有效"""
-        # 16位PCM数据范围是 -32768 到 32767
-        if np.any((pcm_shorts < -32768) | (pcm_shorts > 32767)):
-            invalid_samples = pcm_shorts[(pcm_shorts < -32768) | (pcm_shorts > 32767)]
-            logging.warning(f"发现无效PCM样本: {invalid_samples[:5]}...")
-            # 在实际应用中可以选择裁剪而不是抛出异常
-            # np.clip(pcm_shorts, -32768, 32767, out=pcm_shorts)
-
     def close(self):
-        """关闭编码器并释放资源"""
-        if hasattr(self, 'encoder') and self.encoder:
-            try:
-                del self.encoder
-                self.encoder = None
-            except Exception as e:
-                logging.error(f"Error releasing Opus encoder: {e}")
\ No newline at end of file
+        """关闭编码器，放回编码器池"""
+        encoder = getattr(self, "encoder", None)
+        if encoder is not None:
+            self.encoder = None
+            ENCODER_POOL.release(encoder)
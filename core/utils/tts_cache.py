@@ -0,0 +1,340 @@
+"""
+TTS 合成结果缓存
+直播和对话中相同的句子（开场白、欢迎语、反复出现的回复）会被反复合成。
+按（提供方、提供方 cache_params() 返回的音色/语速等参数、归一化后的文本）的哈希缓存编码好的 Opus 帧，命中时不请求提供方，直接播放。
+
+两级缓存：
+    1. 内存：LRU，按字节数限制大小
+    2. 磁盘：每个条目一个文件，进程重启后仍可命中；超出大小上限时按最后使用时间淘汰。
+       写入时先写临时文件再原子替换，多个工作进程共用同一目录也不会读到写了一半的文件
+
+缓存在共享线程池的多个线程中使用，内部加锁。
+"""
+
+import os
+import re
+import json
+import struct
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from configs.logger import setup_logging
+
+TAG = __name__
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+_FILE_MAGIC = b"TTSC1"
+_PACKET_HEADER = struct.Struct("<H")
+_DISK_EVICT_RATIO = 0.8  # 磁盘超出上限时淘汰到上限的80%，避免每次写入都扫描目录
+
+
+def normalize_tts_text(text: str) -> str:
+    """
+    归一化待合成文本：全角转半角、去除首尾空白、合并连续空白
+
+    不去除标点（标点影响停顿和语调）
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+class TTSCache:
+    """TTS 缓存（内存 LRU + 磁盘）"""
+
+    def __init__(self, config: Dict[str, Any] = None):
+        """
+        初始化TTS缓存
+
+        Args:
+            config: 缓存配置（tts_cache）
+        """
+        config = config or {}
+        self.max_memory_bytes = int(float(config.get("max_memory_mb", 64)) * 1024 * 1024)
+        self.max_text_length = int(config.get("max_text_length", 50))  # 只缓存较短的句子，0 为不限制
+        self.cache_dir = config.get("dir", "data/tts_cache") if config.get("disk", False) else None
+        self.max_disk_bytes = int(float(config.get("max_disk_mb", 512)) * 1024 * 1024)
+        self.logger = setup_logging()
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, List[bytes]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+
+        # 统计信息
+        self.stats = {
+            "hits_memory": 0,
+            "hits_disk": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions_memory": 0,
+            "evictions_disk": 0,
+            "disk_errors": 0,
+        }
+
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self.disk_bytes = sum(size for _, size, _ in self._scan_disk())
+            except OSError as e:
+                self.logger.bind(tag=TAG).warning(f"TTS磁盘缓存目录不可用，仅使用内存缓存: {e}")
+                self.cache_dir = None
+
+    def make_key(self, tts, text: str) -> Optional[str]:
+        """
+        生成缓存键
+
+        Args:
+            tts: TTS提供方实例
+            text: 待合成文本
+
+        Returns:
+            缓存键，文本为空或过长、提供方不参与缓存时返回 None
+        """
+        text = normalize_tts_text(text)
+        if not text or (self.max_text_length and len(text) > self.max_text_length):
+            return None
+        params = tts.cache_params()
+        if params is None:
+            return None
+        provider = f"{type(tts).__module__}.{type(tts).__qualname__}"
+        payload = json.dumps([provider, params, text], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[bytes]]:
+        """
+        查询缓存（先查内存，再查磁盘，磁盘命中后放入内存）
+
+        Returns:
+            Opus音频帧列表，未命中返回 None
+        """
+        with self._lock:
+            packets = self._entries.get(key)
+            if packets is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits_memory"] += 1
+                return packets
+
+        packets = self._read_disk(key)
+        with self._lock:
+            if packets is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits_disk"] += 1
+            self._put_memory(key, packets)
+        return packets
+
+    def put(self, key: str, opus_packets: List[bytes]):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            opus_packets: 完整一句的Opus音频帧
+        """
+        if not key or not opus_packets:
+            return
+        packets = list(opus_packets)
+        with self._lock:
+            self._put_memory(key, packets)
+            self.stats["stores"] += 1
+        self._write_disk(key, packets)
+
+    def clear(self):
+        """清空内存缓存（不删除磁盘文件）"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.memory_bytes = 0
+
+    def get_stats(self) -> dict:
+        """获取统计信息"""
+        with self._lock:
+            hits = self.stats["hits_memory"] + self.stats["hits_disk"]
+            lookups = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "memory_bytes": self.memory_bytes,
+                "disk_bytes": self.disk_bytes,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def register_metrics(self, registry):
+        """注册缓存命中率和大小指标"""
+        lookups = registry.counter("xiaozhi_tts_cache_lookups_total", "TTS缓存查询次数", ["result"])
+        for result, stat in (("hit_memory", "hits_memory"), ("hit_disk", "hits_disk"), ("miss", "misses")):
+            lookups.labels(result).set_function(lambda stat=stat: self.stats[stat])
+        evictions = registry.counter("xiaozhi_tts_cache_evictions_total", "TTS缓存淘汰的条目数", ["tier"])
+        for tier in ("memory", "disk"):
+            evictions.labels(tier).set_function(lambda tier=tier: self.stats[f"evictions_{tier}"])
+        size = registry.gauge("xiaozhi_tts_cache_bytes", "TTS缓存占用的字节数", ["tier"])
+        size.labels("memory").set_function(lambda: self.memory_bytes)
+        size.labels("disk").set_function(lambda: self.disk_bytes)
+
+    def _put_memory(self, key: str, packets: List[bytes]):
+        """写入内存缓存，超出字节数上限时淘汰最久未使用的条目（调用方持有锁）"""
+        size = sum(len(packet) for packet in packets)
+        if size > self.max_memory_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = packets
+        self._sizes[key] = size
+        self.memory_bytes += size
+        while self.memory_bytes > self.max_memory_bytes:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions_memory"] += 1
+
+    def _remove(self, key: str):
+        del self._entries[key]
+        self.memory_bytes -= self._sizes.pop(key, 0)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.opus")
+
+    def _read_disk(self, key: str) -> Optional[List[bytes]]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            packets = self._unpack(data)
+            # 更新修改时间，磁盘淘汰按最后使用时间
+            os.utime(path)
+            return packets
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.bind(tag=TAG).warning(f"TTS磁盘缓存读取失败，已删除: {path}，错误: {e}")
+            self.stats["disk_errors"] += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def _write_disk(self, key: str, packets: List[bytes]):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        data = self._pack(packets)
+        if len(data) > self.max_disk_bytes:
+            return
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            existed = os.path.exists(path)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.logger.bind(tag=TAG).warning(f"TTS磁盘缓存写入失败: {e}")
+            self.stats["disk_errors"] += 1
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            if not existed:
+                self.disk_bytes += len(data)
+            over_limit = self.disk_bytes > self.max_disk_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _scan_disk(self):
+        """遍历磁盘缓存文件，返回 [(路径, 大小, 修改时间)]"""
+        files = []
+        for sub_dir in os.scandir(self.cache_dir):
+            if not sub_dir.is_dir():
+                continue
+            for entry in os.scandir(sub_dir.path):
+                if entry.name.endswith(".opus"):
+                    stat = entry.stat()
+                    files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _evict_disk(self):
+        """按最后使用时间淘汰磁盘缓存，直到低于上限的80%"""
+        try:
+            files = sorted(self._scan_disk(), key=lambda item: item[2])
+        except OSError as e:
+            self.logger.bind(tag=TAG).warning(f"TTS磁盘缓存淘汰失败: {e}")
+            return
+        total = sum(size for _, size, _ in files)
+        target = self.max_disk_bytes * _DISK_EVICT_RATIO
+        removed = 0
+        for path, size, _ in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self.disk_bytes = total
+            self.stats["evictions_disk"] += removed
+
+    @staticmethod
+    def _pack(packets: List[bytes]) -> bytes:
+        """文件格式：标识 + 每帧（2字节长度 + 数据）"""
+        parts = [_FILE_MAGIC]
+        for packet in packets:
+            parts.append(_PACKET_HEADER.pack(len(packet)))
+            parts.append(packet)
+        return b"".join(parts)
+
+    @staticmethod
+    def _unpack(data: bytes) -> List[bytes]:
+        if not data.startswith(_FILE_MAGIC):
+            raise ValueError("文件标识不正确")
+        packets = []
+        offset = len(_FILE_MAGIC)
+        while offset < len(data):
+            if offset + _PACKET_HEADER.size > len(data):
+                raise ValueError("文件不完整")
+            (length,) = _PACKET_HEADER.unpack_from(data, offset)
+            offset += _PACKET_HEADER.size
+            if offset + length > len(data):
+                raise ValueError("文件不完整")
+            packets.append(data[offset: offset + length])
+            offset += length
+        if not packets:
+            raise ValueError("没有音频帧")
+        return packets
+
+
+_cache: Optional[TTSCache] = None
+_cache_lock = threading.Lock()
+
+
+def configure(config: Dict[str, Any] = None) -> Optional[TTSCache]:
+    """
+    按配置创建全局缓存（首次调用有效，多个直播间共用同一个缓存）
+
+    Returns:
+        缓存实例，未启用时返回 None
+    """
+    global _cache
+    config = config or {}
+    if not config.get("enabled", False):
+        return _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSCache(config)
+    return _cache
+
+
+def get_cache() -> Optional[TTSCache]:
+    """获取全局缓存，未启用时返回 None"""
+    return _cache
@@ -0,0 +1,223 @@
+"""
+TTS 共享线程池和队列
+所有连接的 TTS 处理都在各自事件循环的任务中进行，只有阻塞的合成请求和音频编解码交给进程内共享的有界线程池，
+线程数与连接数无关（空闲连接不占用线程）。
+
+LoopQueue 兼容 queue.Queue 的同步接口（流式 TTS 提供方的线程、LLM 线程仍可直接 put/get），
+同时提供不轮询的 get_async() 供事件循环中的任务等待。
+
+线程中执行提供方的异步合成（text_to_speak）使用 run_coroutine()：每个线程保留一个长期的事件循环，
+不再每段文字 asyncio.run() 新建和销毁事件循环；get_http_session() 返回绑定在该事件循环上的共享 HTTP 会话，
+HTTP 连接在多段文字之间复用。直播间空闲时 warm_http_sessions() 让各线程的会话保持到TTS服务的连接。
+"""
+
+import queue
+import atexit
+import asyncio
+import threading
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 32
+HTTP_KEEPALIVE = 120  # 空闲HTTP连接的保持时间（秒），大于预热间隔，预热建立的连接可保持到下一次预热
+
+_executor = None
+_max_workers = DEFAULT_WORKERS
+_lock = threading.Lock()
+_thread_local = threading.local()
+_thread_loops = []  # 所有线程的事件循环，进程退出时统一关闭
+_loop_stats = {"created": 0, "runs": 0}
+
+
+def configure(max_workers=None):
+    """设置线程池大小（线程池创建前调用有效）"""
+    global _max_workers
+    if max_workers:
+        _max_workers = max(1, int(max_workers))
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """获取共享线程池（首次使用时创建）"""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_max_workers, thread_name_prefix="tts")
+    return _executor
+
+
+async def run_blocking(func, *args):
+    """在共享线程池中执行阻塞函数"""
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+
+
+class _ThreadLoop:
+    """一个线程的长期事件循环及其上的共享 HTTP 会话"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.session = None
+        self.pooled = threading.current_thread().name.startswith("tts")  # 是否为共享线程池的线程
+        with _lock:
+            _thread_loops.append(self)
+            _loop_stats["created"] += 1
+
+    def close(self):
+        if self.loop.is_closed():
+            return
+        try:
+            if self.session is not None and not self.session.closed:
+                self.loop.run_until_complete(self.session.close())
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        finally:
+            self.loop.close()
+            with _lock:
+                if self in _thread_loops:
+                    _thread_loops.remove(self)
+
+
+def run_coroutine(coro):
+    """
+    在当前线程的长期事件循环中执行协程（代替 asyncio.run）
+
+    首次调用时为线程创建事件循环，之后复用；只能在没有运行中事件循环的线程（线程池、流式提供方的线程）中调用
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        coro.close()
+        raise RuntimeError("run_coroutine() 不能在运行中的事件循环里调用")
+
+    thread_loop = getattr(_thread_local, "loop", None)
+    if thread_loop is None or thread_loop.loop.is_closed():
+        thread_loop = _thread_local.loop = _ThreadLoop()
+    _loop_stats["runs"] += 1
+    asyncio.set_event_loop(thread_loop.loop)
+    return thread_loop.loop.run_until_complete(coro)
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """获取当前线程事件循环上的共享 HTTP 会话（保持连接，多段文字之间复用）"""
+    thread_loop = getattr(_thread_local, "loop", None)
+    if thread_loop is None or thread_loop.loop is not asyncio.get_running_loop():
+        raise RuntimeError("get_http_session() 只能在 run_coroutine() 执行的协程中调用")
+    # 线程空闲时事件循环不运行，先处理积压的连接关闭事件，避免复用已被服务端关闭的连接
+    for _ in range(3):
+        await asyncio.sleep(0)
+    if thread_loop.session is None or thread_loop.session.closed:
+        thread_loop.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(keepalive_timeout=HTTP_KEEPALIVE))
+    return thread_loop.session
+
+
+async def warm_http_sessions(url: str, timeout: float = 5.0) -> int:
+    """
+    在线程池中每个已有 HTTP 会话的线程上请求一次 url（HEAD），建立或保持到该服务的连接
+
+    会话按线程区分，用屏障让每个请求占用不同的线程；还没有线程创建会话时只预热一个线程。
+    在事件循环中调用，不要在线程池的线程中调用
+
+    Returns:
+        建立了连接的线程数（服务返回任何状态码都算连接成功）
+    """
+    with _lock:
+        count = sum(1 for thread_loop in _thread_loops if thread_loop.pooled and thread_loop.session is not None)
+    count = min(max(count, 1), _max_workers)
+    barrier = threading.Barrier(count)
+
+    async def head():
+        session = await get_http_session()
+        async with session.head(url, timeout=aiohttp.ClientTimeout(total=timeout)):
+            pass
+
+    def warm():
+        try:
+            barrier.wait(timeout)
+        except threading.BrokenBarrierError:
+            pass  # 线程池忙时部分请求可能落在同一线程，只是少预热几个会话
+        run_coroutine(head())
+
+    results = await asyncio.gather(*(run_blocking(warm) for _ in range(count)), return_exceptions=True)
+    return sum(1 for result in results if not isinstance(result, BaseException))
+
+
+def close_thread_loop():
+    """关闭当前线程的事件循环和 HTTP 会话（线程退出前调用）"""
+    thread_loop = getattr(_thread_local, "loop", None)
+    if thread_loop is not None:
+        _thread_local.loop = None
+        thread_loop.close()
+
+
+@atexit.register
+def _close_all_loops():
+    """进程退出时关闭线程池线程的事件循环（线程池线程此时已结束）"""
+    for thread_loop in list(_thread_loops):
+        try:
+            thread_loop.close()
+        except Exception:
+            pass
+
+
+def get_loop_stats() -> dict:
+    """事件循环统计：created 为创建的事件循环数，runs 为执行的协程数"""
+    return dict(_loop_stats)
+
+
+class LoopQueue(queue.Queue):
+    """可在任意线程 put、在事件循环中 await get_async() 的队列"""
+
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self._loop = None
+        self._loop_thread = None
+        self._waiter = None  # 事件循环中等待数据的事件
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        waiter = self._waiter
+        if waiter is None or waiter.is_set():
+            return
+        if threading.get_ident() == self._loop_thread:
+            waiter.set()
+        else:
+            try:
+                self._loop.call_soon_threadsafe(waiter.set)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+    async def get_async(self, timeout=None):
+        """
+        等待并取出一项
+
+        Args:
+            timeout: 最长等待秒数，None 为一直等待
+
+        Raises:
+            queue.Empty: 超时
+        """
+        try:
+            return self.get_nowait()
+        except queue.Empty:
+            pass
+        if self._waiter is None:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+            self._waiter = asyncio.Event()
+        deadline = None if timeout is None else self._loop.time() + timeout
+        while True:
+            self._waiter.clear()
+            # 清除事件后再检查一次，避免错过其他线程在此之前放入的数据
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+            remaining = None if deadline is None else deadline - self._loop.time()
+            if remaining is not None and remaining <= 0:
+                raise queue.Empty
+            try:
+                await asyncio.wait_for(self._waiter.wait(), remaining)
+            except asyncio.TimeoutError:
+                raise queue.Empty
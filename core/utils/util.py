@@ -7,11 +7,11 @@ import socket
 import asyncio
 import requests
 import subprocess
-import numpy as np
 import opuslib_next
 from io import BytesIO
 from core.utils import p3
-from pydub import AudioSegment
+from core.utils.audio_decode import decode_to_pcm
+from core.utils.opus_encoder_utils import ENCODER_POOL
 from typing import Callable, Any
 from configs.logger import setup_logging
 
@@ -259,18 +259,8 @@ def audio_to_data_stream(
 ) -> None:
     # 获取文件后缀名
     file_type = os.path.splitext(audio_file_path)[1]
-    if file_type:
-        file_type = file_type.lstrip(".")
-    # 读取音频文件，-nostdin 参数：不要从标准输入读取数据，否则FFmpeg会阻塞
-    audio = AudioSegment.from_file(
-        audio_file_path, format=file_type, parameters=["-nostdin"]
-    )
-
-    # 转换为单声道/16kHz采样率/16位小端编码（确保与编码器匹配）
-    audio = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
-
-    # 获取原始PCM数据（16位小端）
-    raw_data = audio.raw_data
+    # 解码为单声道/16kHz采样率/16位小端PCM（确保与编码器匹配）
+    raw_data = decode_to_pcm(audio_file_path, file_type)
     pcm_to_data_stream(raw_data, is_opus, callback)
 
 
@@ -299,46 +289,11 @@ async def audio_to_data(
     def _sync_audio_to_data():
         # 获取文件后缀名
         file_type = os.path.splitext(audio_file_path)[1]
-        if file_type:
-            file_type = file_type.lstrip(".")
-        # 读取音频文件，-nostdin 参数：不要从标准输入读取数据，否则FFmpeg会阻塞
-        audio = AudioSegment.from_file(
-            audio_file_path, format=file_type, parameters=["-nostdin"]
-        )
-
-        # 转换为单声道/16kHz采样率/16位小端编码（确保与编码器匹配）
-        audio = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
-
-        # 获取原始PCM数据（16位小端）
-        raw_data = audio.raw_data
-
-        # 初始化Opus编码器
-        encoder = opuslib_next.Encoder(16000, 1, opuslib_next.APPLICATION_AUDIO)
-
-        # 编码参数
-        frame_duration = 60  # 60ms per frame
-        frame_size = int(16000 * frame_duration / 1000)  # 960 samples/frame
+        # 解码为单声道/16kHz采样率/16位小端PCM（确保与编码器匹配）
+        raw_data = decode_to_pcm(audio_file_path, file_type)
 
         datas = []
-        # 按帧处理所有音频数据（包括最后一帧可能补零）
-        for i in range(0, len(raw_data), frame_size * 2):  # 16bit=2bytes/sample
-            # 获取当前帧的二进制数据
-            chunk = raw_data[i : i + frame_size * 2]
-
-            # 如果最后一帧不足，补零
-            if len(chunk) < frame_size * 2:
-                chunk += b"\x00" * (frame_size * 2 - len(chunk))
-
-            if is_opus:
-                # 转换为numpy数组处理
-                np_frame = np.frombuffer(chunk, dtype=np.int16)
-                # 编码Opus数据
-                frame_data = encoder.encode(np_frame.tobytes(), frame_size)
-            else:
-                frame_data = chunk if isinstance(chunk, bytes) else bytes(chunk)
-
-            datas.append(frame_data)
-
+        pcm_to_data_stream(raw_data, is_opus, datas.append)
         return datas
 
     loop = asyncio.get_running_loop()
@@ -363,47 +318,39 @@ def audio_bytes_to_data_stream(
         # 直接用p3解码
         return p3.decode_opus_from_bytes_stream(audio_bytes, callback)
     else:
-        # 其他格式用pydub
-        audio = AudioSegment.from_file(
-            BytesIO(audio_bytes), format=file_type, parameters=["-nostdin"]
-        )
-        audio = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
-        raw_data = audio.raw_data
+        # WAV、MP3 在进程内解码，其他格式用 ffmpeg
+        raw_data = decode_to_pcm(audio_bytes, file_type)
         logger.bind(tag="util").debug(f"🎵 音频解码完成: PCM数据大小={len(raw_data)}字节")
         pcm_to_data_stream(raw_data, is_opus, callback)
 
 
 def pcm_to_data_stream(raw_data, is_opus=True, callback: Callable[[Any], Any] = None):
-    # 初始化Opus编码器
-    encoder = opuslib_next.Encoder(16000, 1, opuslib_next.APPLICATION_AUDIO)
-
     # 编码参数
     frame_duration = 60  # 60ms per frame
     frame_size = int(16000 * frame_duration / 1000)  # 960 samples/frame
+    frame_bytes = frame_size * 2  # 16bit=2bytes/sample
 
+    # 从编码器池取出Opus编码器（用完放回，在TTS分段和连接之间复用）
+    encoder = ENCODER_POOL.acquire(16000, 1, opuslib_next.APPLICATION_AUDIO) if is_opus else None
     frame_count = 0
-    # 按帧处理所有音频数据（包括最后一帧可能补零）
-    for i in range(0, len(raw_data), frame_size * 2):  # 16bit=2bytes/sample
-        # 获取当前帧的二进制数据
-        chunk = raw_data[i : i + frame_size * 2]
-
-        # 如果最后一帧不足，补零
-        if len(chunk) < frame_size * 2:
-            chunk += b"\x00" * (frame_size * 2 - len(chunk))
-
-        if is_opus:
-            # 转换为numpy数组处理
-            np_frame = np.frombuffer(chunk, dtype=np.int16)
+    try:
+        # 按帧处理所有音频数据（包括最后一帧可能补零）
+        for i in range(0, len(raw_data), frame_bytes):
+            # 获取当前帧的二进制数据
+            chunk = bytes(raw_data[i : i + frame_bytes])
+
+            # 如果最后一帧不足，补零
+            if len(chunk) < frame_bytes:
+                chunk += b"\x00" * (frame_bytes - len(chunk))
+
             # 编码Opus数据
-            frame_data = encoder.encode(np_frame.tobytes(), frame_size)
-            if callback:
-                callback(frame_data)
-                frame_count += 1
-        else:
-            frame_data = chunk if isinstance(chunk, bytes) else bytes(chunk)
+            frame_data = encoder.encode(chunk, frame_size) if is_opus else chunk
             if callback:
                 callback(frame_data)
                 frame_count += 1
+    finally:
+        if encoder is not None:
+            ENCODER_POOL.release(encoder)
 
     logger.bind(tag="util").debug(f"🎵 PCM转换完成: 共生成 {frame_count} 个Opus帧")
 
@@ -33,17 +33,26 @@ _setup_websockets_logger()
 from core.connection import ConnectionHandler
 from configs.config_loader import get_config_from_api_async
 from core.auth import AuthManager, AuthenticationError
-from core.utils.modules_initialize import initialize_modules
+from core.utils.modules_initialize import initialize_modules, initialize_tts_shared
 from core.utils.util import check_vad_update, check_asr_update
+from core.utils.metrics import REGISTRY
 
 TAG = __name__
 
+_CONNECTIONS = REGISTRY.gauge("xiaozhi_ws_connections", "当前活跃的设备连接数")
+_CONNECTIONS_TOTAL = REGISTRY.counter("xiaozhi_ws_connections_total", "设备连接累计数", ["result"])
+_CONNECTIONS_ACCEPTED = _CONNECTIONS_TOTAL.labels("accepted")
+_CONNECTIONS_AUTH_FAILED = _CONNECTIONS_TOTAL.labels("auth_failed")
+_QUEUE_DEPTH = REGISTRY.gauge("xiaozhi_ws_queue_depth", "所有连接各队列中等待的消息数之和", ["queue"])
+
 
 class WebSocketServer:
     def __init__(self, config: dict):
         self.config = config
         self.logger = setup_logging()
         self.config_lock = asyncio.Lock()
+        # 每个连接各自创建TTS实例，共用的线程池和缓存只在启动时初始化
+        initialize_tts_shared(self.config)
         modules = initialize_modules(
             self.logger,
             self.config,
@@ -68,6 +77,21 @@ class WebSocketServer:
         expire_seconds = auth_config.get("expire_seconds", None)
         self.auth = AuthManager(secret_key=secret_key, expire_seconds=expire_seconds)
 
+        # 活跃连接（用于拉取指标时统计各队列长度）
+        self.active_handlers = set()
+        _QUEUE_DEPTH.labels("asr_audio").set_function(
+            lambda: self._sum_queue_sizes(lambda h: h.asr_audio_queue)
+        )
+        _QUEUE_DEPTH.labels("report").set_function(
+            lambda: self._sum_queue_sizes(lambda h: h.report_queue)
+        )
+        _QUEUE_DEPTH.labels("tts_text").set_function(
+            lambda: self._sum_queue_sizes(lambda h: h.tts.tts_text_queue)
+        )
+        _QUEUE_DEPTH.labels("tts_audio").set_function(
+            lambda: self._sum_queue_sizes(lambda h: h.tts.tts_audio_queue)
+        )
+
     async def start(self):
         server_config = self.config["server"]
         host = server_config.get("ip", "0.0.0.0")
@@ -110,6 +134,7 @@ class WebSocketServer:
         try:
             await self._handle_auth(websocket)
         except AuthenticationError:
+            _CONNECTIONS_AUTH_FAILED.inc()
             await websocket.send("认证失败")
             await websocket.close()
             return
@@ -123,11 +148,16 @@ class WebSocketServer:
             self._intent,
             self,  # 传入server实例
         )
+        _CONNECTIONS_ACCEPTED.inc()
+        _CONNECTIONS.inc()
+        self.active_handlers.add(handler)
         try:
             await handler.handle_connection(websocket)
         except Exception as e:
             self.logger.bind(tag=TAG).error(f"处理连接时出错: {e}")
         finally:
+            _CONNECTIONS.dec()
+            self.active_handlers.discard(handler)
             # 强制关闭连接（如果还没有关闭的话）
             try:
                 # 安全地检查WebSocket状态并关闭
@@ -143,6 +173,16 @@ class WebSocketServer:
                     f"服务器端强制关闭连接时出错: {close_error}"
                 )
 
+    def _sum_queue_sizes(self, get_queue) -> int:
+        """统计所有活跃连接中某个队列的长度之和（连接尚未初始化该队列时跳过）"""
+        total = 0
+        for handler in list(self.active_handlers):
+            try:
+                total += get_queue(handler).qsize()
+            except AttributeError:
+                continue
+        return total
+
     async def _http_response(self, websocket, request_headers):
         # 检查是否为 WebSocket 升级请求
         if request_headers.headers.get("connection", "").lower() == "upgrade":
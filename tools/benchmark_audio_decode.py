@@ -0,0 +1,221 @@
+"""
+进程内音频解码基准测试
+运行时在临时目录生成测试音频（不同采样率、声道、位深的 WAV；安装了 lameenc 或 ffmpeg 时生成 MP3），验证：
+    1. WAV 进程内解码的结果与 pydub 一致（长度相同，信噪比足够高），文件路径和二进制数据两种输入都可用
+    2. MP3 进程内解码（miniaudio）的时长和频率与原始音频一致；有 ffmpeg 时与 ffmpeg 的解码结果对比（编解码延迟不同，只比较时长和频率）
+    3. 每段音频的解码耗时，对比 pydub（MP3 为 ffmpeg 子进程）
+
+使用方法（在项目根目录运行）:
+    python tools/benchmark_audio_decode.py [每种格式的解码次数]
+"""
+
+import os
+import sys
+import time
+import wave
+import shutil
+import tempfile
+from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+from pydub import AudioSegment
+from core.utils import audio_decode
+from core.utils.audio_decode import decode_to_pcm, get_decode_stats
+from core.utils.util import audio_bytes_to_data_stream
+
+try:
+    import lameenc
+except ImportError:
+    lameenc = None
+
+ROUNDS = 50
+DURATION = 1.0  # 测试音频时长（秒）
+TONES = (300, 1200)  # 测试音频包含的频率（Hz）
+MIN_SNR_DB = 30
+HAS_FFMPEG = shutil.which("ffmpeg") is not None
+
+# (文件名, 采样率, 声道数, 位深字节)
+WAV_FIXTURES = [
+    ("mono_16k_16bit.wav", 16000, 1, 2),
+    ("mono_24k_16bit.wav", 24000, 1, 2),
+    ("stereo_22k_16bit.wav", 22050, 2, 2),
+    ("mono_44k_8bit.wav", 44100, 1, 1),
+    ("stereo_48k_24bit.wav", 48000, 2, 3),
+    ("mono_48k_32bit.wav", 48000, 1, 4),
+]
+
+
+def tone(sample_rate, duration=DURATION) -> np.ndarray:
+    """多个正弦波叠加的测试信号（-1 ~ 1）"""
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    return sum(np.sin(2 * np.pi * freq * t) for freq in TONES) * (0.6 / len(TONES))
+
+
+def encode_samples(signal, sample_width) -> bytes:
+    if sample_width == 1:
+        return (np.round(signal * 127) + 128).astype(np.uint8).tobytes()
+    if sample_width == 3:
+        values = np.round(signal * (2 ** 23 - 1)).astype("<i4").tobytes()
+        return b"".join(values[i: i + 3] for i in range(0, len(values), 4))
+    dtype = {2: "<i2", 4: "<i4"}[sample_width]
+    return np.round(signal * (2 ** (8 * sample_width - 1) - 1)).astype(dtype).tobytes()
+
+
+def make_wav(path, sample_rate, channels, sample_width):
+    signal = tone(sample_rate)
+    if channels == 2:
+        # 两个声道音量不同，检查混音
+        signal = np.stack([signal, signal * 0.5], axis=1).reshape(-1)
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(sample_width)
+        wav.setframerate(sample_rate)
+        wav.writeframes(encode_samples(signal, sample_width))
+
+
+def make_mp3(path, sample_rate=24000):
+    """生成与 Edge TTS 相同规格的 MP3（24kHz 单声道 48kbps），没有编码器时返回 False"""
+    pcm = np.round(tone(sample_rate) * 32767).astype("<i2").tobytes()
+    if lameenc is not None:
+        encoder = lameenc.Encoder()
+        encoder.set_bit_rate(48)
+        encoder.set_in_sample_rate(sample_rate)
+        encoder.set_channels(1)
+        encoder.set_quality(2)
+        with open(path, "wb") as f:
+            f.write(encoder.encode(pcm) + encoder.flush())
+        return True
+    if HAS_FFMPEG:
+        AudioSegment(pcm, frame_rate=sample_rate, sample_width=2, channels=1).export(path, format="mp3", bitrate="48k")
+        return True
+    return False
+
+
+def pydub_decode(source, file_type) -> bytes:
+    """原实现：pydub 解码并转换格式"""
+    audio = AudioSegment.from_file(BytesIO(source), format=file_type, parameters=["-nostdin"])
+    return audio.set_channels(1).set_frame_rate(16000).set_sample_width(2).raw_data
+
+
+def snr_db(reference, actual) -> float:
+    count = min(len(reference), len(actual))
+    reference, actual = reference[:count].astype(np.float64), actual[:count].astype(np.float64)
+    noise = np.sum((reference - actual) ** 2)
+    return float("inf") if noise == 0 else 10 * np.log10(np.sum(reference ** 2) / noise)
+
+
+def peak_frequencies(pcm, count=len(TONES)):
+    spectrum = np.abs(np.fft.rfft(pcm.astype(np.float64)))
+    freqs = np.fft.rfftfreq(len(pcm), 1 / 16000)
+    return sorted(round(freqs[i]) for i in np.argsort(spectrum)[-count:])
+
+
+def check(name, condition):
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+
+def measure(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds
+
+
+def test_wav(fixture_dir):
+    """测试 1/3: WAV 与 pydub 一致"""
+    print("🔍 测试 1/3: WAV 进程内解码与 pydub 一致")
+    results = []
+    for name, sample_rate, channels, sample_width in WAV_FIXTURES:
+        path = os.path.join(fixture_dir, name)
+        data = open(path, "rb").read()
+        reference = np.frombuffer(pydub_decode(data, "wav"), dtype="<i2")
+        from_bytes = np.frombuffer(decode_to_pcm(data, "wav"), dtype="<i2")
+        from_path = np.frombuffer(decode_to_pcm(path, "wav"), dtype="<i2")
+        snr = snr_db(reference, from_bytes)
+        results.append(check(
+            f"{name}: {len(from_bytes)} 个采样（pydub {len(reference)}），信噪比 {snr:.1f}dB",
+            abs(len(from_bytes) - len(reference)) <= 2 and snr >= MIN_SNR_DB and np.array_equal(from_bytes, from_path),
+        ))
+    return all(results)
+
+
+def test_mp3(mp3_path):
+    """测试 2/3: MP3 进程内解码"""
+    print("🔍 测试 2/3: MP3 进程内解码")
+    if mp3_path is None:
+        print("   ⚠️ 未安装 lameenc 或 ffmpeg，无法生成 MP3，跳过")
+        return True
+    if audio_decode.miniaudio is None:
+        print("   ⚠️ 未安装 miniaudio，MP3 使用 ffmpeg 解码，跳过")
+        return True
+
+    data = open(mp3_path, "rb").read()
+    before = get_decode_stats()
+    pcm = np.frombuffer(decode_to_pcm(data, "mp3"), dtype="<i2")
+    in_process = get_decode_stats()["miniaudio"] == before["miniaudio"] + 1
+    duration = len(pcm) / 16000
+    results = [
+        check("使用 miniaudio 解码（不启动 ffmpeg）", in_process),
+        # MP3 编码器会在首尾补充静音
+        check(f"时长 {duration:.3f}s（原始 {DURATION:.3f}s）", DURATION <= duration < DURATION + 0.1),
+        check(f"频率 {peak_frequencies(pcm)}Hz（原始 {list(TONES)}Hz）", peak_frequencies(pcm) == list(TONES)),
+    ]
+    if HAS_FFMPEG:
+        reference = np.frombuffer(pydub_decode(data, "mp3"), dtype="<i2")
+        results.append(check(
+            f"与 ffmpeg 解码结果一致（{len(reference)} 个采样，频率 {peak_frequencies(reference)}Hz）",
+            abs(len(reference) - len(pcm)) < 1600 and peak_frequencies(reference) == peak_frequencies(pcm),
+        ))
+    else:
+        print("   ⚠️ 未安装 ffmpeg，跳过与 ffmpeg 解码结果的对比")
+
+    frames = []
+    audio_bytes_to_data_stream(bytearray(data), file_type="mp3", is_opus=False, callback=frames.append)
+    results.append(check(f"audio_bytes_to_data_stream 输出 {len(frames)} 个60ms帧",
+                         len(frames) == -(-len(pcm) // 960) and all(len(frame) == 1920 for frame in frames)))
+    return all(results)
+
+
+def test_speed(fixture_dir, mp3_path, rounds):
+    """测试 3/3: 解码耗时"""
+    print(f"🔍 测试 3/3: 每段 {DURATION:.0f}s 音频的解码耗时（{rounds} 次平均）")
+    cases = [("mono_24k_16bit.wav", "wav")]
+    if mp3_path is not None:
+        cases.append((os.path.basename(mp3_path), "mp3"))
+    results = []
+    for name, file_type in cases:
+        data = open(os.path.join(fixture_dir, name), "rb").read()
+        in_process = measure(lambda: decode_to_pcm(data, file_type), rounds)
+        line = f"   {name}: 进程内 {in_process * 1000:.2f}ms"
+        if file_type == "mp3" and not HAS_FFMPEG:
+            print(line + "，未安装 ffmpeg，无法对比")
+            continue
+        old = measure(lambda: pydub_decode(data, file_type), rounds)
+        print(line + f"，pydub {old * 1000:.2f}ms")
+        results.append(check(f"{name} 解码不慢于 pydub", in_process <= old * 1.2))
+    return all(results)
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else ROUNDS
+    print("=" * 50)
+    print("进程内音频解码基准")
+    print("=" * 50)
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        for name, sample_rate, channels, sample_width in WAV_FIXTURES:
+            make_wav(os.path.join(fixture_dir, name), sample_rate, channels, sample_width)
+        mp3_path = os.path.join(fixture_dir, "edge_24k_48kbps.mp3")
+        if not make_mp3(mp3_path):
+            mp3_path = None
+        results = [test_wav(fixture_dir), test_mp3(mp3_path), test_speed(fixture_dir, mp3_path, rounds)]
+    passed = sum(results)
+    print("=" * 50)
+    print(f"结果: {passed}/{len(results)} 通过")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
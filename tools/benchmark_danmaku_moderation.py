@@ -0,0 +1,164 @@
+"""
+弹幕内容审核基准测试
+生成 10000 个词的词库和一批模拟弹幕（部分包含敏感词），验证：
+    1. 丢弃、打码、忽略符号、网址拦截的结果正确
+    2. 自动机的命中结果与逐词子串查找一致
+    3. 10000 词词库下每条弹幕的审核耗时，对比逐词子串查找
+
+使用方法（在项目根目录运行）:
+    python tools/benchmark_danmaku_moderation.py [词数] [弹幕数]
+"""
+
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.danmaku.moderation import DanmakuModerator, ACTION_PASS, ACTION_DROP, ACTION_REWRITE
+
+TERM_COUNT = 10000
+MESSAGE_COUNT = 100000
+NAIVE_SAMPLE = 2000  # 逐词查找太慢，只对部分弹幕对比
+HIT_RATIO = 0.2
+
+# 常用汉字（生成随机词和弹幕）
+CHARS = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而"
+    "方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应"
+    "开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命"
+)
+FILLER = "哈嘿啊呀哦嗯吧呢啦嘛哇耶噢哟喔唉0123456789"
+CHAT_TEMPLATES = ["主播好", "今天吃什么", "这个多少钱", "哈哈哈哈", "来了来了", "主播唱首歌吧", "怎么买", "晚上好呀"]
+
+
+def generate_terms(count, rng):
+    terms = set()
+    while len(terms) < count:
+        terms.add("".join(rng.choice(CHARS) for _ in range(rng.randint(2, 6))))
+    return sorted(terms)
+
+
+def generate_messages(count, terms, rng):
+    """模拟弹幕：HIT_RATIO 的弹幕插入一个敏感词（部分用空格或符号隔开）"""
+    messages = []
+    for i in range(count):
+        text = rng.choice(CHAT_TEMPLATES) + "".join(rng.choice(FILLER) for _ in range(rng.randint(0, 12)))
+        if rng.random() < HIT_RATIO:
+            term = rng.choice(terms)
+            if rng.random() < 0.3:
+                term = rng.choice([" ", "-", "*", "。"]).join(term)
+            pos = rng.randint(0, len(text))
+            text = text[:pos] + term + text[pos:]
+        messages.append(text)
+    return messages
+
+
+def naive_matches(moderator, terms, text):
+    """逐词子串查找（与自动机使用相同的归一化）"""
+    folded = moderator._fold_text(text)[0]
+    return {term for term in terms if term in folded}
+
+
+def check(name, condition):
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+
+def test_behaviour():
+    """测试 1: 处理方式"""
+    print("🔍 测试 1/3: 丢弃、打码、忽略符号、网址拦截")
+    moderator = DanmakuModerator({
+        "action": "drop",
+        "terms": ["加微信", "傻瓜|rewrite", "笨蛋|rewrite", "ＶＸ"],
+    })
+    results = [
+        check("正常弹幕通过", moderator.moderate("主播好呀")[0] == ACTION_PASS),
+        check("命中 drop 词丢弃", moderator.moderate("想要的加微信哦")[0] == ACTION_DROP),
+        check("符号隔开仍命中", moderator.moderate("加 微-信 领福利")[0] == ACTION_DROP),
+        check("全角/大小写归一化", moderator.moderate("加vx123")[0] == ACTION_DROP),
+        check("rewrite 词打码", moderator.moderate("你个傻瓜主播") == (ACTION_REWRITE, "你个**主播", ["傻瓜"])),
+        check("多个 rewrite 词都打码", moderator.moderate("傻瓜和笨蛋")[1] == "**和**"),
+        check("只剩敏感词时丢弃", moderator.moderate("笨蛋！")[0] == ACTION_DROP),
+        check("同时命中两种词按 drop", moderator.moderate("傻瓜加微信")[0] == ACTION_DROP),
+        check("网址拦截", moderator.moderate("看这里 www.example.com")[0] == ACTION_DROP),
+        check("统计", moderator.get_stats()["rewritten"] == 2),
+    ]
+    return all(results)
+
+
+def test_correctness(moderator, terms, messages):
+    """测试 2: 与逐词查找结果一致"""
+    print(f"🔍 测试 2/3: 自动机与逐词查找结果一致（{NAIVE_SAMPLE} 条弹幕）")
+    mismatches = 0
+    for text in messages[:NAIVE_SAMPLE]:
+        found = {moderator.automaton.terms[index]
+                 for _, _, index in moderator.automaton.iter_matches(moderator._fold_text(text)[0])}
+        if found != naive_matches(moderator, terms, text):
+            mismatches += 1
+    return check(f"不一致 {mismatches} 条", mismatches == 0)
+
+
+def test_throughput(moderator, terms, messages):
+    """测试 3: 吞吐"""
+    print(f"🔍 测试 3/3: {len(terms)} 词词库审核 {len(messages)} 条弹幕")
+    latencies = []
+    actions = {ACTION_PASS: 0, ACTION_DROP: 0, ACTION_REWRITE: 0}
+    start = time.perf_counter()
+    for text in messages:
+        t0 = time.perf_counter()
+        action = moderator.moderate(text)[0]
+        latencies.append(time.perf_counter() - t0)
+        actions[action] += 1
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    per_message = elapsed / len(messages)
+    print(f"   自动机: {len(messages) / elapsed:,.0f} 条/秒，平均 {per_message * 1e6:.1f}µs/条，"
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.1f}µs")
+    print(f"   结果: 通过 {actions[ACTION_PASS]}，丢弃 {actions[ACTION_DROP]}")
+
+    sample = messages[:NAIVE_SAMPLE]
+    start = time.perf_counter()
+    for text in sample:
+        naive_matches(moderator, terms, text)
+    naive_per_message = (time.perf_counter() - start) / len(sample)
+    print(f"   逐词查找: {1 / naive_per_message:,.0f} 条/秒，平均 {naive_per_message * 1e6:.1f}µs/条")
+    print(f"   提速 {naive_per_message / per_message:.0f} 倍")
+    return check("自动机快于逐词查找", per_message < naive_per_message)
+
+
+def main():
+    term_count = int(sys.argv[1]) if len(sys.argv) > 1 else TERM_COUNT
+    message_count = int(sys.argv[2]) if len(sys.argv) > 2 else MESSAGE_COUNT
+    rng = random.Random(42)
+    terms = generate_terms(term_count, rng)
+    messages = generate_messages(message_count, terms, rng)
+
+    print("=" * 50)
+    print("弹幕内容审核基准")
+    print("=" * 50)
+
+    results = [test_behaviour()]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    moderator = DanmakuModerator({"action": "drop", "terms": terms, "block_links": False})
+    build_time = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"   构建自动机: {len(moderator)} 个词，{moderator.automaton.node_count} 个节点，"
+          f"{build_time * 1000:.0f}ms，约 {memory / 1024 / 1024:.1f}MB")
+
+    results.append(test_correctness(moderator, terms, messages))
+    results.append(test_throughput(moderator, terms, messages))
+
+    passed = sum(results)
+    print("=" * 50)
+    print(f"结果: {passed}/{len(results)} 通过")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,105 @@
+"""
+弹幕连接音频发送路径微基准测试
+对比每个音频帧的额外开销：
+    1. 旧实现：MockWebSocket.send 先尝试 UTF-8 解码和 json.loads，失败后才按音频处理
+    2. 新实现：DanmakuConnection.send_audio_frame 直接按音频帧处理
+
+使用方法（在项目根目录运行）:
+    python tools/benchmark_danmaku_send_path.py
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from configs.logger import setup_logging
+from core.danmaku.handler import DanmakuConnection
+
+FRAME_COUNT = 100000
+FRAME_SIZE = 160  # 16kHz/60ms Opus帧的典型大小（字节）
+
+
+class NullDeviceManager:
+    """不实际发送的设备管理器，只统计调用次数"""
+
+    def __init__(self):
+        self.count = 0
+
+    def get_device_count(self):
+        return 1
+
+    async def broadcast_audio(self, data):
+        self.count += 1
+
+
+class LegacyMockWebSocket:
+    """旧实现：对每个包尝试解析JSON来识别控制消息"""
+
+    def __init__(self, connection, device_manager, logger):
+        self.connection = connection
+        self.device_manager = device_manager
+        self.logger = logger
+        self.packet_count = 0
+
+    async def send(self, data):
+        device_count = self.device_manager.get_device_count()
+        try:
+            if isinstance(data, (str, bytes)):
+                data_bytes = data.encode('utf-8') if isinstance(data, str) else data
+                data_str = data_bytes.decode('utf-8')
+                json_obj = json.loads(data_str)
+                if json_obj.get('type') == 'tts' and json_obj.get('state') == 'stop':
+                    self.connection.playback_done.set()
+                    return
+                self.logger.bind(tag=__name__).debug(f"📨 发送控制消息: {json_obj} → {device_count} 个设备")
+            else:
+                raise ValueError("Not JSON")
+        except:
+            self.packet_count += 1
+            if self.packet_count <= 5 or self.packet_count % 50 == 0:
+                self.logger.bind(tag=__name__).debug(f"🔊 音频包 #{self.packet_count}: {len(data)} 字节 → {device_count} 个设备")
+        await self.device_manager.broadcast_audio(data)
+
+
+async def measure(send, frames):
+    start = time.perf_counter()
+    for frame in frames:
+        await send(frame)
+    return (time.perf_counter() - start) / len(frames) * 1e9
+
+
+async def main():
+    logger = setup_logging()
+    device_manager = NullDeviceManager()
+    conn = DanmakuConnection(device_manager, logger, {})
+    legacy = LegacyMockWebSocket(conn, device_manager, logger)
+
+    # 随机字节模拟Opus帧，另外加入一部分恰好是合法UTF-8的帧（旧实现会进入 json.loads）
+    frames = [os.urandom(FRAME_SIZE) for _ in range(FRAME_COUNT)]
+    frames[::10] = [b"A" * FRAME_SIZE for _ in frames[::10]]
+
+    print("=" * 50)
+    print(f"弹幕音频发送路径微基准（{FRAME_COUNT} 帧，每帧 {FRAME_SIZE} 字节）")
+    print("=" * 50)
+
+    async def noop(frame):
+        await device_manager.broadcast_audio(frame)
+
+    baseline = await measure(noop, frames)
+    legacy_ns = await measure(legacy.send, frames)
+    typed_ns = await measure(conn.send_audio_frame, frames)
+
+    print(f"   直接广播（基线）:        {baseline:8.0f} ns/帧")
+    print(f"   旧实现 解析后分类:       {legacy_ns:8.0f} ns/帧（额外 {legacy_ns - baseline:.0f} ns）")
+    print(f"   新实现 send_audio_frame: {typed_ns:8.0f} ns/帧（额外 {typed_ns - baseline:.0f} ns）")
+    print("=" * 50)
+    print(f"每帧额外开销降低 {(legacy_ns - baseline) / max(typed_ns - baseline, 1):.1f} 倍")
+    return typed_ns < legacy_ns
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
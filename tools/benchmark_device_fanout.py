@@ -0,0 +1,168 @@
+"""
+设备音频广播基准测试
+在本机启动 WebSocket 服务器，连接若干正常设备和若干"慢设备"（接收缓冲区很小且读取很慢），
+按固定节奏广播音频包，统计正常设备的接收延迟，对比：
+    1. 旧实现：每个包 asyncio.gather 发送给所有设备，等待最慢的设备
+    2. 新实现：每个设备独立的有界发送队列 + 发送任务
+
+使用方法（在项目根目录运行）:
+    python tools/benchmark_device_fanout.py
+"""
+
+import os
+import sys
+import time
+import socket
+import struct
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import websockets
+from configs.logger import setup_logging
+from core.danmaku.device_manager import DeviceManager
+
+# 基准参数
+FAST_DEVICES = 4
+SLOW_DEVICES = 2
+PACKET_SIZE = 2048  # 字节
+PACKET_INTERVAL = 0.02  # 广播间隔（秒）
+PACKET_COUNT = 150
+SLOW_READ_DELAY = 0.2  # 慢设备每读取一条消息的延迟（秒）
+SOCKET_BUFFER = 4096  # 慢设备接收缓冲区/服务端发送缓冲区大小
+
+
+class LegacyDeviceManager(DeviceManager):
+    """旧的广播实现：加锁后 gather 发送给所有设备"""
+
+    async def broadcast_audio(self, audio_data: bytes, exclude_devices=None):
+        async with self.device_lock:
+            target_devices = list(self.devices.values())
+        await asyncio.gather(
+            *(self._send_to_device(device_info, audio_data) for device_info in target_devices),
+            return_exceptions=True,
+        )
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(len(values) * pct / 100))
+    return values[index]
+
+
+async def run_client(port, device_id, slow, send_times, latencies, done_event):
+    """模拟设备：记录每个包的接收延迟"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if slow:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+    sock.connect(("127.0.0.1", port))
+    sock.setblocking(False)
+
+    async with websockets.connect(
+        f"ws://127.0.0.1:{port}/?device-id={device_id}",
+        sock=sock,
+        compression=None,
+        max_queue=1 if slow else 16,
+        ping_interval=None,
+    ) as websocket:
+        try:
+            while not done_event.is_set():
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    continue
+                seq = struct.unpack(">I", message[:4])[0]
+                latencies.append(time.perf_counter() - send_times[seq])
+                if slow:
+                    await asyncio.sleep(SLOW_READ_DELAY)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+
+async def run_benchmark(manager_class, label):
+    logger = setup_logging()
+    manager = manager_class(logger=logger, config={"max_size": 50})
+
+    async def handle(websocket):
+        device_id = websocket.request.path.split("device-id=")[-1]
+        sock = websocket.transport.get_extra_info("socket")
+        if device_id.startswith("slow"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+        await manager.add_device(device_id, websocket, "127.0.0.1")
+        try:
+            await websocket.wait_closed()
+        finally:
+            await manager.remove_device(device_id)
+
+    server = await websockets.serve(
+        handle, "127.0.0.1", 0, compression=None, write_limit=SOCKET_BUFFER, ping_interval=None
+    )
+    port = server.sockets[0].getsockname()[1]
+
+    send_times = {}
+    done_event = asyncio.Event()
+    fast_latencies = [[] for _ in range(FAST_DEVICES)]
+    slow_latencies = [[] for _ in range(SLOW_DEVICES)]
+    clients = [
+        asyncio.create_task(run_client(port, f"fast{i}", False, send_times, fast_latencies[i], done_event))
+        for i in range(FAST_DEVICES)
+    ] + [
+        asyncio.create_task(run_client(port, f"slow{i}", True, send_times, slow_latencies[i], done_event))
+        for i in range(SLOW_DEVICES)
+    ]
+    while manager.get_device_count() < FAST_DEVICES + SLOW_DEVICES:
+        await asyncio.sleep(0.01)
+
+    payload = os.urandom(PACKET_SIZE - 4)
+    broadcast_costs = []
+    start = time.perf_counter()
+    for seq in range(PACKET_COUNT):
+        # 按固定节奏广播（与音频帧节奏一致），延迟从计划发送时间算起
+        send_times[seq] = start + seq * PACKET_INTERVAL
+        delay = send_times[seq] - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        broadcast_start = time.perf_counter()
+        await manager.broadcast_audio(struct.pack(">I", seq) + payload)
+        broadcast_costs.append(time.perf_counter() - broadcast_start)
+    elapsed = time.perf_counter() - start
+
+    await asyncio.sleep(1.0)
+    done_event.set()
+    server.close()
+    for task in clients:
+        task.cancel()
+    await asyncio.gather(*clients, return_exceptions=True)
+
+    fast_all = [latency for device in fast_latencies for latency in device]
+    fast_received = min(len(device) for device in fast_latencies)
+    print(f"   [{label}] 广播 {PACKET_COUNT} 个包耗时 {elapsed:.2f}s（目标 {PACKET_COUNT * PACKET_INTERVAL:.2f}s）")
+    print(f"   [{label}] 单次广播耗时 p50={percentile(broadcast_costs, 50) * 1000:.2f}ms "
+          f"p99={percentile(broadcast_costs, 99) * 1000:.2f}ms")
+    print(f"   [{label}] 正常设备收到 {fast_received}/{PACKET_COUNT} 个包，延迟 "
+          f"p50={percentile(fast_all, 50) * 1000:.1f}ms p99={percentile(fast_all, 99) * 1000:.1f}ms "
+          f"max={max(fast_all) * 1000 if fast_all else 0:.1f}ms")
+    print(f"   [{label}] 慢设备收到 {[len(device) for device in slow_latencies]} 个包")
+    return percentile(fast_all, 99), fast_received
+
+
+async def main():
+    print("=" * 50)
+    print("设备音频广播基准测试")
+    print(f"{FAST_DEVICES} 个正常设备 + {SLOW_DEVICES} 个慢设备，每 {PACKET_INTERVAL * 1000:.0f}ms 广播 {PACKET_SIZE} 字节")
+    print("=" * 50)
+
+    legacy_p99, _ = await run_benchmark(LegacyDeviceManager, "旧实现")
+    queued_p99, queued_received = await run_benchmark(DeviceManager, "独立队列")
+
+    print("=" * 50)
+    print(f"正常设备 p99 延迟: {legacy_p99 * 1000:.1f}ms → {queued_p99 * 1000:.1f}ms")
+    ok = queued_p99 < 0.05 and queued_received == PACKET_COUNT
+    print("✅ 慢设备不再影响正常设备" if ok else "❌ 正常设备仍受慢设备影响")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,204 @@
+"""
+多进程设备广播压力测试
+在本机启动设备服务器（主进程单进程 / N 个广播工作进程），由若干客户端进程模拟上千个设备连接，
+主进程持续发布音频帧，统计每秒实际送达设备的帧数，观察吞吐随工作进程数的扩展情况。
+
+主进程单进程模式下每帧都要在同一个事件循环中写入全部设备；
+多进程模式下每帧只发布一次，各工作进程并行写入自己持有的设备。
+CPU核数不少于 工作进程数 + 客户端进程数 + 1 时吞吐应随工作进程数近似线性增长。
+
+使用方法（在项目根目录运行，仅 Linux/macOS）:
+    python tools/benchmark_fanout_workers.py [--devices 2000] [--workers 1,2,4] [--duration 5] [--clients 4]
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import multiprocessing
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import websockets
+from configs.logger import setup_logging
+from core.danmaku.device_manager import DeviceManager, serve_device_connection
+from core.danmaku.fanout import FanoutPublisher, is_supported
+
+ROOM_ID = "bench"
+FRAME_SIZE = 200  # 约为一个60ms Opus帧的大小（字节）
+DEVICE_QUEUE = {"max_size": 100, "drop_policy": "drop_oldest"}
+CONNECT_CONCURRENCY = 100
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_clients(port, first_index, count, ready_queue, stop_event, result_queue):
+    """客户端进程：建立 count 个设备连接，统计收到的音频帧数"""
+
+    async def device(index, counts, connected, semaphore):
+        async with semaphore:
+            websocket = await websockets.connect(
+                f"ws://127.0.0.1:{port}/danmaku/?device-id=dev{index}&room-id={ROOM_ID}",
+                compression=None, ping_interval=None, open_timeout=60,
+            )
+        connected.append(index)
+        try:
+            async for message in websocket:
+                if isinstance(message, bytes):
+                    counts[index] += 1
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    async def main():
+        counts = {index: 0 for index in range(first_index, first_index + count)}
+        connected = []
+        semaphore = asyncio.Semaphore(CONNECT_CONCURRENCY)
+        tasks = [asyncio.create_task(device(index, counts, connected, semaphore)) for index in counts]
+        while len(connected) < count:
+            failed = [task for task in tasks if task.done() and task.exception()]
+            if failed:
+                raise failed[0].exception()
+            await asyncio.sleep(0.05)
+        ready_queue.put(count)
+        await asyncio.get_running_loop().run_in_executor(None, stop_event.wait)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        result_queue.put((sum(counts.values()), min(counts.values())))
+
+    asyncio.run(main())
+
+
+async def run_case(workers, args, logger):
+    """运行一种配置，返回 (每秒送达帧数, 每个设备最少收到的帧数)"""
+    port = free_port()
+    context = multiprocessing.get_context("spawn")
+    publisher = None
+    server = None
+
+    if workers == 0:
+        device_manager = DeviceManager(logger=logger, config=DEVICE_QUEUE)
+        server = await websockets.serve(
+            lambda websocket: serve_device_connection(websocket, {ROOM_ID: device_manager}, ROOM_ID, logger),
+            "127.0.0.1", port, compression=None, ping_interval=None,
+        )
+    else:
+        publisher = FanoutPublisher(
+            {
+                "ws_host": "127.0.0.1",
+                "ws_port": port,
+                "device_queue": DEVICE_QUEUE,
+                "fanout": {"workers": workers, "stats_interval": 0.2},
+            },
+            [ROOM_ID], ROOM_ID, logger,
+        )
+        await publisher.start()
+        device_manager = publisher.device_managers[ROOM_ID]
+
+    ready_queue, result_queue, stop_event = context.Queue(), context.Queue(), context.Event()
+    per_process = args.devices // args.clients
+    clients = [
+        context.Process(
+            target=run_clients,
+            args=(port, i * per_process, per_process, ready_queue, stop_event, result_queue),
+            daemon=True,
+        )
+        for i in range(args.clients)
+    ]
+    for process in clients:
+        process.start()
+    loop = asyncio.get_running_loop()
+    for _ in clients:
+        await loop.run_in_executor(None, ready_queue.get, True, 300)
+    devices = per_process * args.clients
+    while device_manager.get_device_count() < devices:
+        await asyncio.sleep(0.05)
+
+    # 尽快发布音频帧（设备发送队列满时按 drop_oldest 丢弃），统计送达的帧数
+    frame = os.urandom(FRAME_SIZE)
+    published = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.duration:
+        await device_manager.broadcast_audio(frame)
+        published += 1
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(1.0)  # 等待已排队的帧发完
+
+    stop_event.set()
+    delivered, min_per_device = 0, None
+    for _ in clients:
+        total, minimum = await loop.run_in_executor(None, result_queue.get, True, 60)
+        delivered += total
+        min_per_device = minimum if min_per_device is None else min(min_per_device, minimum)
+    for process in clients:
+        process.join(5)
+
+    if publisher is not None:
+        workers_devices = [worker["devices"] for worker in publisher.get_stats()["workers"]]
+        await publisher.stop()
+    else:
+        workers_devices = [devices]
+        server.close()
+        await server.wait_closed()
+
+    label = "主进程" if workers == 0 else f"{workers} 个工作进程"
+    rate = delivered / elapsed
+    print(f"   [{label}] 设备分布 {workers_devices}，发布 {published} 帧，"
+          f"送达 {delivered} 帧（{rate:,.0f} 帧/秒），每设备至少 {min_per_device} 帧")
+    return rate, min_per_device
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="多进程设备广播压力测试")
+    parser.add_argument("--devices", type=int, default=2000, help="模拟设备数")
+    parser.add_argument("--workers", default="1,2,4", help="依次测试的工作进程数，逗号分隔")
+    parser.add_argument("--duration", type=float, default=5, help="每种配置的发布时长（秒）")
+    parser.add_argument("--clients", type=int, default=4, help="模拟设备的客户端进程数")
+    args = parser.parse_args()
+
+    if not is_supported():
+        print("❌ 当前平台不支持 SO_REUSEPORT，无法运行多进程广播")
+        return False
+
+    logger = setup_logging()
+    worker_counts = [int(value) for value in args.workers.split(",") if value.strip()]
+    cpus = os.cpu_count() or 1
+
+    print("=" * 50)
+    print(f"多进程设备广播压力测试（{args.devices} 个设备，{args.clients} 个客户端进程，CPU {cpus} 核）")
+    print("=" * 50)
+
+    results = {}
+    for workers in [0] + worker_counts:
+        results[workers] = await run_case(workers, args, logger)
+
+    print("=" * 50)
+    checks = [all(minimum > 0 for _, minimum in results.values())]
+    print(f"{'✅' if checks[0] else '❌'} 所有设备都收到音频帧")
+
+    base_workers = worker_counts[0]
+    for workers in worker_counts[1:]:
+        speedup = results[workers][0] / results[base_workers][0]
+        expected = workers / base_workers
+        line = f"{workers} 个工作进程吞吐为 {base_workers} 个的 {speedup:.2f} 倍（线性为 {expected:.0f} 倍）"
+        if cpus >= workers + args.clients + 1:
+            ok = speedup >= expected * 0.7
+            checks.append(ok)
+            print(f"{'✅' if ok else '❌'} {line}")
+        else:
+            print(f"⚠️  {line}，CPU核数不足，跳过扩展性检查")
+
+    passed = sum(checks)
+    print(f"结果: {passed}/{len(checks)} 通过")
+    return passed == len(checks)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,139 @@
+"""
+运行指标基准测试
+验证：
+    1. 计数器、仪表、直方图、回调指标输出的 Prometheus 文本格式正确
+    2. /metrics 接口可通过 aiohttp 拉取
+    3. 每次记录的开销（纳秒级）
+
+使用方法（在项目根目录运行）:
+    python tools/benchmark_metrics.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from aiohttp import web, ClientSession
+from core.utils.metrics import MetricsRegistry
+
+ITERATIONS = 1000000
+MAX_NS_PER_OP = 1000  # 单次记录开销上限（纳秒）
+
+
+def check(name, condition):
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+
+def test_format():
+    """测试 1: 文本格式"""
+    print("🔍 测试 1/3: Prometheus 文本格式")
+    registry = MetricsRegistry()
+    requests = registry.counter("demo_requests_total", "请求数", ["room"])
+    requests.labels("a").inc()
+    requests.labels(room="a").inc(2)
+    depth = registry.gauge("demo_queue_depth", "队列长度")
+    depth.set(5)
+    depth.dec()
+    pending = [1, 2, 3]
+    registry.gauge("demo_pending", "回调仪表").set_function(lambda: len(pending))
+    broken = registry.gauge("demo_broken", "回调出错时不输出样本")
+    broken.set_function(lambda: 1 / 0)
+    latency = registry.histogram("demo_latency_seconds", "耗时", ["stage"], buckets=(0.1, 1.0))
+    child = latency.labels(stage='llm"x')
+    for value in (0.05, 0.1, 0.5, 3.0):
+        child.observe(value)
+
+    text = registry.render()
+    lines = text.splitlines()
+    return all([
+        check("计数器", 'demo_requests_total{room="a"} 3' in lines),
+        check("仪表", "demo_queue_depth 4" in lines),
+        check("回调仪表", "demo_pending 3" in lines),
+        check("回调出错时跳过样本", not any(line.startswith("demo_broken ") for line in lines)),
+        check("直方图桶累计（le 包含边界）",
+              'demo_latency_seconds_bucket{stage="llm\\"x",le="0.1"} 2' in lines
+              and 'demo_latency_seconds_bucket{stage="llm\\"x",le="+Inf"} 4' in lines),
+        check("直方图总数与总和",
+              'demo_latency_seconds_count{stage="llm\\"x"} 4' in lines
+              and 'demo_latency_seconds_sum{stage="llm\\"x"} 3.65' in lines),
+        check("TYPE 注释", "# TYPE demo_latency_seconds histogram" in lines),
+        check("重复注册返回同一指标", registry.counter("demo_requests_total", "请求数", ["room"]) is requests),
+    ])
+
+
+async def test_endpoint():
+    """测试 2: /metrics 接口"""
+    print("🔍 测试 2/3: /metrics 接口")
+    registry = MetricsRegistry()
+    registry.counter("demo_scrapes_total", "拉取次数").inc()
+
+    app = web.Application()
+    app.add_routes([web.get("/metrics", registry.handle_metrics)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        async with ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                body = await response.text()
+                content_type = response.headers.get("Content-Type", "")
+    finally:
+        await runner.cleanup()
+    return all([
+        check("Content-Type", content_type.startswith("text/plain; version=0.0.4")),
+        check("返回指标", "demo_scrapes_total 1" in body),
+    ])
+
+
+def measure(func):
+    start = time.perf_counter_ns()
+    for _ in range(ITERATIONS):
+        func()
+    per_op = (time.perf_counter_ns() - start) / ITERATIONS
+    return per_op
+
+
+def test_overhead():
+    """测试 3: 记录开销"""
+    print(f"🔍 测试 3/3: 记录开销（{ITERATIONS} 次）")
+    registry = MetricsRegistry()
+    counter = registry.counter("bench_total", "计数器", ["room"]).labels("a")
+    gauge = registry.gauge("bench_gauge", "仪表")
+    histogram = registry.histogram("bench_seconds", "直方图", ["stage"]).labels("llm")
+
+    baseline = measure(lambda: None)
+    results = []
+    for label, func in (
+        ("counter.inc()", counter.inc),
+        ("gauge.set(v)", lambda: gauge.set(3)),
+        ("histogram.observe(v)", lambda: histogram.observe(0.123)),
+    ):
+        per_op = measure(func) - baseline
+        print(f"   {label}: {per_op:.0f}ns/次")
+        results.append(check(f"{label} < {MAX_NS_PER_OP}ns", per_op < MAX_NS_PER_OP))
+
+    start = time.perf_counter()
+    registry.render()
+    print(f"   输出指标: {(time.perf_counter() - start) * 1e6:.0f}µs")
+    return all(results)
+
+
+def main():
+    print("=" * 50)
+    print("运行指标基准")
+    print("=" * 50)
+    results = [test_format(), asyncio.run(test_endpoint()), test_overhead()]
+    passed = sum(results)
+    print("=" * 50)
+    print(f"结果: {passed}/{len(results)} 通过")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
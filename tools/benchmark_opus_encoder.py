@@ -0,0 +1,198 @@
+"""
+Opus编码缓冲和编码器池基准测试
+验证：
+    1. 预分配缓冲区的分帧结果与原实现（np.append 拼接缓冲区）一致，任意分块输入都相同
+    2. 每帧的编码耗时不随句子长度增长（流式解码按小块输入，对比原实现）
+    3. 编码器池：多个连接连续合成多段文字时，编码器数量不超过同时编码的数量；重用的编码器已重置状态，输出与新编码器相同
+
+使用方法（在项目根目录运行）:
+    python tools/benchmark_opus_encoder.py [每种长度的重复次数]
+"""
+
+import os
+import sys
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+from opuslib_next import Encoder, constants
+from core.utils.opus_encoder_utils import OpusEncoderUtils, ENCODER_POOL
+from core.utils.util import pcm_to_data_stream
+
+ROUNDS = 3
+SAMPLE_RATE = 16000
+CHUNK_SAMPLES = 320  # 流式解码每次输出约20ms的PCM
+DURATIONS = (1, 10, 60)  # 句子长度（秒）
+CONNECTIONS = 8
+SEGMENTS_PER_CONNECTION = 20
+
+
+def make_pcm(seconds) -> bytes:
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return np.round(np.sin(2 * np.pi * 300 * t) * 0.3 * 32767).astype("<i2").tobytes()
+
+
+class LegacyOpusEncoder(OpusEncoderUtils):
+    """原实现：每次调用用 np.append 拼接缓冲区"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.legacy_buffer = np.array([], dtype=np.int16)
+
+    def encode_pcm_to_opus_stream(self, pcm_data, end_of_stream, callback):
+        new_samples = self._convert_bytes_to_shorts(pcm_data)
+        np.any((new_samples < -32768) | (new_samples > 32767))  # 原实现的逐样本校验
+        self.legacy_buffer = np.append(self.legacy_buffer, new_samples)
+        offset = 0
+        while offset <= len(self.legacy_buffer) - self.total_frame_size:
+            output = self._encode(self.legacy_buffer[offset: offset + self.total_frame_size])
+            if output:
+                callback(output)
+            offset += self.total_frame_size
+        self.legacy_buffer = self.legacy_buffer[offset:]
+        if end_of_stream and len(self.legacy_buffer) > 0:
+            last_frame = np.zeros(self.total_frame_size, dtype=np.int16)
+            last_frame[: len(self.legacy_buffer)] = self.legacy_buffer
+            output = self._encode(last_frame)
+            if output:
+                callback(output)
+            self.legacy_buffer = np.array([], dtype=np.int16)
+
+
+def split(data, chunk_bytes):
+    return [data[offset: offset + chunk_bytes] for offset in range(0, len(data), chunk_bytes)]
+
+
+def random_split(data):
+    """随机切分（包括奇数个采样和超过一帧的块）"""
+    chunks, offset = [], 0
+    while offset < len(data):
+        size = random.randint(1, 3000) * 2
+        chunks.append(data[offset: offset + size])
+        offset += size
+    return chunks
+
+
+def encode(encoder_class, chunks):
+    packets = []
+    encoder = encoder_class(SAMPLE_RATE, 1, 60)
+    try:
+        for chunk in chunks:
+            encoder.encode_pcm_to_opus_stream(chunk, False, packets.append)
+        encoder.encode_pcm_to_opus_stream(b"", True, packets.append)
+    finally:
+        encoder.close()
+    return packets
+
+
+def check(name, condition):
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+
+def test_framing():
+    """测试 1/3: 分帧结果一致"""
+    print("🔍 测试 1/3: 分帧结果与原实现一致")
+    pcm = make_pcm(3.03)
+    reference = encode(LegacyOpusEncoder, [pcm])
+    same_chunks = encode(OpusEncoderUtils, split(pcm, CHUNK_SAMPLES * 2))
+    random_chunks = all(encode(OpusEncoderUtils, random_split(pcm)) == reference for _ in range(20))
+    return all([
+        check(f"整段输入 {len(reference)} 帧，按20ms分块输入结果相同", same_chunks == reference),
+        check("20 种随机分块结果相同", random_chunks),
+    ])
+
+
+def measure(encoder_class, chunks, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        packets = encode(encoder_class, chunks)
+        best = min(best, time.perf_counter() - start)
+    return best / len(packets)
+
+
+def test_per_frame_cost(rounds):
+    """测试 2/3: 每帧耗时不随句子长度增长"""
+    print(f"🔍 测试 2/3: 每帧耗时（每次输入 {CHUNK_SAMPLES} 个采样，取最快的一次）")
+    new_costs, old_costs = [], []
+    for seconds in DURATIONS:
+        chunks = split(make_pcm(seconds), CHUNK_SAMPLES * 2)
+        # 短句重复更多次，各长度的总帧数相近，减少计时误差
+        repeats = rounds * max(DURATIONS) // seconds
+        new_costs.append(measure(OpusEncoderUtils, chunks, repeats))
+        old_costs.append(measure(LegacyOpusEncoder, chunks, repeats))
+        print(f"   {seconds:>3}s: 预分配缓冲 {new_costs[-1] * 1e6:.1f}µs/帧，原实现 {old_costs[-1] * 1e6:.1f}µs/帧")
+    return all([
+        check(f"最长句子的每帧耗时为最短句子的 {new_costs[-1] / new_costs[0]:.2f} 倍", new_costs[-1] < new_costs[0] * 1.5),
+        check("每帧耗时不高于原实现", all(new <= old * 1.1 for new, old in zip(new_costs, old_costs))),
+    ])
+
+
+def fresh_encode(pcm, **settings):
+    """参数相同的新编码器的输出"""
+    encoder = Encoder(SAMPLE_RATE, 1, constants.APPLICATION_AUDIO)
+    for name, value in settings.items():
+        setattr(encoder, name, value)
+    frame_bytes = 960 * 2
+    return [encoder.encode(pcm[offset: offset + frame_bytes].ljust(frame_bytes, b"\x00"), 960)
+            for offset in range(0, len(pcm), frame_bytes)]
+
+
+def test_pool():
+    """测试 3/3: 编码器池"""
+    print(f"🔍 测试 3/3: {CONNECTIONS} 个连接各合成 {SEGMENTS_PER_CONNECTION} 段")
+    pcm = make_pcm(1.5)
+    before = ENCODER_POOL.get_stats()
+
+    def connection(index):
+        outputs = []
+        for segment in range(SEGMENTS_PER_CONNECTION):
+            packets = []
+            # 流式合成（OpusEncoderUtils）和整句合成（pcm_to_data_stream）交替
+            if segment % 2:
+                pcm_to_data_stream(pcm, True, packets.append)
+            else:
+                packets = encode(OpusEncoderUtils, split(pcm, CHUNK_SAMPLES * 2))
+            outputs.append((segment % 2, packets))
+        return outputs
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONNECTIONS) as executor:
+        results = [output for outputs in executor.map(connection, range(CONNECTIONS)) for output in outputs]
+    elapsed = time.perf_counter() - start
+    after = ENCODER_POOL.get_stats()
+    created = after["created"] - before["created"]
+    reused = after["reused"] - before["reused"]
+    segments = CONNECTIONS * SEGMENTS_PER_CONNECTION
+    print(f"   {segments} 段耗时 {elapsed * 1000:.0f}ms，新建编码器 {created} 个，重用 {reused} 次")
+
+    stream_reference = fresh_encode(pcm, bitrate=24000, complexity=10, signal=constants.SIGNAL_VOICE)
+    whole_reference = fresh_encode(pcm)
+    return all([
+        # 两种编码参数各自一组编码器
+        check(f"新建编码器不超过同时编码数（{created} ≤ {CONNECTIONS * 2}）", 0 < created <= CONNECTIONS * 2),
+        check("其余段都重用了编码器", created + reused == segments),
+        check("重用的编码器输出与新编码器相同（已重置状态）",
+              all(packets == (whole_reference if whole else stream_reference) for whole, packets in results)),
+    ])
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else ROUNDS
+    random.seed(1)
+    print("=" * 50)
+    print("Opus编码缓冲和编码器池基准")
+    print("=" * 50)
+    results = [test_framing(), test_per_frame_cost(rounds), test_pool()]
+    passed = sum(results)
+    print("=" * 50)
+    print(f"结果: {passed}/{len(results)} 通过")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,196 @@
+"""
+代理采集器消息接收基准测试
+子进程中启动本地 WebSocket 服务器，尽快回放一批 DouyinBarrageGrab 格式的消息
+（默认按大直播间的比例生成：点赞、进场占大多数），采集器进程统计吞吐和每条消息的CPU时间，对比：
+    1. 旧实现：_listen 解析一次，_process_message 再解析整条消息和 Data
+    2. 新实现：每条消息最多解析一次，无人订阅的类型不解析
+
+使用方法（在项目根目录运行）:
+    python tools/benchmark_proxy_ingest.py [录制文件]
+
+录制文件为每行一条原始消息的文本文件，不指定时使用生成的消息
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import multiprocessing
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import websockets
+from configs.logger import setup_logging
+from core.live.douyin_proxy_collector import DouyinProxyCollector, MessageType
+
+MESSAGE_COUNT = 50000
+# 大直播间的消息比例（类型, 权重）
+TYPE_WEIGHTS = [
+    (MessageType.点赞消息, 60),
+    (MessageType.进入直播间, 25),
+    (MessageType.弹幕消息, 10),
+    (MessageType.礼物消息, 3),
+    (MessageType.关注消息, 2),
+]
+
+
+def generate_frames(count, seed=42):
+    """生成 DouyinBarrageGrab 格式的消息（Data 为嵌套的JSON字符串）"""
+    rng = random.Random(seed)
+    types = [t for t, _ in TYPE_WEIGHTS]
+    weights = [w for _, w in TYPE_WEIGHTS]
+    frames = []
+    for i in range(count):
+        msg_type = rng.choices(types, weights)[0]
+        user = {
+            "Id": 100000 + i % 5000,
+            "Nickname": f"观众{i % 5000}",
+            "Gender": i % 3,
+            "Level": i % 50,
+            "HeadImgUrl": f"https://p3.douyinpic.com/aweme/100x100/{i:08x}.jpeg",
+            "FansClub": {"ClubName": "小智的粉丝团", "Level": i % 20},
+            "PayLevel": i % 30,
+        }
+        data = {"MsgId": 7000000000000000000 + i, "User": user, "Content": "", "RoomId": 7300000000000000000}
+        if msg_type == MessageType.弹幕消息:
+            data["Content"] = f"主播好，第{i}条弹幕"
+        elif msg_type == MessageType.点赞消息:
+            data.update({"Count": rng.randint(1, 15), "Total": 100000 + i})
+        elif msg_type == MessageType.进入直播间:
+            data.update({"CurrentCount": 5000 + i % 100})
+        elif msg_type == MessageType.礼物消息:
+            data.update({"GiftName": "小心心", "GiftCount": 1, "DiamondCount": 1})
+        frames.append(json.dumps(
+            {"Type": int(msg_type), "ProcessName": "chrome.exe", "Data": json.dumps(data, ensure_ascii=False)},
+            ensure_ascii=False,
+        ))
+    return frames
+
+
+def load_frames(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def serve_frames(frames, port_queue):
+    """子进程：每个连接依次回放全部消息后关闭"""
+
+    async def handle(websocket):
+        for frame in frames:
+            await websocket.send(frame)
+        await websocket.close()
+
+    async def start():
+        server = await websockets.serve(handle, "127.0.0.1", 0, compression=None, max_size=None)
+        port_queue.put(server.sockets[0].getsockname()[1])
+        await asyncio.Future()
+
+    asyncio.run(start())
+
+
+class LegacyProxyCollector(DouyinProxyCollector):
+    """旧实现：接收时解析一次，处理时再解析整条消息和 Data，所有类型都解析"""
+
+    async def _process_message(self, message: str):
+        try:
+            json.loads(message)  # 旧 _listen 中用于统计弹幕数的解析
+            data = json.loads(message)
+            if "Type" not in data:
+                return
+            msg_type = data["Type"]
+            self.stats['total_messages'] += 1
+            if msg_type == MessageType.下播:
+                await self._handle_live_exit()
+                return
+            if "Data" not in data:
+                return
+            data_dict = json.loads(data["Data"])
+            handler = {
+                MessageType.弹幕消息: self._handle_danmaku,
+                MessageType.点赞消息: self._handle_like,
+                MessageType.进入直播间: self._handle_enter,
+                MessageType.关注消息: self._handle_follow,
+                MessageType.礼物消息: self._handle_gift,
+                MessageType.直播间统计: self._handle_statistics,
+                MessageType.粉丝团消息: self._handle_fansclub,
+                MessageType.直播间分享: self._handle_share,
+            }.get(msg_type)
+            if handler:
+                await handler(data_dict)
+            return msg_type
+        except Exception:
+            return None
+
+
+async def run_collector(collector_class, port, forward_types):
+    """连接回放服务器，接收全部消息，返回 (消息数, 秒, CPU秒, 回调数)"""
+    logger = setup_logging()
+    received = []
+
+    async def on_message(event):
+        received.append(event["type"])
+
+    collector = collector_class(
+        on_message_callback=on_message,
+        ws_url=f"ws://127.0.0.1:{port}",
+        logger=logger,
+        forward_types=forward_types,
+    )
+    async with websockets.connect(collector.ws_url, compression=None, max_size=None) as websocket:
+        count = 0
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        async for message in websocket:
+            await collector._process_message(message)
+            count += 1
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+    return count, wall, cpu, len(received)
+
+
+def report(label, result):
+    count, wall, cpu, callbacks = result
+    print(f"   [{label}] {count} 条消息，{count / wall:,.0f} 条/秒，"
+          f"CPU {cpu / count * 1e6:.1f}µs/条，回调 {callbacks} 次")
+    return cpu / count
+
+
+async def main():
+    frames = load_frames(sys.argv[1]) if len(sys.argv) > 1 else generate_frames(MESSAGE_COUNT)
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve_frames, args=(frames, port_queue), daemon=True)
+    server.start()
+    port = port_queue.get(timeout=30)
+
+    print("=" * 50)
+    print(f"代理采集器消息接收基准（{len(frames)} 条消息）")
+    print("=" * 50)
+
+    results = {}
+    for label, collector_class, forward_types in (
+        ("旧实现 只订阅弹幕", LegacyProxyCollector, ("danmaku",)),
+        ("新实现 只订阅弹幕", DouyinProxyCollector, ("danmaku",)),
+        ("旧实现 订阅全部", LegacyProxyCollector, ("danmaku", "like", "enter", "follow", "gift")),
+        ("新实现 订阅全部", DouyinProxyCollector, ("danmaku", "like", "enter", "follow", "gift")),
+    ):
+        results[label] = await run_collector(collector_class, port, forward_types)
+        report(label, results[label])
+
+    server.terminate()
+
+    legacy_cpu = results["旧实现 只订阅弹幕"][2]
+    new_cpu = results["新实现 只订阅弹幕"][2]
+    print("=" * 50)
+    print(f"只订阅弹幕时每条消息CPU时间降低 {legacy_cpu / new_cpu:.1f} 倍")
+    same_callbacks = all(
+        results[f"旧实现 {name}"][3] == results[f"新实现 {name}"][3] for name in ("只订阅弹幕", "订阅全部")
+    )
+    ok = same_callbacks and new_cpu < legacy_cpu
+    print("✅ 回调结果一致，接收开销降低" if ok else "❌ 回调结果不一致或开销未降低")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,215 @@
+"""
+TTS 长期事件循环基准测试
+本地启动模拟的 HTTP TTS 服务（返回一段 WAV），对比每段文字 asyncio.run() 新建事件循环与线程的长期事件循环，验证：
+    1. 每段文字执行协程的固定开销（新建和销毁事件循环 vs 复用）
+    2. 流式提供方的线程连续合成多段文字时，HTTP 连接在段之间复用（原实现每段新建会话和连接）
+    3. 经由 TTSProviderBase.to_tts_stream 和共享线程池合成时，事件循环和连接数不超过线程池大小
+
+使用方法（在项目根目录运行）:
+    python tools/benchmark_tts_event_loop.py [段数]
+"""
+
+import io
+import os
+import sys
+import time
+import wave
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import aiohttp
+from aiohttp import web
+from core.utils import tts_pool
+from core.providers.tts.base import TTSProviderBase
+
+SEGMENTS = 200
+CONNECTIONS = 20  # 测试 3 的模拟连接数
+SEGMENTS_PER_CONNECTION = 5
+
+
+def make_wav(duration=0.2, sample_rate=16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(bytes(int(sample_rate * duration) * 2))
+    return buffer.getvalue()
+
+
+class FakeUpstream:
+    """模拟的 HTTP TTS 服务，按客户端端口统计连接数"""
+
+    def __init__(self):
+        self.wav = make_wav()
+        self.peers = set()
+        self.requests = 0
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request):
+        self.requests += 1
+        self.peers.add(request.transport.get_extra_info("peername"))
+        return web.Response(body=self.wav, content_type="audio/wav")
+
+    async def start(self):
+        app = web.Application()
+        app.add_routes([web.post("/tts", self.handle)])
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/tts"
+
+    def reset(self):
+        self.peers.clear()
+        self.requests = 0
+
+
+def check(name, condition):
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+
+async def noop():
+    return None
+
+
+def test_loop_overhead(segments):
+    """测试 1/3: 每段的事件循环开销"""
+    print(f"🔍 测试 1/3: 执行 {segments} 个空协程的固定开销")
+    start = time.perf_counter()
+    for _ in range(segments):
+        asyncio.run(noop())
+    per_run = (time.perf_counter() - start) / segments
+
+    tts_pool.run_coroutine(noop())
+    start = time.perf_counter()
+    for _ in range(segments):
+        tts_pool.run_coroutine(noop())
+    per_reuse = (time.perf_counter() - start) / segments
+    tts_pool.close_thread_loop()
+
+    print(f"   asyncio.run(): {per_run * 1e6:.0f}µs/段，长期事件循环: {per_reuse * 1e6:.0f}µs/段")
+    return check(f"每段节省 {(per_run - per_reuse) * 1e6:.0f}µs（{per_run / per_reuse:.0f} 倍）", per_reuse * 5 < per_run)
+
+
+def test_connection_reuse(upstream, segments):
+    """测试 2/3: 流式提供方线程中的连接复用（在独立线程中执行，与提供方的文本线程相同）"""
+    print(f"🔍 测试 2/3: 一个线程连续合成 {segments} 段")
+
+    async def speak_new_session():
+        # 原实现：每段 asyncio.run()，每次新建 ClientSession
+        async with aiohttp.ClientSession() as session:
+            async with session.post(upstream.url, json={"text": "你好"}) as response:
+                return await response.read()
+
+    async def speak_shared_session():
+        session = await tts_pool.get_http_session()
+        async with session.post(upstream.url, json={"text": "你好"}) as response:
+            return await response.read()
+
+    timings = {}
+
+    def worker():
+        upstream.reset()
+        start = time.perf_counter()
+        for _ in range(segments):
+            asyncio.run(speak_new_session())
+        timings["old"] = (time.perf_counter() - start) / segments, len(upstream.peers)
+
+        upstream.reset()
+        start = time.perf_counter()
+        for _ in range(segments):
+            tts_pool.run_coroutine(speak_shared_session())
+        timings["new"] = (time.perf_counter() - start) / segments, len(upstream.peers)
+        tts_pool.close_thread_loop()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    (old_time, old_peers), (new_time, new_peers) = timings["old"], timings["new"]
+    print(f"   asyncio.run() + 新会话: {old_time * 1000:.2f}ms/段，{old_peers} 个连接")
+    print(f"   长期事件循环 + 共享会话: {new_time * 1000:.2f}ms/段，{new_peers} 个连接")
+    return all([
+        check("原实现每段新建连接", old_peers == segments),
+        check("长期事件循环复用同一个连接", new_peers == 1),
+        check(f"每段耗时降低 {(1 - new_time / old_time) * 100:.0f}%", new_time < old_time),
+    ])
+
+
+class FakeConnection:
+    def __init__(self):
+        self.stop_event = threading.Event()
+        self.audio_format = "opus"
+
+
+class HttpTTS(TTSProviderBase):
+    """通过共享会话请求模拟服务的非流式提供方"""
+
+    def __init__(self, url):
+        super().__init__({}, delete_audio_file=True)
+        self.url = url
+        self.conn = FakeConnection()
+        self.packets = []
+
+    async def text_to_speak(self, text, output_file):
+        session = await tts_pool.get_http_session()
+        async with session.post(self.url, json={"text": text}) as response:
+            return await response.read()
+
+    def handle_opus(self, opus_data):
+        self.packets.append(opus_data)
+
+
+async def test_pool(upstream):
+    """测试 3/3: 经由共享线程池合成"""
+    print(f"🔍 测试 3/3: {CONNECTIONS} 个连接各合成 {SEGMENTS_PER_CONNECTION} 段（线程池）")
+    pool_size = tts_pool.get_executor()._max_workers
+    loops_before = tts_pool.get_loop_stats()["created"]
+    upstream.reset()
+    providers = [HttpTTS(upstream.url) for _ in range(CONNECTIONS)]
+
+    async def speak(tts):
+        for index in range(SEGMENTS_PER_CONNECTION):
+            await tts_pool.run_blocking(tts.to_tts_stream, f"第{index}句", tts.handle_opus)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(speak(tts) for tts in providers))
+    elapsed = time.perf_counter() - start
+    loops = tts_pool.get_loop_stats()["created"] - loops_before
+    segments = CONNECTIONS * SEGMENTS_PER_CONNECTION
+    print(f"   {segments} 段耗时 {elapsed:.2f}s，事件循环 {loops} 个，连接 {len(upstream.peers)} 个")
+    return all([
+        check("每段都生成了音频", upstream.requests == segments and all(tts.packets for tts in providers)),
+        check(f"事件循环数不超过线程池大小 {pool_size}", 0 < loops <= pool_size),
+        check("连接数不超过事件循环数", len(upstream.peers) <= loops),
+    ])
+
+
+async def main():
+    segments = int(sys.argv[1]) if len(sys.argv) > 1 else SEGMENTS
+    upstream = FakeUpstream()
+    await upstream.start()
+
+    print("=" * 50)
+    print("TTS 长期事件循环基准")
+    print("=" * 50)
+    loop = asyncio.get_running_loop()
+    results = [
+        await loop.run_in_executor(None, test_loop_overhead, segments),
+        await loop.run_in_executor(None, test_connection_reuse, upstream, segments),
+        await test_pool(upstream),
+    ]
+    await upstream.runner.cleanup()
+    passed = sum(results)
+    print("=" * 50)
+    print(f"结果: {passed}/{len(results)} 通过")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
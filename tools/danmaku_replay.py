@@ -0,0 +1,360 @@
+"""
+弹幕录制回放与压测工具
+录制 DouyinBarrageGrab 的原始消息，或按突发场景生成消息，再通过本地 WebSocket 服务器
+以 1 倍、N 倍或最快速度回放，代替 DouyinBarrageGrab 给弹幕服务或压测使用
+
+使用方法（在项目根目录运行）:
+    # 录制（也可以在配置中设置 danmaku.record_path 边运行边录制）
+    python tools/danmaku_replay.py record --url ws://127.0.0.1:8888 --out room.dyrec --duration 600
+
+    # 生成突发场景：steady（普通直播间）、gift_storm（礼物刷屏）、like_flood（点赞刷屏）
+    python tools/danmaku_replay.py synth --profile gift_storm --duration 60 --out gift_storm.dyrec
+
+    # 代替 DouyinBarrageGrab 回放（弹幕服务配置 use_proxy: true，proxy_ws_url 指向该端口）
+    python tools/danmaku_replay.py serve room.dyrec --port 8888 --speed 4
+
+    # 压测：回放到进程内的弹幕处理器（模拟LLM和播放），统计接收吞吐、队列增长和丢弃率
+    python tools/danmaku_replay.py bench gift_storm.dyrec --speed max --strategy priority
+    python tools/danmaku_replay.py bench --profile like_flood --duration 30 --speed 1
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import websockets
+from configs.logger import setup_logging
+from core.live.douyin_proxy_collector import DouyinProxyCollector, MessageType
+from core.live.frame_recorder import FrameRecorder, read_frames
+from core.providers.llm.base import LLMProviderBase
+from core.danmaku.handler import DanmakuHandler
+
+# 突发场景：基础速率（条/秒）+ 周期性突发（每 period 秒突发 length 秒，突发期间的速率）
+PROFILES = {
+    "steady": {
+        "rates": {MessageType.弹幕消息: 3, MessageType.点赞消息: 20, MessageType.进入直播间: 5,
+                  MessageType.礼物消息: 0.3, MessageType.关注消息: 0.2},
+        "burst": {},
+    },
+    "gift_storm": {
+        "rates": {MessageType.弹幕消息: 3, MessageType.点赞消息: 20, MessageType.进入直播间: 5,
+                  MessageType.礼物消息: 0.3, MessageType.关注消息: 0.2},
+        "burst": {"period": 20, "length": 5, "rates": {MessageType.礼物消息: 50, MessageType.弹幕消息: 30}},
+    },
+    "like_flood": {
+        "rates": {MessageType.弹幕消息: 3, MessageType.点赞消息: 20, MessageType.进入直播间: 5,
+                  MessageType.礼物消息: 0.3, MessageType.关注消息: 0.2},
+        "burst": {"period": 20, "length": 5, "rates": {MessageType.点赞消息: 2000, MessageType.进入直播间: 200}},
+    },
+}
+
+GIFTS = [("小心心", 1), ("玫瑰", 1), ("棒棒糖", 9), ("墨镜", 99), ("嘉年华", 30000)]
+CHAT = ["主播好", "你好小智", "今天天气怎么样", "给我讲个笑话", "唱首歌吧", "哈哈哈哈", "666", "小智你几岁了"]
+
+
+def build_frame(msg_type: int, seq: int, rng: random.Random) -> str:
+    """生成一条 DouyinBarrageGrab 格式的消息（Data 为嵌套的JSON字符串）"""
+    user_id = rng.randint(1, 5000)
+    user = {"Id": user_id, "Nickname": f"观众{user_id}", "Gender": user_id % 3, "Level": user_id % 50}
+    data = {"MsgId": seq, "User": user, "Content": ""}
+    if msg_type == MessageType.弹幕消息:
+        data["Content"] = rng.choice(CHAT)
+    elif msg_type == MessageType.点赞消息:
+        data.update({"Count": rng.randint(1, 15), "Total": 100000 + seq})
+    elif msg_type == MessageType.进入直播间:
+        data.update({"CurrentCount": 5000 + seq % 100})
+    elif msg_type == MessageType.礼物消息:
+        # 礼物价值长尾分布：大多是小礼物
+        gift_name, price = GIFTS[min(int(rng.expovariate(1.2)), len(GIFTS) - 1)]
+        data.update({"GiftName": gift_name, "GiftCount": 1, "DiamondCount": price})
+    return json.dumps(
+        {"Type": int(msg_type), "ProcessName": "chrome.exe", "Data": json.dumps(data, ensure_ascii=False)},
+        ensure_ascii=False,
+    )
+
+
+def synthesize(profile_name: str, duration: float, seed: int = 42) -> list:
+    """
+    按突发场景生成消息
+
+    Returns:
+        [(相对开始的秒数, 消息)]
+    """
+    profile = PROFILES[profile_name]
+    burst = profile["burst"]
+    rng = random.Random(seed)
+    tick = 0.05
+    frames = []
+    seq = 0
+    for step in range(int(duration / tick)):
+        now = step * tick
+        rates = dict(profile["rates"])
+        if burst and now % burst["period"] >= burst["period"] - burst["length"]:
+            rates.update(burst["rates"])
+        for msg_type, rate in rates.items():
+            expected = rate * tick
+            count = int(expected) + (1 if rng.random() < expected - int(expected) else 0)
+            for _ in range(count):
+                seq += 1
+                frames.append((now + rng.random() * tick, build_frame(msg_type, seq, rng)))
+    frames.sort(key=lambda item: item[0])
+    return frames
+
+
+def write_frames(path: str, frames: list):
+    recorder = FrameRecorder(path)
+    for offset, frame in frames:
+        recorder.write(frame, timestamp=offset)
+    recorder.close()
+
+
+def parse_speed(value: str) -> float:
+    """回放速度：数字为倍速，max 为不限速（返回 0）"""
+    return 0.0 if value == "max" else float(value)
+
+
+async def replay(websocket, frames: list, speed: float) -> dict:
+    """
+    按录制时间间隔回放消息
+
+    Args:
+        websocket: 客户端连接
+        frames: [(秒, 消息)]
+        speed: 倍速，0 为不限速
+
+    Returns:
+        回放统计
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    max_lag = 0.0
+    for index, (offset, frame) in enumerate(frames):
+        if speed > 0:
+            delay = start + offset / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+        await websocket.send(frame)
+    elapsed = loop.time() - start
+    return {"frames": len(frames), "elapsed": elapsed, "max_lag": max_lag}
+
+
+async def start_replay_server(frames: list, speed: float, port: int, loop_forever: bool = False, on_done=None):
+    """启动回放服务器：每个连接独立回放一遍（loop_forever 时循环回放）"""
+
+    async def handle(websocket):
+        while True:
+            result = await replay(websocket, frames, speed)
+            if on_done is not None:
+                on_done(result)
+            if not loop_forever:
+                break
+        await websocket.close()
+
+    return await websockets.serve(handle, "127.0.0.1", port, compression=None, max_size=None)
+
+
+def load_frames(args) -> list:
+    if args.file:
+        return list(read_frames(args.file))
+    return synthesize(args.profile, args.duration, args.seed)
+
+
+async def cmd_record(args):
+    """录制 DouyinBarrageGrab 的原始消息"""
+    recorder = FrameRecorder(args.out)
+    deadline = time.monotonic() + args.duration if args.duration else None
+    print(f"📼 录制 {args.url} → {args.out}（Ctrl+C 结束）")
+    try:
+        async with websockets.connect(args.url, max_size=None) as websocket:
+            while deadline is None or time.monotonic() < deadline:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), timeout=timeout)
+                except (asyncio.TimeoutError, websockets.exceptions.ConnectionClosed):
+                    break
+                recorder.write(message)
+                if recorder.count % 1000 == 0:
+                    print(f"   已录制 {recorder.count} 条")
+    finally:
+        recorder.close()
+        print(f"✅ 共录制 {recorder.count} 条消息，文件大小 {os.path.getsize(args.out) / 1024:.1f}KB")
+
+
+async def cmd_synth(args):
+    """生成突发场景消息"""
+    frames = synthesize(args.profile, args.duration, args.seed)
+    write_frames(args.out, frames)
+    print(f"✅ 场景 {args.profile}：{len(frames)} 条消息，{args.duration:.0f} 秒，"
+          f"文件大小 {os.path.getsize(args.out) / 1024:.1f}KB → {args.out}")
+
+
+async def cmd_serve(args):
+    """代替 DouyinBarrageGrab 回放消息"""
+    frames = load_frames(args)
+    speed = parse_speed(args.speed)
+
+    def on_done(result):
+        print(f"   回放 {result['frames']} 条，用时 {result['elapsed']:.1f}秒，"
+              f"{result['frames'] / max(result['elapsed'], 1e-9):,.0f} 条/秒，最大落后 {result['max_lag'] * 1000:.0f}ms")
+
+    server = await start_replay_server(frames, speed, args.port, args.loop, on_done)
+    print(f"📡 回放服务器 ws://127.0.0.1:{args.port}（{len(frames)} 条消息，速度 {args.speed}）")
+    async with server:
+        await asyncio.Future()
+
+
+class LoadLLM(LLMProviderBase):
+    """模拟LLM：固定生成耗时，统计调用次数"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls = 0
+
+    def response(self, session_id, dialogue):
+        self.calls += 1
+        time.sleep(self.delay)
+        yield "谢谢大家的弹幕！"
+
+
+class BenchHandler(DanmakuHandler):
+    """用固定时长的模拟播放代替TTS和设备发送"""
+
+    playback_seconds = 2.0
+
+    async def _play_reply(self, reply):
+        await reply.llm_done.wait()
+        if reply.full_text:
+            await asyncio.sleep(self.playback_seconds)
+
+
+async def cmd_bench(args):
+    """回放到进程内的弹幕处理器，统计接收吞吐、队列增长和丢弃率"""
+    logger = setup_logging()
+    frames = load_frames(args)
+    speed = parse_speed(args.speed)
+    config = {
+        "danmaku": {
+            "flow_control_strategy": args.strategy,
+            "batch": {"enabled": args.batch},
+            "reply_cache": {"enabled": False},
+        }
+    }
+    llm = LoadLLM(args.llm_delay)
+    handler = BenchHandler(config, llm, tts=None, device_manager=None, logger=logger)
+    handler.playback_seconds = args.playback
+
+    done = asyncio.Event()
+    replay_result = {}
+
+    def on_done(result):
+        replay_result.update(result)
+        server.close(close_connections=False)  # 只回放一遍，采集器断开后不再接受重连
+        done.set()
+
+    server = await start_replay_server(frames, speed, 0, on_done=on_done)
+    port = server.sockets[0].getsockname()[1]
+    forward_types = ("danmaku",)
+    if handler.scheduler is not None:
+        forward_types = ("danmaku", "gift", "follow", "fansclub")
+    collector = DouyinProxyCollector(
+        on_message_callback=handler.add_danmaku,
+        ws_url=f"ws://127.0.0.1:{port}",
+        logger=logger,
+        forward_types=forward_types,
+    )
+
+    handler_task = asyncio.create_task(handler.start())
+    collector_task = asyncio.create_task(collector.start())
+
+    # 采样直到采集器处理完全部消息（回放结束后最多再等10秒）
+    samples = []
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    done_at = None
+    while True:
+        await asyncio.sleep(args.sample_interval)
+        samples.append((time.perf_counter() - start, collector.stats["total_messages"], handler.get_stats()))
+        if done.is_set():
+            done_at = done_at or time.perf_counter()
+            if collector.stats["total_messages"] >= len(frames) or time.perf_counter() - done_at > 10:
+                break
+    elapsed = time.perf_counter() - start
+    cpu_used = time.process_time() - cpu_start
+    await asyncio.sleep(args.playback * 2)
+    final = handler.get_stats()
+
+    await collector.stop()
+    await handler.stop()
+    for task in (handler_task, collector_task):
+        task.cancel()
+    server.close()
+
+    total = collector.stats["total_messages"]
+    print("=" * 60)
+    print(f"弹幕压测（{len(frames)} 条消息，速度 {args.speed}，流控策略 {args.strategy}"
+          f"{'，批量模式' if args.batch else ''}）")
+    print("=" * 60)
+    print(f"{'时间(s)':>8} {'接收':>8} {'交给处理器':>10} {'待处理':>6} {'已回复':>6} {'已丢弃':>6}")
+    step = max(1, len(samples) // 20)
+    for at, received_total, stats in samples[::step]:
+        print(f"{at:8.1f} {received_total:8d} {stats['received']:10d} {stats['pending']:6d} "
+              f"{stats['served']:6d} {stats['dropped']:6d}")
+    max_pending = max((stats["pending"] for _, _, stats in samples), default=0)
+    print("=" * 60)
+    print(f"接收吞吐: {total / max(elapsed, 1e-9):,.0f} 条/秒（接收 {total} 条用时 {elapsed:.1f}秒，"
+          f"回放最大落后 {replay_result.get('max_lag', 0) * 1000:.0f}ms），CPU {cpu_used / max(total, 1) * 1e6:.1f}µs/条")
+    print(f"处理器: 收到 {final['received']}，回复 {final['served']}，丢弃 {final['dropped']}"
+          f"（{final['dropped'] / max(final['received'], 1):.1%}），剩余 {final['pending']}，"
+          f"最大待处理 {max_pending}，LLM调用 {llm.calls} 次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="弹幕录制回放与压测工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    record = sub.add_parser("record", help="录制 DouyinBarrageGrab 的原始消息")
+    record.add_argument("--url", default="ws://127.0.0.1:8888")
+    record.add_argument("--out", required=True)
+    record.add_argument("--duration", type=float, default=0, help="录制秒数，0 为直到 Ctrl+C")
+
+    synth = sub.add_parser("synth", help="生成突发场景消息")
+    synth.add_argument("--profile", choices=sorted(PROFILES), default="steady")
+    synth.add_argument("--duration", type=float, default=60)
+    synth.add_argument("--seed", type=int, default=42)
+    synth.add_argument("--out", required=True)
+
+    for name, help_text in (("serve", "代替 DouyinBarrageGrab 回放消息"), ("bench", "回放到弹幕处理器并统计")):
+        command = sub.add_parser(name, help=help_text)
+        command.add_argument("file", nargs="?", help="录制文件，不指定时按 --profile 生成")
+        command.add_argument("--profile", choices=sorted(PROFILES), default="steady")
+        command.add_argument("--duration", type=float, default=60, help="生成场景的秒数")
+        command.add_argument("--seed", type=int, default=42)
+        command.add_argument("--speed", default="1", help="回放倍速，max 为不限速")
+        if name == "serve":
+            command.add_argument("--port", type=int, default=8888)
+            command.add_argument("--loop", action="store_true", help="循环回放")
+        else:
+            command.add_argument("--strategy", choices=["skip", "queue_limit", "priority"], default="skip")
+            command.add_argument("--batch", action="store_true", help="开启批量回复")
+            command.add_argument("--llm-delay", type=float, default=0.5, help="模拟LLM生成耗时（秒）")
+            command.add_argument("--playback", type=float, default=2.0, help="模拟每条回复播放时长（秒）")
+            command.add_argument("--sample-interval", type=float, default=0.5)
+
+    args = parser.parse_args()
+    commands = {"record": cmd_record, "synth": cmd_synth, "serve": cmd_serve, "bench": cmd_bench}
+    try:
+        asyncio.run(commands[args.command](args))
+    except KeyboardInterrupt:
+        print("\n已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+连接关闭时的丢弃消息计数测试
+验证：
+    1. 连接超时、处理出错、客户端断开、服务端主动关闭时，队列中未处理的消息按关闭原因计入
+       xiaozhi_dropped_messages_total
+    2. 重复调用 close() 不会重复计数
+
+使用方法（在项目根目录运行）:
+    python tools/test_connection_drops.py
+"""
+
+import os
+import sys
+import queue
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from websockets.exceptions import ConnectionClosedError
+from core.connection import ConnectionHandler, _DROPPED_MESSAGES
+from core.providers.tts.dto.dto import SentenceType
+
+PENDING = 3  # 每个连接关闭时队列中未处理的消息数
+CONFIG = {"exit_commands": [], "xiaozhi": {}, "close_connection_no_voice_time": 0}
+
+
+class FakeRequest:
+    path = "/xiaozhi/v1/"
+    headers = {"device-id": "test-device"}
+
+
+class FakeWebSocket:
+    """不产生消息，按 ending 结束：None 为正常结束，异常实例则抛出"""
+
+    def __init__(self, ending=None):
+        self.request = FakeRequest()
+        self.remote_address = ("127.0.0.1", 0)
+        self.ending = ending
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(0)
+        if self.ending is None:
+            raise StopAsyncIteration
+        raise self.ending
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeTTS:
+    def __init__(self):
+        self.tts_text_queue = queue.Queue()
+        self.tts_audio_queue = queue.Queue()
+
+    async def close(self):
+        pass
+
+
+def make_handler():
+    conn = ConnectionHandler(CONFIG, None, None, None, None, None)
+    conn.tts = FakeTTS()
+    for _ in range(PENDING):
+        conn.tts.tts_audio_queue.put((SentenceType.MIDDLE, b"audio", None))
+
+    async def no_background_initialize():
+        pass
+
+    async def no_timeout_check():
+        pass
+
+    conn._background_initialize = no_background_initialize
+    conn._check_timeout = no_timeout_check
+    return conn
+
+
+def dropped(reason):
+    return _DROPPED_MESSAGES.labels(reason).value
+
+
+def check(name, condition):
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+
+async def test_close_reasons():
+    """测试 1/2: 各关闭原因"""
+    print("🔍 测试 1/2: 按关闭原因计数")
+    before = {reason: dropped(reason) for reason in ("timeout", "error", "client_close", "server_close")}
+
+    conn = make_handler()
+    conn.websocket = FakeWebSocket()
+    conn.last_activity_time = 1.0  # 很久以前活动过，立即超时
+    await ConnectionHandler._check_timeout(conn)
+
+    await make_handler().handle_connection(FakeWebSocket(ConnectionClosedError(None, None)))
+    await make_handler().handle_connection(FakeWebSocket(RuntimeError("处理出错")))
+    await make_handler().close()
+
+    return all(
+        check(f"{reason} 计入 {dropped(reason) - before[reason]:.0f} 条", dropped(reason) - before[reason] == PENDING)
+        for reason in before
+    )
+
+
+async def test_close_twice():
+    """测试 2/2: 重复关闭"""
+    print("🔍 测试 2/2: 重复调用 close()")
+    before = dropped("server_close")
+    conn = make_handler()
+    await conn.close()
+    await conn.close()
+    return check("只计数一次", dropped("server_close") - before == PENDING)
+
+
+async def main():
+    print("=" * 50)
+    print("连接关闭时的丢弃消息计数测试")
+    print("=" * 50)
+    results = [await test_close_reasons(), await test_close_twice()]
+    passed = sum(results)
+    print("=" * 50)
+    print(f"结果: {passed}/{len(results)} 通过")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,120 @@
+"""
+弹幕批量回复测试
+使用本地模拟LLM（统计调用次数）和模拟播放（固定时长），
+分别在关闭/开启批量模式下以相同速率发送弹幕，比较每次LLM调用服务的弹幕数
+
+使用方法（在项目根目录运行）:
+    python tools/test_danmaku_batching.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from configs.logger import setup_logging
+from core.providers.llm.base import LLMProviderBase
+from core.danmaku.handler import DanmakuHandler, PreparedReply
+
+# 模拟负载参数
+DANMAKU_PER_SECOND = 10
+DURATION = 8.0  # 发送弹幕的时长（秒）
+PLAYBACK_SECONDS = 1.5  # 每条回复的播放时长（秒）
+LLM_DELAY = 0.3  # 模拟LLM生成耗时（秒）
+
+
+class CountingLLM(LLMProviderBase):
+    """模拟LLM：记录调用次数和每次收到的提问"""
+
+    def __init__(self):
+        self.calls = 0
+        self.queries = []
+
+    def response(self, session_id, dialogue):
+        self.calls += 1
+        self.queries.append(dialogue[-1]["content"])
+        time.sleep(LLM_DELAY)
+        yield "谢谢大家的弹幕！"
+
+
+class TimedPlaybackHandler(DanmakuHandler):
+    """用固定时长的模拟播放代替TTS和设备发送，统计被服务的弹幕数"""
+
+    served_comments = 0
+    served_replies = 0
+
+    async def _play_reply(self, reply: PreparedReply):
+        await reply.llm_done.wait()
+        if not reply.full_text:
+            return
+        items = reply.danmaku.get("items") or [reply.danmaku]
+        self.served_comments += len(items)
+        self.served_replies += 1
+        await asyncio.sleep(PLAYBACK_SECONDS)
+
+
+async def run_load(batch_enabled: bool):
+    logger = setup_logging()
+    llm = CountingLLM()
+    config = {
+        "danmaku": {
+            "batch": {"enabled": batch_enabled, "max_size": 5, "wait_window": 0.5},
+            "reply_cache": {"enabled": False},
+        }
+    }
+    handler = TimedPlaybackHandler(config, llm, tts=None, device_manager=None, logger=logger)
+    task = asyncio.create_task(handler.start())
+
+    sent = 0
+    start = time.time()
+    while time.time() - start < DURATION:
+        await handler.add_danmaku({"username": f"观众{sent % 37}", "content": f"第{sent}条弹幕"})
+        sent += 1
+        await asyncio.sleep(1.0 / DANMAKU_PER_SECOND)
+    await asyncio.sleep(PLAYBACK_SECONDS * 2)
+
+    handler.processing = False
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    for generate_task in list(handler.generate_tasks):
+        generate_task.cancel()
+
+    per_call = handler.served_comments / llm.calls if llm.calls else 0
+    print(
+        f"   发送 {sent} 条弹幕，LLM调用 {llm.calls} 次，播放 {handler.served_replies} 条回复，"
+        f"服务 {handler.served_comments} 条弹幕，每次调用服务 {per_call:.2f} 条"
+    )
+    return llm, handler, per_call
+
+
+async def main():
+    print("=" * 50)
+    print("弹幕批量回复测试")
+    print("=" * 50)
+
+    print("🔍 测试 1/2: 关闭批量模式")
+    _, _, single_per_call = await run_load(batch_enabled=False)
+    ok_single = abs(single_per_call - 1.0) < 1e-6
+    print("   ✅ 通过" if ok_single else "   ❌ 失败")
+
+    print("🔍 测试 2/2: 开启批量模式（每批最多5条）")
+    llm, _, batch_per_call = await run_load(batch_enabled=True)
+    batched_prompts = [q for q in llm.queries if q.startswith("以下是直播间观众的最新弹幕")]
+    if batched_prompts:
+        print("   批量提问示例:\n      " + batched_prompts[0].replace("\n", "\n      "))
+    ok_batch = batch_per_call > 2.0 and bool(batched_prompts)
+    print("   ✅ 通过" if ok_batch else "   ❌ 失败")
+
+    results = [ok_single, ok_batch]
+    print("=" * 50)
+    print(f"结果: {sum(results)}/{len(results)} 通过，每次LLM调用服务弹幕数 {single_per_call:.2f} → {batch_per_call:.2f}")
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,140 @@
+"""
+弹幕LLM异步流式测试
+使用本地模拟LLM（同步生成器，每个片段阻塞一段时间）验证：
+    1. 生成过程中事件循环延迟保持在阈值以内
+    2. 首字超时生效
+    3. 取消生成任务后模拟LLM停止产出
+
+使用方法（在项目根目录运行）:
+    python tools/test_danmaku_llm_async.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from configs.logger import setup_logging
+from core.providers.llm.base import LLMProviderBase
+from core.danmaku.handler import DanmakuHandler, PreparedReply
+
+# 事件循环允许的最大延迟（毫秒）
+MAX_LOOP_LAG_MS = 50
+
+
+class FakeLLM(LLMProviderBase):
+    """模拟LLM：同步阻塞地逐个产出片段"""
+
+    def __init__(self, tokens=20, token_delay=0.05, first_token_delay=0.0):
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.produced = 0
+
+    def response(self, session_id, dialogue):
+        time.sleep(self.first_token_delay)
+        for i in range(self.tokens):
+            time.sleep(self.token_delay)  # 模拟阻塞的网络读取
+            self.produced += 1
+            yield f"片段{i}，"
+
+
+async def measure_loop_lag(stop_event: asyncio.Event, interval=0.01):
+    """每隔 interval 秒醒来一次，记录实际醒来时间与预期的最大偏差"""
+    loop = asyncio.get_running_loop()
+    max_lag = 0.0
+    while not stop_event.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, loop.time() - expected)
+    return max_lag * 1000
+
+
+def create_handler(llm, **danmaku_config):
+    logger = setup_logging()
+    config = {"danmaku": danmaku_config}
+    return DanmakuHandler(config, llm, tts=None, device_manager=None, logger=logger)
+
+
+async def test_loop_lag():
+    """测试 1: 生成过程中事件循环保持响应"""
+    print("🔍 测试 1/3: 生成过程中的事件循环延迟")
+    llm = FakeLLM(tokens=20, token_delay=0.05)
+    handler = create_handler(llm)
+    reply = PreparedReply({"username": "测试用户", "content": "你好"}, "测试用户说: 你好")
+
+    stop_event = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop_event))
+    start = time.time()
+    text = await handler._call_llm([{"role": "user", "content": reply.query}], reply)
+    elapsed = time.time() - start
+    stop_event.set()
+    max_lag_ms = await lag_task
+
+    print(f"   生成 {llm.produced} 个片段，耗时 {elapsed:.2f}s，回复长度 {len(text)}")
+    print(f"   事件循环最大延迟: {max_lag_ms:.1f}ms（阈值 {MAX_LOOP_LAG_MS}ms）")
+    ok = llm.produced == 20 and max_lag_ms < MAX_LOOP_LAG_MS
+    print("   ✅ 通过" if ok else "   ❌ 失败")
+    return ok
+
+
+async def test_first_token_timeout():
+    """测试 2: 首字超时"""
+    print("🔍 测试 2/3: 首字超时")
+    llm = FakeLLM(tokens=5, token_delay=0.01, first_token_delay=1.0)
+    handler = create_handler(llm, llm_first_token_timeout=0.2)
+    reply = PreparedReply({"username": "测试用户", "content": "你好"}, "测试用户说: 你好")
+
+    start = time.time()
+    text = await handler._call_llm([{"role": "user", "content": reply.query}], reply)
+    elapsed = time.time() - start
+
+    print(f"   返回耗时 {elapsed:.2f}s，回复: '{text}'")
+    ok = elapsed < 0.5 and text == ""
+    print("   ✅ 通过" if ok else "   ❌ 失败")
+    return ok
+
+
+async def test_cancellation():
+    """测试 3: 取消生成任务后LLM停止产出"""
+    print("🔍 测试 3/3: 取消生成")
+    llm = FakeLLM(tokens=100, token_delay=0.02)
+    handler = create_handler(llm)
+    reply = PreparedReply({"username": "测试用户", "content": "你好"}, "测试用户说: 你好")
+
+    task = asyncio.create_task(
+        handler._call_llm([{"role": "user", "content": reply.query}], reply)
+    )
+    await asyncio.sleep(0.2)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    produced_at_cancel = llm.produced
+    await asyncio.sleep(0.3)
+
+    print(f"   取消时已产出 {produced_at_cancel} 个片段，取消后再产出 {llm.produced - produced_at_cancel} 个")
+    ok = llm.produced - produced_at_cancel <= 1 and llm.produced < 100
+    print("   ✅ 通过" if ok else "   ❌ 失败")
+    return ok
+
+
+async def main():
+    print("=" * 50)
+    print("弹幕LLM异步流式测试")
+    print("=" * 50)
+    results = [
+        await test_loop_lag(),
+        await test_first_token_timeout(),
+        await test_cancellation(),
+    ]
+    print("=" * 50)
+    print(f"结果: {sum(results)}/{len(results)} 通过")
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,157 @@
+"""
+多直播间测试
+在同一个事件循环中启动多个直播间（模拟弹幕采集器），共享一个模拟LLM，
+每个直播间使用独立的模拟TTS和模拟设备，验证：
+    1. 各直播间的设备只收到本直播间的回复
+    2. 各直播间的对话上下文互相独立
+    3. LLM实例在直播间之间共享
+并统计每个直播间的内存开销
+
+使用方法（在项目根目录运行）:
+    python tools/test_danmaku_multi_room.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+import resource
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from configs.logger import setup_logging
+from core.providers.llm.base import LLMProviderBase
+from core.providers.tts.base import TTSProviderBase
+from core.providers.tts.dto.dto import SentenceType
+from core.danmaku.room import LiveRoom
+
+ROOM_COUNT = 3
+DEVICES_PER_ROOM = 2
+MOCK_INTERVAL = 0.3  # 模拟弹幕间隔（秒）
+RUN_SECONDS = 4.0
+
+
+class SharedLLM(LLMProviderBase):
+    """模拟LLM：回复中带上提问所属直播间的标记，记录调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def response(self, session_id, dialogue):
+        self.calls += 1
+        time.sleep(0.05)
+        yield f"收到{dialogue[0]['content'][:8]}的弹幕。"
+
+
+class FakeTTS(TTSProviderBase):
+    """模拟TTS：每句话输出固定数量的音频包，包内容带直播间标记"""
+
+    def __init__(self, room_id):
+        super().__init__({}, True)
+        self.room_id = room_id
+
+    async def text_to_speak(self, text, output_file):
+        return b""
+
+    def to_tts_stream(self, text, opus_handler=None):
+        self.tts_audio_queue.put((SentenceType.FIRST, None, text))
+        for _ in range(3):
+            opus_handler(self.room_id.encode())
+
+    def to_tts(self, text):
+        return [self.room_id.encode() for _ in range(3)]
+
+
+class FakeWebSocket:
+    """模拟设备连接：记录收到的消息"""
+
+    def __init__(self):
+        self.received = []
+
+    async def send(self, data):
+        self.received.append(data)
+
+    async def close(self):
+        pass
+
+
+async def main():
+    logger = setup_logging()
+    llm = SharedLLM()
+    print("=" * 50)
+    print(f"多直播间测试（{ROOM_COUNT} 个直播间，每个 {DEVICES_PER_ROOM} 个设备）")
+    print("=" * 50)
+
+    tracemalloc.start()
+    rooms = []
+    room_sizes = []
+    for i in range(ROOM_COUNT):
+        room_id = f"room{i}"
+        config = {
+            "delete_audio": True,
+            "prompt": f"{room_id}直播间助手",
+            "danmaku": {"use_mock": True, "mock_interval": MOCK_INTERVAL},
+        }
+        before = tracemalloc.get_traced_memory()[0]
+        room = LiveRoom(room_id, config, llm, FakeTTS(room_id), logger)
+        room_sizes.append(tracemalloc.get_traced_memory()[0] - before)
+        rooms.append(room)
+
+    devices = {}
+    for room in rooms:
+        devices[room.room_id] = []
+        for j in range(DEVICES_PER_ROOM):
+            websocket = FakeWebSocket()
+            await room.device_manager.add_device(f"{room.room_id}-dev{j}", websocket, "127.0.0.1")
+            devices[room.room_id].append(websocket)
+        await room.start()
+
+    await asyncio.sleep(RUN_SECONDS)
+    stats = [room.get_stats() for room in rooms]
+    for room in rooms:
+        await room.stop()
+    await asyncio.sleep(0.1)
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    tracemalloc.stop()
+
+    results = []
+
+    print("🔍 测试 1/3: 设备只收到本直播间的音频")
+    isolated = True
+    for room_id, sockets in devices.items():
+        for websocket in sockets:
+            audio = [data for data in websocket.received if isinstance(data, bytes)]
+            foreign = [data for data in audio if data != room_id.encode()]
+            print(f"   {room_id}: 收到 {len(audio)} 个音频包，其他直播间的包 {len(foreign)} 个")
+            isolated = isolated and bool(audio) and not foreign
+    print("   ✅ 通过" if isolated else "   ❌ 失败")
+    results.append(isolated)
+
+    print("🔍 测试 2/3: 各直播间对话上下文独立")
+    separate = True
+    for room in rooms:
+        dialogue = room.handler.dialogue.get_llm_dialogue()
+        system_prompt = dialogue[0]["content"]
+        replies = [m["content"] for m in dialogue if m["role"] == "assistant"]
+        print(f"   {room.room_id}: 系统提示 \"{system_prompt.strip()[:12]}\"，上下文中 {len(replies)} 条回复")
+        separate = separate and system_prompt.startswith(room.room_id) and bool(replies)
+        separate = separate and all(reply.startswith(f"收到{room.room_id}") for reply in replies)
+    print("   ✅ 通过" if separate else "   ❌ 失败")
+    results.append(separate)
+
+    print("🔍 测试 3/3: LLM在直播间之间共享")
+    shared = all(room.llm is llm for room in rooms) and llm.calls >= ROOM_COUNT
+    print(f"   共享LLM调用 {llm.calls} 次，各直播间状态: {[s['devices'] for s in stats]} 个设备")
+    print("   ✅ 通过" if shared else "   ❌ 失败")
+    results.append(shared)
+
+    print("=" * 50)
+    print(f"每个直播间创建时的内存开销: {', '.join(f'{size / 1024:.1f}KB' for size in room_sizes)}")
+    print(f"进程峰值RSS: {rss_mb:.1f}MB")
+    print(f"结果: {sum(results)}/{len(results)} 通过")
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,155 @@
+"""
+互动反应测试
+使用模拟TTS（记录合成次数）和模拟设备管理器（记录发送内容），验证：
+    1. 模板固定文字只在启动时合成一次
+    2. 高频事件按类型限速，昵称片段缓存复用
+    3. 弹幕回复播放期间反应不会插入，等待过久的反应被丢弃
+并统计每条反应消耗的CPU时间
+
+使用方法（在项目根目录运行）:
+    python tools/test_danmaku_reactions.py
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from configs.logger import setup_logging
+from core.danmaku.reactions import ReactionEngine
+
+FRAME_MS = 10  # 缩短帧时长加快测试
+FLOOD_SECONDS = 3.0  # 高频事件持续时长（秒）
+CONFIG = {
+    "max_pending": 2,
+    "max_delay": 1.0,
+    "frame_duration": FRAME_MS,
+    "types": {
+        "gift": {"min_interval": 0.5, "templates": ["谢谢{name}的礼物"]},
+        "like": {"min_interval": 1.0, "templates": ["谢谢大家的点赞"]},
+    },
+}
+
+
+class CountingTTS:
+    """模拟TTS：每个字一个音频帧，记录合成过的文字"""
+
+    def __init__(self):
+        self.texts = []
+
+    def to_tts(self, text):
+        self.texts.append(text)
+        return [text.encode() for _ in text]
+
+
+class RecordingDeviceManager:
+    """模拟设备管理器：记录发送时间和内容"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def broadcast_audio(self, data):
+        self.sent.append((time.monotonic(), data))
+
+    def clip_starts(self):
+        """每段反应的 sentence_start 消息（时间, 文字）"""
+        starts = []
+        for sent_at, data in self.sent:
+            if isinstance(data, str):
+                message = json.loads(data)
+                if message.get("state") == "sentence_start":
+                    starts.append((sent_at, message["text"]))
+        return starts
+
+
+async def run_flood(engine, duration=FLOOD_SECONDS):
+    """每秒约200个点赞和40个礼物事件，来自10位观众"""
+    start = time.monotonic()
+    i = 0
+    while time.monotonic() - start < duration:
+        await engine.add_event({"type": "like", "username": f"观众{i % 10}"})
+        if i % 5 == 0:
+            await engine.add_event({"type": "gift", "username": f"观众{i // 5 % 10}🎉"})
+        i += 1
+        await asyncio.sleep(0.005)
+    await asyncio.sleep(1.0)
+    return i
+
+
+async def main():
+    logger = setup_logging()
+    print("=" * 50)
+    print("互动反应测试")
+    print("=" * 50)
+    results = []
+
+    tts = CountingTTS()
+    device_manager = RecordingDeviceManager()
+    lock = asyncio.Lock()
+    engine = ReactionEngine(CONFIG, tts, device_manager, logger, audio_lock=lock, session_id="test")
+
+    print("🔍 测试 1/3: 模板固定文字只在启动时合成")
+    await engine.start()
+    static_texts = list(tts.texts)
+    ok = sorted(static_texts) == sorted(["谢谢", "的礼物", "谢谢大家的点赞"])
+    print(f"   启动时合成: {static_texts}")
+    print("   ✅ 通过" if ok else "   ❌ 失败")
+    results.append(ok)
+
+    print("🔍 测试 2/3: 按类型限速，昵称片段缓存")
+    cpu_start = time.process_time()
+    events = await run_flood(engine)
+    cpu_used = time.process_time() - cpu_start
+    starts = device_manager.clip_starts()
+    stats = engine.get_stats()
+    # 限速按接受事件的时间计算，每类反应最多 时长/间隔 + 1 条
+    played = {
+        "gift": sum(1 for _, text in starts if "礼物" in text),
+        "like": sum(1 for _, text in starts if "点赞" in text),
+    }
+    allowed = {t: int(FLOOD_SECONDS / CONFIG["types"][t]["min_interval"]) + 1 for t in played}
+    name_texts = tts.texts[len(static_texts):]
+    ok = (
+        stats["played"] == len(starts) > 0
+        and all(0 < played[t] <= allowed[t] for t in played)
+        and len(name_texts) == len(set(name_texts))
+        and all("🎉" not in text for text in name_texts)
+    )
+    print(f"   {events * 6 // 5} 个事件 → 播放 {stats['played']} 条反应，限速丢弃 {stats['rate_limited']} 个")
+    print(f"   各类反应播放数: {played}，上限: {allowed}")
+    print(f"   昵称合成 {len(name_texts)} 次，缓存命中 {stats['name_hits']} 次，示例: {[t for _, t in starts[:3]]}")
+    print(f"   CPU时间 {cpu_used * 1000:.1f}ms，平均每条反应 {cpu_used * 1000 / max(stats['played'], 1):.2f}ms（含事件接收）")
+    print("   ✅ 通过" if ok else "   ❌ 失败")
+    results.append(ok)
+
+    print("🔍 测试 3/3: 回复播放期间不插入反应，过期反应被丢弃")
+    await asyncio.sleep(1.1)  # 等待限速窗口结束
+    device_manager.sent.clear()
+    async with lock:
+        # 模拟弹幕回复占用音频发送 1.5 秒
+        reply_start = time.monotonic()
+        await engine.add_event({"type": "like", "username": "观众A"})
+        await asyncio.sleep(1.5)
+        reply_end = time.monotonic()
+    await asyncio.sleep(0.2)
+    overlapped = [t for t, _ in device_manager.sent if reply_start <= t < reply_end]
+    await engine.add_event({"type": "gift", "username": "观众B"})
+    await asyncio.sleep(0.5)
+    starts = device_manager.clip_starts()
+    stats = engine.get_stats()
+    ok = not overlapped and stats["expired"] >= 1 and [text for _, text in starts] == ["谢谢观众B的礼物"]
+    print(f"   回复期间发送 {len(overlapped)} 条，过期丢弃 {stats['expired']} 条，之后播放: {[t for _, t in starts]}")
+    print("   ✅ 通过" if ok else "   ❌ 失败")
+    results.append(ok)
+
+    await engine.stop()
+    print("=" * 50)
+    print(f"结果: {sum(results)}/{len(results)} 通过")
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
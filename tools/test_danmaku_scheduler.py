@@ -0,0 +1,160 @@
+"""
+弹幕优先级调度器测试
+使用模拟时钟生成高密度直播间事件，验证：
+    1. 1000+ 事件/秒持续输入时，待处理事件数和内存占用保持有界
+    2. 礼物、粉丝团、关注事件优先于普通弹幕被选中
+    3. 超过截止时间的事件被丢弃
+
+使用方法（在项目根目录运行）:
+    python tools/test_danmaku_scheduler.py
+"""
+
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.danmaku.scheduler import PriorityEventScheduler
+
+# 模拟负载参数
+EVENTS_PER_SECOND = 2000
+SIMULATED_SECONDS = 120
+REPLY_INTERVAL = 4.0  # 每条回复播放时长（秒）
+MAX_PENDING = 200
+
+
+class FakeClock:
+    """可手动推进的模拟时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_event(rng: random.Random, index: int) -> dict:
+    """按直播间常见比例生成事件"""
+    roll = rng.random()
+    username = f"用户{rng.randint(1, 5000)}"
+    if roll < 0.01:
+        value = rng.choice([1, 1, 1, 10, 52, 99, 520])
+        return {"type": "gift", "username": username, "content": "送出礼物",
+                "gift_name": "小心心", "gift_count": 1, "value": value}
+    if roll < 0.015:
+        return {"type": "fansclub", "username": username, "content": "加入了粉丝团"}
+    if roll < 0.03:
+        return {"type": "follow", "username": username, "content": "关注了主播"}
+    return {"type": "danmaku", "username": username, "content": f"弹幕{index}"}
+
+
+def test_bounded_memory():
+    """测试 1: 持续高负载下内存有界"""
+    print(f"🔍 测试 1/3: {EVENTS_PER_SECOND} 事件/秒持续 {SIMULATED_SECONDS} 秒（模拟时钟）")
+    clock = FakeClock()
+    scheduler = PriorityEventScheduler({"max_pending": MAX_PENDING}, clock=clock)
+    rng = random.Random(42)
+
+    tracemalloc.start()
+    served_types = {}
+    next_reply_at = clock.now + REPLY_INTERVAL
+    step = 1.0 / EVENTS_PER_SECOND
+    total = EVENTS_PER_SECOND * SIMULATED_SECONDS
+    max_pending = 0
+    max_heap_entries = 0
+    warmup_memory = None
+
+    start = time.perf_counter()
+    for i in range(total):
+        clock.now += step
+        scheduler.push(make_event(rng, i))
+        if clock.now >= next_reply_at:
+            event = scheduler.pop()
+            if event:
+                served_types[event["type"]] = served_types.get(event["type"], 0) + 1
+            next_reply_at += REPLY_INTERVAL
+        max_pending = max(max_pending, len(scheduler))
+        if i % 1000 == 0:
+            max_heap_entries = max(max_heap_entries, scheduler.get_stats()["heap_entries"])
+        if i == EVENTS_PER_SECOND * 10:
+            warmup_memory = tracemalloc.get_traced_memory()[0]
+    elapsed = time.perf_counter() - start
+    final_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    stats = scheduler.get_stats()
+    print(f"   处理 {total} 个事件耗时 {elapsed:.2f}s（{total / elapsed:.0f} 事件/秒，不含模拟外开销）")
+    print(f"   最大待处理事件: {max_pending}（上限 {MAX_PENDING}），最大堆条目: {max_heap_entries}")
+    print(f"   内存: 预热后 {warmup_memory / 1024:.0f}KB，结束时 {final_memory / 1024:.0f}KB")
+    print(f"   统计: {stats}")
+    print(f"   已回复事件类型: {served_types}")
+    ok = (
+        max_pending <= MAX_PENDING
+        and max_heap_entries <= 6 * MAX_PENDING + 64 + 3
+        and final_memory < warmup_memory * 1.5
+    )
+    print("   ✅ 通过" if ok else "   ❌ 失败")
+    return ok
+
+
+def test_priority_order():
+    """测试 2: 高价值事件优先"""
+    print("🔍 测试 2/3: 事件优先级")
+    clock = FakeClock()
+    scheduler = PriorityEventScheduler({}, clock=clock)
+    scheduler.push({"type": "danmaku", "username": "甲", "content": "你好"})
+    clock.now += 1
+    scheduler.push({"type": "follow", "username": "乙", "content": "关注了主播"})
+    scheduler.push({"type": "gift", "username": "丙", "content": "送出礼物", "value": 1})
+    scheduler.push({"type": "gift", "username": "丁", "content": "送出礼物", "value": 520})
+    clock.now += 1
+    scheduler.push({"type": "danmaku", "username": "戊", "content": "最新弹幕"})
+
+    order = []
+    while True:
+        event = scheduler.pop()
+        if event is None:
+            break
+        order.append(event["username"])
+    print(f"   回复顺序: {order}")
+    ok = order == ["丁", "丙", "乙", "戊", "甲"]
+    print("   ✅ 通过" if ok else "   ❌ 失败")
+    return ok
+
+
+def test_deadline():
+    """测试 3: 截止时间"""
+    print("🔍 测试 3/3: 过期事件丢弃")
+    clock = FakeClock()
+    scheduler = PriorityEventScheduler({"ttl": {"danmaku": 5}}, clock=clock)
+    scheduler.push({"type": "danmaku", "username": "甲", "content": "旧弹幕"})
+    scheduler.push({"type": "gift", "username": "乙", "content": "送出礼物", "value": 1})
+    clock.now += 10
+    first = scheduler.pop()
+    second = scheduler.pop()
+    stats = scheduler.get_stats()
+    print(f"   取出: {first and first['username']}, {second}，过期 {stats['expired']} 个")
+    ok = first is not None and first["username"] == "乙" and second is None and stats["expired"] == 1
+    print("   ✅ 通过" if ok else "   ❌ 失败")
+    return ok
+
+
+def main():
+    print("=" * 50)
+    print("弹幕优先级调度器测试")
+    print("=" * 50)
+    results = [
+        test_bounded_memory(),
+        test_priority_order(),
+        test_deadline(),
+    ]
+    print("=" * 50)
+    print(f"结果: {sum(results)}/{len(results)} 通过")
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
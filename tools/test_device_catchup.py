@@ -0,0 +1,247 @@
+"""
+中途加入设备补发测试
+按60ms节奏广播一段回复（tts start、sentence_start、音频帧），在句子中途加入新设备，验证：
+    1. 新设备先收到 tts start 和 sentence_start，再从句首收到全部音频帧，之后无缝接上实时音频（无重复、无缺失）
+    2. 补发按节奏发送：开头的突发帧数和之后每帧间隔符合配置，不会一次塞满设备缓冲区
+    3. 很长的句子中缓冲区的帧数和字节数不超过上限
+    4. 句子结束（静音超过 idle_timeout）后加入的设备不补发
+    5. 多进程广播：工作进程中没有设备时也记录当前句子，第一个中途加入的设备同样补发
+    6. 多进程广播：工作进程处理不过来时只丢弃音频帧，JSON控制消息以文本帧发布且不丢弃
+
+使用方法（在项目根目录运行）:
+    python tools/test_device_catchup.py
+"""
+
+import os
+import sys
+import json
+import time
+import struct
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from configs.logger import setup_logging
+from core.danmaku.device_manager import DeviceManager
+from core.danmaku.fanout import FanoutPublisher, FanoutWorker, _WorkerLink, encode_frame, FRAME_BINARY, FRAME_TEXT
+
+FRAME_DURATION = 0.06
+FRAME_SIZE = 120
+CATCHUP = {"max_frames": 50, "max_kb": 64, "burst_frames": 5, "rate": 1.5, "frame_duration": 60, "idle_timeout": 0.5}
+
+
+class FakeWebSocket:
+    """记录发送时间和内容的模拟设备连接"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, data):
+        self.sent.append((time.monotonic(), data))
+
+    async def close(self):
+        pass
+
+    def frames(self):
+        return [(at, struct.unpack(">I", data[:4])[0]) for at, data in self.sent if isinstance(data, bytes)]
+
+    def controls(self):
+        return [json.loads(data)["state"] for _, data in self.sent if isinstance(data, str)]
+
+
+def frame(seq: int) -> bytes:
+    return struct.pack(">I", seq) + bytes(FRAME_SIZE - 4)
+
+
+def check(name, condition):
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+
+async def broadcast_sentence(manager, first_seq, count, on_frame=None):
+    """按实时节奏广播一句话"""
+    await manager.broadcast_audio(json.dumps({"type": "tts", "state": "sentence_start", "text": f"第{first_seq}句"}))
+    start = time.monotonic()
+    for i in range(count):
+        delay = start + i * FRAME_DURATION - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await manager.broadcast_audio(frame(first_seq + i))
+        if on_frame is not None:
+            await on_frame(i)
+
+
+async def test_late_joiner(logger):
+    """测试 1/6、2/6: 补发内容和节奏"""
+    print("🔍 测试 1/6: 句子中途加入，补发后接上实时音频")
+    manager = DeviceManager(logger=logger, config={"max_size": 100, "catchup": CATCHUP})
+    early, late = FakeWebSocket(), FakeWebSocket()
+    await manager.add_device("early", early, "127.0.0.1")
+    await manager.broadcast_audio(json.dumps({"type": "tts", "state": "start"}))
+
+    joined_at = {}
+
+    async def join_midway(index):
+        if index == 20:
+            joined_at["time"] = time.monotonic()
+            await manager.add_device("late", late, "127.0.0.1")
+
+    await broadcast_sentence(manager, 0, 60, join_midway)
+    await asyncio.sleep(0.5)
+    await manager.remove_device("early")
+    await manager.remove_device("late")
+
+    late_seqs = [seq for _, seq in late.frames()]
+    content_results = [
+        check("先收到 tts start 和 sentence_start", late.controls()[:2] == ["start", "sentence_start"]),
+        check(f"从句首收到全部帧且无重复（{len(late_seqs)} 帧）", late_seqs == list(range(60))),
+        check("早加入的设备不受影响", [seq for _, seq in early.frames()] == list(range(60))),
+        check("统计补发次数", manager.total_catchups == 1),
+    ]
+
+    print("🔍 测试 2/6: 补发节奏")
+    times = [at for at, _ in late.frames()]
+    burst = CATCHUP["burst_frames"]
+    interval = CATCHUP["frame_duration"] / 1000 / CATCHUP["rate"]
+    burst_span = times[burst - 1] - times[0]
+    gaps = [b - a for a, b in zip(times[burst:21], times[burst + 1:22])]
+    caught_up = next((i for i, (at, seq) in enumerate(late.frames()) if seq >= 21 and at - joined_at["time"] > 0), None)
+    pacing_results = [
+        check(f"前 {burst} 帧立即发送（{burst_span * 1000:.1f}ms）", burst_span < 0.02),
+        check(f"之后每帧间隔约 {interval * 1000:.0f}ms（最小 {min(gaps) * 1000:.1f}ms）", min(gaps) > interval * 0.8),
+        check("追上实时音频", caught_up is not None and times[-1] - joined_at["time"] < 60 * FRAME_DURATION),
+    ]
+    return [all(content_results), all(pacing_results)]
+
+
+async def test_bounded(logger):
+    """测试 3/6: 内存上限"""
+    print("🔍 测试 3/6: 长句子的缓冲区上限")
+    manager = DeviceManager(logger=logger, config={"catchup": CATCHUP})
+    await manager.add_device("listener", FakeWebSocket(), "127.0.0.1")
+    await manager.broadcast_audio(json.dumps({"type": "tts", "state": "sentence_start", "text": "长句子"}))
+    for seq in range(2000):
+        await manager.broadcast_audio(frame(seq) + bytes(seq % 700))
+        await asyncio.sleep(0)
+    buffer = manager.catchup
+    results = [
+        check(f"帧数 {len(buffer.frames)} ≤ {buffer.max_frames}", len(buffer.frames) <= buffer.max_frames),
+        check(f"字节数 {buffer.bytes} ≤ {buffer.max_bytes}", buffer.bytes <= buffer.max_bytes),
+        check("保留最新的帧", struct.unpack(">I", buffer.frames[-1][:4])[0] == 1999),
+        check("字节计数准确", buffer.bytes == sum(len(data) for data in buffer.frames)),
+    ]
+    await manager.remove_device("listener")
+    return all(results)
+
+
+async def test_idle(logger):
+    """测试 4/6: 句子结束后不补发"""
+    print("🔍 测试 4/6: 静音后加入不补发")
+    manager = DeviceManager(logger=logger, config={"catchup": CATCHUP})
+    await broadcast_sentence(manager, 0, 5)
+    await asyncio.sleep(CATCHUP["idle_timeout"] + 0.1)
+    websocket = FakeWebSocket()
+    await manager.add_device("idle", websocket, "127.0.0.1")
+    await asyncio.sleep(0.1)
+    await manager.remove_device("idle")
+    return check("没有补发", not websocket.sent and manager.total_catchups == 0)
+
+
+class FakeStreamWriter:
+    """工作进程回报统计用的模拟连接"""
+
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        pass
+
+
+async def test_fanout_worker(logger):
+    """测试 5/6: 工作进程中没有设备时加入"""
+    print("🔍 测试 5/6: 广播工作进程中没有设备时，第一个设备中途加入")
+    worker = FanoutWorker(0, "", "127.0.0.1", 0, ["room"], "room", {"catchup": CATCHUP}, 60, logger)
+    manager = worker.device_managers["room"]
+    reader = asyncio.StreamReader()
+    publisher = asyncio.create_task(worker._handle_publisher(reader, FakeStreamWriter()))
+
+    reader.feed_data(encode_frame(FRAME_TEXT, "room", json.dumps({"type": "tts", "state": "start"})))
+    reader.feed_data(encode_frame(FRAME_TEXT, "room", json.dumps({"type": "tts", "state": "sentence_start"})))
+    websocket = FakeWebSocket()
+    for seq in range(40):
+        if seq == 20:
+            await manager.add_device("first", websocket, "127.0.0.1")
+        reader.feed_data(encode_frame(FRAME_BINARY, "room", frame(seq)))
+        await asyncio.sleep(FRAME_DURATION)
+    await asyncio.sleep(0.5)
+    reader.feed_eof()
+    await publisher
+    await manager.remove_device("first")
+
+    return all([
+        check("先收到 tts start 和 sentence_start", websocket.controls()[:2] == ["start", "sentence_start"]),
+        check(f"从句首收到全部帧且无重复（{len(websocket.frames())} 帧）",
+              [seq for _, seq in websocket.frames()] == list(range(40))),
+        check("统计补发次数", manager.total_catchups == 1),
+    ])
+
+
+class BackloggedTransport:
+    """未发送数据一直超过上限的模拟连接"""
+
+    def is_closing(self):
+        return False
+
+    def get_write_buffer_size(self):
+        return 1 << 30
+
+
+class RecordingStreamWriter:
+    """记录主进程写给工作进程的帧"""
+
+    def __init__(self):
+        self.transport = BackloggedTransport()
+        self.frames = []
+
+    def write(self, data):
+        self.frames.append(data)
+
+
+async def test_fanout_backpressure(logger):
+    """测试 6/6: 背压时的丢弃范围"""
+    print("🔍 测试 6/6: 工作进程处理不过来时发布音频和控制消息")
+    publisher = FanoutPublisher({"fanout": {"max_buffer_kb": 1}}, ["room"], "room", logger)
+    link = _WorkerLink(0, "")
+    link.writer = RecordingStreamWriter()
+    publisher.links.append(link)
+    manager = publisher.device_managers["room"]
+
+    await manager.broadcast_audio(frame(0))
+    message = {"type": "tts", "state": "stop"}
+    await manager.broadcast_message(message)
+    return all([
+        check("音频帧被丢弃", link.dropped == 1),
+        check("控制消息以文本帧发布", link.writer.frames == [encode_frame(FRAME_TEXT, "room", json.dumps(message))]),
+    ])
+
+
+async def main():
+    logger = setup_logging()
+    print("=" * 50)
+    print("中途加入设备补发测试")
+    print("=" * 50)
+    results = [
+        *await test_late_joiner(logger),
+        await test_bounded(logger),
+        await test_idle(logger),
+        await test_fanout_worker(logger),
+        await test_fanout_backpressure(logger),
+    ]
+    passed = sum(results)
+    print("=" * 50)
+    print(f"结果: {passed}/{len(results)} 通过")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
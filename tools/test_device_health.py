@@ -0,0 +1,203 @@
+"""
+设备健康检查测试
+验证：
+    1. 正常设备通过 ping 记录往返时间，保持 healthy
+    2. 发送变慢的设备降级（发送队列缩短），恢复后升级
+    3. 连续发送失败、ping 无响应、缓冲数据过多的设备立即移除，不影响其他设备
+    4. 停止读取数据的真实连接（半开连接）ping 无响应或发送卡住后被移除
+
+使用方法（在项目根目录运行）:
+    python tools/test_device_health.py
+"""
+
+import os
+import sys
+import socket
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import websockets
+from configs.logger import setup_logging
+from core.danmaku.device_manager import DeviceManager, serve_device_connection, HEALTHY, DEMOTED
+
+HEALTH = {
+    "ping_interval": 0.2, "ping_timeout": 0.2, "ewma_alpha": 0.5, "demote_rtt_ms": 500, "demote_send_ms": 100,
+    "demoted_queue_size": 5, "max_failures": 3, "max_buffer_kb": 64, "max_stall": 1.0,
+}
+FRAME = bytes(200)
+
+
+class FakeTransport:
+    def __init__(self):
+        self.buffered = 0
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+
+class FakeWebSocket:
+    """可模拟发送变慢、发送出错和 ping 无响应的设备连接"""
+
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.send_delay = 0.0
+        self.send_error = False
+        self.answer_ping = True
+        self.closed = False
+        self.received = 0
+
+    async def send(self, data):
+        if self.send_error:
+            raise OSError("模拟发送失败")
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        self.received += 1
+
+    async def ping(self):
+        future = asyncio.get_running_loop().create_future()
+        if self.answer_ping:
+            future.set_result(0.0)
+        return future
+
+    async def close(self):
+        self.closed = True
+
+
+def check(name, condition):
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+
+async def test_demote(logger):
+    """测试 1/3: 降级和恢复"""
+    print("🔍 测试 1/3: 发送变慢时降级，恢复后升级")
+    manager = DeviceManager(logger=logger, config={"max_size": 100, "health": HEALTH})
+    good, slow = FakeWebSocket(), FakeWebSocket()
+    await manager.add_device("good", good, "127.0.0.1")
+    await manager.add_device("slow", slow, "127.0.0.1")
+    await manager.check_health()
+
+    slow.send_delay = 0.3
+    for _ in range(3):
+        await manager.broadcast_audio(FRAME)
+        await asyncio.sleep(0.35)
+    slow_info = manager.devices["slow"]
+    demoted = slow_info.state == DEMOTED
+    for _ in range(50):
+        await manager.broadcast_audio(FRAME)
+    queued = slow_info.send_queue.qsize()
+
+    slow.send_delay = 0.0
+    await asyncio.sleep(0.1)
+    for _ in range(10):
+        await manager.broadcast_audio(FRAME)
+        await asyncio.sleep(0.01)
+    stats = manager.get_health_stats()
+    results = [
+        check("ping 记录往返时间", manager.devices["good"].rtt is not None),
+        check("发送变慢的设备降级", demoted),
+        check(f"降级后发送队列缩短（{queued} ≤ {HEALTH['demoted_queue_size']}）", queued <= HEALTH["demoted_queue_size"]),
+        check("正常设备不受影响", manager.devices["good"].state == HEALTHY and good.received == 63),
+        check("发送恢复后升级", slow_info.state == HEALTHY and stats["demoted"] == 0),
+    ]
+    for device_id in list(manager.devices):
+        await manager.remove_device(device_id)
+    return all(results)
+
+
+async def test_evict(logger):
+    """测试 2/3: 失效连接立即移除"""
+    print("🔍 测试 2/3: 连续失败、ping 无响应、缓冲过多时立即移除")
+    manager = DeviceManager(logger=logger, config={"health": HEALTH})
+    sockets = {name: FakeWebSocket() for name in ("good", "failing", "silent", "buffered")}
+    for name, websocket in sockets.items():
+        await manager.add_device(name, websocket, "127.0.0.1")
+
+    sockets["failing"].send_error = True
+    for _ in range(HEALTH["max_failures"]):
+        await manager.broadcast_audio(FRAME)
+        await asyncio.sleep(0.01)
+    failing_evicted = "failing" not in manager.devices
+
+    sockets["buffered"].transport.buffered = 100 * 1024
+    await manager.broadcast_audio(FRAME)
+    await asyncio.sleep(0.01)
+    buffered_evicted = "buffered" not in manager.devices
+
+    sockets["silent"].answer_ping = False
+    for _ in range(HEALTH["max_failures"]):
+        await manager.check_health()
+    await asyncio.sleep(0.05)
+
+    stats = manager.get_health_stats()
+    results = [
+        check("连续发送失败后移除（无需等待 ping）", failing_evicted),
+        check("缓冲数据过多时发送后立即移除", buffered_evicted),
+        check(f"{HEALTH['max_failures']} 次 ping 无响应后移除", "silent" not in manager.devices),
+        check("连接已关闭", all(sockets[name].closed for name in ("failing", "silent", "buffered"))),
+        check("正常设备保留", list(manager.devices) == ["good"]),
+        check(f"按原因统计 {stats['evictions']}",
+              stats["evictions"] == {"send_failures": 1, "buffer": 1, "missed_pongs": 1}),
+    ]
+    await manager.remove_device("good")
+    return all(results)
+
+
+async def test_half_open(logger):
+    """测试 3/3: 真实连接停止读取"""
+    print("🔍 测试 3/3: 停止读取的真实连接被移除")
+    manager = DeviceManager(logger=logger, config={"max_size": 1000, "catchup": {"enabled": False}, "health": HEALTH})
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = await websockets.serve(
+        lambda websocket: serve_device_connection(websocket, {"room": manager}, "room", logger),
+        "127.0.0.1", port, ping_interval=None,
+    )
+    healthy = await websockets.connect(f"ws://127.0.0.1:{port}/danmaku/?device-id=healthy", ping_interval=None)
+    stuck = await websockets.connect(f"ws://127.0.0.1:{port}/danmaku/?device-id=stuck", ping_interval=None)
+    while manager.get_device_count() < 2:
+        await asyncio.sleep(0.01)
+
+    async def drain():
+        async for _ in healthy:
+            pass
+
+    drain_task = asyncio.create_task(drain())
+    stuck.transport.pause_reading()  # 模拟设备掉线：不再读取，服务端的发送最终卡住
+    frame = bytes(4000)
+    deadline = asyncio.get_running_loop().time() + 10
+    while "stuck" in manager.devices and asyncio.get_running_loop().time() < deadline:
+        await manager.broadcast_audio(frame)
+        await asyncio.sleep(0.005)
+        await manager.check_health()
+
+    stats = manager.get_health_stats()
+    results = [
+        check(f"半开连接被移除 {stats['evictions']}", "stuck" not in manager.devices),
+        check("正常连接保留并记录往返时间",
+              "healthy" in manager.devices and manager.devices["healthy"].rtt is not None),
+    ]
+    drain_task.cancel()
+    stuck.transport.abort()
+    await healthy.close()
+    server.close()
+    await server.wait_closed()
+    return all(results)
+
+
+async def main():
+    logger = setup_logging()
+    print("=" * 50)
+    print("设备健康检查测试")
+    print("=" * 50)
+    results = [await test_demote(logger), await test_evict(logger), await test_half_open(logger)]
+    passed = sum(results)
+    print("=" * 50)
+    print(f"结果: {passed}/{len(results)} 通过")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
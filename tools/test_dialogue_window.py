@@ -0,0 +1,100 @@
+"""
+弹幕对话滑动窗口测试
+验证：
+    1. 长时间对话时窗口内的消息数和token数保持有界，移出的消息折叠进长度受限的抽取式摘要
+    2. LLM摘要不会被之后移出的消息挤掉，超出长度时只裁剪其后的抽取式摘要行
+    3. 生成LLM摘要期间移出的消息保留为抽取式摘要行
+
+使用方法（在项目根目录运行）:
+    python tools/test_dialogue_window.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.utils.dialogue import Message, SlidingWindowDialogue
+
+SUMMARY_MAX_CHARS = 100
+
+
+def make_dialogue():
+    dialogue = SlidingWindowDialogue(max_turns=2, max_tokens=1500, summary_max_chars=SUMMARY_MAX_CHARS)
+    dialogue.update_system_message("你是直播间助手")
+    return dialogue
+
+
+def chat(dialogue, start, turns):
+    for index in range(start, start + turns):
+        dialogue.put(Message(role="user", content=f"弹幕{index}"))
+        dialogue.put(Message(role="assistant", content=f"回复{index}"))
+
+
+def check(name, condition):
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+
+def test_window():
+    """测试 1/3: 窗口和抽取式摘要有界"""
+    print("🔍 测试 1/3: 200 轮对话后窗口和摘要有界")
+    dialogue = make_dialogue()
+    chat(dialogue, 0, 200)
+    stats = dialogue.get_window_stats()
+    messages = dialogue.get_llm_dialogue()
+    return all([
+        check(f"窗口内保留 {stats['messages']} 条消息", stats["messages"] == 4 and len(messages) == 5),
+        check(f"摘要 {stats['summary_chars']} 字，不超过上限", stats["summary_chars"] <= SUMMARY_MAX_CHARS),
+        check("摘要保留最近移出的消息", dialogue.summary.endswith("助手: 回复197")),
+        check("摘要附加在系统提示词后", "<history_summary>" in messages[0]["content"]),
+    ])
+
+
+def test_llm_summary_kept():
+    """测试 2/3: LLM摘要不被裁剪"""
+    print("🔍 测试 2/3: 设置LLM摘要后继续移出消息")
+    dialogue = make_dialogue()
+    chat(dialogue, 0, 10)
+    llm_summary = "观众主要在问" + "直播时间" * 30
+    dialogue.set_summary(llm_summary)
+    chat(dialogue, 10, 1)
+    after_one = dialogue.summary
+    chat(dialogue, 11, 50)
+    lines = dialogue.summary.split("\n")
+    kept = dialogue.llm_summary
+    return all([
+        check(f"LLM摘要截断到 {len(kept)} 字", kept == llm_summary[:SUMMARY_MAX_CHARS]),
+        check("下一次移出后LLM摘要仍在", after_one.startswith(kept) and after_one.endswith("助手: 回复8")),
+        check("继续移出 50 轮后LLM摘要仍在最前", lines[0] == kept and lines[-1] == "助手: 回复58"),
+        check("只裁剪抽取式摘要行", sum(len(line) + 1 for line in lines[1:]) <= SUMMARY_MAX_CHARS),
+    ])
+
+
+def test_evicted_during_summary():
+    """测试 3/3: 生成摘要期间移出的消息"""
+    print("🔍 测试 3/3: 生成LLM摘要期间移出的消息")
+    dialogue = make_dialogue()
+    chat(dialogue, 0, 5)
+    summarized_total = dialogue.evicted_total
+    chat(dialogue, 5, 1)  # 生成摘要期间又移出一轮
+    dialogue.set_summary("LLM摘要", summarized_total=summarized_total)
+    return all([
+        check("摘要期间移出的消息追加在LLM摘要后", dialogue.summary == "LLM摘要\n弹幕3\n助手: 回复3"),
+        check("这些消息留待下次LLM摘要", list(dialogue.evicted_since_summary) == ["弹幕3", "助手: 回复3"]),
+    ])
+
+
+def main():
+    print("=" * 50)
+    print("弹幕对话滑动窗口测试")
+    print("=" * 50)
+    results = [test_window(), test_llm_summary_kept(), test_evicted_during_summary()]
+    passed = sum(results)
+    print("=" * 50)
+    print(f"结果: {passed}/{len(results)} 通过")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
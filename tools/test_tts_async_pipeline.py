@@ -0,0 +1,248 @@
+"""
+异步TTS流水线测试
+验证：
+    1. 打开数百个连接的TTS通道后，线程数不随连接数增长（只有共享线程池）
+    2. 每个连接的文本按顺序合成，音频按 FIRST → MIDDLE... → LAST 的顺序发送
+    3. 重写了 tts_text_priority_thread 的流式提供方仍在独立线程中处理文本
+    4. 其他线程放入队列的数据立即唤醒事件循环中的任务（不轮询）
+    5. 打断导致的发送取消只跳过当前音频；任务本身被取消时立即退出，close() 取消并等待两个任务
+
+使用方法（在项目根目录运行）:
+    python tools/test_tts_async_pipeline.py [--connections 300]
+"""
+
+import os
+import sys
+import time
+import queue
+import asyncio
+import argparse
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import core.providers.tts.base as tts_base
+from core.providers.tts.base import TTSProviderBase
+from core.providers.tts.dto.dto import TTSMessageDTO, SentenceType, ContentType
+from core.utils.tts_pool import LoopQueue, get_executor
+
+PACKETS_PER_SEGMENT = 3
+sent = {}  # 连接ID -> [(sentence_type, 数据, 文本)]
+
+
+async def record_audio_message(conn, sentence_type, audios, text):
+    """代替 sendAudioMessage，记录每个连接收到的音频"""
+    if text == "打断":
+        raise asyncio.CancelledError("客户端已中止")
+    if text == "阻塞":
+        await asyncio.sleep(10)
+    sent.setdefault(conn.conn_id, []).append((sentence_type, audios, text))
+
+
+tts_base.sendAudioMessage = record_audio_message
+
+
+class FakeConnection:
+    def __init__(self, conn_id):
+        self.conn_id = conn_id
+        self.stop_event = threading.Event()
+        self.client_abort = False
+        self.max_output_size = 0
+        self.headers = {"device-id": conn_id}
+        self.read_config_from_api = False  # 不上报TTS数据
+
+
+class FakeTTS(TTSProviderBase):
+    """模拟阻塞的合成请求：每段文字等待20ms后输出3个音频包"""
+
+    def __init__(self):
+        super().__init__({}, delete_audio_file=True)
+
+    async def text_to_speak(self, text, output_file):
+        return b""
+
+    def to_tts_stream(self, text, opus_handler=None):
+        time.sleep(0.02)
+        self.tts_audio_queue.put((SentenceType.FIRST, None, text))
+        for index in range(PACKETS_PER_SEGMENT):
+            opus_handler(f"{text}#{index}".encode())
+
+
+class FakeStreamTTS(FakeTTS):
+    """重写了 tts_text_priority_thread 的流式提供方"""
+
+    def tts_text_priority_thread(self):
+        while not self.conn.stop_event.is_set():
+            try:
+                message = self.tts_text_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if message.content_type == ContentType.TEXT:
+                self.to_tts_stream(message.content_detail, self.handle_opus)
+            if message.sentence_type == SentenceType.LAST:
+                self.tts_audio_queue.put((SentenceType.LAST, [], None))
+
+
+def say(tts, texts):
+    tts.tts_text_queue.put(TTSMessageDTO(sentence_id="s", sentence_type=SentenceType.FIRST, content_type=ContentType.ACTION))
+    for text in texts:
+        tts.tts_text_queue.put(TTSMessageDTO(
+            sentence_id="s", sentence_type=SentenceType.MIDDLE, content_type=ContentType.TEXT, content_detail=text,
+        ))
+    tts.tts_text_queue.put(TTSMessageDTO(sentence_id="s", sentence_type=SentenceType.LAST, content_type=ContentType.ACTION))
+
+
+def check(name, condition):
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+
+def expected_order(texts):
+    """一个连接应收到的音频顺序（分段时去掉句末标点）"""
+    order = []
+    for text in (text.rstrip("。！") for text in texts):
+        order.append((SentenceType.FIRST, None, text))
+        order += [(SentenceType.MIDDLE, f"{text}#{index}".encode(), None) for index in range(PACKETS_PER_SEGMENT)]
+    return order + [(SentenceType.LAST, [], None)]
+
+
+async def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def test_threads(count):
+    """测试 1/5、2/5: 线程数和顺序"""
+    print(f"🔍 测试 1/5: 打开 {count} 个连接的TTS通道")
+    pool_size = get_executor()._max_workers
+    threads_before = threading.active_count()
+    connections = []
+    for index in range(count):
+        conn, tts = FakeConnection(f"c{index}"), FakeTTS()
+        await tts.open_audio_channels(conn)
+        connections.append((conn, tts))
+    idle_threads = threading.active_count() - threads_before
+
+    texts = ["你好。", "欢迎来到直播间！"]
+    start = time.perf_counter()
+    for _, tts in connections:
+        say(tts, texts)
+    await wait_for(lambda: all(len(sent.get(conn.conn_id, [])) == len(expected_order(texts)) for conn, _ in connections))
+    elapsed = time.perf_counter() - start
+    busy_threads = threading.active_count() - threads_before
+
+    results = [
+        check(f"空闲时新增线程 {idle_threads} 个（原实现为 {count * 2} 个）", idle_threads == 0),
+        check(f"合成时新增线程 {busy_threads} 个，不超过线程池大小 {pool_size}", busy_threads <= pool_size),
+    ]
+    print(f"   {count} 个连接各合成 {len(texts)} 段，耗时 {elapsed:.2f}s")
+
+    print("🔍 测试 2/5: 音频顺序")
+    order = expected_order(texts)
+    ordered = check("每个连接的音频按顺序发送", all(sent[conn.conn_id] == order for conn, _ in connections))
+    for conn, _ in connections:
+        conn.stop_event.set()
+    return [all(results), ordered]
+
+
+async def test_thread_mode():
+    """测试 3/5: 流式提供方的线程模式"""
+    print("🔍 测试 3/5: 重写 tts_text_priority_thread 的提供方")
+    conn, tts = FakeConnection("stream"), FakeStreamTTS()
+    await tts.open_audio_channels(conn)
+    say(tts, ["流式"])
+    order = expected_order(["流式"])
+    await wait_for(lambda: len(sent.get("stream", [])) == len(order), timeout=5)
+    conn.stop_event.set()
+    return all([
+        check("文本在独立线程中处理", tts.tts_text_task is None and tts.tts_priority_thread.is_alive()),
+        check("音频按顺序发送", sent.get("stream") == order),
+    ])
+
+
+async def test_wakeup():
+    """测试 4/5: 跨线程唤醒"""
+    print("🔍 测试 4/5: 其他线程放入数据时立即唤醒")
+    loop_queue = LoopQueue()
+    delays = []
+    for _ in range(20):
+        put_at = {}
+
+        def producer():
+            time.sleep(0.01)
+            put_at["time"] = time.perf_counter()
+            loop_queue.put("item")
+
+        threading.Thread(target=producer).start()
+        await loop_queue.get_async(timeout=1)
+        delays.append(time.perf_counter() - put_at["time"])
+    try:
+        await loop_queue.get_async(timeout=0.05)
+        timed_out = False
+    except queue.Empty:
+        timed_out = True
+    worst = max(delays) * 1000
+    return all([
+        check(f"唤醒延迟最大 {worst:.2f}ms", worst < 5),
+        check("超时抛出 queue.Empty", timed_out),
+    ])
+
+
+async def test_cancel():
+    """测试 5/5: 取消"""
+    print("🔍 测试 5/5: 打断和任务取消")
+    conn, tts = FakeConnection("cancel"), FakeTTS()
+    await tts.open_audio_channels(conn)
+    conn.client_abort = True
+    tts.tts_audio_queue.put((SentenceType.FIRST, None, "打断"))
+    await asyncio.sleep(0.05)
+    conn.client_abort = False
+    tts.tts_audio_queue.put((SentenceType.LAST, [], "继续"))
+    await wait_for(lambda: sent.get("cancel"), timeout=2)
+    interrupted = not tts.audio_play_task.done() and sent.get("cancel") == [(SentenceType.LAST, [], "继续")]
+
+    tts.tts_audio_queue.put((SentenceType.FIRST, None, "阻塞"))
+    await asyncio.sleep(0.05)
+    tts.audio_play_task.cancel()
+    await asyncio.sleep(0.05)
+    cancelled = tts.audio_play_task.cancelled()
+
+    conn, tts = FakeConnection("close"), FakeTTS()
+    await tts.open_audio_channels(conn)
+    tts.tts_audio_queue.put((SentenceType.FIRST, None, "阻塞"))
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await tts.close()
+    elapsed = time.perf_counter() - start
+    conn.stop_event.set()
+    return all([
+        check("打断导致的发送取消只跳过当前音频", interrupted),
+        check("发送中的播放任务被取消后退出", cancelled),
+        check(f"close() 取消并等待两个任务（{elapsed * 1000:.1f}ms）",
+              tts.tts_text_task.done() and tts.audio_play_task.done() and elapsed < 0.5),
+    ])
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="异步TTS流水线测试")
+    parser.add_argument("--connections", type=int, default=300, help="模拟连接数")
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("异步TTS流水线测试")
+    print("=" * 50)
+    results = [
+        *await test_threads(args.connections),
+        await test_thread_mode(),
+        await test_wakeup(),
+        await test_cancel(),
+    ]
+    passed = sum(results)
+    print("=" * 50)
+    print(f"结果: {passed}/{len(results)} 通过")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,231 @@
+"""
+TTS 合成结果缓存测试
+验证：
+    1. 缓存键：空白和全角字符不同的相同句子得到同一个键；提供方、音色、语速、输出格式不同得到不同的键，密钥不影响缓存键
+    2. 命中时不请求提供方，立即开始播放，音频与首次合成相同（流式提供方、整句提供方、to_tts 都适用）
+    3. 内存缓存按字节数淘汰最久未使用的句子；磁盘缓存在新进程（新实例）中仍可命中，损坏的文件视为未命中
+    4. 中途中断的语音流不写入缓存；命中和未命中计入指标
+
+使用方法（在项目根目录运行）:
+    python tools/test_tts_cache.py
+"""
+
+import io
+import os
+import sys
+import time
+import wave
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+from core.utils import tts_cache
+from core.utils.tts_cache import TTSCache
+from core.utils.metrics import MetricsRegistry
+from core.providers.tts.base import TTSProviderBase
+from core.providers.tts.openai import TTSProvider as OpenAITTS
+from core.providers.tts.dto.dto import SentenceType
+
+SYNTHESIS_TIME = 0.3  # 模拟的整句合成耗时（秒）
+
+
+def make_wav(duration=1.0, sample_rate=16000) -> bytes:
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    samples = np.round(np.sin(2 * np.pi * 440 * t) * 0.3 * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+class FakeConnection:
+    audio_format = "opus"
+
+
+class FakeTTS(TTSProviderBase):
+    """整句返回音频的提供方，记录合成次数"""
+
+    def __init__(self, voice="xiaoxiao", speed=1.0, api_key="sk-secret"):
+        # 使用基类默认的缓存参数（去掉密钥后的全部配置）
+        super().__init__({"voice": voice, "speed": speed, "api_key": api_key}, delete_audio_file=True)
+        self.conn = FakeConnection()
+        self.data = make_wav()
+        self.calls = 0
+        self.fail_after = None  # 流式提供方输出多少块后中断
+        self.packets = []
+
+    async def text_to_speak(self, text, output_file):
+        self.calls += 1
+        await asyncio.sleep(SYNTHESIS_TIME)
+        return self.data
+
+    def handle_opus(self, opus_data):
+        self.packets.append(opus_data)
+
+    def speak(self, text):
+        """合成一句，返回 (第一帧延迟, Opus帧)"""
+        self.packets = []
+        first = {}
+        start = time.perf_counter()
+
+        def handle_opus(opus_data):
+            first.setdefault("time", time.perf_counter() - start)
+            self.handle_opus(opus_data)
+
+        self.to_tts_stream(text, handle_opus)
+        return first.get("time"), self.packets
+
+
+class FakeStreamTTS(FakeTTS):
+    """逐块返回音频的提供方"""
+
+    async def text_to_speak_stream(self, text):
+        self.calls += 1
+        step = len(self.data) // 10 + 1
+        for index, offset in enumerate(range(0, len(self.data), step)):
+            if index == self.fail_after:
+                raise ConnectionError("模拟连接中断")
+            await asyncio.sleep(SYNTHESIS_TIME / 10)
+            yield self.data[offset: offset + step]
+
+
+class OtherTTS(FakeTTS):
+    """另一个提供方"""
+
+
+def check(name, condition):
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+
+def test_key(cache):
+    """测试 1/4: 缓存键"""
+    print("🔍 测试 1/4: 缓存键")
+    tts = FakeTTS()
+    key = cache.make_key(tts, "欢迎来到直播间！")
+    return all([
+        check("空白、全角字符不同的相同句子得到同一个键",
+              key == cache.make_key(tts, "  欢迎来到直播间!  ") == cache.make_key(FakeTTS(), "欢迎来到直播间！")),
+        check("音色不同的键不同", key != cache.make_key(FakeTTS(voice="yunxi"), "欢迎来到直播间！")),
+        check("语速不同的键不同", key != cache.make_key(FakeTTS(speed=1.2), "欢迎来到直播间！")),
+        check("提供方不同的键不同", key != cache.make_key(OtherTTS(), "欢迎来到直播间！")),
+        check("文本不同的键不同", key != cache.make_key(tts, "欢迎来到直播间。")),
+        check("密钥不影响缓存键", key == cache.make_key(FakeTTS(api_key="sk-other"), "欢迎来到直播间！")),
+        check("提供方的输出格式、模型不同的键不同",
+              len({cache.make_key(OpenAITTS(config, True), "欢迎来到直播间！") for config in (
+                  {"api_key": "sk-a"}, {"api_key": "sk-b"}, {"api_key": "sk-a", "format": "mp3"},
+                  {"api_key": "sk-a", "model": "tts-1-hd"},
+              )}) == 3),
+        check("过长的句子不缓存", cache.make_key(tts, "很" * 51) is None),
+    ])
+
+
+def test_hit(cache):
+    """测试 2/4: 命中时不请求提供方"""
+    print(f"🔍 测试 2/4: 命中时跳过提供方（合成耗时 {SYNTHESIS_TIME * 1000:.0f}ms）")
+    results = []
+    for label, tts in (("整句提供方", FakeTTS()), ("流式提供方", FakeStreamTTS(voice="stream"))):
+        miss_first, miss_packets = tts.speak("主播好")
+        tts.tts_audio_queue.queue.clear()
+        hit_first, hit_packets = tts.speak("主播好")
+        queued = [item[0] for item in list(tts.tts_audio_queue.queue)]
+        print(f"   {label}: 首次第一帧 {miss_first * 1000:.1f}ms，命中第一帧 {hit_first * 1000:.2f}ms")
+        results.append(all([
+            check(f"{label} 只请求了一次提供方", tts.calls == 1),
+            check(f"{label} 命中后立即开始播放", hit_first < 0.01),
+            check(f"{label} 命中的音频与首次合成相同（{len(hit_packets)} 帧）",
+                  hit_packets == miss_packets and len(hit_packets) > 10),
+            check(f"{label} 命中时先放入 FIRST", queued == [SentenceType.FIRST]),
+        ]))
+
+    tts = FakeTTS(voice="to_tts")
+    packets = tts.to_tts("感谢关注")
+    results.append(check("to_tts 命中时不请求提供方",
+                         tts.to_tts("感谢关注") == packets and tts.calls == 1 and len(packets) > 10))
+    results.append(check("流式合成的结果可被 to_tts 命中",
+                         FakeStreamTTS(voice="stream").to_tts("主播好") is not None))
+    return all(results)
+
+
+def test_tiers(cache_dir):
+    """测试 3/4: 内存淘汰和磁盘缓存"""
+    print("🔍 测试 3/4: 内存按字节数淘汰，磁盘缓存跨实例命中")
+    packet = bytes(1000)
+    cache = TTSCache({"max_memory_mb": 3000 / 1024 / 1024, "disk": True, "dir": cache_dir})
+    cache.put("a" * 64, [packet])
+    cache.put("b" * 64, [packet])
+    cache.get("a" * 64)  # a 变为最近使用
+    cache.put("c" * 64, [packet, packet])
+    entries = set(cache._entries)
+
+    reloaded = TTSCache({"disk": True, "dir": cache_dir})
+    from_disk = reloaded.get("b" * 64)
+    again = reloaded.get("b" * 64)
+
+    corrupt_path = reloaded._disk_path("c" * 64)
+    with open(corrupt_path, "r+b") as f:
+        f.truncate(100)
+    corrupt = TTSCache({"disk": True, "dir": cache_dir}).get("c" * 64)
+
+    stats = reloaded.get_stats()
+    return all([
+        check(f"内存不超过上限（{cache.memory_bytes} 字节），淘汰最久未使用的 b",
+              cache.memory_bytes <= 3000 and entries == {"a" * 64, "c" * 64}),
+        check("新实例从磁盘命中被内存淘汰的 b", from_disk == [packet] and stats["hits_disk"] == 1),
+        check("磁盘命中后放入内存", again == [packet] and stats["hits_memory"] == 1),
+        check(f"新实例统计已有的磁盘占用（{stats['disk_bytes']} 字节）", stats["disk_bytes"] > 4000),
+        check("损坏的文件视为未命中并删除", corrupt is None and not os.path.exists(corrupt_path)),
+    ])
+
+
+def test_interrupted(cache):
+    """测试 4/4: 中断不写入缓存，指标"""
+    print("🔍 测试 4/4: 中断的语音流不缓存，命中统计")
+    tts = FakeStreamTTS(voice="interrupted")
+    tts.fail_after = 5
+    tts.speak("中途断开")
+    _, packets = tts.speak("中途断开")
+    calls = tts.calls
+    stores_before = cache.stats["stores"]
+    tts.fail_after = None
+    tts.speak("中途断开")
+
+    registry = MetricsRegistry()
+    cache.register_metrics(registry)
+    text = registry.render()
+    stats = cache.get_stats()
+    print(f"   统计: {stats}")
+    return all([
+        check("中断后再次合成仍请求提供方", calls == 2 and len(packets) > 0),
+        check("完整合成后写入缓存", cache.stats["stores"] == stores_before + 1),
+        check("指标包含命中和未命中",
+              f'xiaozhi_tts_cache_lookups_total{{result="hit_memory"}} {stats["hits_memory"]}' in text
+              and f'xiaozhi_tts_cache_lookups_total{{result="miss"}} {stats["misses"]}' in text),
+    ])
+
+
+def main():
+    print("=" * 50)
+    print("TTS 合成结果缓存测试")
+    print("=" * 50)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = tts_cache.configure({"enabled": True, "disk": True, "dir": os.path.join(cache_dir, "shared")})
+        results = [
+            test_key(cache),
+            test_hit(cache),
+            test_tiers(os.path.join(cache_dir, "tiers")),
+            test_interrupted(cache),
+        ]
+    passed = sum(results)
+    print("=" * 50)
+    print(f"结果: {passed}/{len(results)} 通过")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
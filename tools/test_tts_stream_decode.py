@@ -0,0 +1,294 @@
+"""
+流式音频边接收边解码测试
+验证：
+    1. AudioStreamDecoder 分块解码 WAV（含长度占位的流式头部）的结果与整体解码一致，MP3 任意分块的结果相同
+    2. 提供方逐块返回音频时，第一个Opus帧在整句合成完成前进入播放队列（原实现要等整句合成完成）
+    3. 没有收到音频时重试；已输出音频后出错不重试，不重复播放
+    4. OpenAI 提供方从本地模拟服务流式读取 WAV，边接收边输出；服务停止响应时按 tts_timeout 超时
+
+使用方法（在项目根目录运行）:
+    python tools/test_tts_stream_decode.py
+"""
+
+import io
+import os
+import sys
+import time
+import wave
+import random
+import struct
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+from aiohttp import web
+from core.utils import audio_decode, tts_pool
+from core.utils.audio_decode import AudioStreamDecoder, decode_to_pcm
+from core.providers.tts.base import TTSProviderBase
+from core.providers.tts.dto.dto import SentenceType
+from core.providers.tts.openai import TTSProvider as OpenAITTS
+
+try:
+    import lameenc
+except ImportError:
+    lameenc = None
+
+SYNTHESIS_TIME = 0.6  # 模拟的整句合成耗时（秒）
+CHUNKS = 12
+
+
+def tone(sample_rate, duration=1.0):
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    return np.round((np.sin(2 * np.pi * 300 * t) + np.sin(2 * np.pi * 1200 * t)) * 0.3 * 32767).astype("<i2")
+
+
+def make_wav(sample_rate=24000, channels=1, streaming_header=False) -> bytes:
+    samples = tone(sample_rate)
+    if channels == 2:
+        samples = np.stack([samples, samples // 2], axis=1).reshape(-1)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.tobytes())
+    data = bytearray(buffer.getvalue())
+    if streaming_header:
+        # 流式响应不知道总长度，长度字段为占位值
+        data[4:8] = struct.pack("<I", 0xFFFFFFFF)
+        data[40:44] = struct.pack("<I", 0xFFFFFFFF)
+    return bytes(data)
+
+
+def make_mp3():
+    if lameenc is None:
+        return None
+    encoder = lameenc.Encoder()
+    encoder.set_bit_rate(48)
+    encoder.set_in_sample_rate(24000)
+    encoder.set_channels(1)
+    encoder.set_quality(2)
+    return bytes(encoder.encode(tone(24000).tobytes()) + encoder.flush())
+
+
+def split(data, count=CHUNKS):
+    """随机切分为多块"""
+    cuts = sorted(random.sample(range(1, len(data)), count - 1))
+    return [data[start:end] for start, end in zip([0] + cuts, cuts + [len(data)])]
+
+
+def stream_decode(data, file_type, chunks=CHUNKS):
+    pcm = []
+    decoder = AudioStreamDecoder(file_type, pcm.append)
+    try:
+        for chunk in split(data, chunks) if chunks > 1 else [data]:
+            decoder.feed(chunk)
+        decoder.finish()
+    finally:
+        decoder.close()
+    return np.frombuffer(b"".join(pcm), dtype="<i2")
+
+
+def check(name, condition):
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+
+def test_decoder():
+    """测试 1/4: 分块解码与整体解码一致"""
+    print("🔍 测试 1/4: 分块解码与整体解码一致")
+    results = []
+    for label, data in (
+        ("WAV 24kHz 单声道", make_wav()),
+        ("WAV 22.05kHz 双声道", make_wav(22050, 2)),
+        ("WAV 流式头部（长度占位）", make_wav(streaming_header=True)),
+    ):
+        whole = np.frombuffer(decode_to_pcm(make_wav() if "占位" in label else data, "wav"), dtype="<i2")
+        streamed = stream_decode(data, "wav")
+        count = min(len(whole), len(streamed))
+        diff = np.abs(whole[:count].astype(np.int32) - streamed[:count]).max()
+        results.append(check(f"{label}: {len(streamed)} 个采样（整体 {len(whole)}），最大差值 {diff}",
+                             abs(len(whole) - len(streamed)) <= 1 and diff <= 1))
+
+    mp3 = make_mp3()
+    if mp3 is None or audio_decode.miniaudio is None:
+        print("   ⚠️ 未安装 lameenc 或 miniaudio，跳过 MP3")
+    else:
+        whole = np.frombuffer(decode_to_pcm(mp3, "mp3"), dtype="<i2")
+        single = stream_decode(mp3, "mp3", chunks=1)
+        consistent = all(np.array_equal(stream_decode(mp3, "mp3", chunks), single) for chunks in (2, 12, 60, 300))
+        # 整体解码会把开头的 LAME 信息帧解码为一帧静音，流式解码跳过该帧
+        results.append(check(f"MP3: {len(single)} 个采样（整体 {len(whole)}），任意分块结果相同",
+                             0 <= len(whole) - len(single) <= 1152 and consistent))
+    return all(results)
+
+
+class FakeConnection:
+    audio_format = "opus"
+
+
+class FakeWholeTTS(TTSProviderBase):
+    """原实现：整句合成完成（SYNTHESIS_TIME）后一次返回"""
+
+    def __init__(self, data, file_type, fail_after=None):
+        super().__init__({}, delete_audio_file=True)
+        self.conn = FakeConnection()
+        self.audio_file_type = file_type
+        self.data = data
+        self.fail_after = fail_after  # 输出多少块后出错（0 为没有输出就出错）
+        self.calls = 0
+        self.packets = []
+        self.first_packet_at = None
+
+    async def text_to_speak(self, text, output_file):
+        await asyncio.sleep(SYNTHESIS_TIME)
+        return self.data
+
+    def handle_opus(self, opus_data):
+        if self.first_packet_at is None:
+            self.first_packet_at = time.perf_counter()
+        self.packets.append(opus_data)
+
+
+class FakeStreamTTS(FakeWholeTTS):
+    """逐块返回音频的提供方"""
+
+    async def text_to_speak_stream(self, text):
+        self.calls += 1
+        for index, chunk in enumerate(split(self.data)):
+            if index == self.fail_after:
+                raise ConnectionError("模拟连接中断")
+            await asyncio.sleep(SYNTHESIS_TIME / CHUNKS)
+            yield chunk
+
+
+def first_audio(tts):
+    start = time.perf_counter()
+    tts_pool.get_executor().submit(tts.to_tts_stream, "你好", tts.handle_opus).result()
+    return tts.first_packet_at - start, time.perf_counter() - start
+
+
+def test_first_audio():
+    """测试 2/4: 第一帧延迟"""
+    print(f"🔍 测试 2/4: 第一个Opus帧的延迟（整句合成 {SYNTHESIS_TIME * 1000:.0f}ms）")
+    cases = [("wav", make_wav())]
+    mp3 = make_mp3()
+    if mp3 is not None and audio_decode.miniaudio is not None:
+        cases.append(("mp3", mp3))
+    results = []
+    for file_type, data in cases:
+        streamed = FakeStreamTTS(data, file_type)
+        stream_first, _ = first_audio(streamed)
+        whole = FakeWholeTTS(data, file_type)
+        whole_first, _ = first_audio(whole)
+        queued = [item[0] for item in list(streamed.tts_audio_queue.queue)]
+        print(f"   {file_type}: 边接收边解码 {stream_first * 1000:.0f}ms，整句解码 {whole_first * 1000:.0f}ms")
+        results.append(all([
+            check(f"{file_type} 第一帧在合成完成前输出", stream_first < SYNTHESIS_TIME / 2),
+            check(f"{file_type} 帧数与整句解码相近（{len(streamed.packets)} / {len(whole.packets)}）",
+                  abs(len(streamed.packets) - len(whole.packets)) <= 1),
+            check(f"{file_type} 先放入 FIRST", queued and queued[0] == SentenceType.FIRST),
+        ]))
+    return all(results)
+
+
+def test_retry():
+    """测试 3/4: 重试"""
+    print("🔍 测试 3/4: 出错重试")
+    data = make_wav()
+    before_audio = FakeStreamTTS(data, "wav", fail_after=0)
+    before_audio.to_tts_stream("你好", before_audio.handle_opus)
+    after_audio = FakeStreamTTS(data, "wav", fail_after=CHUNKS // 2)
+    after_audio.to_tts_stream("你好", after_audio.handle_opus)
+    firsts = [item for item in list(after_audio.tts_audio_queue.queue) if item[0] == SentenceType.FIRST]
+    return all([
+        check(f"没有音频时重试 {before_audio.calls} 次", before_audio.calls == 5 and not before_audio.packets),
+        check("已输出音频后出错不重试", after_audio.calls == 1 and after_audio.packets and len(firsts) == 1),
+    ])
+
+
+async def test_openai():
+    """测试 4/4: OpenAI 提供方流式读取"""
+    print("🔍 测试 4/4: OpenAI 提供方流式读取 WAV")
+    data = make_wav(streaming_header=True)
+
+    async def speech(request):
+        body = await request.json()
+        response = web.StreamResponse(headers={"Content-Type": "audio/wav"})
+        await response.prepare(request)
+        step = len(data) // CHUNKS + 1
+        for offset in range(0, len(data), step):
+            await response.write(data[offset: offset + step])
+            await asyncio.sleep(SYNTHESIS_TIME / CHUNKS)
+        await response.write_eof()
+        request.app["format"] = body.get("response_format")
+        return response
+
+    async def stall(request):
+        response = web.StreamResponse(headers={"Content-Type": "audio/wav"})
+        await response.prepare(request)
+        await response.write(data[:100])
+        await asyncio.sleep(30)
+        return response
+
+    app = web.Application()
+    app.add_routes([web.post("/v1/audio/speech", speech), web.post("/v1/audio/stall", stall)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    tts = OpenAITTS({"api_key": "sk-local-test", "api_url": f"http://127.0.0.1:{port}/v1/audio/speech"}, True)
+    tts.conn = FakeConnection()
+    packets = []
+    start = time.perf_counter()
+    first = {}
+
+    def handle_opus(opus_data):
+        first.setdefault("time", time.perf_counter() - start)
+        packets.append(opus_data)
+
+    await tts_pool.run_blocking(tts.to_tts_stream, "你好", handle_opus)
+    total = time.perf_counter() - start
+
+    stalled = OpenAITTS({
+        "api_key": "sk-local-test", "api_url": f"http://127.0.0.1:{port}/v1/audio/stall", "tts_timeout": 0.5,
+    }, True)
+
+    async def read_stalled():
+        async for _ in stalled.text_to_speak_stream("你好"):
+            pass
+
+    start = time.perf_counter()
+    try:
+        await tts_pool.run_blocking(lambda: tts_pool.run_coroutine(read_stalled()))
+        timed_out = False
+    except asyncio.TimeoutError:
+        timed_out = True
+    stall_time = time.perf_counter() - start
+    await runner.cleanup()
+    print(f"   第一帧 {first.get('time', 0) * 1000:.0f}ms，完成 {total * 1000:.0f}ms")
+    return all([
+        check("第一帧在响应结束前输出", first and first["time"] < total / 2),
+        check(f"输出 {len(packets)} 个60ms帧", abs(len(packets) - 17) <= 1),
+        check("请求 WAV 格式", app["format"] == "wav"),
+        check(f"服务停止响应时 {stall_time * 1000:.0f}ms 后超时", timed_out and stall_time < 2),
+    ])
+
+
+def main():
+    print("=" * 50)
+    print("流式音频边接收边解码测试")
+    print("=" * 50)
+    random.seed(1)
+    results = [test_decoder(), test_first_audio(), test_retry(), asyncio.run(test_openai())]
+    passed = sum(results)
+    print("=" * 50)
+    print(f"结果: {passed}/{len(results)} 通过")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,248 @@
+"""
+上游连接空闲预热测试
+本地启动模拟的 OpenAI 兼容服务（空闲2秒关闭连接），前面加一层代理为每个新连接增加300ms建立耗时（模拟 TCP+TLS 握手），验证：
+    1. 连续对话复用连接；空闲超过服务端连接超时后，不预热时首条回复要多付一次建连耗时
+    2. 开启预热后，空闲后的首条回复延迟与连续对话时持平
+    3. 直播间有活动时不预热，预热次数不超过预算，TTS 按配置预热
+    4. OpenAI TTS 的流式合成在共享线程池的 HTTP 会话中复用预热保持的连接
+
+使用方法（在项目根目录运行）:
+    python tools/test_upstream_warmup.py
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from aiohttp import web
+from configs.logger import setup_logging
+from core.danmaku.warmup import UpstreamWarmer
+from core.providers.llm.openai.openai import LLMProvider
+from core.providers.tts.openai import TTSProvider as OpenAITTS
+from core.utils.tts_pool import run_blocking, run_coroutine
+
+CONNECT_DELAY = 0.3  # 模拟的建连耗时（秒）
+SERVER_IDLE_TIMEOUT = 2.0  # 服务端关闭空闲连接的时间（秒）
+IDLE = 3.0  # 测试中直播间的空闲时间（秒）
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_upstream():
+    """模拟的 OpenAI 兼容服务"""
+
+    async def models(request):
+        return web.json_response({"object": "list", "data": []})
+
+    async def chat(request):
+        body = await request.json()
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for text in ("你好", "呀")[:body.get("max_tokens") or 2]:
+            chunk = {
+                "id": "fake", "object": "chat.completion.chunk", "created": 0, "model": "fake",
+                "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def speech(request):
+        return web.Response(body=bytes(3200), content_type="audio/pcm")
+
+    app = web.Application()
+    app.add_routes([
+        web.get("/v1/models", models),
+        web.post("/v1/chat/completions", chat),
+        web.post("/v1/audio/speech", speech),
+    ])
+    runner = web.AppRunner(app, keepalive_timeout=SERVER_IDLE_TIMEOUT)
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, port
+
+
+class SlowConnectProxy:
+    """每个新连接增加固定建立耗时的TCP代理"""
+
+    def __init__(self, upstream_port: int):
+        self.upstream_port = upstream_port
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        await asyncio.sleep(CONNECT_DELAY)
+        upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", self.upstream_port)
+
+        async def pipe(source, target):
+            try:
+                while data := await source.read(65536):
+                    target.write(data)
+                    await target.drain()
+            except ConnectionError:
+                pass
+            finally:
+                target.close()
+
+        try:
+            await asyncio.gather(pipe(reader, upstream_writer), pipe(upstream_reader, writer))
+        except asyncio.CancelledError:
+            writer.close()
+
+
+class FakeHandler:
+    def __init__(self):
+        self.is_speaking = False
+        self.received = 0
+
+    def get_stats(self):
+        return {"received": self.received, "served": self.received}
+
+
+class FakeTTS:
+    def __init__(self):
+        self.warmups = []
+
+    async def warmup(self, request=False):
+        self.warmups.append(request)
+        return True
+
+
+class FakeRoom:
+    def __init__(self, tts=None):
+        self.handler = FakeHandler()
+        self.tts = tts or FakeTTS()
+
+
+def check(name, condition):
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+
+async def first_token_latency(llm) -> float:
+    """首字延迟（读完整个回复，连接回到连接池）"""
+    start = time.perf_counter()
+    first = None
+    async for _ in llm.response_async("test", [{"role": "user", "content": "在吗"}]):
+        if first is None:
+            first = time.perf_counter() - start
+    return first
+
+
+async def synthesize(tts) -> int:
+    """在共享线程池中流式合成一句，返回收到的字节数"""
+
+    async def consume():
+        return sum([len(chunk) async for chunk in tts.text_to_speak_stream("你好")])
+
+    return await run_blocking(lambda: run_coroutine(consume()))
+
+
+async def test_tts_sessions(proxy, proxy_port, logger):
+    """测试 4/4: TTS HTTP 会话预热"""
+    print(f"🔍 测试 4/4: OpenAI TTS 空闲 {IDLE:.0f}s 后的流式合成")
+    tts = OpenAITTS({"api_key": "sk-local-test", "api_url": f"http://127.0.0.1:{proxy_port}/v1/audio/speech"}, True)
+    received = await synthesize(tts)
+    await asyncio.sleep(IDLE)
+    connections = proxy.connections
+    await synthesize(tts)
+    cold_connections = proxy.connections - connections
+
+    room = FakeRoom(tts)
+    warmer = UpstreamWarmer({"idle_after": 0.5, "interval": 1.0, "max_per_hour": 100}, None, {"room": room}, logger)
+    warmer.targets = [target for target in warmer.targets if target.name != "llm"]
+    task = asyncio.create_task(warmer.run())
+    await asyncio.sleep(IDLE)
+    task.cancel()
+    connections = proxy.connections
+    await synthesize(tts)
+    stats = warmer.get_stats()["tts:room"]
+    return all([
+        check(f"不预热时空闲后新建 {cold_connections} 个连接", received == 3200 and cold_connections == 1),
+        check(f"预热 TTS {stats['ok']} 次（默认不发送合成请求）", stats["ok"] >= 2),
+        check("预热后复用保持的连接", proxy.connections == connections),
+    ])
+
+
+async def main():
+    logger = setup_logging()
+    runner, upstream_port = await start_upstream()
+    proxy = SlowConnectProxy(upstream_port)
+    proxy_port = free_port()
+    proxy_server = await asyncio.start_server(proxy.handle, "127.0.0.1", proxy_port)
+    llm = LLMProvider({"model_name": "fake", "api_key": "sk-local-test", "base_url": f"http://127.0.0.1:{proxy_port}/v1"})
+
+    print("=" * 50)
+    print(f"上游连接空闲预热测试（建连 {CONNECT_DELAY * 1000:.0f}ms，服务端空闲 {SERVER_IDLE_TIMEOUT:.0f}s 关闭连接）")
+    print("=" * 50)
+
+    print("🔍 测试 1/4: 连续对话与空闲后不预热")
+    await first_token_latency(llm)
+    steady = min([await first_token_latency(llm) for _ in range(5)])
+    print(f"   连续对话首字延迟: {steady * 1000:.1f}ms")
+    reused = check("连续对话复用连接", steady < CONNECT_DELAY / 2)
+
+    print(f"   空闲 {IDLE:.0f}s 后不预热:")
+    await asyncio.sleep(IDLE)
+    cold = await first_token_latency(llm)
+    results = [check(f"首字延迟 {cold * 1000:.1f}ms，多付一次建连", cold > steady + CONNECT_DELAY * 0.8) and reused]
+
+    print(f"🔍 测试 2/4: 空闲 {IDLE:.0f}s 期间预热")
+    room = FakeRoom()
+    config = {"idle_after": 0.5, "interval": 1.0, "max_per_hour": 100, "tts_request": True}
+    warmer = UpstreamWarmer(config, llm, {"room": room}, logger)
+    task = asyncio.create_task(warmer.run())
+    await asyncio.sleep(IDLE)
+    task.cancel()
+    connections = proxy.connections
+    warm = await first_token_latency(llm)
+    stats = warmer.get_stats()
+    results.append(all([
+        check(f"首字延迟 {warm * 1000:.1f}ms，与连续对话持平", warm < steady + CONNECT_DELAY * 0.3),
+        check("复用预热保持的连接", proxy.connections == connections),
+        check(f"预热 LLM {stats['llm']['ok']} 次", stats["llm"]["ok"] >= 2),
+        check("TTS 按配置发送短合成预热", room.tts.warmups and all(room.tts.warmups)),
+    ]))
+
+    print("🔍 测试 3/4: 活动期间不预热，预热次数受预算限制")
+    busy_room = FakeRoom()
+    busy = UpstreamWarmer({"idle_after": 0.5, "interval": 0.2, "max_per_hour": 100}, llm, {"room": busy_room}, logger)
+    await busy.check()
+    for _ in range(10):
+        busy_room.handler.received += 1
+        await busy.check()
+        await asyncio.sleep(0.1)
+    busy_stats = busy.get_stats()
+
+    limited = UpstreamWarmer({"idle_after": 0, "interval": 0.2, "max_per_hour": 2}, llm, {"room": FakeRoom()}, logger)
+    for _ in range(10):
+        await limited.check()
+        await asyncio.sleep(0.2)
+    limited_stats = limited.get_stats()["llm"]
+    results.append(all([
+        check("直播间有弹幕时不预热", busy_stats["llm"]["ok"] == 0 and busy_stats["tts:room"]["ok"] == 0),
+        check(f"超出预算后跳过 {limited_stats}", limited_stats["ok"] == 2 and limited_stats["skipped"] > 0),
+    ]))
+
+    results.append(await test_tts_sessions(proxy, proxy_port, logger))
+
+    proxy_server.close()
+    await runner.cleanup()
+    passed = sum(results)
+    print("=" * 50)
+    print(f"结果: {passed}/{len(results)} 通过")
+    return passed == len(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)